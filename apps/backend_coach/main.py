@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 import os
 import sys
+import json
+import asyncio
 from datetime import datetime
 from typing import Any, Dict, Optional
 
 from fastapi import FastAPI, Query, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
 # إعداد المسارات
 APP_DIR = os.path.dirname(__file__)
@@ -31,23 +35,63 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# تهيئة المكونات
-skills_manager = None
-_orch = None
+# زمن/عدد الطلبات لكل route + Server-Timing عند X-Factory-Trace (المقاييس على /metrics)
+from scripts.ai.stage_timing import TimingMiddleware, render_prometheus
 
-try:
-    from scripts.ai.skills_manager import SkillsManager
-    skills_manager = SkillsManager()
-    print("✅ SkillsManager جاهز للعمل")
-except Exception as e:
-    print(f"❌ خطأ في تحميل SkillsManager: {e}")
+app.add_middleware(TimingMiddleware)
+
+# تهيئة المكونات: سجل مشترك يبني كل مكون مرة واحدة عند أول استخدام أو في الإحماء
+from scripts.ai import registry
+
+def _orchestrator():
+    try:
+        return registry.get("orchestrator")
+    except Exception as e:
+        print(f"❌ خطأ في تحميل LLMOrchestrator: {e}")
+        raise HTTPException(status_code=500, detail="LLMOrchestrator غير متوفر")
+
+def _skills_manager():
+    try:
+        return registry.get("skills_manager")
+    except Exception as e:
+        print(f"❌ خطأ في تحميل SkillsManager: {e}")
+        raise HTTPException(status_code=500, detail="SkillsManager غير متوفر")
 
 try:
-    from scripts.ai.llm.llm_orchestrator import LLMOrchestrator
-    _orch = LLMOrchestrator()
-    print("✅ LLMOrchestrator جاهز للعمل")
+    from scripts.ai.factory_metrics import shutdown_metrics, metrics_sink_stats
 except Exception as e:
-    print(f"❌ خطأ في تحميل LLMOrchestrator: {e}")
+    shutdown_metrics = None
+    metrics_sink_stats = None
+    print(f"❌ خطأ في تحميل factory_metrics: {e}")
+
+from scripts.ai.executors import run_io, shutdown_executors
+
+def _warm_up() -> None:
+    result = registry.warm_up()
+    for name, step in result["steps"].items():
+        if "error" in step:
+            print(f"❌ خطأ في تحميل {name}: {step['error']}")
+        else:
+            print(f"✅ {name} جاهز للعمل ({step['ms']}ms)")
+    print(f"🔥 اكتمل الإحماء في {result['ms']}ms")
+
+@app.on_event("startup")
+async def warm_up_components():
+    # المنفذ يُفتح فوراً (/api/health)؛ /api/ready يعيد 503 حتى ينتهي الإحماء في thread
+    if registry.WARMUP_ENABLED:
+        app.state.warmup_task = asyncio.create_task(run_io(_warm_up))
+    else:
+        registry.mark_ready()
+
+@app.on_event("shutdown")
+async def flush_metrics_on_shutdown():
+    # تفريغ طابور القياسات وإغلاق pools قبل إغلاق العملية
+    shutdown_executors(wait=False)
+    if shutdown_metrics:
+        shutdown_metrics()
+    orch = registry.peek("orchestrator")
+    if orch:
+        await orch.aclose()
 
 @app.get("/")
 async def root():
@@ -60,18 +104,36 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
+    # لا يبني أي مكون: فقط ما تم بناؤه فعلاً
+    orch = registry.peek("orchestrator")
     return {
         "status": "healthy ✅",
         "service": "backend_coach",
         "timestamp": datetime.utcnow().isoformat(),
+        "metrics_sink": metrics_sink_stats() if metrics_sink_stats else None,
+        "analysis_cache": orch.cache_stats() if orch else None,
+        "llm": orch.llm_stats() if orch else None,
+        "answer_cache": orch.answer_cache_stats() if orch else None,
     }
 
+@app.get("/api/ready")
+async def readiness_check():
+    # منفصل عن /api/health: الخدمة حيّة ≠ المكونات محمّلة وجاهزة
+    status = registry.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # مقاييس هذه العملية فقط (histograms المراحل وطلبات كل route)
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/api/skills/state")
 async def get_skills_state(user_id: str = Query(...)):
-    if not skills_manager:
-        raise HTTPException(status_code=500, detail="SkillsManager غير متوفر")
+    skills_manager = _skills_manager()
     try:
-        result = skills_manager.get_skills_state(user_id)
+        result = await skills_manager.get_skills_state_async(user_id)
         print(f"📊 جلب حالة المهارات للمستخدم: {user_id}")
         return result
     except Exception as e:
@@ -84,51 +146,132 @@ async def update_skill(
     skill_id: str = Query(...),
     new_score: int = Query(...)
 ):
-    if not skills_manager:
-        raise HTTPException(status_code=500, detail="SkillsManager غير متوفر")
+    skills_manager = _skills_manager()
     try:
-        result = skills_manager.update_skill(user_id, skill_id, new_score)
+        result = await skills_manager.update_skill_async(user_id, skill_id, new_score)
         print(f"🔄 تحديث المهارة: {skill_id} للمستخدم: {user_id} إلى: {new_score}")
         return result
     except Exception as e:
         print(f"❌ خطأ في تحديث المهارة: {e}")
         raise HTTPException(status_code=500, detail=f"خطأ في تحديث المهارة: {e}")
 
+@app.get("/api/skills/cohort")
+async def skills_cohort(
+    track: Optional[str] = Query(None, description="مسار من ai/skills_tracks (مثلاً backend_junior)"),
+    skill: Optional[str] = Query(None, description="مهارة أو عدة مهارات مفصولة بفواصل؛ الافتراضي كل مهارات المسار"),
+    bins: int = Query(10, ge=1, le=101),
+    percentiles: str = Query("50,90,99"),
+):
+    try:
+        cohort = registry.get("cohort")
+    except Exception as e:
+        print(f"❌ خطأ في تحميل لقطة المهارات: {e}")
+        raise HTTPException(status_code=500, detail="لقطة المهارات غير متوفرة")
+    try:
+        pcts = [float(p) for p in percentiles.split(",") if p.strip()]
+        skills = [s.strip() for s in skill.split(",") if s.strip()] if skill else None
+        return await run_io(cohort.stats, track, skills, bins, pcts)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
 @app.get("/api/orchestrator/analyze")
 async def analyze_message(
     user_id: str = Query(...),
     message: str = Query(...)
 ):
-    if not _orch:
-        raise HTTPException(status_code=500, detail="LLMOrchestrator غير متوفر")
+    orch = _orchestrator()
     try:
-        result = _orch.analyze_message(user_id, message)
+        result = await orch.analyze_message_async(user_id, message)
         print(f"🎯 تحليل الرسالة للمستخدم: {user_id} - الرسالة: {message}")
         return result
     except Exception as e:
         print(f"❌ خطأ في تحليل الرسالة: {e}")
         raise HTTPException(status_code=500, detail=f"خطأ في تحليل الرسالة: {e}")
 
+@app.post("/api/orchestrator/analyze_batch")
+async def analyze_batch(
+    user_id: str = Query("batch"),
+    data: Dict[str, Any] = Body(...)
+):
+    orch = _orchestrator()
+    messages = data.get("messages", [])
+    if not isinstance(messages, list) or not all(isinstance(m, str) for m in messages):
+        raise HTTPException(status_code=422, detail="messages يجب أن تكون قائمة نصوص")
+    try:
+        results = await orch.analyze_batch_async(user_id, messages)
+        print(f"🎯 تحليل دفعي لـ {len(messages)} رسالة للمستخدم: {user_id}")
+        return {"count": len(results), "results": results}
+    except Exception as e:
+        print(f"❌ خطأ في التحليل الدفعي: {e}")
+        raise HTTPException(status_code=500, detail=f"خطأ في التحليل الدفعي: {e}")
+
 @app.post("/api/orchestrator/smart_answer")
 async def smart_answer(
     user_id: str = Query(...),
     data: Dict[str, Any] = Body(...)
 ):
-    if not _orch:
-        raise HTTPException(status_code=500, detail="LLMOrchestrator غير متوفر")
+    orch = _orchestrator()
     try:
         message = data.get("message", "")
-        result = _orch.generate_smart_response(user_id, message)
+        result = await orch.smart_answer_async(user_id, message)
         print(f"🤖 إجابة ذكية للمستخدم: {user_id} - الرسالة: {message}")
         return result
     except Exception as e:
         print(f"❌ خطأ في توليد الإجابة: {e}")
         raise HTTPException(status_code=500, detail=f"خطأ في توليد الإجابة: {e}")
 
+async def _after_stream(user_id: str, message: str, final: Dict[str, Any]) -> None:
+    # بعد إرسال آخر بايت: القياسات وتحديث المهارات خارج مسار الاستجابة
+    if not final:
+        return
+    from scripts.ai.skills_manager import AGENT_SKILL_MAP
+
+    agent = final["agent"]
+    _orchestrator().record_stream(user_id, message, agent, final["rag_hits"])
+    deltas = {sk: 10 for sk in AGENT_SKILL_MAP.get(agent, [])}
+    if deltas:
+        await _skills_manager().apply_skill_deltas_async(user_id, deltas)
+
+@app.post("/api/orchestrator/smart_answer/stream")
+async def smart_answer_stream(
+    user_id: str = Query(...),
+    data: Dict[str, Any] = Body(...)
+):
+    """Server-Sent Events: route → snippet* → token* → done."""
+    orch = _orchestrator()
+    message = data.get("message", "")
+    final: Dict[str, Any] = {}
+
+    async def events():
+        try:
+            async for ev in orch.smart_answer_stream(user_id, message):
+                if ev["event"] == "done":
+                    final.update(ev["data"])
+                yield f"event: {ev['event']}\ndata: {json.dumps(ev['data'], ensure_ascii=False)}\n\n"
+        except Exception as e:
+            print(f"❌ خطأ في بث الإجابة: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)}, ensure_ascii=False)}\n\n"
+
+    print(f"🤖 إجابة ذكية (stream) للمستخدم: {user_id} - الرسالة: {message}")
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(_after_stream, user_id, message, final),
+    )
+
 print("🎉 تم تهيئة جميع المكونات بنجاح")
 print("🎯 جميع مسارات الـAPI مسجلة وجاهزة!")
 
 if __name__ == "__main__":
-    import uvicorn
-    print("🚀 تشغيل خادم FastAPI على port 9090...")
-    uvicorn.run(app, host="0.0.0.0", port=9090, log_level="info")
+    # FACTORY_WORKERS > 1: عدة عمال pre-fork يتشاركون الفهرس المحمّل (scripts/ai/prefork.py)
+    from scripts.ai.prefork import WORKERS, serve
+
+    if WORKERS > 1:
+        serve(app, host="0.0.0.0", port=9090, workers=WORKERS)
+    else:
+        import uvicorn
+        print("🚀 تشغيل خادم FastAPI على port 9090...")
+        uvicorn.run(app, host="0.0.0.0", port=9090, log_level="info")
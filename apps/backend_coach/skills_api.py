@@ -20,23 +20,22 @@ ROOT_DIR = os.path.abspath(os.path.join(APP_DIR, "..", ".."))
 if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
-from scripts.ai.llm.llm_orchestrator import LLMOrchestrator
-from scripts.ai.skills_manager import SkillsManager
+from scripts.ai import registry
+from scripts.ai.skills_manager import AGENT_SKILL_MAP
 from scripts.ai.factory_metrics import log_metric
 
 router = APIRouter(tags=["factory"])
 
-# instances
-orchestrator = LLMOrchestrator()
-skills_manager = SkillsManager()
+# instances: نفس نسخ main.py من السجل المشترك (تُبنى عند أول طلب)
+def orchestrator():
+    return registry.get("orchestrator")
 
-# خريطة: agent -> skills
-AGENT_SKILL_MAP = {
-    "debug_expert": ["python_errors_handling"],
-    "technical_coach": ["python_control_flow", "python_functions_basics"],
-    "system_architect": ["backend_framework_intro", "db_modeling_basic"],
-    "knowledge_spider": ["web_http_fundamentals", "rest_api_concepts"],
-}
+def skills_manager():
+    return registry.get("skills_manager")
+
+def _overall_progress(state: dict) -> float:
+    scores = list(state.get("skills", {}).values())
+    return round(sum(scores) / len(scores), 1) if scores else 0
 
 # ===== نماذج الطلبات =====
 
@@ -54,19 +53,19 @@ async def get_skills_state(
     حالة مهارات مستخدم واحد.
     """
     try:
-        profile = skills_manager.get_user_skills(user_id)
-        weak = skills_manager.get_weak_skills(user_id)
+        state = await skills_manager().get_skills_state_async(user_id)
         return {
             "success": True,
             "user_id": user_id,
             "profile": {
-                "track": profile["track_id"],
-                "current_phase": profile["current_phase"],
-                "overall_progress": profile["overall_progress"],
-                "sessions_count": profile["sessions_count"],
-                "weak_skills_count": len(weak),
+                "track": state.get("track_id"),
+                "current_phase": state.get("current_phase"),
+                "level": state.get("level", "beginner"),
+                "overall_progress": _overall_progress(state),
+                "sessions_count": state.get("sessions_count", 0),
+                "skills_count": len(state.get("skills", {})),
             },
-            "weak_skills": weak[:3],
+            "skills": state.get("skills", {}),
             "timestamp": datetime.utcnow().isoformat(),
         }
     except Exception as e:
@@ -83,14 +82,16 @@ async def update_skill_score(
     تعديل درجة مهارة واحدة لمستخدم.
     """
     try:
-        profile = skills_manager.update_skill_score(user_id, skill_id, new_score)
+        state = await skills_manager().update_skill_async(user_id, skill_id, new_score)
+        if "error" in state:
+            raise RuntimeError(state["error"])
         return {
             "success": True,
             "user_id": user_id,
             "skill_id": skill_id,
             "new_score": new_score,
-            "overall_progress": profile["overall_progress"],
-            "current_phase": profile["current_phase"],
+            "overall_progress": _overall_progress(state),
+            "level": state.get("level", "beginner"),
             "timestamp": datetime.utcnow().isoformat(),
         }
     except Exception as e:
@@ -107,7 +108,7 @@ async def orchestrator_analyze(
     تحليل الرسالة وتحديد الـ agent الأنسب.
     """
     try:
-        result = orchestrator.analyze_message(message, user_id)
+        result = await orchestrator().analyze_message_async(user_id, message)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"analyze error: {e}")
@@ -127,8 +128,8 @@ async def orchestrator_smart_answer(payload: SmartAnswerRequest):
     message = payload.message
 
     try:
-        analysis = orchestrator.analyze_message(message, user_id)
-        target_agent = analysis.get("target_agent", "debug_expert")
+        analysis = await orchestrator().analyze_message_async(user_id, message)
+        target_agent = analysis.get("agent", "debug_expert")
 
         # تسجيل metric بسيط
         try:
@@ -141,21 +142,17 @@ async def orchestrator_smart_answer(payload: SmartAnswerRequest):
         except Exception as m_err:
             print(f"[METRICS] log_metric error: {m_err}")
 
-        # تحديث مهارات أوتوماتيك حسب الـ agent
+        # تحديث مهارات أوتوماتيك حسب الـ agent: قراءة/كتابة واحدة لكل الطلب
         skill_updates = []
-        if target_agent in AGENT_SKILL_MAP:
-            for sk in AGENT_SKILL_MAP[target_agent]:
-                prof = skills_manager.get_user_skills(user_id)
-                current = prof["skills"].get(sk, {}).get("score", 0)
-                new_score = min(current + 10, 100)
-                prof = skills_manager.update_skill_score(user_id, sk, new_score)
-                skill_updates.append(
-                    {"skill_id": sk, "old_score": current, "new_score": new_score}
-                )
-
-        overall = 0
-        prof = skills_manager.get_user_skills(user_id)
-        overall = prof.get("overall_progress", 0)
+        deltas = {sk: 10 for sk in AGENT_SKILL_MAP.get(target_agent, [])}
+        if deltas:
+            prof = await skills_manager().apply_skill_deltas_async(
+                user_id, deltas, changes=skill_updates
+            )
+        else:
+            prof = await skills_manager().get_skills_state_async(user_id)
+        if "error" in prof:
+            raise RuntimeError(prof["error"])
 
         return {
             "success": True,
@@ -164,7 +161,7 @@ async def orchestrator_smart_answer(payload: SmartAnswerRequest):
             "analysis": analysis,
             "result_mode": "agent_only",
             "skill_updates": skill_updates,
-            "overall_progress": overall,
+            "overall_progress": _overall_progress(prof),
             "timestamp": datetime.utcnow().isoformat(),
         }
     except Exception as e:
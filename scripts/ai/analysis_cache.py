@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+import re
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from scripts.ai.chunk_store import default_store_path, file_stamp
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    # الموجّه والـ tokenizer لا يميزان حالة الأحرف ولا المسافات المتكررة
+    return _WS_RE.sub(" ", message).strip().lower()
+
+
+def corpus_generation(knowledge_dir: str, config_stamp: Any, index_path: Optional[str] = None) -> str:
+    """
+    ختم يتغيّر عند استبدال المخزن (chunks.seg) أو الفهرس الذي يخدم الاستعلام (index_path)، أو إعادة
+    تحميل قواعد orchestrator.yaml. stat لكل ملف فقط: أي تغيير في مجلد المعرفة يصل كإعادة حزم للمخزن.
+    """
+    stamps = [file_stamp(default_store_path(knowledge_dir))]
+    if index_path:
+        stamps.append(file_stamp(index_path))
+    return f"{'|'.join(stamps)}|{config_stamp}"
+
+
+class AnalysisCache:
+    """LRU + TTL محدود بعدد المدخلات وبحجم تقريبي بالبايت (حجم JSON للنتيجة)."""
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, max_entries: int = 10000, ttl: float = 600.0) -> None:
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self.generation: Optional[str] = None
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejected = 0
+        self.invalidations = 0
+
+    def get(self, generation: str, message: str) -> Optional[Dict[str, Any]]:
+        key = normalize_message(message)
+        now = time.monotonic()
+        with self._lock:
+            if generation != self.generation:
+                # تغيّر الـ corpus أو القواعد: كل المدخلات السابقة لم تعد صالحة
+                if self._data:
+                    self.invalidations += 1
+                self._data.clear()
+                self.bytes = 0
+                self.generation = generation
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, size, value = item
+            if expires <= now:
+                del self._data[key]
+                self.bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, generation: str, message: str, value: Dict[str, Any]) -> None:
+        key = normalize_message(message)
+        size = len(json.dumps(value, ensure_ascii=False).encode("utf-8")) + len(key.encode("utf-8"))
+        if size > self.max_bytes:
+            self.rejected += 1
+            return
+        with self._lock:
+            if generation != self.generation:
+                # نتيجة محسوبة على جيل سابق
+                return
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._data[key] = (time.monotonic() + self.ttl, size, value)
+            self.bytes += size
+            while self._data and (self.bytes > self.max_bytes or len(self._data) > self.max_entries):
+                _, (_, old_size, _) = self._data.popitem(last=False)
+                self.bytes -= old_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "rejected": self.rejected,
+            "invalidations": self.invalidations,
+        }
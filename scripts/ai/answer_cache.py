@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+كاش دائم للإجابات المولَّدة (قسم answer_cache: في config/orchestrator.yaml) أمام طلب الـ LLM.
+المفتاح: (العامل، السؤال المطبّع، بصمات مقتطفات top-k، نسخة prompt العامل من
+config/agents.yaml + النموذج) → نفس السؤال على نفس المقتطفات يُجاب من القرص دون طلب للنموذج.
+  - SQLite بوضع WAL: مشترك بين عمال prefork، ويبقى بعد إعادة التشغيل
+  - إخلاء بالحجم (max_bytes): الأقدم استخداماً أولاً حتى 90% من الحد
+  - تطابق تقريبي اختياري (near_duplicate): تشابه Jaccard لكلمات السؤال، فقط بين
+    إجابات نفس العامل ونفس المقتطفات ونفس النسخة
+  - نسبة الإصابة لكل عامل (جدول agent_stats، مجمَّع عبر العمليات)
+تحديث last_used والعدّادات عند الإصابة يُجمَّع في الذاكرة ويُكتب مع أول put أو كل flush_every/flush_interval.
+
+    python3 scripts/ai/answer_cache.py stats|clear [--path ...]
+"""
+import os
+import re
+import sys
+import atexit
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import yaml
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+ANSWER_CACHE_PATH = os.environ.get(
+    "ANSWER_CACHE_PATH", os.path.join(ROOT_DIR, "ai", "datasets", "answer_cache.sqlite3")
+)
+AGENTS_CONFIG_PATH = os.path.join(ROOT_DIR, "config", "agents.yaml")
+# بعد تجاوز max_bytes يُخلى حتى هذه النسبة: إخلاء واحد لعدة إدخالات بدل إخلاء مع كل put
+_LOW_WATERMARK = 0.9
+_NEAR_CANDIDATES = 32
+
+_WORD_RE = re.compile(r"\w+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key       TEXT PRIMARY KEY,
+    scope     TEXT NOT NULL,
+    agent     TEXT NOT NULL,
+    question  TEXT NOT NULL,
+    terms     TEXT NOT NULL,
+    answer    TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    created   REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits      INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS answers_scope ON answers (scope, last_used);
+CREATE INDEX IF NOT EXISTS answers_lru ON answers (last_used);
+CREATE TABLE IF NOT EXISTS agent_stats (
+    agent     TEXT PRIMARY KEY,
+    hits      INTEGER NOT NULL DEFAULT 0,
+    near_hits INTEGER NOT NULL DEFAULT 0,
+    misses    INTEGER NOT NULL DEFAULT 0,
+    stores    INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (name, value) VALUES ('bytes', 0), ('evictions', 0);
+"""
+
+SQL_GET = "SELECT answer FROM answers WHERE key = ?"
+SQL_NEAR = (
+    "SELECT key, terms, answer FROM answers WHERE scope = ? ORDER BY last_used DESC LIMIT "
+    + str(_NEAR_CANDIDATES)
+)
+SQL_UPSERT = (
+    "INSERT INTO answers (key, scope, agent, question, terms, answer, size, created, last_used) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(key) DO UPDATE SET answer = excluded.answer, size = excluded.size, last_used = excluded.last_used"
+)
+SQL_TOUCH = "UPDATE answers SET last_used = MAX(last_used, ?), hits = hits + ? WHERE key = ?"
+SQL_STATS = (
+    "INSERT INTO agent_stats (agent, hits, near_hits, misses, stores) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(agent) DO UPDATE SET hits = hits + excluded.hits, near_hits = near_hits + excluded.near_hits, "
+    "misses = misses + excluded.misses, stores = stores + excluded.stores"
+)
+SQL_ADD_META = "UPDATE meta SET value = value + ? WHERE name = ?"
+
+_COUNTERS = ("hits", "near_hits", "misses", "stores")
+
+
+def _digest(*parts: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for p in parts:
+        h.update(p.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def chunk_ids(rag_results: Iterable[Dict[str, Any]]) -> List[str]:
+    """
+    معرّف لكل مقتطف: المسار + بصمة النص، فإعادة كتابة chunk بنفس الاسم تغيّر المفتاح
+    (الفهرس يُعاد بناؤه دون تغيير أسماء الملفات).
+    """
+    return [f"{r.get('path', '')}#{_digest(str(r.get('preview', '')))[:12]}" for r in rag_results]
+
+
+def question_terms(question: str) -> List[str]:
+    return sorted(set(w.lower() for w in _WORD_RE.findall(question)))
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class PromptVersions:
+    """
+    نسخة prompt كل عامل: بصمة محتوى prompt_file من config/agents.yaml ("-" إن لم يوجد).
+    agents.yaml يُعاد تحميله عند تغيّره، وبصمة الملف تُحسب مرة لكل (mtime, size).
+    """
+
+    def __init__(self, agents_path: str = AGENTS_CONFIG_PATH) -> None:
+        self.agents_path = agents_path
+        self._lock = threading.Lock()
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._files: Dict[str, str] = {}
+        self._hashes: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _reload(self) -> None:
+        stamp = self._stat(self.agents_path)
+        if stamp == self._stamp:
+            return
+        files: Dict[str, str] = {}
+        try:
+            with open(self.agents_path, "r", encoding="utf-8") as f:
+                cfg = yaml.safe_load(f) or {}
+            for agent in cfg.get("agents") or []:
+                if agent.get("id") and agent.get("prompt_file"):
+                    files[agent["id"]] = os.path.join(ROOT_DIR, agent["prompt_file"])
+        except (OSError, yaml.YAMLError):
+            pass
+        self._files = files
+        self._stamp = stamp
+
+    def get(self, agent: str) -> str:
+        with self._lock:
+            self._reload()
+            path = self._files.get(agent)
+            if path is None:
+                return "-"
+            stamp = self._stat(path)
+            if stamp is None:
+                return "-"
+            cached = self._hashes.get(agent)
+            if cached and cached[0] == stamp:
+                return cached[1]
+            try:
+                with open(path, "rb") as f:
+                    version = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+            except OSError:
+                return "-"
+            self._hashes[agent] = (stamp, version)
+            return version
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        path: str = ANSWER_CACHE_PATH,
+        max_bytes: int = 64 * 1024 * 1024,
+        near_threshold: float = 0.0,
+        flush_every: int = 64,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        # 0 = تطابق تام فقط؛ 0.85 مثلاً: 85% على الأقل من كلمات السؤالين مشتركة
+        self.near_threshold = near_threshold
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._touches: Dict[str, Tuple[float, int]] = {}
+        self._counts: Dict[str, List[int]] = {}
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self.rejected = 0
+        self._conn().executescript(SCHEMA)
+        atexit.register(self.close)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def scope(agent: str, chunks: List[str], version: str) -> str:
+        return _digest(agent, version, *chunks)
+
+    def _count(self, agent: str, field: str) -> None:
+        with self._lock:
+            counts = self._counts.get(agent)
+            if counts is None:
+                counts = self._counts[agent] = [0, 0, 0, 0]
+            counts[_COUNTERS.index(field)] += 1
+            self._pending += 1
+
+    def _touch(self, key: str) -> None:
+        with self._lock:
+            _, hits = self._touches.get(key, (0.0, 0))
+            self._touches[key] = (time.time(), hits + 1)
+
+    def _take_pending(self) -> Tuple[Dict[str, Tuple[float, int]], Dict[str, List[int]]]:
+        with self._lock:
+            touches, counts = self._touches, self._counts
+            self._touches, self._counts = {}, {}
+            self._pending = 0
+            self._last_flush = time.monotonic()
+        return touches, counts
+
+    def _write_pending(self, conn: sqlite3.Connection) -> None:
+        touches, counts = self._take_pending()
+        if touches:
+            conn.executemany(SQL_TOUCH, [(ts, hits, key) for key, (ts, hits) in touches.items()])
+        if counts:
+            conn.executemany(SQL_STATS, [(agent, *c) for agent, c in counts.items()])
+
+    def _maybe_flush(self) -> None:
+        if self._pending < self.flush_every and time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        self.flush()
+
+    def flush(self) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_pending(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, agent: str, question: str, chunks: List[str], version: str) -> Tuple[Optional[str], str]:
+        """(الإجابة أو None، "exact" | "near" | "miss")."""
+        scope = self.scope(agent, chunks, version)
+        key = _digest(scope, question)
+        conn = self._conn()
+        row = conn.execute(SQL_GET, (key,)).fetchone()
+        kind = "exact"
+        if row is None and self.near_threshold > 0:
+            terms = set(question_terms(question))
+            best = (0.0, "", "")
+            for other_key, other_terms, answer in conn.execute(SQL_NEAR, (scope,)):
+                score = _jaccard(terms, set(other_terms.split()))
+                if score > best[0]:
+                    best = (score, other_key, answer)
+            if best[0] >= self.near_threshold:
+                key, row, kind = best[1], (best[2],), "near"
+        if row is None:
+            self._count(agent, "misses")
+            self._maybe_flush()
+            return None, "miss"
+        self._touch(key)
+        self._count(agent, "hits" if kind == "exact" else "near_hits")
+        self._maybe_flush()
+        return row[0], kind
+
+    def put(self, agent: str, question: str, chunks: List[str], version: str, answer: str) -> None:
+        scope = self.scope(agent, chunks, version)
+        key = _digest(scope, question)
+        size = len(answer.encode("utf-8")) + len(question.encode("utf-8"))
+        if size > self.max_bytes:
+            self.rejected += 1
+            return
+        self._count(agent, "stores")
+        now = time.time()
+        conn = self._conn()
+        # BEGIN IMMEDIATE: حساب الحجم الكلي والإخلاء لا يتداخلان بين العمال
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_pending(conn)
+            old = conn.execute("SELECT size FROM answers WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                SQL_UPSERT, (key, scope, agent, question, " ".join(question_terms(question)), answer, size, now, now)
+            )
+            conn.execute(SQL_ADD_META, (size - (old[0] if old else 0), "bytes"))
+            total = conn.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(conn, total)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn: sqlite3.Connection, total: int) -> None:
+        target = int(self.max_bytes * _LOW_WATERMARK)
+        freed = evicted = 0
+        while total - freed > target:
+            rows = conn.execute("SELECT key, size FROM answers ORDER BY last_used LIMIT 256").fetchall()
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                victims.append((key,))
+                freed += size
+                if total - freed <= target:
+                    break
+            conn.executemany("DELETE FROM answers WHERE key = ?", victims)
+            evicted += len(victims)
+        conn.execute(SQL_ADD_META, (-freed, "bytes"))
+        conn.execute(SQL_ADD_META, (evicted, "evictions"))
+
+    def clear(self) -> None:
+        self._take_pending()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM answers")
+            conn.execute("DELETE FROM agent_stats")
+            conn.execute("UPDATE meta SET value = 0")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        """مجمّعة عبر كل العمليات (ما كُتب إلى القاعدة) + عدّادات هذه العملية غير المكتوبة بعد."""
+        conn = self._conn()
+        entries = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        meta = dict(conn.execute("SELECT name, value FROM meta"))
+        agents: Dict[str, List[int]] = {
+            agent: list(counts)
+            for agent, *counts in conn.execute("SELECT agent, hits, near_hits, misses, stores FROM agent_stats")
+        }
+        with self._lock:
+            for agent, counts in self._counts.items():
+                row = agents.setdefault(agent, [0, 0, 0, 0])
+                for i, n in enumerate(counts):
+                    row[i] += n
+        per_agent: Dict[str, Dict[str, Any]] = {}
+        totals = [0, 0, 0, 0]
+        for agent, counts in sorted(agents.items()):
+            totals = [t + n for t, n in zip(totals, counts)]
+            per_agent[agent] = self._rates(counts)
+        return {
+            "enabled": True,
+            "path": self.path,
+            "entries": entries,
+            "bytes": meta.get("bytes", 0),
+            "max_bytes": self.max_bytes,
+            "evictions": meta.get("evictions", 0),
+            "rejected": self.rejected,
+            "near_threshold": self.near_threshold,
+            **self._rates(totals),
+            "agents": per_agent,
+        }
+
+    @staticmethod
+    def _rates(counts: List[int]) -> Dict[str, Any]:
+        hits, near_hits, misses, stores = counts
+        lookups = hits + near_hits + misses
+        return {
+            "lookups": lookups,
+            "hits": hits,
+            "near_hits": near_hits,
+            "misses": misses,
+            "stores": stores,
+            "hit_rate": round((hits + near_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            return
+        if self._touches or self._counts:
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass
+        conn.close()
+        self._local.conn = None
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser(description="كاش الإجابات المولَّدة")
+    p.add_argument("command", choices=["stats", "clear"])
+    p.add_argument("--path", default=ANSWER_CACHE_PATH)
+    a = p.parse_args()
+    if not os.path.exists(a.path):
+        print(json.dumps({"enabled": False, "path": a.path}, ensure_ascii=False, indent=2))
+        return
+    cache = AnswerCache(a.path)
+    if a.command == "clear":
+        cache.clear()
+    print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
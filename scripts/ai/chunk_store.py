@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+مخزن chunks مضغوط في ملف واحد (segment) يُقرأ عبر mmap:
+
+  MAGIC (8 bytes) | طول الجدول (uint64 LE) | جدول JSON | نصوص كل الـ chunks (UTF-8) متتالية
+
+الجدول: لكل chunk → path (المصدر في knowledge_chunks)، domain، sha256، offset، length،
+preview_len (بايتات أول PREVIEW_CHARS حرفاً). المعاينة = شريحة من الـ mmap بدون open() لكل chunk.
+ملف واحد يُستبدل ذرّياً (os.replace)؛ القرّاء الحاليون يحتفظون بالـ mmap على النسخة القديمة.
+الجدول يحمل أيضاً source_sig: بصمة (المسار، الحجم، mtime_ns) لكل ملف مصدر، فتعديل chunk في
+مكانه أو داخل مجلد فرعي يظهر عند المقارنة. إعادة الحزم محمية بقفل ملف (chunks.seg.lock) بين العمال.
+الحداثة صريحة: مسار الاستعلام (open_store) يفحص chunks.seg فقط (stat واحد)؛ مسح مجلد المعرفة
+يتم في refresh_store (الجامعون، --build، ومراقب الخادم الخلفي في rag_engine).
+"""
+import os
+import sys
+import json
+import hashlib
+import mmap
+import struct
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.file_lock import file_lock
+
+DEFAULT_KNOWLEDGE_DIR = os.path.join(ROOT_DIR, "ai", "datasets", "knowledge_chunks")
+STORE_DIRNAME = "knowledge_index"
+STORE_FILENAME = "chunks.seg"
+MAGIC = b"HFSEG01\n"
+_HEADER = struct.Struct("<Q")
+PREVIEW_CHARS = 1200
+
+# store_path -> (st_mtime_ns, st_ino, المخزن المفتوح)
+_STORE_CACHE: Dict[str, Tuple[int, int, "ChunkStore"]] = {}
+
+
+def default_store_path(knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR) -> str:
+    parent = os.path.dirname(os.path.abspath(knowledge_dir))
+    return os.path.join(parent, STORE_DIRNAME, STORE_FILENAME)
+
+
+def iter_chunk_files(knowledge_dir: str) -> Iterator[str]:
+    """كل ملفات المعرفة: .txt (PDF/يدوية) وملفات العنكبوت بدون امتداد (<md5>_chunk_NN)."""
+    for root, _, files in os.walk(knowledge_dir):
+        for fname in sorted(files):
+            if fname.startswith(".") or ".tmp." in fname:
+                continue
+            ext = os.path.splitext(fname)[1].lower()
+            if ext and ext != ".txt":
+                continue
+            yield os.path.join(root, fname)
+
+
+def source_signature(knowledge_dir: str) -> str:
+    """بصمة محتوى مجلد المعرفة: (المسار النسبي، الحجم، mtime_ns) لكل ملف، بما فيها المجلدات الفرعية."""
+    h = hashlib.blake2b(digest_size=16)
+    for path in iter_chunk_files(knowledge_dir):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        h.update(f"{os.path.relpath(path, knowledge_dir)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def file_stamp(path: str) -> str:
+    """(mtime_ns, inode) لملف يُستبدل ذرّياً؛ "-" إن لم يوجد."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return "-"
+    return f"{st.st_mtime_ns}:{st.st_ino}"
+
+
+def store_lock_path(store_path: str) -> str:
+    return f"{store_path}.lock"
+
+
+def _domain_map(knowledge_dir: str) -> Dict[str, str]:
+    # raw_content/<domain>/<md5>.html → md5 → domain (نفس مفتاح أسماء chunks العنكبوت)
+    raw_dir = os.path.join(os.path.dirname(os.path.abspath(knowledge_dir)), "raw_content")
+    out: Dict[str, str] = {}
+    if not os.path.isdir(raw_dir):
+        return out
+    for domain in os.listdir(raw_dir):
+        domain_dir = os.path.join(raw_dir, domain)
+        if os.path.isdir(domain_dir):
+            for fname in os.listdir(domain_dir):
+                out[os.path.splitext(fname)[0]] = domain
+    return out
+
+
+def source_domain(fname: str, domains: Dict[str, str]) -> str:
+    if "_pdf_chunk_" in fname:
+        return "pdf"
+    if "_chunk_" in fname:
+        return domains.get(fname.split("_chunk_", 1)[0], "web")
+    return "local"
+
+
+def build_store(
+    knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR,
+    store_path: Optional[str] = None,
+) -> Dict[str, Any]:
+    """المحوّل: يحزم مجلد knowledge_chunks الحالي في segment واحد ويعيد الجدول."""
+    os.makedirs(knowledge_dir, exist_ok=True)
+    store_path = store_path or default_store_path(knowledge_dir)
+    source_mtime = os.path.getmtime(knowledge_dir)
+    # البصمة قبل القراءة: ملف يتغيّر أثناء الحزم يظهر كتغيير في الفحص التالي
+    source_sig = source_signature(knowledge_dir)
+    domains = _domain_map(knowledge_dir)
+
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    data_tmp = f"{store_path}.data.{os.getpid()}"
+    entries: List[Dict[str, Any]] = []
+    offset = 0
+    with open(data_tmp, "wb") as data:
+        for path in iter_chunk_files(knowledge_dir):
+            try:
+                with open(path, "rb") as f:
+                    raw = f.read()
+                text = raw.decode("utf-8")
+            except (OSError, UnicodeDecodeError):
+                continue
+            data.write(raw)
+            entries.append({
+                "path": path,
+                "domain": source_domain(os.path.basename(path), domains),
+                "sha256": hashlib.sha256(raw).hexdigest(),
+                "offset": offset,
+                "length": len(raw),
+                "preview_len": len(text[:PREVIEW_CHARS].encode("utf-8")),
+            })
+            offset += len(raw)
+
+    table = {
+        "built_at": time.time(),
+        "knowledge_dir": os.path.abspath(knowledge_dir),
+        "source_mtime": source_mtime,
+        "source_sig": source_sig,
+        "entries": entries,
+    }
+    table_bytes = json.dumps(table, ensure_ascii=False).encode("utf-8")
+    tmp_path = f"{store_path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_path, "wb") as out, open(data_tmp, "rb") as data:
+            out.write(MAGIC)
+            out.write(_HEADER.pack(len(table_bytes)))
+            out.write(table_bytes)
+            while True:
+                block = data.read(1 << 20)
+                if not block:
+                    break
+                out.write(block)
+        os.replace(tmp_path, store_path)
+    finally:
+        for p in (data_tmp, tmp_path):
+            if os.path.exists(p):
+                os.remove(p)
+    _STORE_CACHE.pop(store_path, None)
+    return table
+
+
+class ChunkStore:
+    """قارئ segment: كل القراءات شرائح من mmap واحد."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"not a chunk segment: {path}")
+        (table_len,) = _HEADER.unpack_from(self._mm, len(MAGIC))
+        table_start = len(MAGIC) + _HEADER.size
+        table = json.loads(self._mm[table_start:table_start + table_len].decode("utf-8"))
+        self._data_start = table_start + table_len
+        self.built_at = float(table.get("built_at", 0.0))
+        self.source_mtime = float(table.get("source_mtime", 0.0))
+        self.source_sig = str(table.get("source_sig", ""))
+        self.entries: List[Dict[str, Any]] = table.get("entries", [])
+        self._view = memoryview(self._mm)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _slice(self, i: int, length: Optional[int] = None) -> memoryview:
+        e = self.entries[i]
+        start = self._data_start + e["offset"]
+        return self._view[start:start + (e["length"] if length is None else length)]
+
+    def text_bytes(self, i: int) -> memoryview:
+        """شريحة zero-copy من الـ mmap."""
+        return self._slice(i)
+
+    def preview_bytes(self, i: int) -> memoryview:
+        return self._slice(i, self.entries[i]["preview_len"])
+
+    def text(self, i: int) -> str:
+        return str(self._slice(i), "utf-8")
+
+    def preview(self, i: int) -> str:
+        return str(self.preview_bytes(i), "utf-8")
+
+    def path_of(self, i: int) -> str:
+        return self.entries[i]["path"]
+
+    def iter_texts(self) -> Iterator[Tuple[int, str]]:
+        for i in range(len(self.entries)):
+            yield i, self.text(i)
+
+
+def _cached_store(store_path: str) -> ChunkStore:
+    st = os.stat(store_path)
+    cached = _STORE_CACHE.get(store_path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_ino:
+        return cached[2]
+    store = ChunkStore(store_path)
+    _STORE_CACHE[store_path] = (st.st_mtime_ns, st.st_ino, store)
+    return store
+
+
+def refresh_store(
+    knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR,
+    store_path: Optional[str] = None,
+) -> ChunkStore:
+    """يمسح مجلد المعرفة ويعيد الحزم إن تغيّر أي ملف (خارج مسار الطلب: الجامعون والمراقب)."""
+    return rebuild_store_if_stale(knowledge_dir, store_path or default_store_path(knowledge_dir))
+
+
+def rebuild_store_if_stale(knowledge_dir: str, store_path: str, source_sig: Optional[str] = None) -> ChunkStore:
+    """يعيد الحزم تحت قفل الملف إن لم تطابق البصمة؛ عامل آخر أعاد البناء أثناء الانتظار → لا إعادة."""
+    source_sig = source_sig or source_signature(knowledge_dir)
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    with file_lock(store_lock_path(store_path)):
+        try:
+            store = _cached_store(store_path)
+            if store.source_sig == source_sig:
+                return store
+        except (OSError, ValueError):
+            pass
+        build_store(knowledge_dir, store_path)
+        return _cached_store(store_path)
+
+
+def open_store(
+    knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR,
+    store_path: Optional[str] = None,
+) -> ChunkStore:
+    """
+    يفتح المخزن (مع كاش لكل عملية، stat واحد لـ chunks.seg) ويبنيه فقط إن كان مفقوداً.
+    تغييرات مجلد المعرفة تصل عبر refresh_store، لا من هنا.
+    """
+    store_path = store_path or default_store_path(knowledge_dir)
+    try:
+        return _cached_store(store_path)
+    except (OSError, ValueError):
+        return rebuild_store_if_stale(knowledge_dir, store_path)
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--knowledge-dir", default=DEFAULT_KNOWLEDGE_DIR)
+    p.add_argument("--store-path", default=None)
+    p.add_argument("--show", type=int, default=None, help="طباعة معاينة chunk برقمه")
+    a = p.parse_args()
+    store_path = a.store_path or default_store_path(a.knowledge_dir)
+    if a.show is None:
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+        with file_lock(store_lock_path(store_path)):
+            table = build_store(a.knowledge_dir, store_path)
+        by_domain: Dict[str, int] = {}
+        for e in table["entries"]:
+            by_domain[e["domain"]] = by_domain.get(e["domain"], 0) + 1
+        print(json.dumps(
+            {
+                "store_path": store_path,
+                "chunks": len(table["entries"]),
+                "bytes": os.path.getsize(store_path),
+                "domains": by_domain,
+            },
+            ensure_ascii=False,
+            indent=2,
+        ))
+        return
+    store = ChunkStore(store_path)
+    print(json.dumps(dict(store.entries[a.show], preview=store.preview(a.show)), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+تقسيم النص إلى chunks محدودة بعدد الـ tokens على حدود الفقرات والعناوين، مع تداخل،
+وإسقاط الـ chunks المكررة أو شبه المكررة (SimHash 64-bit) وقت الإدخال.
+"""
+import os
+import re
+import json
+import hashlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", "300"))
+OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", "40"))
+MIN_TOKENS = 8
+# مسافة Hamming القصوى بين بصمتين لاعتبارهما شبه مكررتين (عدد نطاقات الفهرس = المسافة + 1)
+SIMHASH_DISTANCE = int(os.environ.get("CHUNK_SIMHASH_DISTANCE", "3"))
+SIMHASH_MIN_SHINGLES = 8
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_WORD_RE = re.compile(r"\w+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?؟。])\s+|\n")
+_HEADING_RE = re.compile(r"^(#{1,6}\s|--- الصفحة \d+ ---)")
+
+
+def count_tokens(text: str) -> int:
+    return len(_TOKEN_RE.findall(text))
+
+
+def iter_blocks(lines: Iterable[str]) -> Iterator[str]:
+    """فقرات مفصولة بأسطر فارغة (بالبث، سطراً بسطر)."""
+    buf: List[str] = []
+    for line in lines:
+        line = line.rstrip("\n")
+        if line.strip():
+            buf.append(line)
+        elif buf:
+            yield "\n".join(buf)
+            buf = []
+    if buf:
+        yield "\n".join(buf)
+
+
+def _split_oversized(block: str, max_tokens: int) -> List[str]:
+    pieces: List[str] = []
+    for sentence in _SENTENCE_RE.split(block):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if count_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        # جملة أطول من الحد: نوافذ كلمات بنصف الحد (بالـ tokens لا بالكلمات)
+        buf: List[str] = []
+        buf_n = 0
+        for word in sentence.split():
+            word_n = count_tokens(word)
+            if buf and buf_n + word_n > max_tokens // 2:
+                pieces.append(" ".join(buf))
+                buf, buf_n = [], 0
+            buf.append(word)
+            buf_n += word_n
+        if buf:
+            pieces.append(" ".join(buf))
+    return pieces
+
+
+def iter_chunks(
+    blocks: Iterable[str],
+    max_tokens: int = MAX_TOKENS,
+    overlap_tokens: int = OVERLAP_TOKENS,
+) -> Iterator[str]:
+    """
+    يجمع الفقرات بشراهة حتى max_tokens. العنوان يبدأ chunk جديداً إذا امتلأ الحالي
+    إلى النصف؛ عند القطع بسبب الحجم فقط تُكرَّر آخر جمل الـ chunk السابق (overlap_tokens).
+    """
+    current: List[Tuple[str, int]] = []
+    size = 0
+    fresh = 0  # أجزاء لم تظهر في chunk سابق (غير التداخل)
+
+    def flush() -> str:
+        return "\n\n".join(p for p, _ in current)
+
+    for block in blocks:
+        is_heading = bool(_HEADING_RE.match(block))
+        if is_heading and fresh and size >= max_tokens // 2:
+            yield flush()
+            current, size, fresh = [], 0, 0
+        n = count_tokens(block)
+        parts = [(block, n)] if n <= max_tokens else [(p, count_tokens(p)) for p in _split_oversized(block, max_tokens)]
+        for part, part_n in parts:
+            if fresh and size + part_n > max_tokens:
+                yield flush()
+                tail: List[Tuple[str, int]] = []
+                tail_size = 0
+                for prev, prev_n in reversed(current):
+                    if tail_size + prev_n > min(overlap_tokens, max_tokens - part_n):
+                        break
+                    tail.insert(0, (prev, prev_n))
+                    tail_size += prev_n
+                current, size, fresh = tail, tail_size, 0
+            current.append((part, part_n))
+            size += part_n
+            fresh += 1
+    if fresh:
+        yield flush()
+
+
+def chunk_text(text: str, max_tokens: int = MAX_TOKENS, overlap_tokens: int = OVERLAP_TOKENS) -> List[str]:
+    return list(iter_chunks(iter_blocks(text.splitlines()), max_tokens, overlap_tokens))
+
+
+def _hash64(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(text: str) -> Tuple[int, bool]:
+    """(بصمة 64-bit، هل النص كافٍ لمقارنة تقريبية). النصوص القصيرة تُقارن بالتطابق فقط."""
+    words = [w.lower() for w in _WORD_RE.findall(text)]
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(0, len(words) - 2))]
+    if len(shingles) < SIMHASH_MIN_SHINGLES:
+        return _hash64(" ".join(words)), False
+    v = [0] * 64
+    for sh in shingles:
+        h = _hash64(sh)
+        for bit in range(64):
+            v[bit] += 1 if (h >> bit) & 1 else -1
+    fp = 0
+    for bit in range(64):
+        if v[bit] > 0:
+            fp |= 1 << bit
+    return fp, True
+
+
+class NearDuplicateIndex:
+    """
+    فهرس بصمات SimHash لكل ملفات knowledge_chunks. البحث عن مسافة ≤ max_distance يتم بمبدأ
+    الحمام: البصمة تُقسَّم إلى max_distance + 1 نطاقات، فبصمتان بمسافة ≤ max_distance تتطابقان
+    تماماً في نطاق واحد على الأقل (نطاقات أقصر مع مسافة أكبر → مرشحون أكثر للمقارنة).
+    """
+
+    def __init__(self, max_distance: int = SIMHASH_DISTANCE) -> None:
+        if not 0 <= max_distance < 64:
+            raise ValueError(f"max_distance must be in [0, 63], got {max_distance}")
+        self.max_distance = max_distance
+        self.entries: Dict[str, Tuple[int, bool]] = {}
+        # البصمة -> كل الأسماء التي تحملها (الأقدم أولاً)
+        self._by_fp: Dict[int, List[str]] = {}
+        # (إزاحة، قناع) لكل نطاق: 64 bit موزعة على النطاقات بأطوال متقاربة
+        n_bands = max_distance + 1
+        widths = [64 // n_bands + (1 if i < 64 % n_bands else 0) for i in range(n_bands)]
+        self._band_spec = [(sum(widths[:i]), (1 << w) - 1) for i, w in enumerate(widths)]
+        self._bands: List[Dict[int, List[str]]] = [{} for _ in range(n_bands)]
+
+    def _band_keys(self, fp: int) -> List[int]:
+        return [(fp >> shift) & mask for shift, mask in self._band_spec]
+
+    def find(self, fp: int, approx: bool) -> Optional[str]:
+        names = self._by_fp.get(fp)
+        if names:
+            return names[0]
+        if not approx:
+            return None
+        for band, key in zip(self._bands, self._band_keys(fp)):
+            for name in band.get(key, ()):
+                other, other_approx = self.entries[name]
+                if other_approx and bin(fp ^ other).count("1") <= self.max_distance:
+                    return name
+        return None
+
+    def add(self, name: str, fp: int, approx: bool) -> None:
+        self.remove(name)
+        self.entries[name] = (fp, approx)
+        self._by_fp.setdefault(fp, []).append(name)
+        if approx:
+            for band, key in zip(self._bands, self._band_keys(fp)):
+                band.setdefault(key, []).append(name)
+
+    def remove(self, name: str) -> None:
+        item = self.entries.pop(name, None)
+        if item is None:
+            return
+        fp, approx = item
+        names = self._by_fp[fp]
+        names.remove(name)
+        if not names:
+            del self._by_fp[fp]
+        if approx:
+            for band, key in zip(self._bands, self._band_keys(fp)):
+                names = band.get(key)
+                if names and name in names:
+                    names.remove(name)
+                    if not names:
+                        del band[key]
+
+    def remove_prefix(self, prefix: str) -> None:
+        for name in [n for n in self.entries if n.startswith(prefix)]:
+            self.remove(name)
+
+    @classmethod
+    def load(cls, path: str, knowledge_dir: str) -> "NearDuplicateIndex":
+        """يحمّل البصمات المحفوظة ويزامنها مع الملفات الموجودة فعلاً في knowledge_dir."""
+        index = cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            saved = {}
+        present = set(os.listdir(knowledge_dir)) if os.path.isdir(knowledge_dir) else set()
+        for name in sorted(present):
+            if name.startswith("."):
+                continue
+            item = saved.get(name)
+            try:
+                mtime_ns = os.stat(os.path.join(knowledge_dir, name)).st_mtime_ns
+            except OSError:
+                continue
+            if item is None or len(item) < 3 or item[2] != mtime_ns:
+                # ملف جديد أو عُدِّل خارج هذه الأداة → إعادة حساب البصمة
+                try:
+                    with open(os.path.join(knowledge_dir, name), "r", encoding="utf-8") as f:
+                        fp, approx = simhash(f.read())
+                except (OSError, UnicodeDecodeError):
+                    continue
+            else:
+                fp, approx = int(item[0], 16), bool(item[1])
+            index.add(name, fp, approx)
+        return index
+
+    def save(self, path: str, knowledge_dir: str) -> None:
+        entries = {}
+        for name, (fp, approx) in self.entries.items():
+            try:
+                mtime_ns = os.stat(os.path.join(knowledge_dir, name)).st_mtime_ns
+            except OSError:
+                continue
+            entries[name] = [format(fp, "016x"), approx, mtime_ns]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"entries": entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def default_simhash_path(knowledge_dir: str) -> str:
+    parent = os.path.dirname(os.path.abspath(knowledge_dir))
+    return os.path.join(parent, "knowledge_index", "simhash.json")
+
+
+def remove_chunks(knowledge_dir: str, prefix: str, dedupe: Optional[NearDuplicateIndex] = None) -> None:
+    for name in os.listdir(knowledge_dir):
+        if name.startswith(prefix):
+            os.remove(os.path.join(knowledge_dir, name))
+    if dedupe is not None:
+        dedupe.remove_prefix(prefix)
+
+
+def write_chunks(
+    chunks: Iterable[str],
+    knowledge_dir: str,
+    prefix: str,
+    name_format: str,
+    dedupe: Optional[NearDuplicateIndex] = None,
+) -> Dict[str, int]:
+    """
+    يحذف chunks المصدر السابقة (prefix) ثم يكتب الجديدة بأسماء name_format.format(i)
+    متخطياً ما يطابق تقريباً chunk موجوداً (من نفس المصدر أو غيره).
+    """
+    remove_chunks(knowledge_dir, prefix, dedupe)
+    stats = {"written": 0, "dropped": 0, "bytes": 0, "dropped_bytes": 0}
+    for chunk in chunks:
+        if count_tokens(chunk) < MIN_TOKENS:
+            continue
+        data = chunk.encode("utf-8")
+        if dedupe is not None:
+            fp, approx = simhash(chunk)
+            if dedupe.find(fp, approx) is not None:
+                stats["dropped"] += 1
+                stats["dropped_bytes"] += len(data)
+                continue
+        name = name_format.format(stats["written"])
+        path = os.path.join(knowledge_dir, name)
+        tmp_path = os.path.join(knowledge_dir, f".{name}.tmp.{os.getpid()}")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        if dedupe is not None:
+            dedupe.add(name, fp, approx)
+        stats["written"] += 1
+        stats["bytes"] += len(data)
+    return stats
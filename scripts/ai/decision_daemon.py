@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+خدمة قرارات دائمة لـ `ffactory decide` بدل orchestrator_decision_engine.sh
+(الذي كان يشغّل `echo | grep -qiE` لكل قاعدة في كل قرار، و `tail | grep | wc` لكل تقييم):
+  - القواعد نفسها المترجمة التي يستخدمها الـ API (KeywordRouter على config/orchestrator.yaml،
+    مع إعادة الترجمة عند تعديل الملف)
+  - سلاسل الجودة في الذاكرة: ring buffer (آخر QUALITY_WINDOW تقييمات) لكل (عامل، مستخدم)،
+    تُملأ من logs/quality_feedback.csv عند البدء
+  - Unix socket ببروتوكول JSON سطر بسطر: decide / batch / quality / status / shutdown،
+    وسطر نصي "user_id<TAB>message" → اسم العامل (للـ shell عبر socat دون تشغيل Python)
+العميل خفيف (socket + json فقط)، وإن لم تكن الخدمة شغالة يقرر داخل العملية بنفس القواعد.
+
+    python3 scripts/ai/decision_daemon.py start|stop|serve
+    python3 scripts/ai/decision_daemon.py decide "عندي خطأ في الكود" user_123
+    python3 scripts/ai/decision_daemon.py batch [--json] < messages.txt
+    python3 scripts/ai/decision_daemon.py quality debug_expert user_123 bad
+"""
+import os
+import sys
+import json
+import socket
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+LOGS_DIR = os.path.join(ROOT_DIR, "logs")
+# نفس ملف LLMOrchestrator (دون استيراده: يسحب RAG وnumpy)
+CONFIG_PATH = os.environ.get("ORCHESTRATOR_CONFIG") or os.path.join(ROOT_DIR, "config", "orchestrator.yaml")
+SOCKET_PATH = os.environ.get("DECISION_SOCKET") or os.path.join(LOGS_DIR, "orchestrator", "decision.sock")
+DECISIONS_LOG = os.environ.get("DECISIONS_LOG") or os.path.join(LOGS_DIR, "orchestrator", "decisions.log")
+QUALITY_CSV = os.environ.get("QUALITY_FEEDBACK_CSV") or os.path.join(LOGS_DIR, "quality_feedback.csv")
+# تحذير عند QUALITY_BAD_THRESHOLD تقييمات سيئة ضمن آخر QUALITY_WINDOW لنفس (العامل، المستخدم)
+QUALITY_WINDOW = int(os.environ.get("QUALITY_WINDOW", "10"))
+QUALITY_BAD_THRESHOLD = int(os.environ.get("QUALITY_BAD_THRESHOLD", "3"))
+# أقصى حجم لسطر طلب (batch كبير)
+_MAX_LINE = 16 * 1024 * 1024
+
+_AGENT_LABELS = {
+    "debug_expert": "🔧 توجيه لـ: Debug Expert",
+    "system_architect": "🏗️ توجيه لـ: System Architect",
+    "technical_coach": "👨‍🏫 توجيه لـ: Technical Coach",
+    "knowledge_spider": "🕸️ توجيه لـ: Knowledge Spider",
+}
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class QualityTracker:
+    """آخر QUALITY_WINDOW تقييمات لكل (عامل، مستخدم) بدل قراءة ذيل ملف الـ CSV في كل حدث."""
+
+    def __init__(self, window: int = QUALITY_WINDOW, threshold: int = QUALITY_BAD_THRESHOLD) -> None:
+        self.window = window
+        self.threshold = threshold
+        self.recent: Dict[Tuple[str, str], Deque[bool]] = {}
+        self.events = 0
+        self.warnings = 0
+
+    def add(self, agent_id: str, user_id: str, quality: str) -> Dict[str, Any]:
+        ring = self.recent.get((agent_id, user_id))
+        if ring is None:
+            ring = self.recent[(agent_id, user_id)] = deque(maxlen=self.window)
+        ring.append(quality == "bad")
+        self.events += 1
+        streak = 0
+        for bad in reversed(ring):
+            if not bad:
+                break
+            streak += 1
+        bad_in_window = sum(ring)
+        warning = bad_in_window >= self.threshold
+        if warning:
+            self.warnings += 1
+        return {"bad_in_window": bad_in_window, "bad_streak": streak, "window": len(ring), "warning": warning}
+
+    def load(self, path: str) -> int:
+        """يملأ الـ ring buffers من سجل التقييمات الموجود (ts,agent,user,quality)."""
+        n = 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split(",")
+                    if len(parts) >= 4:
+                        self.add(parts[-3], parts[-2], parts[-1])
+                        n += 1
+        except FileNotFoundError:
+            pass
+        self.warnings = 0
+        return n
+
+
+class DecisionService:
+    def __init__(
+        self,
+        config_path: Optional[str] = None,
+        decisions_log: str = DECISIONS_LOG,
+        quality_csv: str = QUALITY_CSV,
+    ) -> None:
+        from scripts.ai.llm.keyword_router import KeywordRouter
+
+        self.router = KeywordRouter(config_path or CONFIG_PATH)
+        self.quality = QualityTracker()
+        self.quality.load(quality_csv)
+        os.makedirs(os.path.dirname(decisions_log), exist_ok=True)
+        os.makedirs(os.path.dirname(quality_csv), exist_ok=True)
+        # ملفات السجل مفتوحة طوال عمر الخدمة؛ flush مرة لكل طلب
+        self._decisions_log = open(decisions_log, "a", encoding="utf-8")
+        self._quality_csv = open(quality_csv, "a", encoding="utf-8")
+        self.started = time.time()
+        self.decisions = 0
+        self.by_agent: Dict[str, int] = {}
+
+    def _decide(self, message: str, user_id: str, ts: str) -> str:
+        agent = self.router.route(message)
+        self.decisions += 1
+        self.by_agent[agent] = self.by_agent.get(agent, 0) + 1
+        self._decisions_log.write(
+            f"{ts} - 🧠 المدير يحلل الرسالة من {user_id}: '{message}'\n"
+            f"{ts} - {_AGENT_LABELS.get(agent, f'توجيه لـ: {agent}')}\n"
+        )
+        return agent
+
+    def decide(self, message: str, user_id: str = "anonymous") -> str:
+        agent = self._decide(message, user_id, _now())
+        self._decisions_log.flush()
+        return agent
+
+    def decide_many(self, items: Iterable[Union[str, Dict[str, Any]]], user_id: str = "anonymous") -> List[str]:
+        ts = _now()
+        out = []
+        for item in items:
+            if isinstance(item, dict):
+                out.append(self._decide(str(item.get("message", "")), str(item.get("user_id") or user_id), ts))
+            else:
+                out.append(self._decide(str(item), user_id, ts))
+        self._decisions_log.flush()
+        return out
+
+    def record_quality(self, agent_id: str, user_id: str, quality: str) -> Dict[str, Any]:
+        if quality not in ("good", "bad"):
+            raise ValueError("quality must be good or bad")
+        ts = _now()
+        self._quality_csv.write(f"{ts},{agent_id},{user_id},{quality}\n")
+        self._quality_csv.flush()
+        result = self.quality.add(agent_id, user_id, quality)
+        if result["warning"]:
+            self._decisions_log.write(
+                f"{ts} - ⚠️  تحذير: عامل {agent_id} حصل على {result['bad_in_window']} تقييمات سيئة"
+                f" في آخر {result['window']} من {user_id}\n"
+            )
+            self._decisions_log.flush()
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        uptime = time.time() - self.started
+        compiled = self.router.compiled
+        return {
+            "pid": os.getpid(),
+            "uptime_s": round(uptime, 1),
+            "decisions": self.decisions,
+            "decisions_per_s": round(self.decisions / uptime, 1) if uptime > 0 else 0.0,
+            "by_agent": dict(self.by_agent),
+            "quality_events": self.quality.events,
+            "quality_warnings": self.quality.warnings,
+            "tracked_pairs": len(self.quality.recent),
+            "rules": len(compiled.rules) if compiled else 0,
+            "keywords": compiled.n_keywords if compiled else 0,
+            "rules_generation": self.router.generation,
+        }
+
+    def handle(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        op = req.get("op")
+        if op == "decide":
+            return {"ok": True, "agent": self.decide(str(req.get("message", "")), str(req.get("user_id") or "anonymous"))}
+        if op == "batch":
+            return {"ok": True, "agents": self.decide_many(req.get("items") or [], str(req.get("user_id") or "anonymous"))}
+        if op == "quality":
+            return {"ok": True, **self.record_quality(str(req["agent_id"]), str(req["user_id"]), str(req["quality"]))}
+        if op in ("status", "ping"):
+            return {"ok": True, **self.status()}
+        if op == "shutdown":
+            return {"ok": True}
+        raise ValueError(f"unknown op: {op}")
+
+    def close(self) -> None:
+        self._decisions_log.close()
+        self._quality_csv.close()
+
+
+async def _handle_conn(service: DecisionService, reader: Any, writer: Any, stop: Any) -> None:
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.lstrip().startswith(b"{"):
+                # سطر نصي من الـ shell (socat): "user_id<TAB>message" → اسم العامل
+                user_id, _, message = line.decode("utf-8", "replace").rstrip("\r\n").rpartition("\t")
+                writer.write(service.decide(message, user_id or "anonymous").encode("utf-8") + b"\n")
+                await writer.drain()
+                continue
+            req: Dict[str, Any] = {}
+            try:
+                req = json.loads(line)
+                resp = service.handle(req)
+            except Exception as e:
+                resp = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            writer.write(json.dumps(resp, ensure_ascii=False).encode("utf-8") + b"\n")
+            await writer.drain()
+            if req.get("op") == "shutdown":
+                stop.set()
+                break
+    except (ConnectionError, ValueError):
+        # ValueError: سطر أطول من _MAX_LINE
+        pass
+    finally:
+        writer.close()
+
+
+def _clear_stale(path: str) -> None:
+    if not os.path.exists(path):
+        return
+    try:
+        DecisionClient(path, timeout=1.0).close()
+    except OSError:
+        os.unlink(path)
+        return
+    raise RuntimeError(f"decision daemon already running on {path}")
+
+
+async def _serve(service: DecisionService, path: str) -> None:
+    import asyncio
+    import signal
+
+    _clear_stale(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    server = await asyncio.start_unix_server(
+        lambda r, w: _handle_conn(service, r, w, stop), path=path, limit=_MAX_LINE
+    )
+    os.chmod(path, 0o600)
+    print(f"🧠 decision daemon on {path} (pid {os.getpid()})", flush=True)
+    async with server:
+        await stop.wait()
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+def serve(path: str = SOCKET_PATH) -> None:
+    import asyncio
+
+    service = DecisionService()
+    try:
+        asyncio.run(_serve(service, path))
+    finally:
+        service.close()
+
+
+class DecisionClient:
+    """اتصال دائم بالخدمة؛ طلب واحد في كل مرة."""
+
+    def __init__(self, path: str = SOCKET_PATH, timeout: float = 30.0) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(path)
+        except OSError:
+            self.sock.close()
+            raise
+        self._reader = self.sock.makefile("rb")
+
+    def call(self, **req: Any) -> Dict[str, Any]:
+        self.sock.sendall(json.dumps(req, ensure_ascii=False).encode("utf-8") + b"\n")
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("decision daemon closed the connection")
+        resp = json.loads(line)
+        if not resp.get("ok"):
+            raise RuntimeError(resp.get("error", "decision daemon error"))
+        return resp
+
+    def close(self) -> None:
+        self._reader.close()
+        self.sock.close()
+
+
+def _connect(path: str) -> Union[DecisionClient, DecisionService]:
+    """الخدمة إن كانت شغالة، وإلا نفس القواعد داخل هذه العملية."""
+    try:
+        return DecisionClient(path)
+    except OSError:
+        return DecisionService()
+
+
+def _call(target: Union[DecisionClient, DecisionService], **req: Any) -> Dict[str, Any]:
+    if isinstance(target, DecisionClient):
+        return target.call(**req)
+    return target.handle(req)
+
+
+def _read_items(stream: Iterable[str]) -> Iterator[Union[str, Dict[str, Any]]]:
+    """سطر نصي = رسالة؛ سطر JSON = {"message", "user_id"}."""
+    for line in stream:
+        line = line.rstrip("\n")
+        if not line.strip():
+            continue
+        if line.lstrip().startswith("{"):
+            try:
+                yield json.loads(line)
+                continue
+            except ValueError:
+                pass
+        yield line
+
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def start(path: str = SOCKET_PATH, timeout: float = 30.0) -> int:
+    """يشغّل الخدمة في الخلفية (إن لم تكن شغالة) وينتظر جاهزيتها؛ يعيد الـ pid."""
+    import subprocess
+
+    try:
+        client = DecisionClient(path, timeout=2.0)
+        try:
+            return int(client.call(op="ping")["pid"])
+        finally:
+            client.close()
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(DECISIONS_LOG), exist_ok=True)
+    env = dict(os.environ, DECISION_SOCKET=path)
+    with open(os.path.join(os.path.dirname(DECISIONS_LOG), "decisiond.log"), "a") as out:
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "serve"],
+            env=env, stdin=subprocess.DEVNULL, stdout=out, stderr=out, start_new_session=True,
+        )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"decision daemon exited with code {proc.returncode}")
+        try:
+            DecisionClient(path, timeout=2.0).close()
+            return proc.pid
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("decision daemon did not start")
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--socket", default=SOCKET_PATH)
+    sub = p.add_subparsers(dest="command", required=True)
+    sub.add_parser("serve", help="تشغيل الخدمة في المقدمة")
+    sub.add_parser("start", help="تشغيل الخدمة في الخلفية")
+    sub.add_parser("stop")
+    sub.add_parser("status")
+    d = sub.add_parser("decide")
+    d.add_argument("message")
+    d.add_argument("user_id", nargs="?", default="anonymous")
+    b = sub.add_parser("batch", help="رسالة في كل سطر من stdin (أو JSON بـ message/user_id)")
+    b.add_argument("--user-id", default="anonymous")
+    b.add_argument("--json", action="store_true", help="JSON لكل سطر بدل اسم العامل فقط")
+    b.add_argument("--chunk", type=int, default=1000)
+    q = sub.add_parser("quality")
+    q.add_argument("agent_id")
+    q.add_argument("user_id")
+    q.add_argument("quality", choices=["good", "bad"])
+    a = p.parse_args()
+
+    if a.command == "serve":
+        serve(a.socket)
+        return
+    if a.command == "start":
+        print(f"🧠 decision daemon pid {start(a.socket)} on {a.socket}")
+        return
+    if a.command == "stop":
+        try:
+            client = DecisionClient(a.socket)
+        except OSError:
+            print("decision daemon not running")
+            return
+        client.call(op="shutdown")
+        client.close()
+        print("decision daemon stopped")
+        return
+
+    target = _connect(a.socket)
+    try:
+        if a.command == "decide":
+            print(_call(target, op="decide", message=a.message, user_id=a.user_id)["agent"])
+        elif a.command == "batch":
+            out = sys.stdout
+            for chunk in _chunks(_read_items(sys.stdin), a.chunk):
+                agents = _call(target, op="batch", items=chunk, user_id=a.user_id)["agents"]
+                if a.json:
+                    for item, agent in zip(chunk, agents):
+                        message = item.get("message", "") if isinstance(item, dict) else item
+                        out.write(json.dumps({"message": message, "agent": agent}, ensure_ascii=False) + "\n")
+                else:
+                    out.write("".join(agent + "\n" for agent in agents))
+        elif a.command == "quality":
+            r = _call(target, op="quality", agent_id=a.agent_id, user_id=a.user_id, quality=a.quality)
+            print(f"📊 {a.agent_id}/{a.user_id}: {r['bad_in_window']}/{r['window']} سيئة، سلسلة {r['bad_streak']}")
+            if r["warning"]:
+                print(f"⚠️  تحذير: عامل {a.agent_id} حصل على {r['bad_in_window']} تقييمات سيئة من {a.user_id}")
+        elif a.command == "status":
+            r = _call(target, op="status")
+            r["daemon"] = isinstance(target, DecisionClient)
+            r.pop("ok", None)
+            print(json.dumps(r, ensure_ascii=False, indent=2))
+    finally:
+        target.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import os
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+# I/O (ملفات المهارات، القياسات) → threads ؛ التقييم الثقيل (RAG) → processes
+IO_WORKERS = int(os.environ.get("FACTORY_IO_WORKERS", "16"))
+# عدد عمليات الخادم (scripts/ai/prefork.py)؛ مع عدة عمال هم أنفسهم مصدر التوازي
+SERVER_WORKERS = int(os.environ.get("FACTORY_WORKERS", "1"))
+# 0 = تشغيل مهام CPU على نفس thread pool الخاص بالـ I/O
+CPU_WORKERS = int(
+    os.environ.get("FACTORY_CPU_WORKERS", str(min(4, os.cpu_count() or 1) if SERVER_WORKERS <= 1 else 0))
+)
+# عمليات الـ pools لا تُنشأ بـ fork مباشرة: الخادم متعدد الـ threads (I/O pool، كاتب القياسات،
+# warm-up) والعملية الناتجة عن fork قد ترث قفلاً مأخوذاً فتتجمد. forkserver ينسخ من عملية
+# خادم نظيفة بلا threads (spawn حيث لا يتوفر)؛ الوحدات الثقيلة تُستورد فيه مرة واحدة.
+MP_START_METHOD = os.environ.get("FACTORY_MP_START", "forkserver")
+FORKSERVER_PRELOAD = ["scripts.ai.rag_engine", "scripts.ai.rag_shards"]
+
+_lock = threading.Lock()
+_io_pool: Optional[ThreadPoolExecutor] = None
+_cpu_pool: Optional[Executor] = None
+_pinned: List[ProcessPoolExecutor] = []
+_pid = os.getpid()
+
+
+def _reset_after_fork() -> None:
+    global _io_pool, _cpu_pool, _pinned, _pid
+    if _pid != os.getpid():
+        _io_pool = None
+        _cpu_pool = None
+        _pinned = []
+        _pid = os.getpid()
+
+
+def _mp_context() -> Any:
+    method = MP_START_METHOD if MP_START_METHOD in multiprocessing.get_all_start_methods() else "spawn"
+    ctx = multiprocessing.get_context(method)
+    if method == "forkserver":
+        # sys.path العملية الحالية (ومعه ROOT_DIR) يُمرَّر لخادم forkserver مع قائمة الوحدات
+        ctx.set_forkserver_preload(FORKSERVER_PRELOAD)
+    return ctx
+
+
+def io_executor() -> ThreadPoolExecutor:
+    global _io_pool
+    _reset_after_fork()
+    if _io_pool is None:
+        with _lock:
+            if _io_pool is None:
+                _io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="factory-io")
+    return _io_pool
+
+
+def cpu_executor(initializer: Optional[Callable[..., Any]] = None, initargs: Tuple[Any, ...] = ()) -> Executor:
+    """
+    initializer (دالة على مستوى وحدة) يعمل في كل عملية عند بدئها، مثلاً تحميل الفهرس؛
+    يؤخذ فقط من الاستدعاء الذي ينشئ الـ pool.
+    """
+    global _cpu_pool
+    _reset_after_fork()
+    if CPU_WORKERS <= 0:
+        return io_executor()
+    if _cpu_pool is None:
+        with _lock:
+            if _cpu_pool is None:
+                _cpu_pool = ProcessPoolExecutor(
+                    max_workers=CPU_WORKERS, mp_context=_mp_context(), initializer=initializer, initargs=initargs
+                )
+    return _cpu_pool
+
+
+def pinned_executors(n: int) -> List[ProcessPoolExecutor]:
+    """
+    n عمليات منفصلة (عامل واحد لكل منها): المهمة المرسلة لنفس الرقم تذهب دائماً
+    لنفس العملية، فتبقى البيانات التي حمّلتها (شارد فهرس مثلاً) في ذاكرتها وحدها.
+    """
+    _reset_after_fork()
+    if len(_pinned) < n:
+        with _lock:
+            ctx = _mp_context()
+            while len(_pinned) < n:
+                _pinned.append(ProcessPoolExecutor(max_workers=1, mp_context=ctx))
+    return _pinned[:n]
+
+
+async def run_io(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor(), functools.partial(fn, *args, **kwargs))
+
+
+async def run_cpu(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """fn ومعاملاته يجب أن تكون قابلة للـ pickle (دالة على مستوى الوحدة)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    global _io_pool, _cpu_pool, _pinned
+    with _lock:
+        for pool in _pinned:
+            pool.shutdown(wait=wait)
+        _pinned = []
+        if _cpu_pool is not None:
+            _cpu_pool.shutdown(wait=wait)
+            _cpu_pool = None
+        if _io_pool is not None:
+            _io_pool.shutdown(wait=wait)
+            _io_pool = None
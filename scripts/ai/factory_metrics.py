@@ -1,24 +1,281 @@
 #!/usr/bin/env python3
 import os
+import sys
+import atexit
 import json
+import queue
+import threading
+import time
 import uuid
 from datetime import datetime
 from collections import Counter
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 _THIS_DIR = os.path.dirname(__file__)
 ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.metrics_rollup import DIMENSIONS, parse_time, query_rollups, update_rollups
+from scripts.ai.metrics_segments import (
+    SEGMENTS_DIR,
+    SegmentWriter,
+    cutoff_days,
+    drop_segments_before,
+    hour_key,
+    list_segments,
+    migrate_legacy,
+    read_range,
+)
+from scripts.ai.stage_timing import timed
+
 LOGS_DIR = os.path.join(ROOT_DIR, "logs")
+# الملف القديم (قبل segments): يُرحَّل تلقائياً عند أول summary
 METRICS_PATH = os.path.join(LOGS_DIR, "factory_metrics.jsonl")
 
+# إعدادات الكاتب الخلفي (قابلة للتعديل عبر متغيرات البيئة)
+QUEUE_SIZE = int(os.environ.get("FACTORY_METRICS_QUEUE_SIZE", "10000"))
+BATCH_SIZE = int(os.environ.get("FACTORY_METRICS_BATCH_SIZE", "512"))
+FLUSH_INTERVAL = float(os.environ.get("FACTORY_METRICS_FLUSH_INTERVAL", "0.5"))
+# none: flush للنظام فقط | batch: fsync بعد كل دفعة | interval: fsync كل FSYNC_INTERVAL ثانية
+FSYNC_POLICY = os.environ.get("FACTORY_METRICS_FSYNC", "none")
+FSYNC_INTERVAL = float(os.environ.get("FACTORY_METRICS_FSYNC_INTERVAL", "5"))
+
+
+class MetricsSink:
+    """طابور محدود يفرغه thread خلفي على دفعات في segments ساعية (metrics_segments)."""
+
+    def __init__(
+        self,
+        segments_dir: str = SEGMENTS_DIR,
+        max_queue: int = QUEUE_SIZE,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        fsync_policy: str = FSYNC_POLICY,
+        fsync_interval: float = FSYNC_INTERVAL,
+    ) -> None:
+        if fsync_policy not in ("none", "batch", "interval"):
+            raise ValueError(f"unknown fsync policy: {fsync_policy}")
+        self.segments_dir = segments_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.pid = os.getpid()
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        # dropped يُحدَّث من كل threads المنتجين
+        self._stats_lock = threading.Lock()
+        self.last_error: Optional[str] = None
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self._last_fsync = time.monotonic()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-sink", daemon=True)
+        self._thread.start()
+
+    def _drop(self, n: int = 1) -> None:
+        with self._stats_lock:
+            self.dropped += n
+
+    def _error(self, e: BaseException) -> None:
+        self.errors += 1
+        self.last_error = f"{type(e).__name__}: {e}"
+        print(f"[METRICS] write error: {self.last_error}", file=sys.stderr)
+
+    def submit(self, rec: Dict[str, Any]) -> bool:
+        if self._closed:
+            self._drop()
+            return False
+        try:
+            self._queue.put_nowait(rec)
+            return True
+        except queue.Full:
+            self._drop()
+            return False
+
+    def _drain(self, first: Any) -> List[Any]:
+        items = [first]
+        while len(items) < self.batch_size:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _write(self, writer: SegmentWriter, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        try:
+            by_hour: Dict[str, List[str]] = {}
+            for r in records:
+                by_hour.setdefault(hour_key(r["ts"]), []).append(
+                    json.dumps(r, ensure_ascii=False) + "\n"
+                )
+            f = writer.write(by_hour)
+            now = time.monotonic()
+            if self.fsync_policy == "batch" or (
+                self.fsync_policy == "interval" and now - self._last_fsync >= self.fsync_interval
+            ):
+                os.fsync(f.fileno())
+                self._last_fsync = now
+            self.written += len(records)
+            self.batches += 1
+        except Exception as e:
+            # الدفعة كلها لم تُكتب: تُحسب في dropped لا في errors فقط
+            self._drop(len(records))
+            self._error(e)
+
+    def _fsync(self, writer: SegmentWriter) -> None:
+        if writer.f is not None:
+            os.fsync(writer.f.fileno())
+
+    def _run(self) -> None:
+        failures = 0
+        while True:
+            written = self.written
+            try:
+                if self._loop():
+                    return
+            except Exception as e:
+                # فتح/ختم الـ segments فشل: لا يموت الكاتب بصمت (وإلا يمتلئ الطابور ويُسقط كل شيء)؛
+                # نسجّل الخطأ ونعيد المحاولة بكاتب جديد مع backoff
+                self._error(e)
+            if self._closed:
+                # الإغلاق أثناء العطل: ما بقي في الطابور لن يُكتب
+                while True:
+                    try:
+                        if self._queue.get_nowait() is not None:
+                            self._drop()
+                    except queue.Empty:
+                        return
+            failures = 1 if self.written > written else failures + 1
+            self._wake.wait(min(5.0, 0.1 * 2 ** failures))
+
+    def _loop(self) -> bool:
+        """True عند الإغلاق."""
+        writer = SegmentWriter(self.segments_dir)
+        try:
+            while True:
+                try:
+                    first = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    if self._closed:
+                        # close() لم يستطع وضع علامة التوقف (طابور ممتلئ) والطابور فرغ الآن
+                        return True
+                    continue
+                items = self._drain(first)
+                records: List[Dict[str, Any]] = []
+                stop = False
+                for i, item in enumerate(items):
+                    try:
+                        if isinstance(item, threading.Event):
+                            # علامة flush: نكتب ما قبلها ثم نُبلغ المنتظر
+                            self._write(writer, records)
+                            records = []
+                            if self.fsync_policy != "none":
+                                self._fsync(writer)
+                            item.set()
+                        elif item is None:
+                            stop = True
+                        else:
+                            records.append(item)
+                    except BaseException:
+                        # _run يعيد المحاولة بكاتب جديد، لكن ما سُحب من الطابور ولم يُكتب يضيع
+                        self._drop(len(records) + sum(1 for it in items[i + 1:] if isinstance(it, dict)))
+                        raise
+                self._write(writer, records)
+                if stop:
+                    self._fsync(writer)
+                    return True
+        finally:
+            writer.close()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        if self._closed or not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        if self._thread.is_alive():
+            deadline = time.monotonic() + timeout
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                # الكاتب يتوقف وحده عندما يفرغ الطابور (_closed)
+                pass
+            self._thread.join(max(0.0, deadline - time.monotonic()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "writer_alive": self._thread.is_alive(),
+            "fsync_policy": self.fsync_policy,
+        }
+
+
+_SINK: Optional[MetricsSink] = None
+_SINK_LOCK = threading.Lock()
+
 
+def get_sink() -> MetricsSink:
+    global _SINK
+    sink = _SINK
+    # بعد fork لا يوجد thread الكاتب في العملية الابنة → ننشئ sink جديداً
+    if sink is None or sink.pid != os.getpid():
+        with _SINK_LOCK:
+            if _SINK is None or _SINK.pid != os.getpid():
+                _SINK = MetricsSink()
+            sink = _SINK
+    return sink
+
+
+def flush_metrics(timeout: float = 5.0) -> bool:
+    if _SINK is None or _SINK.pid != os.getpid():
+        return True
+    return _SINK.flush(timeout)
+
+
+def shutdown_metrics(timeout: float = 5.0) -> None:
+    global _SINK
+    with _SINK_LOCK:
+        if _SINK is not None and _SINK.pid == os.getpid():
+            _SINK.close(timeout)
+        _SINK = None
+
+
+def metrics_sink_stats() -> Dict[str, Any]:
+    if _SINK is None or _SINK.pid != os.getpid():
+        return {"queued": 0, "written": 0, "dropped": 0, "batches": 0, "errors": 0}
+    return _SINK.stats()
+
+
+atexit.register(shutdown_metrics)
+
+
+@timed("metrics")
 def log_metric(
     agent: str,
     event_type: str,
     user_id: Optional[str] = None,
     meta: Optional[Dict[str, Any]] = None,
 ) -> None:
-    os.makedirs(LOGS_DIR, exist_ok=True)
     rec = {
         "id": str(uuid.uuid4()),
         "ts": datetime.utcnow().isoformat() + "Z",
@@ -27,47 +284,100 @@ def log_metric(
         "user_id": user_id,
         "meta": meta or {},
     }
-    with open(METRICS_PATH, "a", encoding="utf-8") as f:
-        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    get_sink().submit(rec)
+
 
+def _migrate_legacy_if_needed() -> None:
+    if os.path.exists(METRICS_PATH):
+        n = migrate_legacy(METRICS_PATH)
+        print(f"[METRICS] migrated {n} legacy records to {SEGMENTS_DIR}", file=sys.stderr)
 
-def summarize_metrics() -> None:
-    if not os.path.exists(METRICS_PATH):
+
+def summarize_metrics(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    by: Optional[str] = None,
+    as_json: bool = False,
+) -> None:
+    flush_metrics()
+    _migrate_legacy_if_needed()
+    if not list_segments():
         print("no metrics yet")
         return
-    agents = Counter()
-    events = Counter()
-    with open(METRICS_PATH, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                obj = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            agents[obj.get("agent", "unknown")] += 1
-            events[obj.get("event_type", "unknown")] += 1
+    since_dt, until_dt = parse_time(since), parse_time(until)
+    dims = [by] if by else ["agent", "event_type"]
+    rollups = update_rollups()
+    try:
+        results = {d: query_rollups(rollups, since_dt, until_dt, by=d) for d in dims}
+    finally:
+        rollups.close()
+
+    if as_json:
+        print(json.dumps(
+            {
+                "since": since_dt.isoformat() + "Z" if since_dt else None,
+                "until": until_dt.isoformat() + "Z" if until_dt else None,
+                "events": results[dims[0]]["events"],
+                "by": {d: r["counts"] for d, r in results.items()},
+            },
+            ensure_ascii=False,
+            indent=2,
+        ))
+        return
 
     print("===== Factory Metrics Summary =====")
-    total = sum(events.values())
-    print(f"Total events: {total}")
-    print("\nBy agent:")
-    for k, v in agents.most_common():
-        print(f" - {k}: {v}")
-    print("\nBy event_type:")
-    for k, v in events.most_common():
-        print(f" - {k}: {v}")
+    if since_dt or until_dt:
+        print(f"Range: {since_dt or '-'} → {until_dt or '-'} (UTC)")
+    print(f"Total events: {results[dims[0]]['events']}")
+    for d in dims:
+        print(f"\nBy {d}:")
+        for k, v in Counter(results[d]["counts"]).most_common():
+            print(f" - {k}: {v}")
+
+
+def dump_events(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    agent: Optional[str] = None,
+    limit: int = 0,
+) -> None:
+    flush_metrics()
+    _migrate_legacy_if_needed()
+    n = 0
+    for rec in read_range(parse_time(since), parse_time(until)):
+        if agent and rec.get("agent") != agent:
+            continue
+        print(json.dumps(rec, ensure_ascii=False))
+        n += 1
+        if limit and n >= limit:
+            break
+
+
+def clean_metrics(days: int) -> int:
+    return drop_segments_before(cutoff_days(days))
 
 
 def main() -> None:
     import argparse
 
     p = argparse.ArgumentParser()
-    p.add_argument("command", choices=["summary"])
+    p.add_argument("command", choices=["summary", "events", "clean", "migrate"])
+    p.add_argument("--since", help="ISO-8601 أو مدة نسبية مثل 24h / 7d")
+    p.add_argument("--until", help="ISO-8601 أو مدة نسبية")
+    p.add_argument("--by", choices=list(DIMENSIONS))
+    p.add_argument("--json", action="store_true")
+    p.add_argument("--agent", help="events: تصفية حسب الـ agent")
+    p.add_argument("--limit", type=int, default=0)
+    p.add_argument("--days", type=int, default=30, help="clean: حذف segments أقدم من عدد الأيام")
     a = p.parse_args()
     if a.command == "summary":
-        summarize_metrics()
+        summarize_metrics(a.since, a.until, a.by, a.json)
+    elif a.command == "events":
+        dump_events(a.since, a.until, a.agent, a.limit)
+    elif a.command == "clean":
+        print(f"dropped {clean_metrics(a.days)} metrics segments older than {a.days} days")
+    elif a.command == "migrate":
+        _migrate_legacy_if_needed()
 
 
 if __name__ == "__main__":
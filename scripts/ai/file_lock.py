@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+أقفال ملفات بين العمليات (flock) لعمال backend_coach المتعددين (scripts/ai/prefork.py):
+ملفات مهارات المستخدمين وsegments القياسات تُكتب من أكثر من عملية.
+القفل استشاري ومرتبط بالـ fd: يُحرَّر تلقائياً إن ماتت العملية.
+"""
+import os
+import fcntl
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+@contextmanager
+def file_lock(path: str, shared: bool = False) -> Iterator[None]:
+    """قفل حصري (أو مشترك للقراءة) على ملف القفل path؛ يُنشأ إن لم يكن موجوداً."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        # إغلاق الـ fd يحرر القفل
+        os.close(fd)
+
+
+def try_file_lock(path: str) -> Optional[int]:
+    """قفل حصري بدون انتظار: يعيد الـ fd (إغلاقه يحرر القفل) أو None إن كانت عملية أخرى تحمله."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
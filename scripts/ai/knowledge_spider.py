@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+"""
+عنكبوت المعرفة (بديل knowledge_spider.sh):
+- asyncio + httpx بعميل واحد (connection pool) وحد تزامن لكل domain
+- GET مشروط (ETag / Last-Modified) وإزالة التكرار ببصمة المحتوى (sha256)
+- frontier دائم في SQLite: إعادة التشغيل تعالج الصفحات المتغيرة فقط
+- استخراج النص من HTML في process pool
+- تقسيم على حدود الفقرات/العناوين وإسقاط الـ chunks شبه المكررة (scripts/ai/chunker.py)
+المخرجات بنفس البنية القديمة:
+  raw_content/<domain>/<md5(url)>.html → cleaned_content/<md5(url)>.txt → knowledge_chunks/<md5(url)>_chunk_NN
+"""
+import os
+import sys
+import asyncio
+import hashlib
+import html
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urldefrag, urljoin, urlparse
+
+import httpx
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.chunker import (
+    NearDuplicateIndex,
+    default_simhash_path,
+    iter_blocks,
+    iter_chunks,
+    remove_chunks,
+    write_chunks,
+)
+
+DATASETS_DIR = os.path.join(ROOT_DIR, "ai", "datasets")
+LOGS_DIR = os.path.join(ROOT_DIR, "logs", "spider")
+
+DEFAULT_SEEDS = [
+    "https://docs.python.org/3/tutorial/",
+    "https://fastapi.tiangolo.com/",
+    "https://docs.djangoproject.com/",
+    "https://realpython.com/",
+]
+
+USER_AGENT = "HyperFactory-KnowledgeSpider/1.0"
+
+# nav/footer: قوائم تنقل مكررة في كل صفحات docs.python.org / realpython
+_SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "head", "nav", "footer"}
+_BLOCK_TAGS = {"br", "li", "dt", "dd", "tr", "td", "th", "title"}
+# وسوم تفصل فقرات (سطر فارغ) → حدود التقسيم في chunker
+_PARA_TAGS = {
+    "p", "div", "section", "article", "main", "header", "aside", "hr", "ul", "ol", "dl",
+    "table", "pre", "blockquote",
+}
+_HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+# نفس الشيء بأدوار ARIA (Sphinx: <div class="related" role="navigation">)
+_SKIP_ROLES = {"navigation", "contentinfo", "search"}
+
+
+def url_key(url: str) -> str:
+    # نفس اسم الملف في النسخة القديمة: echo "$url" | md5sum
+    return hashlib.md5((url + "\n").encode("utf-8")).hexdigest()
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.links: List[str] = []
+        self.title = ""
+        self._skip = 0
+        self._in_title = False
+        # وسم الـ landmark المتخطّى حالياً وعمق تداخله مع وسوم بنفس الاسم
+        self._landmark: Optional[str] = None
+        self._landmark_depth = 0
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag == "title":
+            self._in_title = True
+        elif tag in _SKIP_TAGS:
+            self._skip += 1
+        elif self._landmark == tag:
+            self._landmark_depth += 1
+        elif self._landmark is None and tag not in _BLOCK_TAGS and dict(attrs).get("role") in _SKIP_ROLES:
+            self._landmark = tag
+            self._landmark_depth = 1
+            self._skip += 1
+        if tag == "a":
+            for k, v in attrs:
+                if k == "href" and v:
+                    self.links.append(v)
+        if tag in _HEADING_TAGS:
+            self.parts.append("\n\n" + "#" * _HEADING_TAGS[tag] + " ")
+        elif tag in _PARA_TAGS:
+            self.parts.append("\n\n")
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "title":
+            self._in_title = False
+        elif tag in _SKIP_TAGS and self._skip:
+            self._skip -= 1
+        elif tag == self._landmark:
+            self._landmark_depth -= 1
+            if not self._landmark_depth:
+                self._landmark = None
+                self._skip -= 1
+        if tag in _HEADING_TAGS or tag in _PARA_TAGS:
+            self.parts.append("\n\n")
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data: str) -> None:
+        if self._in_title:
+            self.title += data
+        elif not self._skip:
+            self.parts.append(data)
+
+
+def html_to_text(raw: bytes, encoding: str = "utf-8") -> Dict[str, Any]:
+    """يُنفَّذ في process pool: يعيد العنوان والنص النظيف والروابط الخام."""
+    parser = _TextExtractor()
+    parser.feed(raw.decode(encoding or "utf-8", errors="replace"))
+    parser.close()
+    lines: List[str] = []
+    for line in "".join(parser.parts).splitlines():
+        line = " ".join(line.split())
+        if line.strip("#"):
+            lines.append(line)
+        elif lines and lines[-1]:
+            # سطر فارغ واحد بين الفقرات
+            lines.append("")
+    while lines and not lines[-1]:
+        lines.pop()
+    return {
+        "title": html.unescape(" ".join(parser.title.split())),
+        "text": "\n".join(lines),
+        "links": parser.links,
+    }
+
+
+class Frontier:
+    """حالة الزحف الدائمة: url → (ETag, Last-Modified, بصمة المحتوى، العمق، آخر جلب)."""
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                domain TEXT NOT NULL,
+                depth INTEGER NOT NULL DEFAULT 0,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                status INTEGER,
+                chunks INTEGER NOT NULL DEFAULT 0,
+                duplicate_of TEXT,
+                fetched_at REAL,
+                error TEXT
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_hash ON pages(content_hash)")
+        self.conn.commit()
+
+    def add(self, url: str, depth: int) -> bool:
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO pages (url, domain, depth) VALUES (?, ?, ?)",
+            (url, urlparse(url).netloc, depth),
+        )
+        return cur.rowcount > 0
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        cur = self.conn.execute("SELECT * FROM pages WHERE url = ?", (url,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return dict(zip([c[0] for c in cur.description], row))
+
+    def pending(self, max_depth: int) -> List[Tuple[str, int]]:
+        return list(self.conn.execute(
+            "SELECT url, depth FROM pages WHERE depth <= ? ORDER BY depth, url", (max_depth,)
+        ))
+
+    def owner_of(self, content_hash: str, url: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT url FROM pages WHERE content_hash = ? AND url != ? AND duplicate_of IS NULL LIMIT 1",
+            (content_hash, url),
+        ).fetchone()
+        return row[0] if row else None
+
+    def orphans(self) -> List[Tuple[str, int]]:
+        """نسخ مكررة لم يعد لأصلها نفس المحتوى."""
+        return list(self.conn.execute(
+            """SELECT p.url, p.depth FROM pages p WHERE p.duplicate_of IS NOT NULL
+               AND NOT EXISTS (SELECT 1 FROM pages o WHERE o.content_hash = p.content_hash
+                               AND o.url != p.url AND o.duplicate_of IS NULL)"""
+        ))
+
+    def update(self, url: str, **fields: Any) -> None:
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        self.conn.execute(f"UPDATE pages SET {cols} WHERE url = ?", (*fields.values(), url))
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+
+class KnowledgeSpider:
+    def __init__(
+        self,
+        datasets_dir: str = DATASETS_DIR,
+        state_path: Optional[str] = None,
+        concurrency: int = 16,
+        per_domain: int = 2,
+        timeout: float = 30.0,
+        max_depth: int = 0,
+        max_pages: int = 500,
+        workers: int = 0,
+        log_path: Optional[str] = None,
+    ) -> None:
+        self.datasets_dir = datasets_dir
+        self.raw_dir = os.path.join(datasets_dir, "raw_content")
+        self.clean_dir = os.path.join(datasets_dir, "cleaned_content")
+        self.chunks_dir = os.path.join(datasets_dir, "knowledge_chunks")
+        for d in (self.raw_dir, self.clean_dir, self.chunks_dir):
+            os.makedirs(d, exist_ok=True)
+        self.frontier = Frontier(state_path or os.path.join(datasets_dir, "spider_state.sqlite3"))
+        self.concurrency = concurrency
+        self.per_domain = per_domain
+        self.timeout = timeout
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.log_path = log_path
+        self._domain_locks: Dict[str, asyncio.Semaphore] = {}
+        self._claimed: Dict[str, str] = {}
+        # بصمات SimHash لكل chunks المعرفة؛ _write_outputs تعمل في threads
+        self.simhash_path = default_simhash_path(self.chunks_dir)
+        self.dedupe = NearDuplicateIndex.load(self.simhash_path, self.chunks_dir)
+        self._dedupe_lock = threading.Lock()
+        self.stats = {
+            "fetched": 0, "not_modified": 0, "unchanged": 0, "duplicates": 0,
+            "updated": 0, "failed": 0, "chunks_written": 0, "chunks_dropped": 0, "discovered": 0,
+        }
+
+    def log(self, msg: str) -> None:
+        print(msg)
+        if self.log_path:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(f"{datetime.now():%Y-%m-%d %H:%M:%S} - {msg}\n")
+
+    def _domain_sem(self, domain: str) -> asyncio.Semaphore:
+        sem = self._domain_locks.get(domain)
+        if sem is None:
+            sem = self._domain_locks[domain] = asyncio.Semaphore(self.per_domain)
+        return sem
+
+    def _remove_chunks(self, key: str) -> None:
+        with self._dedupe_lock:
+            remove_chunks(self.chunks_dir, f"{key}_chunk_", self.dedupe)
+
+    def _write_outputs(self, url: str, domain: str, body: bytes, extracted: Dict[str, Any]) -> int:
+        key = url_key(url)
+        raw_dir = os.path.join(self.raw_dir, domain)
+        os.makedirs(raw_dir, exist_ok=True)
+        _write_atomic(os.path.join(raw_dir, f"{key}.html"), body)
+
+        header = [
+            f"🔗 المصدر: {url}",
+            f"📅 تم الجلب: {datetime.now():%Y-%m-%d %H:%M:%S}",
+            "==========================================",
+        ]
+        if extracted["title"]:
+            header.append(extracted["title"])
+        lines = header + [""] + extracted["text"].splitlines()
+        _write_atomic(os.path.join(self.clean_dir, f"{key}.txt"), ("\n".join(lines) + "\n").encode("utf-8"))
+
+        # يحذف قطع النسخة السابقة ثم يكتب الجديدة متخطياً شبه المكرر
+        chunks = list(iter_chunks(iter_blocks(lines)))
+        with self._dedupe_lock:
+            result = write_chunks(chunks, self.chunks_dir, f"{key}_chunk_", f"{key}_chunk_{{:02d}}", self.dedupe)
+        self.stats["chunks_dropped"] += result["dropped"]
+        return result["written"]
+
+    async def _process(
+        self,
+        client: httpx.AsyncClient,
+        pool: ProcessPoolExecutor,
+        url: str,
+        depth: int,
+        queue: "asyncio.Queue[Tuple[str, int]]",
+    ) -> None:
+        page = self.frontier.get(url) or {}
+        domain = urlparse(url).netloc
+        headers = {}
+        # نسخة مكررة تغيّر أصلها صار محتواها فريداً → جلب كامل بدون GET مشروط
+        orphaned = bool(page.get("duplicate_of")) and (
+            self.frontier.owner_of(page.get("content_hash") or "", url) is None
+        )
+        if not orphaned:
+            if page.get("etag"):
+                headers["If-None-Match"] = page["etag"]
+            if page.get("last_modified"):
+                headers["If-Modified-Since"] = page["last_modified"]
+
+        async with self._domain_sem(domain):
+            try:
+                resp = await client.get(url, headers=headers)
+            except httpx.HTTPError as e:
+                self.stats["failed"] += 1
+                self.frontier.update(url, error=str(e) or type(e).__name__, fetched_at=time.time())
+                self.log(f"❌ فشل الجلب: {url} ({e!r})")
+                return
+
+        now = time.time()
+        if resp.status_code == 304:
+            self.stats["not_modified"] += 1
+            self.frontier.update(url, status=304, fetched_at=now, error=None)
+            return
+        if resp.status_code >= 400:
+            self.stats["failed"] += 1
+            self.frontier.update(url, status=resp.status_code, fetched_at=now, error=f"HTTP {resp.status_code}")
+            self.log(f"❌ فشل الجلب: {url} (HTTP {resp.status_code})")
+            return
+
+        self.stats["fetched"] += 1
+        body = resp.content
+        content_hash = hashlib.sha256(body).hexdigest()
+        validators = {
+            "etag": resp.headers.get("etag"),
+            "last_modified": resp.headers.get("last-modified"),
+            "status": resp.status_code,
+            "fetched_at": now,
+            "error": None,
+        }
+        owner = self.frontier.owner_of(content_hash, url)
+        if owner is None and self._claimed.get(content_hash, url) != url:
+            # صفحة أخرى بنفس المحتوى قيد المعالجة الآن في هذا التشغيل
+            owner = self._claimed[content_hash]
+        if content_hash == page.get("content_hash") and (owner is not None or not page.get("duplicate_of")):
+            # الخادم لا يدعم GET المشروط لكن المحتوى (أو حالة التكرار) لم يتغير
+            self.stats["unchanged"] += 1
+            self.frontier.update(url, **validators)
+            return
+
+        if owner is not None:
+            self.stats["duplicates"] += 1
+            self._remove_chunks(url_key(url))
+            self.frontier.update(url, content_hash=content_hash, duplicate_of=owner, chunks=0, **validators)
+            self.log(f"♻️ محتوى مكرر: {url} = {owner}")
+            return
+
+        self._claimed.setdefault(content_hash, url)
+        loop = asyncio.get_running_loop()
+        extracted = await loop.run_in_executor(pool, html_to_text, body, resp.encoding or "utf-8")
+        n = await loop.run_in_executor(None, self._write_outputs, url, domain, body, extracted)
+        self.stats["updated"] += 1
+        self.stats["chunks_written"] += n
+        self.frontier.update(url, content_hash=content_hash, duplicate_of=None, chunks=n, **validators)
+        self.log(f"✅ {url} → {n} قطعة")
+
+        if depth < self.max_depth:
+            for href in extracted["links"]:
+                link = urldefrag(urljoin(str(resp.url), href))[0]
+                if urlparse(link).scheme not in ("http", "https") or urlparse(link).netloc != domain:
+                    continue
+                if self.frontier.add(link, depth + 1):
+                    self.stats["discovered"] += 1
+                    await queue.put((link, depth + 1))
+
+    async def crawl(self, seeds: List[str]) -> Dict[str, Any]:
+        for url in seeds:
+            self.frontier.add(url, 0)
+        self.frontier.commit()
+
+        queue: "asyncio.Queue[Tuple[str, int]]" = asyncio.Queue()
+        for url, depth in self.frontier.pending(self.max_depth):
+            queue.put_nowait((url, depth))
+
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency,
+        )
+        processed = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            async with httpx.AsyncClient(
+                limits=limits,
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT},
+            ) as client:
+
+                async def worker() -> None:
+                    nonlocal processed
+                    while True:
+                        url, depth = await queue.get()
+                        try:
+                            if processed < self.max_pages:
+                                processed += 1
+                                await self._process(client, pool, url, depth, queue)
+                        except Exception as e:
+                            self.stats["failed"] += 1
+                            self.log(f"❌ خطأ في معالجة {url}: {e!r}")
+                        finally:
+                            queue.task_done()
+
+                tasks = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+                await queue.join()
+                # أصول تغيّرت في هذا التشغيل → نسخها المكررة تُعالج الآن بدل التشغيل القادم
+                for url, depth in self.frontier.orphans():
+                    queue.put_nowait((url, depth))
+                await queue.join()
+                for t in tasks:
+                    t.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        self.frontier.commit()
+        with self._dedupe_lock:
+            self.dedupe.save(self.simhash_path, self.chunks_dir)
+        return dict(self.stats, processed=processed)
+
+    def close(self) -> None:
+        self.frontier.close()
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_seeds(path: str) -> List[str]:
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(DEFAULT_SEEDS) + "\n")
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def main() -> None:
+    import argparse
+    import json
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--datasets-dir", default=DATASETS_DIR)
+    p.add_argument("--seeds-file", help="الافتراضي: <datasets-dir>/spider_seeds/urls.txt")
+    p.add_argument("--state-path", help="الافتراضي: <datasets-dir>/spider_state.sqlite3")
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--per-domain", type=int, default=2)
+    p.add_argument("--timeout", type=float, default=30.0)
+    p.add_argument("--max-depth", type=int, default=0, help="0 = البذور فقط")
+    p.add_argument("--max-pages", type=int, default=500)
+    p.add_argument("--workers", type=int, default=0, help="عمليات استخراج النص (0 = تلقائي)")
+    p.add_argument("--no-index", action="store_true", help="عدم إعادة بناء فهرس BM25")
+    a = p.parse_args()
+
+    seeds = load_seeds(a.seeds_file or os.path.join(a.datasets_dir, "spider_seeds", "urls.txt"))
+    spider = KnowledgeSpider(
+        datasets_dir=a.datasets_dir,
+        state_path=a.state_path,
+        concurrency=a.concurrency,
+        per_domain=a.per_domain,
+        timeout=a.timeout,
+        max_depth=a.max_depth,
+        max_pages=a.max_pages,
+        workers=a.workers,
+        log_path=os.path.join(LOGS_DIR, "spider.log"),
+    )
+    t0 = time.perf_counter()
+    try:
+        stats = asyncio.run(spider.crawl(seeds))
+    finally:
+        spider.close()
+    stats["elapsed_s"] = round(time.perf_counter() - t0, 3)
+
+    if (stats["updated"] or stats["duplicates"]) and not a.no_index:
+        from scripts.ai.rag_engine import build_index
+
+        build_index(spider.chunks_dir)
+        spider.log("🗂️ تم بناء الفهرس")
+
+    from scripts.ai.factory_metrics import log_metric
+
+    log_metric(agent="knowledge_spider", event_type="crawl_completed", meta=stats)
+    print(json.dumps(stats, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+DEFAULT_AGENT = "technical_coach"
+
+# مفاتيح routing القديمة في orchestrator.yaml بترتيب الأولوية (الأعلى أولاً)
+LEGACY_KEYWORD_KEYS = [
+    ("debug_keywords", "debug_expert"),
+    ("architect_keywords", "system_architect"),
+    ("coach_keywords", "technical_coach"),
+    ("spider_keywords", "knowledge_spider"),
+]
+
+
+class _Automaton:
+    """Aho-Corasick: كل الكلمات المفتاحية في مرور واحد على الرسالة."""
+
+    def __init__(self, patterns: List[str]) -> None:
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[Tuple[int, ...]] = [()]
+        outs: List[List[int]] = [[]]
+        for pid, pat in enumerate(patterns):
+            state = 0
+            for ch in pat:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    outs.append([])
+                state = nxt
+            outs[state].append(pid)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                outs[nxt].extend(outs[self.fail[nxt]])
+        self.out = [tuple(o) for o in outs]
+        # جدول انتقالات DFA يُملأ عند الحاجة (بما فيه انتقالات الـ fail)
+        self.delta: List[Dict[str, int]] = [dict(g) for g in self.goto]
+
+    def _resolve(self, state: int, ch: str) -> int:
+        s = state
+        while s and ch not in self.goto[s]:
+            s = self.fail[s]
+        nxt = self.goto[s].get(ch, 0)
+        self.delta[state][ch] = nxt
+        return nxt
+
+    def matches(self, text: str) -> set:
+        delta, out = self.delta, self.out
+        found = set()
+        state = 0
+        for ch in text:
+            nxt = delta[state].get(ch)
+            if nxt is None:
+                nxt = self._resolve(state, ch)
+            state = nxt
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class CompiledRules:
+    def __init__(self, rules: List[Dict[str, Any]], default_agent: str = DEFAULT_AGENT) -> None:
+        self.default_agent = default_agent
+        self.rules = rules
+        patterns: List[str] = []
+        self.kw_rule: List[int] = []
+        self.kw_weight: List[float] = []
+        for rule_idx, rule in enumerate(rules):
+            for kw, weight in rule["keywords"]:
+                patterns.append(kw)
+                self.kw_rule.append(rule_idx)
+                self.kw_weight.append(weight)
+        self.n_keywords = len(patterns)
+        self.automaton = _Automaton(patterns)
+
+    def route(self, message: str) -> str:
+        found = self.automaton.matches(message.lower())
+        if not found:
+            return self.default_agent
+        scores: Dict[int, float] = {}
+        for pid in found:
+            r = self.kw_rule[pid]
+            scores[r] = scores.get(r, 0.0) + self.kw_weight[pid]
+        # أعلى priority، ثم أعلى وزن، ثم ترتيب القاعدة في الملف
+        best = max(scores, key=lambda r: (self.rules[r]["priority"], scores[r], -r))
+        return self.rules[best]["agent"]
+
+
+def _parse_keywords(items: List[Any], default_weight: float) -> List[Tuple[str, float]]:
+    out: List[Tuple[str, float]] = []
+    for item in items or []:
+        if isinstance(item, dict):
+            kw = str(item.get("keyword", ""))
+            weight = float(item.get("weight", default_weight))
+        else:
+            kw, weight = str(item), default_weight
+        kw = kw.lower()
+        if kw:
+            out.append((kw, weight))
+    return out
+
+
+def compile_rules(routing: Dict[str, Any]) -> CompiledRules:
+    rules: List[Dict[str, Any]] = []
+    for i, (key, agent) in enumerate(LEGACY_KEYWORD_KEYS):
+        if key in routing:
+            rules.append({
+                "agent": agent,
+                "priority": len(LEGACY_KEYWORD_KEYS) - i,
+                "keywords": _parse_keywords(routing.get(key), 1.0),
+            })
+    for rule in routing.get("rules", []) or []:
+        rules.append({
+            "agent": rule["agent"],
+            "priority": int(rule.get("priority", 0)),
+            "keywords": _parse_keywords(rule.get("keywords"), float(rule.get("weight", 1.0))),
+        })
+    return CompiledRules(rules, routing.get("default_agent", DEFAULT_AGENT))
+
+
+class KeywordRouter:
+    """يعيد ترجمة القواعد تلقائياً عند تغيّر ملف الـ YAML دون إعادة تشغيل الخدمة."""
+
+    def __init__(self, config_path: str, check_interval: float = 1.0) -> None:
+        self.config_path = config_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = 0.0
+        self._next_check = 0.0
+        self.compiled: Optional[CompiledRules] = None
+        self.reload()
+
+    def reload(self) -> None:
+        with self._lock:
+            mtime = os.path.getmtime(self.config_path)
+            with open(self.config_path, "r", encoding="utf-8") as f:
+                cfg = yaml.safe_load(f) or {}
+            compiled = compile_rules(cfg.get("routing", {}) or {})
+            # استبدال مرجع واحد: الطلبات الجارية ترى إما الجدول القديم أو الجديد كاملاً
+            self.compiled = compiled
+            self._mtime = mtime
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            if os.path.getmtime(self.config_path) != self._mtime:
+                self.reload()
+        except Exception as e:
+            # نبقي القواعد السابقة إذا كان الملف الجديد غير صالح
+            print(f"[ROUTER] reload failed, keeping previous rules: {e}", file=sys.stderr)
+
+    @property
+    def generation(self) -> float:
+        """mtime ملف الإعداد الذي تُرجمت منه القواعد النشطة حالياً."""
+        self._maybe_reload()
+        return self._mtime
+
+    def route(self, message: str) -> str:
+        self._maybe_reload()
+        return self.compiled.route(message)
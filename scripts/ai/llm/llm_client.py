@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+عميل LLM غير متزامن لمزوّد متوافق مع OpenAI (قسم llm: في config/orchestrator.yaml):
+  - httpx.AsyncClient واحد لكل event loop: اتصالات keep-alive مُعاد استخدامها (max_connections)
+  - حد تزامن عام (max_concurrency) وحد لكل عامل (per_agent_concurrency)
+  - timeout = ميزانية الطلب كاملة (انتظار الدور + المحاولات + الانتظار بينها)، و retries مع
+    backoff وميزانية إعادة محاولة مشتركة (retry_budget × الطلبات) كي لا تضاعف الأعطال الحمل
+  - batch_size > 1: طلبات complete() المتزامنة تُجمع خلال batch_window_ms في طلب
+    /completions واحد (prompt كقائمة) — للخوادم التي تدعم ذلك
+provider: local = بدون عميل (LLMOrchestrator يبني النص محلياً).
+خادم بديل للتجربة دون شبكة: scripts/ai/llm/llm_stub_server.py
+
+    python3 scripts/ai/llm/llm_client.py --base-url http://127.0.0.1:8001/v1 --message "مرحبا"
+"""
+import os
+import sys
+import asyncio
+import json
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+DEFAULTS: Dict[str, Any] = {
+    "timeout": 15.0,
+    "connect_timeout": 3.0,
+    "max_connections": 16,
+    # أقل من max_connections = اتصالات تُغلق وتُفتح من جديد تحت الحمل
+    "max_keepalive": 16,
+    "keepalive_expiry": 30.0,
+    "max_concurrency": 16,
+    "per_agent_concurrency": 8,
+    "retries": 2,
+    "retry_budget": 0.2,
+    "backoff": 0.1,
+    "backoff_max": 2.0,
+    "batch_size": 1,
+    "batch_window_ms": 5.0,
+    "max_tokens": 512,
+    "temperature": 0.2,
+}
+_RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMError(RuntimeError):
+    pass
+
+
+class _Retryable(Exception):
+    def __init__(self, detail: str, retry_after: Optional[float] = None) -> None:
+        super().__init__(detail)
+        self.retry_after = retry_after
+
+
+class RetryBudget:
+    """كل طلب يودع ratio، وكل إعادة محاولة تسحب 1: الإعادات ≤ ratio من الطلبات (+ رصيد أولي)."""
+
+    def __init__(self, ratio: float, initial: float = 10.0, cap: float = 100.0) -> None:
+        self.ratio = ratio
+        self.tokens = initial
+        self.cap = cap
+
+    def deposit(self) -> None:
+        self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class _LoopState:
+    """كل ما يرتبط بـ event loop: الاتصالات والـ semaphores وطابور الـ batch."""
+
+    def __init__(self, client: "LLMClient", loop: asyncio.AbstractEventLoop) -> None:
+        cfg = client.cfg
+        self.loop = loop
+        headers = {"Content-Type": "application/json"}
+        if client.api_key:
+            headers["Authorization"] = f"Bearer {client.api_key}"
+        self.http = httpx.AsyncClient(
+            base_url=client.base_url,
+            headers=headers,
+            limits=httpx.Limits(
+                max_connections=int(cfg["max_connections"]),
+                max_keepalive_connections=int(cfg["max_keepalive"]),
+                keepalive_expiry=float(cfg["keepalive_expiry"]),
+            ),
+            timeout=httpx.Timeout(float(cfg["timeout"]), connect=float(cfg["connect_timeout"])),
+        )
+        self.global_sem = asyncio.Semaphore(int(cfg["max_concurrency"]))
+        self.agent_sems: Dict[str, asyncio.Semaphore] = {}
+        # (max_tokens, temperature) -> طابور الـ batch: لا يُجمع إلا ما يتطابق في المعاملات
+        self.pending: Dict[Tuple[int, float], List[Tuple[str, asyncio.Future]]] = {}
+        self.flush_handles: Dict[Tuple[int, float], asyncio.TimerHandle] = {}
+
+
+class LLMClient:
+    def __init__(self, cfg: Dict[str, Any]) -> None:
+        self.cfg = {**DEFAULTS, **{k: v for k, v in (cfg or {}).items() if v is not None}}
+        self.base_url = str(self.cfg.get("base_url") or "").rstrip("/")
+        if not self.base_url:
+            raise ValueError("llm.base_url is required for a remote provider")
+        self.model = str(self.cfg.get("model") or "")
+        key_env = self.cfg.get("api_key_env") or ""
+        self.api_key = os.environ.get(key_env, "") if key_env else ""
+        self.timeout = float(self.cfg["timeout"])
+        self.retries = int(self.cfg["retries"])
+        self.batch_size = max(1, int(self.cfg["batch_size"]))
+        self.budget = RetryBudget(float(self.cfg["retry_budget"]))
+        self._state: Optional[_LoopState] = None
+        self.counters: Dict[str, int] = {
+            "requests": 0, "http_requests": 0, "retries": 0, "retries_denied": 0,
+            "timeouts": 0, "errors": 0, "batches": 0, "batched_prompts": 0, "in_flight": 0,
+        }
+
+    @classmethod
+    def from_config(cls, cfg: Optional[Dict[str, Any]]) -> Optional["LLMClient"]:
+        """None لمزوّد local (أو قسم llm غائب)."""
+        cfg = cfg or {}
+        if str(cfg.get("provider") or "local").lower() == "local":
+            return None
+        return cls(cfg)
+
+    def _loop_state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._state
+        if state is None or state.loop is not loop:
+            # loop جديد (عامل جديد بعد fork، أو asyncio.run في CLI): اتصالات الـ loop القديم لا تصلح هنا
+            state = self._state = _LoopState(self, loop)
+        return state
+
+    def _agent_sem(self, state: _LoopState, agent: str) -> asyncio.Semaphore:
+        sem = state.agent_sems.get(agent)
+        if sem is None:
+            limit = self.cfg["per_agent_concurrency"]
+            if isinstance(limit, dict):
+                limit = limit.get(agent, limit.get("default", DEFAULTS["per_agent_concurrency"]))
+            sem = state.agent_sems[agent] = asyncio.Semaphore(int(limit))
+        return sem
+
+    async def _acquire(self, sem: asyncio.Semaphore, deadline: float) -> None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise asyncio.TimeoutError()
+        await asyncio.wait_for(sem.acquire(), remaining)
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return retry_after
+        base = min(float(self.cfg["backoff_max"]), float(self.cfg["backoff"]) * (2 ** (attempt - 1)))
+        return base * random.uniform(0.5, 1.0)
+
+    async def _with_retries(self, attempt_fn: Any, deadline: float) -> Any:
+        """attempt_fn() → النتيجة أو _Retryable؛ الأخطاء الأخرى تُرفع مباشرة."""
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                return await attempt_fn()
+            except _Retryable as e:
+                attempt += 1
+                delay = self._backoff(attempt, e.retry_after)
+                if attempt > self.retries or time.monotonic() + delay >= deadline:
+                    raise LLMError(f"LLM request failed after {attempt} attempts: {e}") from None
+                if not self.budget.withdraw():
+                    self.counters["retries_denied"] += 1
+                    raise LLMError(f"LLM retry budget exhausted: {e}") from None
+                self.counters["retries"] += 1
+                await asyncio.sleep(delay)
+
+    async def _post(self, path: str, payload: Dict[str, Any], deadline: float) -> Dict[str, Any]:
+        state = self._loop_state()
+
+        async def attempt() -> Dict[str, Any]:
+            await self._acquire(state.global_sem, deadline)
+            try:
+                self.counters["http_requests"] += 1
+                remaining = max(0.001, deadline - time.monotonic())
+                try:
+                    resp = await state.http.post(path, json=payload, timeout=min(remaining, self.timeout))
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    raise _Retryable(f"{type(e).__name__}: {e}")
+            finally:
+                state.global_sem.release()
+            return self._parse(resp)
+
+        return await self._with_retries(attempt, deadline)
+
+    def _parse(self, resp: httpx.Response) -> Dict[str, Any]:
+        if resp.status_code in _RETRYABLE_STATUS:
+            retry_after = resp.headers.get("retry-after")
+            try:
+                delay = float(retry_after) if retry_after else None
+            except ValueError:
+                delay = None
+            raise _Retryable(f"HTTP {resp.status_code}", delay)
+        if resp.status_code >= 400:
+            raise LLMError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+        return resp.json()
+
+    async def _run(self, agent: str, coro_fn: Any) -> Any:
+        """حد العامل + عدّادات + تحويل تجاوز الميزانية إلى LLMError."""
+        state = self._loop_state()
+        deadline = time.monotonic() + self.timeout
+        self.counters["requests"] += 1
+        self.counters["in_flight"] += 1
+        try:
+            sem = self._agent_sem(state, agent)
+            await self._acquire(sem, deadline)
+            try:
+                return await coro_fn(deadline)
+            finally:
+                sem.release()
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise LLMError(f"LLM request exceeded its {self.timeout}s budget") from None
+        except LLMError:
+            self.counters["errors"] += 1
+            raise
+        finally:
+            self.counters["in_flight"] -= 1
+
+    def _sampling(self, params: Dict[str, Any]) -> Tuple[int, float]:
+        """(max_tokens, temperature) للطلب: معاملات المستدعي وإلا قيم الإعداد."""
+        return (
+            int(params.get("max_tokens") or self.cfg["max_tokens"]),
+            float(params.get("temperature", self.cfg["temperature"])),
+        )
+
+    def _chat_payload(self, messages: List[Dict[str, str]], stream: bool, **params: Any) -> Dict[str, Any]:
+        max_tokens, temperature = self._sampling(params)
+        return {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": stream,
+        }
+
+    async def chat(self, messages: List[Dict[str, str]], agent: str = "default", **params: Any) -> str:
+        async def call(deadline: float) -> str:
+            data = await self._post("/chat/completions", self._chat_payload(messages, False, **params), deadline)
+            return data["choices"][0]["message"]["content"] or ""
+
+        return await self._run(agent, call)
+
+    async def complete(self, prompt: str, agent: str = "default", **params: Any) -> str:
+        """/completions؛ مع batch_size > 1 يُجمع مع الطلبات المتزامنة في طلب واحد."""
+        sampling = self._sampling(params)
+
+        async def call(deadline: float) -> str:
+            if self.batch_size <= 1:
+                payload = {"model": self.model, "prompt": prompt, "max_tokens": sampling[0], "temperature": sampling[1]}
+                data = await self._post("/completions", payload, deadline)
+                return data["choices"][0]["text"]
+            return await self._enqueue(prompt, sampling, deadline)
+
+        return await self._run(agent, call)
+
+    async def _enqueue(self, prompt: str, sampling: Tuple[int, float], deadline: float) -> str:
+        state = self._loop_state()
+        fut: asyncio.Future = state.loop.create_future()
+        queue = state.pending.setdefault(sampling, [])
+        queue.append((prompt, fut))
+        if len(queue) >= self.batch_size:
+            self._flush(state, sampling)
+        elif sampling not in state.flush_handles:
+            state.flush_handles[sampling] = state.loop.call_later(
+                float(self.cfg["batch_window_ms"]) / 1000.0, self._flush, state, sampling
+            )
+        remaining = deadline - time.monotonic()
+        # shield: انتهاء مهلة أحد المنتظرين لا يلغي الـ batch لبقية الطلبات
+        return await asyncio.wait_for(asyncio.shield(fut), max(0.001, remaining))
+
+    def _flush(self, state: _LoopState, sampling: Tuple[int, float]) -> None:
+        handle = state.flush_handles.pop(sampling, None)
+        if handle is not None:
+            handle.cancel()
+        queue = state.pending.pop(sampling, [])
+        batch, rest = queue[: self.batch_size], queue[self.batch_size :]
+        if rest:
+            state.pending[sampling] = rest
+            state.flush_handles[sampling] = state.loop.call_later(0, self._flush, state, sampling)
+        if batch:
+            state.loop.create_task(self._send_batch(batch, sampling))
+
+    async def _send_batch(self, batch: List[Tuple[str, asyncio.Future]], sampling: Tuple[int, float]) -> None:
+        self.counters["batches"] += 1
+        self.counters["batched_prompts"] += len(batch)
+        payload = {
+            "model": self.model,
+            "prompt": [p for p, _ in batch],
+            "max_tokens": sampling[0],
+            "temperature": sampling[1],
+        }
+        try:
+            data = await self._post("/completions", payload, time.monotonic() + self.timeout)
+            texts: Dict[int, str] = {int(c.get("index", i)): c.get("text", "") for i, c in enumerate(data["choices"])}
+            for i, (_, fut) in enumerate(batch):
+                if not fut.done():
+                    if i in texts:
+                        fut.set_result(texts[i])
+                    else:
+                        fut.set_exception(LLMError(f"batch response has no choice {i}"))
+        except Exception as e:
+            err = e if isinstance(e, LLMError) else LLMError(f"{type(e).__name__}: {e}")
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(err)
+
+    async def stream_chat(
+        self, messages: List[Dict[str, str]], agent: str = "default", **params: Any
+    ) -> AsyncIterator[str]:
+        """أجزاء النص كما تصل (SSE). إعادة المحاولة فقط قبل أول جزء."""
+        state = self._loop_state()
+        deadline = time.monotonic() + self.timeout
+        payload = self._chat_payload(messages, True, **params)
+        self.counters["requests"] += 1
+        self.counters["in_flight"] += 1
+        sem = self._agent_sem(state, agent)
+        acquired: List[asyncio.Semaphore] = []
+        try:
+            await self._acquire(sem, deadline)
+            acquired.append(sem)
+
+            async def attempt() -> Tuple[Any, httpx.Response]:
+                await self._acquire(state.global_sem, deadline)
+                self.counters["http_requests"] += 1
+                req = state.http.build_request("POST", "/chat/completions", json=payload)
+                try:
+                    resp = await state.http.send(req, stream=True)
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    state.global_sem.release()
+                    raise _Retryable(f"{type(e).__name__}: {e}")
+                if resp.status_code >= 400:
+                    await resp.aread()
+                    await resp.aclose()
+                    state.global_sem.release()
+                    self._parse(resp)
+                return state.global_sem, resp
+
+            global_sem, resp = await self._with_retries(attempt, deadline)
+            acquired.append(global_sem)
+            try:
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        delta = (json.loads(data).get("choices") or [{}])[0].get("delta") or {}
+                        content = delta.get("content")
+                    except (ValueError, KeyError, IndexError, AttributeError) as e:
+                        # سطر تالف = فشل المزوّد (LLMError) كي يطبّق المستدعي الرد المحلي ويُغلق البث
+                        raise LLMError(f"malformed LLM stream event: {type(e).__name__}: {data[:200]}") from None
+                    if content:
+                        yield content
+            except httpx.HTTPError as e:
+                raise LLMError(f"LLM stream interrupted: {type(e).__name__}: {e}") from None
+            finally:
+                await resp.aclose()
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise LLMError(f"LLM request exceeded its {self.timeout}s budget") from None
+        except LLMError:
+            self.counters["errors"] += 1
+            raise
+        finally:
+            for s in acquired:
+                s.release()
+            self.counters["in_flight"] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "retry_tokens": round(self.budget.tokens, 2),
+            "base_url": self.base_url,
+            "model": self.model,
+            "max_connections": int(self.cfg["max_connections"]),
+            "max_concurrency": int(self.cfg["max_concurrency"]),
+            "batch_size": self.batch_size,
+        }
+
+    async def aclose(self) -> None:
+        state, self._state = self._state, None
+        if state is not None and state.loop is asyncio.get_running_loop():
+            await state.http.aclose()
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--base-url", required=True)
+    p.add_argument("--model", default="stub")
+    p.add_argument("--message", required=True)
+    p.add_argument("--agent", default="technical_coach")
+    p.add_argument("--stream", action="store_true")
+    a = p.parse_args()
+
+    async def run() -> None:
+        client = LLMClient({"provider": "openai", "base_url": a.base_url, "model": a.model})
+        messages = [{"role": "user", "content": a.message}]
+        try:
+            if a.stream:
+                async for part in client.stream_chat(messages, a.agent):
+                    print(part, end="", flush=True)
+                print()
+            else:
+                print(await client.chat(messages, a.agent))
+            print(json.dumps(client.stats(), ensure_ascii=False), file=sys.stderr)
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,39 @@
 #!/usr/bin/env python3
 import os
+import re
 import sys
-from typing import Dict, Any, List
+import asyncio
+import copy
+import time
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
 
 import yaml
 
 _THIS_DIR = os.path.dirname(__file__)
-ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", "..", ".."))
 if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
-from scripts.ai.rag_engine import search_knowledge
+from scripts.ai.rag_engine import index_file, search_knowledge, search_knowledge_batch, start_source_watcher
+from scripts.ai.analysis_cache import AnalysisCache, corpus_generation, normalize_message
+from scripts.ai.answer_cache import ANSWER_CACHE_PATH, AnswerCache, PromptVersions, chunk_ids
 from scripts.ai.factory_metrics import log_metric
+from scripts.ai.executors import CPU_WORKERS, cpu_executor, run_cpu, run_io
+from scripts.ai.llm.keyword_router import KeywordRouter
+from scripts.ai.llm.llm_client import LLMClient, LLMError
+from scripts.ai.stage_timing import stage
 
-CONFIG_PATH = os.path.join(ROOT_DIR, "config", "orchestrator.yaml")
+# كلمة مع المسافة التي تليها: دمج الأجزاء يعيد النص كما هو
+_TOKEN_RE = re.compile(r"\s*\S+\s*|\s+")
+
+CONFIG_PATH = os.environ.get("ORCHESTRATOR_CONFIG") or os.path.join(
+    ROOT_DIR, "config", "orchestrator.yaml"
+)
+
+
+def _warm_worker(params: Dict[str, Any]) -> None:
+    # initializer عمليات الـ CPU pool: الفهرس في الذاكرة قبل أول مهمة
+    search_knowledge("warm up", **params)
 
 
 class LLMOrchestrator:
@@ -25,81 +45,362 @@ class LLMOrchestrator:
         self.config = cfg
         self.routing = cfg.get("routing", {})
         self.rag_cfg = cfg.get("rag", {})
+        self.router = KeywordRouter(CONFIG_PATH)
+        # None لمزوّد local: النص يُبنى من المقتطفات دون طلب شبكة
+        self.llm: Optional[LLMClient] = LLMClient.from_config(cfg.get("llm"))
+        answers_cfg = cfg.get("answer_cache", {}) or {}
+        self.answers: Optional[AnswerCache] = None
+        self.prompt_versions = PromptVersions()
+        # provider local: الرد يُبنى من المقتطفات فوراً، الكاش على القرص أبطأ منه
+        if self.llm is not None and answers_cfg.get("enabled", True):
+            path = os.environ.get("ANSWER_CACHE_PATH") or answers_cfg.get("path")
+            self.answers = AnswerCache(
+                path=os.path.join(ROOT_DIR, path) if path else ANSWER_CACHE_PATH,
+                max_bytes=int(answers_cfg.get("max_bytes", 64 * 1024 * 1024)),
+                near_threshold=float(answers_cfg.get("near_duplicate") or 0.0),
+            )
+        cache_cfg = cfg.get("cache", {}) or {}
+        self.cache: Optional[AnalysisCache] = None
+        if cache_cfg.get("enabled", True):
+            self.cache = AnalysisCache(
+                max_bytes=int(cache_cfg.get("max_bytes", 16 * 1024 * 1024)),
+                max_entries=int(cache_cfg.get("max_entries", 10000)),
+                ttl=float(cache_cfg.get("ttl_seconds", 600)),
+            )
 
     def _select_agent(self, message: str) -> str:
-        msg = message.lower()
-        if any(k.lower() in msg for k in self.routing.get("debug_keywords", [])):
-            return "debug_expert"
-        if any(k.lower() in msg for k in self.routing.get("architect_keywords", [])):
-            return "system_architect"
-        if any(k.lower() in msg for k in self.routing.get("coach_keywords", [])):
-            return "technical_coach"
-        if any(k.lower() in msg for k in self.routing.get("spider_keywords", [])):
-            return "knowledge_spider"
-        return "technical_coach"
+        with stage("route"):
+            return self.router.route(message)
+
+    def _knowledge_dir(self) -> str:
+        index_path = self.rag_cfg.get("index_path") or os.path.join(
+            "ai", "datasets", "knowledge_chunks"
+        )
+        return os.path.join(ROOT_DIR, index_path)
+
+    def _generation(self) -> str:
+        knowledge_dir = self._knowledge_dir()
+        index_path = index_file(knowledge_dir, self.rag_cfg.get("mode", "bm25"))
+        return corpus_generation(knowledge_dir, self.router.generation, index_path)
+
+    def llm_stats(self) -> Dict[str, Any]:
+        return self.llm.stats() if self.llm is not None else {"provider": "local"}
+
+    async def aclose(self) -> None:
+        if self.llm is not None:
+            await self.llm.aclose()
+        if self.answers is not None:
+            self.answers.flush()
+
+    def answer_cache_stats(self) -> Dict[str, Any]:
+        return self.answers.stats() if self.answers else {"enabled": False}
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats() if self.cache else {"enabled": False}
+
+    def _rag_params(self) -> Dict[str, Any]:
+        nprobe = self.rag_cfg.get("nprobe")
+        return {
+            "top_k": int(self.rag_cfg.get("top_k", 5)),
+            "knowledge_dir": self._knowledge_dir(),
+            "mode": self.rag_cfg.get("mode", "bm25"),
+            "nprobe": int(nprobe) if nprobe else None,
+        }
 
     def _run_rag(self, message: str) -> List[Dict[str, Any]]:
         if not self.rag_cfg.get("enabled", True):
             return []
-        index_path = self.rag_cfg.get("index_path") or os.path.join(
-            ROOT_DIR, "ai", "datasets", "knowledge_chunks"
-        )
-        top_k = int(self.rag_cfg.get("top_k", 5))
-        return search_knowledge(message, top_k=top_k, knowledge_dir=index_path)
+        with stage("rag"):
+            return search_knowledge(message, **self._rag_params())
+
+    async def _run_rag_async(self, message: str) -> List[Dict[str, Any]]:
+        if not self.rag_cfg.get("enabled", True):
+            return []
+        # التقييم (BM25 / IVF) عمل CPU → process pool حتى لا يُحجز event loop؛
+        # الوضع المقسّم يوزّع على عملياته بنفسه → thread يكفي
+        run = run_io if self.rag_cfg.get("mode") == "sharded" else run_cpu
+        with stage("rag"):
+            return await run(search_knowledge, message, **self._rag_params())
+
+    def _run_rag_batch(self, messages: List[str]) -> List[List[Dict[str, Any]]]:
+        if not self.rag_cfg.get("enabled", True):
+            return [[] for _ in messages]
+        with stage("rag"):
+            return search_knowledge_batch(messages, **self._rag_params())
+
+    def warm_up(self, spawn_pools: bool = True) -> Dict[str, Any]:
+        """
+        يحمّل جداول التوجيه وفهرس الاسترجاع قبل أول طلب: في هذه العملية، ثم في كل عملية
+        من الـ CPU pool عبر initializer (العمال تبدأ من forkserver فلا ترث فهرس هذه العملية).
+        spawn_pools=False: التحميل فقط (عملية master في prefork قبل fork العمال).
+        """
+        t0 = time.perf_counter()
+        self._select_agent("warm up python error")
+        detail: Dict[str, Any] = {"router_ms": round((time.perf_counter() - t0) * 1000.0, 2)}
+        if not self.rag_cfg.get("enabled", True):
+            return detail
+        params = self._rag_params()
+        t0 = time.perf_counter()
+        if not spawn_pools and params["mode"] == "sharded":
+            # الشاردات تُحمَّل داخل عمليات البحث المثبّتة؛ هنا الـ manifest والمخزن فقط
+            from scripts.ai.rag_shards import load_sharded_index
+
+            load_sharded_index(params["knowledge_dir"])
+        else:
+            search_knowledge("warm up", **params)
+        detail["rag_mode"] = params["mode"]
+        detail["rag_index_ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+        if spawn_pools and params["mode"] != "sharded" and CPU_WORKERS > 0:
+            t0 = time.perf_counter()
+            pool = cpu_executor(_warm_worker, (params,))
+            for f in [pool.submit(search_knowledge, "warm up", **params) for _ in range(CPU_WORKERS)]:
+                f.result()
+            detail["cpu_pool_ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+        if spawn_pools:
+            # لا threads في عملية master قبل fork: المراقب يبدأ في العمال فقط
+            detail["knowledge_watch"] = start_source_watcher(params["knowledge_dir"])
+        return detail
 
     def analyze_message(self, user_id: str, message: str) -> Dict[str, Any]:
-        agent = self._select_agent(message)
-        rag_results = self._run_rag(message)
+        # التحليل يتم على النص المطبّع نفسه المستخدم كمفتاح → نتيجة واحدة لكل مفتاح
+        message = normalize_message(message)
+        generation, cached = self._cache_lookup(message)
+        if cached is not None:
+            return self._log_analysis(user_id, cached, cached=True)
+        return self._analysis(user_id, message, self._run_rag(message), generation)
+
+    async def analyze_message_async(self, user_id: str, message: str) -> Dict[str, Any]:
+        # التحليل يتم على النص المطبّع نفسه المستخدم كمفتاح → نتيجة واحدة لكل مفتاح
+        message = normalize_message(message)
+        generation, cached = self._cache_lookup(message)
+        if cached is not None:
+            return self._log_analysis(user_id, cached, cached=True)
+        return self._analysis(user_id, message, await self._run_rag_async(message), generation)
+
+    def _analysis(
+        self,
+        user_id: str,
+        message: str,
+        rag_results: List[Dict[str, Any]],
+        generation: str = "",
+    ) -> Dict[str, Any]:
+        result = {
+            "agent": self._select_agent(message),
+            "rag_hits": len(rag_results),
+            "rag_results": rag_results,
+        }
+        if self.cache:
+            self.cache.put(generation, message, result)
+        return self._log_analysis(user_id, result, cached=False)
+
+    def _log_analysis(self, user_id: str, result: Dict[str, Any], cached: bool) -> Dict[str, Any]:
         log_metric(
             agent="router",
             event_type="route_decision",
             user_id=user_id,
-            meta={"selected_agent": agent, "rag_hits": len(rag_results)},
+            meta={"selected_agent": result["agent"], "rag_hits": result["rag_hits"], "cached": cached},
         )
-        return {
-            "agent": agent,
-            "rag_hits": len(rag_results),
-            "rag_results": rag_results,
-        }
+        # نسخة عميقة: المستدعي قد يعدّل النتيجة (أو rag_results داخلها) دون المساس بالمخزّن
+        return copy.deepcopy(result)
+
+    def analyze_batch(self, user_id: str, messages: List[str]) -> List[Dict[str, Any]]:
+        texts, generation, cached = self._batch_lookup(messages)
+        misses = [t for t, c in zip(texts, cached) if c is None]
+        rag = self._run_rag_batch(misses) if misses else []
+        return self._batch_analysis(user_id, texts, generation, cached, rag)
+
+    async def analyze_batch_async(self, user_id: str, messages: List[str]) -> List[Dict[str, Any]]:
+        texts, generation, cached = self._batch_lookup(messages)
+        misses = [t for t, c in zip(texts, cached) if c is None]
+        rag: List[List[Dict[str, Any]]] = []
+        if misses and not self.rag_cfg.get("enabled", True):
+            rag = [[] for _ in misses]
+        elif misses:
+            run = run_io if self.rag_cfg.get("mode") == "sharded" else run_cpu
+            with stage("rag"):
+                rag = await run(search_knowledge_batch, misses, **self._rag_params())
+        return self._batch_analysis(user_id, texts, generation, cached, rag)
+
+    def _cache_lookup(self, text: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        if not self.cache:
+            return "", None
+        with stage("cache"):
+            generation = self._generation()
+            return generation, self.cache.get(generation, text)
+
+    def _batch_lookup(
+        self, messages: List[str]
+    ) -> Tuple[List[str], str, List[Optional[Dict[str, Any]]]]:
+        texts = [normalize_message(m) for m in messages]
+        if not self.cache:
+            return texts, "", [None] * len(texts)
+        with stage("cache"):
+            generation = self._generation()
+            return texts, generation, [self.cache.get(generation, t) for t in texts]
+
+    def _batch_analysis(
+        self,
+        user_id: str,
+        texts: List[str],
+        generation: str,
+        cached: List[Optional[Dict[str, Any]]],
+        rag: List[List[Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        agents: Dict[str, int] = {}
+        misses = iter(rag)
+        for text, hit in zip(texts, cached):
+            if hit is None:
+                rag_results = next(misses)
+                hit = {
+                    "agent": self._select_agent(text),
+                    "rag_hits": len(rag_results),
+                    "rag_results": rag_results,
+                }
+                if self.cache:
+                    self.cache.put(generation, text, hit)
+            agents[hit["agent"]] = agents.get(hit["agent"], 0) + 1
+            out.append(copy.deepcopy(hit))
+        log_metric(
+            agent="router",
+            event_type="route_decision_batch",
+            user_id=user_id,
+            meta={
+                "messages": len(texts),
+                "selected_agents": agents,
+                "cached": sum(1 for c in cached if c is not None),
+            },
+        )
+        return out
 
     def smart_answer(self, user_id: str, message: str) -> Dict[str, Any]:
-        analysis = self.analyze_message(user_id, message)
-        agent = analysis["agent"]
-        rag_results = analysis["rag_results"]
+        if self.llm is not None:
+            return asyncio.run(self._smart_answer_once(user_id, message))
+        return self._compose_answer(user_id, message, self.analyze_message(user_id, message))
 
+    async def _smart_answer_once(self, user_id: str, message: str) -> Dict[str, Any]:
+        # asyncio.run يغلق الـ loop بعد الرد: اتصالات LLMClient المرتبطة به تُغلق قبله
+        try:
+            return await self.smart_answer_async(user_id, message)
+        finally:
+            await self.llm.aclose()
+
+    async def smart_answer_async(self, user_id: str, message: str) -> Dict[str, Any]:
+        analysis = await self.analyze_message_async(user_id, message)
+        if self.llm is None:
+            return self._compose_answer(user_id, message, analysis)
+        snippets = self._snippets(analysis["rag_results"])
+        key = self._answer_key(analysis["agent"], message, analysis["rag_results"])
+        if key is not None:
+            with stage("answer_cache"):
+                body, kind = await run_io(self.answers.get, *key)
+            if body is not None:
+                result = self._compose_answer(user_id, message, analysis, body)
+                result["analysis"]["answer_cache"] = kind
+                return result
+        try:
+            with stage("llm"):
+                body = await self._llm_body(analysis["agent"], message, snippets)
+            result = self._compose_answer(user_id, message, analysis, body)
+            if key is not None:
+                await run_io(self.answers.put, *key, body)
+                result["analysis"]["answer_cache"] = "miss"
+            return result
+        except LLMError as e:
+            # المزوّد غير متاح: نفس الرد المحلي مع سبب الفشل بدل خطأ 500
+            result = self._compose_answer(user_id, message, analysis)
+            result["analysis"]["llm_error"] = str(e)
+            return result
+
+    def _answer_key(
+        self, agent: str, message: str, rag_results: List[Dict[str, Any]]
+    ) -> Optional[Tuple[str, str, List[str], str]]:
+        """(العامل، السؤال المطبّع، مقتطفات top-k، نسخة الـ prompt + النموذج) لكاش الإجابات."""
+        if self.answers is None:
+            return None
+        version = f"{self.prompt_versions.get(agent)}|{self.llm.model}"
+        return agent, normalize_message(message), chunk_ids(rag_results), version
+
+    def _agent_prefix(self, agent: str) -> str:
         if agent == "debug_expert":
-            prefix = "Debug Expert: أعطني traceback أو رسالة الخطأ بالكامل."
+            return "Debug Expert: أعطني traceback أو رسالة الخطأ بالكامل."
         elif agent == "system_architect":
-            prefix = "System Architect: سأحوّل فكرتك إلى معمارية وخطوات تنفيذ."
+            return "System Architect: سأحوّل فكرتك إلى معمارية وخطوات تنفيذ."
         elif agent == "technical_coach":
-            prefix = "Technical Coach: سأبني لك خطة مهارات ومهام عملية."
+            return "Technical Coach: سأبني لك خطة مهارات ومهام عملية."
         elif agent == "knowledge_spider":
-            prefix = "Knowledge Spider: سأبحث في المعرفة المتاحة وأجمع لك مقتطفات."
-        else:
-            prefix = "Generic Agent: سأساعدك قدر الإمكان."
+            return "Knowledge Spider: سأبحث في المعرفة المتاحة وأجمع لك مقتطفات."
+        return "Generic Agent: سأساعدك قدر الإمكان."
 
+    def _snippets(self, rag_results: List[Dict[str, Any]]) -> List[str]:
         snippets: List[str] = []
         for r in rag_results[:3]:
             text = r.get("preview", "")
             if len(text) > 300:
                 text = text[:300] + "..."
             snippets.append(text)
+        return snippets
 
-        parts = [prefix, "", f"سؤالك: {message}"]
+    def _local_body(self, message: str, snippets: List[str]) -> str:
+        parts = [f"سؤالك: {message}"]
         if snippets:
             parts.append("")
             parts.append("مقتطفات من الـ Knowledge:")
             for i, s in enumerate(snippets, start=1):
                 parts.append(f"[{i}] {s}")
-        answer = "\n".join(parts)
+        return "\n".join(parts)
+
+    def _llm_messages(self, agent: str, message: str, snippets: List[str]) -> List[Dict[str, str]]:
+        system = self._agent_prefix(agent)
+        if snippets:
+            system += "\n\nمقتطفات من الـ Knowledge:\n" + "\n".join(
+                f"[{i}] {s}" for i, s in enumerate(snippets, start=1)
+            )
+        return [{"role": "system", "content": system}, {"role": "user", "content": message}]
+
+    async def _llm_body(self, agent: str, message: str, snippets: List[str]) -> str:
+        messages = self._llm_messages(agent, message, snippets)
+        if self.llm.batch_size > 1:
+            # /completions: الطلبات المتزامنة تُجمع في طلب واحد للخادم
+            prompt = "\n\n".join(f"{m['role']}: {m['content']}" for m in messages) + "\n\nassistant:"
+            return await self.llm.complete(prompt, agent)
+        return await self.llm.chat(messages, agent)
+
+    async def _generate_tokens(
+        self, agent: str, message: str, snippets: List[str]
+    ) -> AsyncIterator[str]:
+        if self.llm is not None:
+            async for part in self.llm.stream_chat(self._llm_messages(agent, message, snippets), agent):
+                yield part
+            return
+        async for token in self._local_tokens(message, snippets):
+            yield token
+
+    async def _local_tokens(self, message: str, snippets: List[str]) -> AsyncIterator[str]:
+        # provider "local" (أو فشل المزوّد): النص مبني من المقتطفات ويُرسل كلمة بكلمة.
+        for token in _TOKEN_RE.findall(self._local_body(message, snippets)):
+            yield token
+            await asyncio.sleep(0)
 
+    def log_answer(self, user_id: str, message: str, agent: str, rag_hits: int) -> None:
         log_metric(
             agent=agent,
             event_type="answer_generated",
             user_id=user_id,
-            meta={"message_len": len(message), "rag_hits": len(rag_results)},
+            meta={"message_len": len(message), "rag_hits": rag_hits},
         )
 
+    def _compose_answer(
+        self, user_id: str, message: str, analysis: Dict[str, Any], body: Optional[str] = None
+    ) -> Dict[str, Any]:
+        agent = analysis["agent"]
+        rag_results = analysis["rag_results"]
+        if body is None:
+            body = self._local_body(message, self._snippets(rag_results))
+        answer = self._agent_prefix(agent) + "\n\n" + body
+
+        self.log_answer(user_id, message, agent, len(rag_results))
+
         return {
             "agent": agent,
             "answer": answer,
@@ -108,6 +409,71 @@ class LLMOrchestrator:
             },
         }
 
+    async def smart_answer_stream(self, user_id: str, message: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        أحداث بالترتيب: route (فوراً بعد التوجيه) → snippet لكل مقتطف حسب الترتيب
+        → token لكل جزء من النص المولَّد → done.
+        القياسات لا تُسجَّل هنا: المستدعي يستدعي record_stream بعد إغلاق الاستجابة.
+        """
+        text = normalize_message(message)
+        generation, analysis = self._cache_lookup(text)
+        agent = analysis["agent"] if analysis else self._select_agent(text)
+        yield {
+            "event": "route",
+            "data": {"agent": agent, "prefix": self._agent_prefix(agent), "cached": analysis is not None},
+        }
+
+        if analysis is None:
+            rag_results = await self._run_rag_async(text)
+            analysis = {"agent": agent, "rag_hits": len(rag_results), "rag_results": rag_results}
+            if self.cache:
+                self.cache.put(generation, text, analysis)
+        rag_results = analysis["rag_results"]
+
+        snippets = self._snippets(rag_results)
+        for rank, (r, snippet) in enumerate(zip(rag_results, snippets), start=1):
+            yield {
+                "event": "snippet",
+                "data": {"rank": rank, "score": r.get("score"), "path": r.get("path"), "text": snippet},
+            }
+
+        done: Dict[str, Any] = {"agent": agent, "rag_hits": len(rag_results)}
+        key = self._answer_key(agent, message, rag_results)
+        body: Optional[str] = None
+        if key is not None:
+            with stage("answer_cache"):
+                body, done["answer_cache"] = await run_io(self.answers.get, *key)
+        if body is not None:
+            # من الكاش: النص كاملاً في حدث token واحد
+            yield {"event": "token", "data": body}
+        else:
+            parts: List[str] = []
+            try:
+                async for token in self._generate_tokens(agent, message, snippets):
+                    parts.append(token)
+                    yield {"event": "token", "data": token}
+            except LLMError as e:
+                # كما في smart_answer_async: الرد المحلي بدل حدث error بلا done؛
+                # بعد أول جزء لا يمكن استبدال النص، فيُغلق البث بـ done مع سبب الفشل
+                done["llm_error"] = str(e)
+                if not parts:
+                    async for token in self._local_tokens(message, snippets):
+                        yield {"event": "token", "data": token}
+            else:
+                if key is not None:
+                    await run_io(self.answers.put, *key, "".join(parts))
+
+        yield {"event": "done", "data": done}
+
+    def record_stream(self, user_id: str, message: str, agent: str, rag_hits: int) -> None:
+        log_metric(
+            agent="router",
+            event_type="route_decision",
+            user_id=user_id,
+            meta={"selected_agent": agent, "rag_hits": rag_hits, "streamed": True},
+        )
+        self.log_answer(user_id, message, agent, rag_hits)
+
 
 if __name__ == "__main__":
     import argparse
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+خادم بديل متوافق مع OpenAI لقياس عميل الـ LLM دون شبكة أو نموذج:
+  POST /v1/chat/completions   (stream: true → SSE بنفس صيغة OpenAI)
+  POST /v1/completions        (prompt نص أو قائمة: batch بكلفة طلب واحد تقريباً)
+  GET  /v1/models
+  GET  /stats | POST /stats/reset   الطلبات، الـ prompts، الاتصالات المختلفة، أقصى تزامن
+زمن الرد = latency_ms (+ jitter) + per_token_ms لكل جزء، و fail_rate نسبة ردود 503
+لاختبار إعادة المحاولة. النص المولَّد حتمي (مبني من رسالة المستخدم).
+
+    python3 scripts/ai/llm/llm_stub_server.py --port 8001 --latency-ms 50
+    # orchestrator.yaml: llm: {provider: openai, base_url: http://127.0.0.1:8001/v1}
+"""
+import os
+import sys
+import asyncio
+import json
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List, Set, Tuple
+
+from fastapi import Body, FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def _reply_tokens(text: str, max_tokens: int) -> List[str]:
+    words = (text or "").split()[:32]
+    body = ["رد", "تجريبي", "على:"] + words + ["—", "انتهى."]
+    return [w + " " for w in body[: max(1, max_tokens)]]
+
+
+def create_app(
+    latency_ms: float = 50.0,
+    per_token_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    fail_rate: float = 0.0,
+    max_batch: int = 64,
+    per_prompt_ms: float = 1.0,
+    seed: int = 0,
+) -> FastAPI:
+    app = FastAPI(title="LLM stub")
+    rnd = random.Random(seed)
+    stats: Dict[str, Any] = {}
+    connections: Set[Tuple[str, int]] = set()
+
+    def reset() -> None:
+        stats.update({"requests": 0, "prompts": 0, "failed": 0, "in_flight": 0, "max_in_flight": 0})
+        connections.clear()
+
+    reset()
+
+    async def _delay(tokens: int = 0, prompts: int = 1) -> None:
+        ms = latency_ms + rnd.uniform(0, jitter_ms) + per_token_ms * tokens + per_prompt_ms * (prompts - 1)
+        await asyncio.sleep(ms / 1000.0)
+
+    def _begin(request: Request, prompts: int = 1) -> bool:
+        """يعيد False إن كان يجب رفض الطلب (fail_rate)."""
+        stats["requests"] += 1
+        stats["prompts"] += prompts
+        if request.client:
+            connections.add((request.client.host, request.client.port))
+        if fail_rate and rnd.random() < fail_rate:
+            stats["failed"] += 1
+            return False
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        return True
+
+    def _unavailable() -> JSONResponse:
+        return JSONResponse(status_code=503, content={"error": {"message": "stub overloaded", "type": "server_error"}})
+
+    def _last_user(messages: List[Dict[str, Any]]) -> str:
+        for m in reversed(messages or []):
+            if m.get("role") == "user":
+                return str(m.get("content") or "")
+        return ""
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "local"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return {**stats, "connections": len(connections)}
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        reset()
+        return {"ok": True}
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request, data: Dict[str, Any] = Body(...)):
+        if not _begin(request):
+            return _unavailable()
+        model = data.get("model") or "stub"
+        tokens = _reply_tokens(_last_user(data.get("messages") or []), int(data.get("max_tokens") or 256))
+        created = int(time.time())
+        if not data.get("stream"):
+            try:
+                await _delay(len(tokens))
+            finally:
+                stats["in_flight"] -= 1
+            return {
+                "id": f"chatcmpl-stub-{stats['requests']}",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+            }
+
+        async def events() -> AsyncIterator[str]:
+            try:
+                await _delay()
+                for tok in tokens:
+                    chunk = {"object": "chat.completion.chunk", "created": created, "model": model,
+                             "choices": [{"index": 0, "delta": {"content": tok}, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    if per_token_ms:
+                        await asyncio.sleep(per_token_ms / 1000.0)
+                yield "data: [DONE]\n\n"
+            finally:
+                stats["in_flight"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/completions")
+    async def completions(request: Request, data: Dict[str, Any] = Body(...)):
+        prompts = data.get("prompt")
+        prompts = prompts if isinstance(prompts, list) else [prompts or ""]
+        if len(prompts) > max_batch:
+            return JSONResponse(status_code=400, content={"error": {"message": f"batch larger than {max_batch}"}})
+        if not _begin(request, len(prompts)):
+            return _unavailable()
+        max_tokens = int(data.get("max_tokens") or 256)
+        texts = ["".join(_reply_tokens(str(p), max_tokens)) for p in prompts]
+        try:
+            # batch: التوليد متوازٍ على الخادم، فالكلفة ≈ أطول رد + كلفة صغيرة لكل prompt
+            await _delay(max(len(t.split()) for t in texts), len(prompts))
+        finally:
+            stats["in_flight"] -= 1
+        return {
+            "id": f"cmpl-stub-{stats['requests']}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": data.get("model") or "stub",
+            "choices": [{"index": i, "text": t, "finish_reason": "stop"} for i, t in enumerate(texts)],
+        }
+
+    return app
+
+
+def main() -> None:
+    import argparse
+    import uvicorn
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8001)
+    p.add_argument("--latency-ms", type=float, default=50.0)
+    p.add_argument("--per-token-ms", type=float, default=0.0)
+    p.add_argument("--jitter-ms", type=float, default=0.0)
+    p.add_argument("--fail-rate", type=float, default=0.0)
+    p.add_argument("--max-batch", type=int, default=64)
+    p.add_argument("--log-level", default="warning")
+    a = p.parse_args()
+    app = create_app(a.latency_ms, a.per_token_ms, a.jitter_ms, a.fail_rate, a.max_batch)
+    print(f"🧪 LLM stub على http://{a.host}:{a.port}/v1 (latency {a.latency_ms}ms, fail_rate {a.fail_rate})")
+    uvicorn.run(app, host=a.host, port=a.port, log_level=a.log_level)
+
+
+if __name__ == "__main__":
+    main()
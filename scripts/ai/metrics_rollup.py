@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+عدّادات القياسات (agent، event_type، user) مجمّعة في SQLite (logs/factory_metrics.rollup.sqlite3):
+  gran T  الإجمالي منذ البداية
+  gran d  يوم   — الساعات الأقدم من HOUR_RETENTION_DAYS تُدمج في يومها
+  gran h  ساعة
+  gran m  دقيقة — تُحذف بعد MINUTE_RETENTION_HOURS
+التحديث يقرأ البايتات الجديدة فقط من كل segment (offset محفوظ في جدول sources) ويضيفها
+بـ upsert؛ الاستعلام مجاميع SQL على نطاق المفاتيح. الكلفة تتبع البيانات الجديدة وحجم النطاق،
+لا طول التاريخ.
+"""
+import os
+import json
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from scripts.ai.metrics_segments import SEGMENTS_DIR, list_segments, read_raw, segment_base
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+LOGS_DIR = os.path.join(ROOT_DIR, "logs")
+ROLLUP_PATH = os.path.join(LOGS_DIR, "factory_metrics.rollup.sqlite3")
+ROLLUP_VERSION = 3
+
+DIMENSIONS = ("agent", "event_type", "user")
+MINUTE_RETENTION_HOURS = int(os.environ.get("FACTORY_METRICS_MINUTE_RETENTION_HOURS", "48"))
+# buckets الساعة (ومعها عدّادات كل مستخدم لكل ساعة) تُدمج في buckets يومية بعد هذه المدة
+HOUR_RETENTION_DAYS = int(os.environ.get("FACTORY_METRICS_HOUR_RETENTION_DAYS", "30"))
+
+_EVENTS = "events"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counts (
+    gran   TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    dim    TEXT NOT NULL,
+    key    TEXT NOT NULL,
+    n      INTEGER NOT NULL,
+    PRIMARY KEY (gran, dim, bucket, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sources (
+    hour   TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    stamp  INTEGER
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name  TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+SQL_ADD = (
+    "INSERT INTO counts (gran, bucket, dim, key, n) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(gran, dim, bucket, key) DO UPDATE SET n = n + excluded.n"
+)
+SQL_RANGE = (
+    "SELECT key, SUM(n) FROM counts WHERE gran = ? AND dim = ? AND bucket >= ? AND bucket < ? GROUP BY key"
+)
+
+Counts = Dict[Tuple[str, str, str, str], int]
+
+
+def _bump(counts: Counts, gran: str, bucket: str, rec: Dict[str, Any]) -> None:
+    for dim, key in (
+        (_EVENTS, ""),
+        ("agent", rec.get("agent") or "unknown"),
+        ("event_type", rec.get("event_type") or "unknown"),
+        ("user", rec.get("user_id") or "anonymous"),
+    ):
+        k = (gran, bucket, dim, key)
+        counts[k] = counts.get(k, 0) + 1
+
+
+def apply_record(counts: Counts, rec: Dict[str, Any]) -> None:
+    ts = str(rec.get("ts") or "")
+    _bump(counts, "T", "", rec)
+    if len(ts) < 16:
+        return
+    _bump(counts, "h", ts[:13], rec)
+    _bump(counts, "m", ts[:16], rec)
+
+
+def apply_lines(counts: Counts, lines: Iterable[bytes]) -> int:
+    n = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            continue
+        apply_record(counts, rec)
+        n += 1
+    return n
+
+
+def _segment_stamp(hour: str, sealed: bool, segments_dir: str) -> Optional[int]:
+    ext = ".idx.json" if sealed else ".jsonl"
+    try:
+        st = os.stat(segment_base(hour, segments_dir) + ext)
+    except OSError:
+        return None
+    return st.st_mtime_ns + st.st_size
+
+
+def _hour_str(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H")
+
+
+def _minute_str(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M")
+
+
+class Rollups:
+    def __init__(self, path: str = ROLLUP_PATH) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        version = self._meta("version")
+        if version != str(ROLLUP_VERSION):
+            self.conn.execute("BEGIN IMMEDIATE")
+            for table in ("counts", "sources", "meta"):
+                self.conn.execute(f"DELETE FROM {table}")
+            self.conn.execute("INSERT INTO meta (name, value) VALUES ('version', ?)", (str(ROLLUP_VERSION),))
+            self.conn.execute("COMMIT")
+
+    def _meta(self, name: str, default: str = "") -> str:
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, name: str, value: str) -> None:
+        self.conn.execute(
+            "INSERT INTO meta (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, value),
+        )
+
+    @property
+    def minutes_since(self) -> str:
+        return self._meta("minutes_since")
+
+    def update(self, segments_dir: str = SEGMENTS_DIR, now: Optional[datetime] = None) -> int:
+        """يقرأ فقط البايتات الجديدة بعد آخر offset محفوظ لكل segment. يعيد عدد الـ segments المقروءة."""
+        conn = self.conn
+        # BEGIN IMMEDIATE: عمليتا summary متزامنتان لا تقرآن نفس البايتات مرتين
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            sources = {h: (o, s) for h, o, s in conn.execute("SELECT hour, offset, stamp FROM sources")}
+            counts: Counts = {}
+            touched = 0
+            present = set()
+            for hour, sealed in list_segments(segments_dir):
+                present.add(hour)
+                stamp = _segment_stamp(hour, sealed, segments_dir)
+                offset, old_stamp = sources.get(hour, (0, None))
+                if stamp is not None and stamp == old_stamp:
+                    continue
+                data = read_raw(hour, offset, segments_dir)
+                # السطر الأخير غير المكتمل يُترك للتحديث القادم
+                end = data.rfind(b"\n") + 1
+                apply_lines(counts, data[:end].split(b"\n"))
+                conn.execute(
+                    "INSERT INTO sources (hour, offset, stamp) VALUES (?, ?, ?) "
+                    "ON CONFLICT(hour) DO UPDATE SET offset = excluded.offset, stamp = excluded.stamp",
+                    (hour, offset + end, stamp),
+                )
+                touched += 1
+            gone = [(h,) for h in sources if h not in present]
+            if gone:
+                # segments حُذفت (clean): العدّادات تبقى، فقط لا شيء لنتابعه
+                conn.executemany("DELETE FROM sources WHERE hour = ?", gone)
+            conn.executemany(SQL_ADD, [(g, b, d, k, n) for (g, b, d, k), n in counts.items()])
+            if touched:
+                self._compact(now or datetime.utcnow())
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return touched + len(gone)
+
+    def _compact(self, now: datetime) -> None:
+        conn = self.conn
+        minute_cutoff = _minute_str(now - timedelta(hours=MINUTE_RETENTION_HOURS))
+        conn.execute("DELETE FROM counts WHERE gran = 'm' AND bucket < ?", (minute_cutoff,))
+        # الساعات قبل هذا الحد لم تعد لها تفاصيل بالدقيقة
+        self._set_meta("minutes_since", max(self.minutes_since, minute_cutoff))
+
+        day_cutoff = (now - timedelta(days=HOUR_RETENTION_DAYS)).strftime("%Y-%m-%d")
+        conn.execute(
+            "INSERT INTO counts (gran, bucket, dim, key, n) "
+            "SELECT 'd', substr(bucket, 1, 10), dim, key, SUM(n) FROM counts "
+            "WHERE gran = 'h' AND bucket < ? GROUP BY substr(bucket, 1, 10), dim, key "
+            "ON CONFLICT(gran, dim, bucket, key) DO UPDATE SET n = n + excluded.n",
+            (day_cutoff,),
+        )
+        conn.execute("DELETE FROM counts WHERE gran = 'h' AND bucket < ?", (day_cutoff,))
+
+    def _sum(self, gran: str, by: str, lo: str, hi: str, into: Dict[str, int]) -> int:
+        if lo >= hi:
+            return 0
+        for key, n in self.conn.execute(SQL_RANGE, (gran, by, lo, hi)):
+            into[key] = into.get(key, 0) + n
+        row = self.conn.execute(SQL_RANGE, (gran, _EVENTS, lo, hi)).fetchone()
+        return int(row[1]) if row else 0
+
+    def query(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        by: str = "agent",
+    ) -> Dict[str, Any]:
+        """
+        عدّ الأحداث في [since, until) مجمّعة حسب بُعد واحد.
+        الساعات الكاملة من buckets الساعة، وأطراف النطاق من buckets الدقيقة (إن كانت ما زالت
+        ضمن مدة الاحتفاظ، وإلا تُحسب الساعة كاملة)، والأيام المدمجة تُحسب كاملة إن تقاطعت مع النطاق.
+        """
+        if by not in DIMENSIONS:
+            raise ValueError(f"by must be one of {DIMENSIONS}")
+        counts: Dict[str, int] = {}
+        if since is None and until is None:
+            events = self._sum("T", by, "", "~", counts)
+            return {"events": events, "by": by, "counts": counts}
+
+        start = since or datetime.min.replace(year=1970)
+        end = until or datetime.utcnow() + timedelta(days=1)
+        events = 0
+        if start >= end:
+            return {"events": 0, "by": by, "counts": counts}
+
+        # أيام مدمجة (لا ساعات لها بعد الآن)
+        events += self._sum("d", by, start.strftime("%Y-%m-%d"), _ceil_day(end), counts)
+
+        minutes_since = self.minutes_since
+        first_hour = start.replace(minute=0, second=0, microsecond=0)
+        end_hour = end.replace(minute=0, second=0, microsecond=0)
+        full_lo = first_hour if start == first_hour else first_hour + timedelta(hours=1)
+        full_hi = end_hour
+
+        edges: List[Tuple[datetime, datetime, datetime]] = []
+        if full_lo > full_hi:
+            # النطاق داخل ساعة واحدة
+            edges.append((first_hour, start, end))
+        else:
+            if start != first_hour:
+                edges.append((first_hour, start, full_lo))
+            if end != end_hour:
+                edges.append((end_hour, end_hour, end))
+            events += self._sum("h", by, _hour_str(full_lo), _hour_str(full_hi), counts)
+
+        for hour, lo, hi in edges:
+            if _minute_str(hour) >= minutes_since:
+                events += self._sum_minutes(by, lo, hi, counts)
+            else:
+                events += self._sum("h", by, _hour_str(hour), _hour_str(hour + timedelta(hours=1)), counts)
+        return {"events": events, "by": by, "counts": counts}
+
+    def _sum_minutes(self, by: str, lo: datetime, hi: datetime, into: Dict[str, int]) -> int:
+        # الدقيقة التي يقع فيها lo تُحسب كاملة، والدقيقة التي يقع فيها hi لا تُحسب إلا إن لم يكن على حدّها
+        hi_key = _minute_str(hi)
+        if hi.second or hi.microsecond:
+            hi_key = _minute_str(hi + timedelta(minutes=1))
+        return self._sum("m", by, _minute_str(lo), hi_key, into)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _ceil_day(dt: datetime) -> str:
+    day = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if day != dt:
+        day += timedelta(days=1)
+    return day.strftime("%Y-%m-%d")
+
+
+def update_rollups(segments_dir: str = SEGMENTS_DIR, path: str = ROLLUP_PATH) -> Rollups:
+    rollups = Rollups(path)
+    rollups.update(segments_dir)
+    return rollups
+
+
+def parse_time(value: Optional[str], now: Optional[datetime] = None) -> Optional[datetime]:
+    """يقبل ISO-8601 أو مدة نسبية مثل 30m / 24h / 7d."""
+    if not value:
+        return None
+    now = now or datetime.utcnow()
+    m = re.fullmatch(r"(\d+)\s*([smhd])", value.strip())
+    if m:
+        amount, unit = int(m.group(1)), m.group(2)
+        seconds = {"s": 1, "m": 60, "h": 3600, "d": 86400}[unit]
+        return now - timedelta(seconds=amount * seconds)
+    value = value.strip().rstrip("Z")
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None) - dt.utcoffset()
+    return dt
+
+
+def query_rollups(
+    rollups: Rollups,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    by: str = "agent",
+) -> Dict[str, Any]:
+    return rollups.query(since, until, by)
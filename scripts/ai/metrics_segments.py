@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+تخزين القياسات في segments ساعية:
+  logs/metrics/metrics-YYYYMMDDTHH.jsonl      ← الساعة الحالية (append فقط)
+  logs/metrics/metrics-YYYYMMDDTHH.jsonl.gz   ← ساعة مختومة: blocks مستقلة (gzip members)
+  logs/metrics/metrics-YYYYMMDDTHH.idx.json   ← فهرس متناثر: مدى ts (الأصغر والأكبر) لكل block → offset
+الاستعلام الزمني يختار الـ segments من أسمائها ثم يقفز داخل كل segment عبر الفهرس.
+الكتابة والختم من عدة عمليات (عدة عمال للخادم) تمر عبر قفل logs/metrics/.lock.
+"""
+import os
+import sys
+import gzip
+import json
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.file_lock import file_lock
+
+SEGMENTS_DIR = os.path.join(ROOT_DIR, "logs", "metrics")
+
+SEGMENT_PREFIX = "metrics-"
+HOUR_FORMAT = "%Y%m%dT%H"
+BLOCK_LINES = 1000
+
+
+def hour_key(ts: str) -> str:
+    # "2025-11-18T22:58:30.28Z" → "20251118T22"
+    return ts[0:4] + ts[5:7] + ts[8:10] + "T" + ts[11:13]
+
+
+def segment_base(hour: str, segments_dir: str = SEGMENTS_DIR) -> str:
+    return os.path.join(segments_dir, f"{SEGMENT_PREFIX}{hour}")
+
+
+def segments_lock(segments_dir: str = SEGMENTS_DIR) -> Any:
+    return file_lock(os.path.join(segments_dir, ".lock"))
+
+
+def list_segments(segments_dir: str = SEGMENTS_DIR) -> List[Tuple[str, bool]]:
+    """(hour, sealed) مرتبة زمنياً."""
+    try:
+        names = os.listdir(segments_dir)
+    except OSError:
+        return []
+    hours: Dict[str, bool] = {}
+    for name in names:
+        if not name.startswith(SEGMENT_PREFIX):
+            continue
+        hour = name[len(SEGMENT_PREFIX):len(SEGMENT_PREFIX) + 11]
+        if name.endswith(".jsonl"):
+            hours[hour] = False
+        elif name.endswith(".jsonl.gz"):
+            hours.setdefault(hour, True)
+    return sorted(hours.items())
+
+
+def load_segment_index(hour: str, segments_dir: str = SEGMENTS_DIR) -> Dict[str, Any]:
+    try:
+        with open(segment_base(hour, segments_dir) + ".idx.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"hour": hour, "raw_bytes": 0, "blocks": []}
+
+
+def _write_json_atomic(path: str, data: Dict[str, Any]) -> None:
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _ts_bounds(block: List[str]) -> Tuple[str, str]:
+    """أصغر وأكبر ts في الـ block؛ السجلات ليست مرتبة (عمّال متداخلون، دفعات متأخرة)."""
+    stamps = []
+    for line in block:
+        try:
+            stamps.append(str(json.loads(line).get("ts") or "").rstrip("Z"))
+        except ValueError:
+            continue
+    stamps = [t for t in stamps if t]
+    if not stamps:
+        return "", ""
+    return min(stamps), max(stamps)
+
+
+def append_sealed(hour: str, lines: List[str], segments_dir: str = SEGMENTS_DIR) -> None:
+    """يضيف أسطراً إلى segment مختوم كـ gzip members جديدة ويحدّث الفهرس."""
+    if not lines:
+        return
+    base = segment_base(hour, segments_dir)
+    index = load_segment_index(hour, segments_dir)
+    raw_offset = index["raw_bytes"]
+    with open(base + ".jsonl.gz", "ab") as f:
+        offset = f.tell()
+        for i in range(0, len(lines), BLOCK_LINES):
+            block = lines[i:i + BLOCK_LINES]
+            data = "".join(block).encode("utf-8")
+            comp = gzip.compress(data)
+            f.write(comp)
+            lo, hi = _ts_bounds(block)
+            index["blocks"].append({
+                "ts": lo,
+                "ts_max": hi,
+                "offset": offset,
+                "raw_offset": raw_offset,
+                "lines": len(block),
+            })
+            offset += len(comp)
+            raw_offset += len(data)
+        f.flush()
+        os.fsync(f.fileno())
+    index["raw_bytes"] = raw_offset
+    _write_json_atomic(base + ".idx.json", index)
+
+
+def seal_segment(hour: str, segments_dir: str = SEGMENTS_DIR) -> bool:
+    base = segment_base(hour, segments_dir)
+    src = base + ".jsonl"
+    try:
+        with open(src, "r", encoding="utf-8") as f:
+            lines = [line for line in f if line.endswith("\n")]
+    except OSError:
+        return False
+    append_sealed(hour, lines, segments_dir)
+    os.remove(src)
+    return True
+
+
+def seal_stale(now: Optional[datetime] = None, segments_dir: str = SEGMENTS_DIR) -> int:
+    current = (now or datetime.utcnow()).strftime(HOUR_FORMAT)
+    n = 0
+    for hour, sealed in list_segments(segments_dir):
+        if not sealed and hour < current and seal_segment(hour, segments_dir):
+            n += 1
+    return n
+
+
+def drop_segments_before(cutoff: datetime, segments_dir: str = SEGMENTS_DIR) -> int:
+    """الاحتفاظ بالبيانات = حذف segments كاملة أقدم من cutoff."""
+    limit = cutoff.strftime(HOUR_FORMAT)
+    n = 0
+    for hour, _ in list_segments(segments_dir):
+        if hour >= limit:
+            break
+        base = segment_base(hour, segments_dir)
+        for ext in (".jsonl", ".jsonl.gz", ".idx.json"):
+            try:
+                os.remove(base + ext)
+            except OSError:
+                pass
+        n += 1
+    return n
+
+
+def read_raw(hour: str, offset: int = 0, segments_dir: str = SEGMENTS_DIR) -> bytes:
+    """البايتات غير المضغوطة للـ segment ابتداءً من offset (نفس الترقيم للملف النشط والمختوم)."""
+    base = segment_base(hour, segments_dir)
+    try:
+        with open(base + ".jsonl", "rb") as f:
+            f.seek(offset)
+            return f.read()
+    except OSError:
+        pass
+    index = load_segment_index(hour, segments_dir)
+    if offset >= index["raw_bytes"]:
+        return b""
+    start = index["blocks"][0]
+    for b in index["blocks"]:
+        if b["raw_offset"] > offset:
+            break
+        start = b
+    with open(base + ".jsonl.gz", "rb") as f:
+        f.seek(start["offset"])
+        data = _decompress_members(f.read())
+    return data[offset - start["raw_offset"]:]
+
+
+def _decompress_members(comp: bytes) -> bytes:
+    out = []
+    while comp:
+        d = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        out.append(d.decompress(comp))
+        comp = d.unused_data
+    return b"".join(out)
+
+
+def _iter_sealed(
+    hour: str, since: Optional[str], until: Optional[str], segments_dir: str
+) -> Iterator[bytes]:
+    blocks = load_segment_index(hour, segments_dir)["blocks"]
+    with open(segment_base(hour, segments_dir) + ".jsonl.gz", "rb") as f:
+        for i, b in enumerate(blocks):
+            # نتخطى فقط الـ blocks التي لا يتقاطع مداها [ts, ts_max] مع النطاق؛
+            # الفهارس القديمة بلا ts_max تُقرأ دائماً
+            lo, hi = b.get("ts", ""), b.get("ts_max", "")
+            if lo and hi:
+                if until and lo >= until:
+                    continue
+                if since and hi < since:
+                    continue
+            f.seek(b["offset"])
+            size = blocks[i + 1]["offset"] - b["offset"] if i + 1 < len(blocks) else -1
+            d = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            yield from d.decompress(f.read(size)).splitlines()
+
+
+def read_range(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    segments_dir: str = SEGMENTS_DIR,
+) -> Iterator[Dict[str, Any]]:
+    """السجلات ذات ts في [since, until) مرتبة حسب الـ segment."""
+    since_ts = since.isoformat() if since else None
+    until_ts = until.isoformat() if until else None
+    lo = since.strftime(HOUR_FORMAT) if since else None
+    hi = until.strftime(HOUR_FORMAT) if until else None
+    for hour, sealed in list_segments(segments_dir):
+        if lo and hour < lo:
+            continue
+        if hi and hour > hi:
+            break
+        if sealed:
+            lines: Iterator[bytes] = _iter_sealed(hour, since_ts, until_ts, segments_dir)
+        else:
+            lines = iter(read_raw(hour, 0, segments_dir).splitlines())
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            ts = str(rec.get("ts", "")).rstrip("Z")
+            if since_ts and ts < since_ts:
+                continue
+            if until_ts and ts >= until_ts:
+                continue
+            yield rec
+
+
+class SegmentWriter:
+    """يكتب دفعات السجلات إلى segment الساعة المناسبة ويختم الساعات المنتهية."""
+
+    def __init__(self, segments_dir: str = SEGMENTS_DIR) -> None:
+        self.segments_dir = segments_dir
+        os.makedirs(segments_dir, exist_ok=True)
+        self.hour: Optional[str] = None
+        self.f = None
+        with segments_lock(segments_dir):
+            seal_stale(segments_dir=segments_dir)
+
+    def _open(self, hour: str) -> None:
+        if self.f is not None:
+            self.f.close()
+        self.f = open(segment_base(hour, self.segments_dir) + ".jsonl", "a", encoding="utf-8")
+        self.hour = hour
+
+    def write(self, lines_by_hour: Dict[str, List[str]]) -> Any:
+        """يعيد الملف المفتوح للساعة الأحدث (لأجل fsync)."""
+        with segments_lock(self.segments_dir):
+            if self.f is not None and os.fstat(self.f.fileno()).st_nlink == 0:
+                # عملية أخرى ختمت segment هذه الساعة (حذفت الـ .jsonl) → ما بعده يُلحق بالمختوم
+                self.f.close()
+                self.f = None
+            for hour in sorted(lines_by_hour):
+                lines = lines_by_hour[hour]
+                base = segment_base(hour, self.segments_dir)
+                if hour == self.hour and self.f is not None:
+                    self.f.write("".join(lines))
+                elif (self.hour is not None and hour <= self.hour) or (
+                    not os.path.exists(base + ".jsonl") and os.path.exists(base + ".jsonl.gz")
+                ):
+                    # سجل متأخر لساعة انتهت
+                    if os.path.exists(base + ".jsonl"):
+                        with open(base + ".jsonl", "a", encoding="utf-8") as f:
+                            f.write("".join(lines))
+                    else:
+                        append_sealed(hour, lines, self.segments_dir)
+                else:
+                    previous = self.hour
+                    self._open(hour)
+                    if previous is not None:
+                        seal_segment(previous, self.segments_dir)
+                    self.f.write("".join(lines))
+            if self.f is not None:
+                self.f.flush()
+        return self.f
+
+    def close(self) -> None:
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+def migrate_legacy(legacy_path: str, segments_dir: str = SEGMENTS_DIR) -> int:
+    """ينقل factory_metrics.jsonl القديم إلى segments ساعية ثم يعيد تسميته."""
+    if not os.path.exists(legacy_path):
+        return 0
+    os.makedirs(segments_dir, exist_ok=True)
+    with segments_lock(segments_dir):
+        return _migrate_legacy(legacy_path, segments_dir)
+
+
+def _migrate_legacy(legacy_path: str, segments_dir: str) -> int:
+    if not os.path.exists(legacy_path):
+        # رحّلته عملية أخرى أثناء انتظار القفل
+        return 0
+    by_hour: Dict[str, List[str]] = {}
+    n = 0
+    with open(legacy_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                ts = json.loads(line).get("ts", "")
+            except ValueError:
+                continue
+            if len(ts) < 13:
+                continue
+            by_hour.setdefault(hour_key(ts), []).append(line if line.endswith("\n") else line + "\n")
+            n += 1
+    current = datetime.utcnow().strftime(HOUR_FORMAT)
+    for hour, lines in sorted(by_hour.items()):
+        if hour < current and not os.path.exists(segment_base(hour, segments_dir) + ".jsonl"):
+            append_sealed(hour, lines, segments_dir)
+        else:
+            with open(segment_base(hour, segments_dir) + ".jsonl", "a", encoding="utf-8") as out:
+                out.write("".join(lines))
+    os.replace(legacy_path, legacy_path + ".migrated")
+    return n
+
+
+def cutoff_days(days: int) -> datetime:
+    return datetime.utcnow() - timedelta(days=days)
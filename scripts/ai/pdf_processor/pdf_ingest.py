@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+استخراج ملفات PDF بالتوازي (process pool على نطاقات صفحات) وبشكل تزايدي:
+- PDF لم تتغير بصمته (sha256) منذ آخر تشغيل يُتخطى، و PDF حُذف تُحذف chunks ونصوصه
+- كل عامل يكتب نص نطاقه إلى ملف جزئي؛ الدمج والتقسيم إلى chunks يتمّان بالبث
+  دون تحميل المستند كاملاً في الذاكرة (حدود الصفحات/الفقرات، بدون شبه المكرر: scripts/ai/chunker.py)
+- تقرير لكل ملف: صفحات/ثانية و peak RSS
+المخرجات بنفس بنية pdf_ingest.sh:
+  pdf_text/<name>.txt , cleaned_content/<name>_pdf.txt , knowledge_chunks/<name>_pdf_chunk_NNN.txt
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import resource
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.chunker import (
+    NearDuplicateIndex,
+    default_simhash_path,
+    iter_blocks,
+    iter_chunks,
+    remove_chunks,
+    write_chunks,
+)
+
+PDF_DIR = os.path.join(ROOT_DIR, "ai", "pdfs")
+DATASETS_DIR = os.path.join(ROOT_DIR, "ai", "datasets")
+TEXT_DIR = os.path.join(DATASETS_DIR, "pdf_text")
+CLEANED_DIR = os.path.join(DATASETS_DIR, "cleaned_content")
+KNOWLEDGE_DIR = os.path.join(DATASETS_DIR, "knowledge_chunks")
+STATE_PATH = os.path.join(DATASETS_DIR, "pdf_ingest_state.json")
+LOG_FILE = os.path.join(ROOT_DIR, "logs", "pdf_processor.log")
+
+PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", "8"))
+
+_CLEAN_BLANKS = re.compile(r"\n\s*\n")
+_CLEAN_SPACES = re.compile(r" +")
+_CLEAN_CHARS = re.compile(r"[^\u0600-\u06FF\u0750-\u077F\u08A0-\u08FFa-zA-Z0-9\s\.\,\!\?\:\;\(\)\-]")
+
+
+def clean_text(text: str) -> str:
+    """تنظيف النص المستخرج (نفس قواعد pdf_ingest.sh)."""
+    if not text:
+        return ""
+    text = _CLEAN_BLANKS.sub("\n\n", text)
+    text = _CLEAN_SPACES.sub(" ", text)
+    text = _CLEAN_CHARS.sub("", text)
+    return text.strip()
+
+
+def _read_vm_hwm_kb() -> int:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _reset_peak_rss() -> None:
+    # Linux: كتابة 5 إلى clear_refs تعيد ضبط VmHWM → peak لكل مهمة وليس لعمر العامل
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def count_pages(pdf_path: str) -> int:
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_range(pdf_path: str, start: int, end: int, part_path: str) -> Dict[str, Any]:
+    """يُنفَّذ في عامل: يستخرج الصفحات [start, end) ويكتبها مباشرة إلى part_path."""
+    _reset_peak_rss()
+    t0 = time.time()
+    pages_with_text = 0
+    engine = "pdfplumber"
+    with open(part_path, "w", encoding="utf-8") as out:
+        try:
+            import pdfplumber
+
+            with pdfplumber.open(pdf_path, pages=list(range(start + 1, end + 1))) as pdf:
+                for page in pdf.pages:
+                    cleaned = clean_text(page.extract_text() or "")
+                    if cleaned:
+                        out.write(f"--- الصفحة {page.page_number} ---\n{cleaned}\n\n")
+                        pages_with_text += 1
+                    # تحرير كاش الصفحة فوراً بدل الاحتفاظ بالمستند كاملاً
+                    if hasattr(page, "close"):
+                        page.close()
+        except Exception:
+            # بديل: PyMuPDF كما في النسخة القديمة
+            import fitz
+
+            engine = "pymupdf"
+            out.seek(0)
+            out.truncate()
+            pages_with_text = 0
+            doc = fitz.open(pdf_path)
+            try:
+                for page_num in range(start, min(end, len(doc))):
+                    cleaned = clean_text(doc[page_num].get_text() or "")
+                    if cleaned:
+                        out.write(f"--- الصفحة {page_num + 1} ---\n{cleaned}\n\n")
+                        pages_with_text += 1
+            finally:
+                doc.close()
+    return {
+        "start": start,
+        "end": end,
+        "part_path": part_path,
+        "pages_with_text": pages_with_text,
+        "engine": engine,
+        "t_start": t0,
+        "t_end": time.time(),
+        "peak_rss_kb": _read_vm_hwm_kb(),
+    }
+
+
+def stream_chunks(
+    text_path: str,
+    knowledge_dir: str,
+    name_prefix: str,
+    dedupe: Optional[NearDuplicateIndex] = None,
+) -> Dict[str, int]:
+    """chunks على حدود الصفحات/الفقرات تُكتب أثناء القراءة سطراً بسطر."""
+    with open(text_path, "r", encoding="utf-8") as f:
+        return write_chunks(
+            iter_chunks(iter_blocks(f)), knowledge_dir, name_prefix, name_prefix + "{:03d}.txt", dedupe
+        )
+
+
+def load_state(path: str = STATE_PATH) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}}
+
+
+def save_state(state: Dict[str, Any], path: str = STATE_PATH) -> None:
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _log(msg: str) -> None:
+    print(f"[PDF Processor] {msg}")
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    with open(LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {msg}\n")
+
+
+def _finalize(
+    base_name: str,
+    parts: List[Dict[str, Any]],
+    text_dir: str,
+    cleaned_dir: str,
+    knowledge_dir: str,
+    dedupe: NearDuplicateIndex,
+) -> Dict[str, int]:
+    text_path = os.path.join(text_dir, f"{base_name}.txt")
+    tmp_path = f"{text_path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        for part in sorted(parts, key=lambda p: p["start"]):
+            with open(part["part_path"], "r", encoding="utf-8") as f:
+                shutil.copyfileobj(f, out)
+            os.remove(part["part_path"])
+    os.replace(tmp_path, text_path)
+    shutil.copyfile(text_path, os.path.join(cleaned_dir, f"{base_name}_pdf.txt"))
+    return stream_chunks(text_path, knowledge_dir, f"{base_name}_pdf_chunk_", dedupe)
+
+
+def ingest(
+    pdf_dir: str = PDF_DIR,
+    text_dir: str = TEXT_DIR,
+    cleaned_dir: str = CLEANED_DIR,
+    knowledge_dir: str = KNOWLEDGE_DIR,
+    state_path: str = STATE_PATH,
+    workers: int = 0,
+    pages_per_task: int = PAGES_PER_TASK,
+    force: bool = False,
+) -> Dict[str, Any]:
+    for d in (text_dir, cleaned_dir, knowledge_dir):
+        os.makedirs(d, exist_ok=True)
+    parts_dir = os.path.join(text_dir, ".parts")
+    os.makedirs(parts_dir, exist_ok=True)
+    state = load_state(state_path)
+    files_state: Dict[str, Any] = state.setdefault("files", {})
+
+    pdfs = sorted(f for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf")) if os.path.isdir(pdf_dir) else []
+    report: Dict[str, Any] = {"files": {}, "processed": 0, "skipped": 0, "failed": 0, "removed": 0}
+    # مجلد PDF غير موجود (قرص غير موصول مثلاً) لا يعني حذف كل شيء
+    removed = [f for f in files_state if f not in set(pdfs)] if os.path.isdir(pdf_dir) else []
+    todo: Dict[str, Dict[str, Any]] = {}
+    for fname in pdfs:
+        path = os.path.join(pdf_dir, fname)
+        base_name = fname[:-4]
+        digest = file_sha256(path)
+        prev = files_state.get(fname)
+        text_path = os.path.join(text_dir, f"{base_name}.txt")
+        if not force and prev and prev.get("sha256") == digest and os.path.exists(text_path):
+            report["skipped"] += 1
+            report["files"][fname] = {"status": "unchanged"}
+            continue
+        try:
+            pages = count_pages(path)
+        except Exception as e:
+            report["failed"] += 1
+            report["files"][fname] = {"status": "failed", "error": str(e)}
+            _log(f"ERROR: فشل فتح {fname}: {e}")
+            continue
+        todo[fname] = {"path": path, "base_name": base_name, "sha256": digest, "pages": pages, "parts": []}
+
+    if not todo and not removed:
+        report["parent_peak_rss_mb"] = round(_read_vm_hwm_kb() / 1024.0, 1)
+        return report
+
+    simhash_path = default_simhash_path(knowledge_dir)
+    dedupe = NearDuplicateIndex.load(simhash_path, knowledge_dir)
+    for fname in removed:
+        base_name = fname[:-4]
+        remove_chunks(knowledge_dir, f"{base_name}_pdf_chunk_", dedupe)
+        for path in (os.path.join(text_dir, f"{base_name}.txt"), os.path.join(cleaned_dir, f"{base_name}_pdf.txt")):
+            if os.path.exists(path):
+                os.remove(path)
+        del files_state[fname]
+        report["removed"] += 1
+        report["files"][fname] = {"status": "removed"}
+        _log(f"🗑️ {fname}: حُذف الملف، أُزيلت chunks الخاصة به")
+
+    if todo:
+        workers = workers or min(os.cpu_count() or 1, 8)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for file_idx, (fname, info) in enumerate(todo.items()):
+                for start in range(0, max(info["pages"], 1), pages_per_task):
+                    end = min(start + pages_per_task, info["pages"])
+                    part_path = os.path.join(parts_dir, f"{os.getpid()}-{file_idx}.{start:06d}.part")
+                    fut = pool.submit(extract_range, info["path"], start, end, part_path)
+                    futures[fut] = fname
+            for fut in as_completed(futures):
+                fname = futures[fut]
+                try:
+                    todo[fname]["parts"].append(fut.result())
+                except Exception as e:
+                    todo[fname]["error"] = str(e)
+
+        for fname, info in todo.items():
+            if info.get("error"):
+                report["failed"] += 1
+                report["files"][fname] = {"status": "failed", "error": info["error"]}
+                _log(f"ERROR: فشل تحويل {fname}: {info['error']}")
+                for part in info["parts"]:
+                    if os.path.exists(part["part_path"]):
+                        os.remove(part["part_path"])
+                continue
+            parts = info["parts"]
+            written = _finalize(info["base_name"], parts, text_dir, cleaned_dir, knowledge_dir, dedupe)
+            chunks = written["written"]
+            elapsed = max(p["t_end"] for p in parts) - min(p["t_start"] for p in parts) if parts else 0.0
+            file_report = {
+                "status": "processed",
+                "pages": info["pages"],
+                "pages_with_text": sum(p["pages_with_text"] for p in parts),
+                "chunks": chunks,
+                "chunks_dropped": written["dropped"],
+                "seconds": round(elapsed, 3),
+                "pages_per_sec": round(info["pages"] / elapsed, 2) if elapsed > 0 else None,
+                "peak_rss_mb": round(max((p["peak_rss_kb"] for p in parts), default=0) / 1024.0, 1),
+                "tasks": len(parts),
+                "engine": sorted({p["engine"] for p in parts}),
+            }
+            report["files"][fname] = file_report
+            report["processed"] += 1
+            files_state[fname] = {
+                "sha256": info["sha256"],
+                "pages": info["pages"],
+                "chunks": chunks,
+                "ingested_at": datetime.utcnow().isoformat() + "Z",
+            }
+            _log(
+                f"✅ {fname}: {info['pages']} صفحة، {chunks} chunk، "
+                f"{file_report['pages_per_sec']} صفحة/ث، peak RSS {file_report['peak_rss_mb']}MB"
+            )
+    save_state(state, state_path)
+    dedupe.save(simhash_path, knowledge_dir)
+
+    report["parent_peak_rss_mb"] = round(_read_vm_hwm_kb() / 1024.0, 1)
+    return report
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--pdf-dir", default=PDF_DIR)
+    p.add_argument("--datasets-dir", default=DATASETS_DIR)
+    p.add_argument("--workers", type=int, default=0, help="0 = عدد الأنوية (حتى 8)")
+    p.add_argument("--pages-per-task", type=int, default=PAGES_PER_TASK)
+    p.add_argument("--force", action="store_true", help="إعادة المعالجة حتى لو لم تتغير البصمة")
+    p.add_argument("--no-index", action="store_true", help="عدم إعادة بناء فهرس BM25")
+    p.add_argument("--json", action="store_true")
+    a = p.parse_args()
+
+    knowledge_dir = os.path.join(a.datasets_dir, "knowledge_chunks")
+    report = ingest(
+        pdf_dir=a.pdf_dir,
+        text_dir=os.path.join(a.datasets_dir, "pdf_text"),
+        cleaned_dir=os.path.join(a.datasets_dir, "cleaned_content"),
+        knowledge_dir=knowledge_dir,
+        state_path=os.path.join(a.datasets_dir, "pdf_ingest_state.json"),
+        workers=a.workers,
+        pages_per_task=a.pages_per_task,
+        force=a.force,
+    )
+    if (report["processed"] or report["removed"]) and not a.no_index:
+        from scripts.ai.rag_engine import build_index
+
+        build_index(knowledge_dir)
+        _log("🗂️ تم تحديث فهرس المعرفة")
+
+    from scripts.ai.factory_metrics import log_metric
+
+    log_metric(
+        agent="pdf_processor",
+        event_type="pdf_ingest_completed",
+        meta={k: report[k] for k in ("processed", "skipped", "failed", "removed")},
+    )
+
+    if a.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    for fname, r in report["files"].items():
+        if r["status"] == "processed":
+            print(
+                f"  {fname}: {r['pages']} pages, {r['chunks']} chunks, "
+                f"{r['pages_per_sec']} pages/s, peak RSS {r['peak_rss_mb']} MB"
+            )
+        else:
+            print(f"  {fname}: {r['status']}")
+    print(
+        f"📊 processed={report['processed']} skipped={report['skipped']} failed={report['failed']}"
+        f" removed={report['removed']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+تشغيل backend_coach بعدة عمال (pre-fork):
+  1) العملية الرئيسية تستورد التطبيق وتحمّل فهرس الاسترجاع وجداول التوجيه مرة واحدة
+     (بدون threads أو pools)، ثم gc.freeze() كي لا يلمس جامع القمامة صفحات الكائنات الموروثة
+  2) تفتح socket الاستماع وتعمل fork لـ N عمال uvicorn يتشاركونه
+  3) العمال يرثون الفهرس copy-on-write، والمخزن (chunks.seg) mmap مشترك عبر page cache؛
+     العامل الذي يموت يُعاد تشغيله من نفس الحالة المحمّلة
+الحالة المكتوبة آمنة بين العمليات: ملفات المهارات بأقفال flock (أو SQLite)، وsegments القياسات
+بقفل logs/metrics/.lock. كاش التحليل وhistograms /metrics تبقى لكل عامل على حدة.
+
+    python3 scripts/ai/prefork.py --workers 4 [--host 0.0.0.0] [--port 9090]
+    FACTORY_WORKERS=4 python3 apps/backend_coach/main.py
+"""
+import os
+import sys
+import gc
+import signal
+import socket
+import threading
+import time
+from typing import Any, Dict, Optional
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+APP_DIR = os.path.join(ROOT_DIR, "apps", "backend_coach")
+WORKERS = int(os.environ.get("FACTORY_WORKERS", "1"))
+# أقل عمر لعامل قبل اعتبار موته تعطلاً متكرراً (ننتظر قبل إعادة تشغيله)
+MIN_WORKER_LIFETIME = 1.0
+
+
+def preload() -> Dict[str, Any]:
+    """يبني المنسّق ويحمّل الفهرس في العملية الرئيسية قبل fork."""
+    from scripts.ai import registry
+
+    t0 = time.perf_counter()
+    detail = registry.get("orchestrator").warm_up(spawn_pools=False)
+    detail["ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+    if threading.active_count() > 1:
+        # fork مع threads حية قد يرث أقفالاً مأخوذة
+        names = [t.name for t in threading.enumerate() if t is not threading.current_thread()]
+        print(f"⚠️ threads قبل fork: {names}", file=sys.stderr)
+    gc.collect()
+    gc.freeze()
+    return detail
+
+
+def _listen(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app: Any, sock: socket.socket, log_level: str) -> None:
+    import uvicorn
+
+    # uvicorn يثبّت معالجات الإشارات الخاصة به (إغلاق سلس)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(app: Any, sock: socket.socket, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(app, sock, log_level)
+        except BaseException as e:
+            print(f"❌ worker {os.getpid()}: {e}", file=sys.stderr)
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+    return pid
+
+
+def serve(
+    app: Any,
+    host: str = "0.0.0.0",
+    port: int = 9090,
+    workers: int = WORKERS,
+    log_level: str = "info",
+    shutdown_timeout: float = 30.0,
+) -> None:
+    """يحمّل ثم يعمل fork لـ workers عمليات ويراقبها حتى SIGTERM/SIGINT."""
+    sock = _listen(host, port)
+    detail = preload()
+    print(f"🚀 pre-fork: {workers} عمال على {host}:{port} (preload {detail['ms']}ms)")
+
+    stopping: Optional[int] = None
+
+    def _stop(signum: int, frame: Any) -> None:
+        nonlocal stopping
+        stopping = signum
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    started: Dict[int, float] = {}
+    for _ in range(workers):
+        started[_spawn(app, sock, log_level)] = time.monotonic()
+
+    while stopping is None:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+        t_start = started.pop(pid, None)
+        if t_start is None or stopping is not None:
+            continue
+        print(f"⚠️ worker {pid} انتهى (status={status})؛ إعادة تشغيل", file=sys.stderr)
+        if time.monotonic() - t_start < MIN_WORKER_LIFETIME:
+            time.sleep(MIN_WORKER_LIFETIME)
+        started[_spawn(app, sock, log_level)] = time.monotonic()
+
+    for pid in started:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + shutdown_timeout
+    while started and time.monotonic() < deadline:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.1)
+            continue
+        started.pop(pid, None)
+    for pid in started:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    sock.close()
+
+
+def main() -> None:
+    import argparse
+    import importlib
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--workers", type=int, default=max(WORKERS, os.cpu_count() or 1))
+    p.add_argument("--host", default="0.0.0.0")
+    p.add_argument("--port", type=int, default=9090)
+    p.add_argument("--app-dir", default=APP_DIR)
+    p.add_argument("--log-level", default="info")
+    a = p.parse_args()
+
+    # يجب ضبطه قبل استيراد التطبيق: executors / skills_store / rag_shards تقرأه عند الاستيراد
+    os.environ["FACTORY_WORKERS"] = str(a.workers)
+    sys.path.insert(0, os.path.abspath(a.app_dir))
+    app = importlib.import_module("main").app
+    serve(app, a.host, a.port, a.workers, a.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,425 @@
 #!/usr/bin/env python3
 import os
+import sys
 import argparse
+import heapq
 import json
+import math
 import re
-from typing import List, Dict, Any, Tuple
+import threading
+import time
+from collections import Counter
+from typing import Callable, Iterable, List, Dict, Any, Optional, Tuple
 
 _THIS_DIR = os.path.dirname(__file__)
 ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
-DEFAULT_KNOWLEDGE_DIR = os.path.join(ROOT_DIR, "ai", "datasets", "knowledge_chunks")
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.chunk_store import (
+    DEFAULT_KNOWLEDGE_DIR,
+    ChunkStore,
+    build_store,
+    default_store_path,
+    open_store,
+    rebuild_store_if_stale,
+    source_signature,
+    store_lock_path,
+)
+from scripts.ai.file_lock import file_lock, try_file_lock
+
+INDEX_DIRNAME = "knowledge_index"
+INDEX_FILENAME = "bm25.json"
+# 2: النصوص والمعاينات في chunks.seg (chunk_store)؛ الفهرس يحمل الأطوال فقط
+INDEX_VERSION = 2
+BM25_K1 = 1.5
+BM25_B = 0.75
+# "bm25" (افتراضي)، "semantic" (scripts/ai/rag_semantic.py، يتطلب numpy)،
+# أو "sharded": BM25 مقسّم حسب المصدر/الحجم مع توزيع الاستعلام على عمليات (scripts/ai/rag_shards.py)
+SEARCH_MODES = ("bm25", "semantic", "sharded")
+
+# فاصل (ثوانٍ) مسح مجلد المعرفة في مراقب الخادم الخلفي؛ عملية واحدة على الجهاز تمسح (قفل watch)؛ 0 = تعطيل
+WATCH_INTERVAL = float(os.environ.get("KNOWLEDGE_WATCH_INTERVAL", "30"))
+
+# index_path -> (mtime الخاص بملف الفهرس, الفهرس المحمّل)
+_INDEX_CACHE: Dict[str, Tuple[float, "BM25Index"]] = {}
+# مفتاح (مسار الفهرس) -> thread إعادة البناء الجارية في هذه العملية
+_REBUILDS: Dict[str, threading.Thread] = {}
+_REBUILDS_LOCK = threading.Lock()
+# knowledge_dir -> thread المراقب في هذه العملية
+_WATCHERS: Dict[str, threading.Thread] = {}
 
 
 def _tokenize(text: str) -> List[str]:
     return [t for t in re.split(r"\W+", text.lower()) if t]
 
 
-def _score_overlap(q: List[str], d: List[str]) -> float:
-    if not q or not d:
-        return 0.0
-    qset, dset = set(q), set(d)
-    inter = qset & dset
-    return len(inter) / float(len(qset))
+def default_index_path(knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR) -> str:
+    parent = os.path.dirname(os.path.abspath(knowledge_dir))
+    return os.path.join(parent, INDEX_DIRNAME, INDEX_FILENAME)
+
+
+def index_file(knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR, mode: str = "bm25") -> str:
+    """الملف الذي يُستبدل ذرّياً مع كل بناء لفهرس الوضع mode (لختم جيل كاش التحليل)."""
+    if mode == "semantic":
+        from scripts.ai.rag_semantic import default_semantic_dir
+
+        return os.path.join(default_semantic_dir(knowledge_dir), "meta.json")
+    if mode == "sharded":
+        from scripts.ai.rag_shards import default_shard_dir
+
+        return os.path.join(default_shard_dir(knowledge_dir), "manifest.json")
+    return default_index_path(knowledge_dir)
+
+
+def build_index(
+    knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR,
+    index_path: Optional[str] = None,
+) -> Dict[str, Any]:
+    """يعيد حزم مجلد المعرفة في chunks.seg ثم يبني فهرس BM25 منه."""
+    store_path = default_store_path(knowledge_dir)
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    with file_lock(store_lock_path(store_path)):
+        build_store(knowledge_dir, store_path)
+    index_path = index_path or default_index_path(knowledge_dir)
+    with file_lock(f"{index_path}.lock"):
+        return _index_from_store(open_store(knowledge_dir), knowledge_dir, index_path)
+
+
+def bm25_idf(n_docs: int, df: int) -> float:
+    return math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+
+
+def bm25_data(texts: Iterable[str]) -> Dict[str, Any]:
+    """إحصاءات BM25 لمجموعة نصوص؛ doc_id = ترتيب النص في texts."""
+    docs: List[Dict[str, Any]] = []
+    postings: Dict[str, List[List[int]]] = {}
+    for doc_id, content in enumerate(texts):
+        tokens = _tokenize(content)
+        docs.append({"len": len(tokens)})
+        for term, tf in Counter(tokens).items():
+            postings.setdefault(term, []).append([doc_id, tf])
+
+    n_docs = len(docs)
+    avgdl = (sum(d["len"] for d in docs) / float(n_docs)) if n_docs else 0.0
+    idf = {term: bm25_idf(n_docs, len(plist)) for term, plist in postings.items()}
+    return {
+        "k1": BM25_K1,
+        "b": BM25_B,
+        "n_docs": n_docs,
+        "avgdl": avgdl,
+        "docs": docs,
+        "idf": idf,
+        "postings": postings,
+    }
+
+
+def _index_from_store(
+    store: ChunkStore,
+    knowledge_dir: str,
+    index_path: Optional[str] = None,
+) -> Dict[str, Any]:
+    index_path = index_path or default_index_path(knowledge_dir)
+    # doc_id == رقم الـ chunk في المخزن
+    data = {
+        "version": INDEX_VERSION,
+        "built_at": time.time(),
+        "knowledge_dir": os.path.abspath(knowledge_dir),
+        "source_mtime": store.source_mtime,
+        "store_built_at": store.built_at,
+    }
+    data.update(bm25_data(content for _, content in store.iter_texts()))
+
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    tmp_path = f"{index_path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
+    _INDEX_CACHE.pop(index_path, None)
+    return data
+
+
+class BM25Index:
+    def __init__(self, data: Dict[str, Any], store: Optional[ChunkStore] = None) -> None:
+        self.source_mtime = float(data.get("source_mtime", 0.0))
+        self.store_built_at = float(data.get("store_built_at", 0.0))
+        self.store = store
+        self.version = data.get("version")
+        self.k1 = float(data.get("k1", BM25_K1))
+        self.b = float(data.get("b", BM25_B))
+        self.avgdl = float(data.get("avgdl", 0.0)) or 1.0
+        self.docs: List[Dict[str, Any]] = data.get("docs", [])
+        self.idf: Dict[str, float] = data.get("idf", {})
+        self.postings: Dict[str, List[List[int]]] = data.get("postings", {})
+        self._matrix = None
+
+    def term_doc_matrix(self):
+        # numpy اختياري: لا يُستورد إلا عند استخدام البحث الدفعي
+        if self._matrix is None:
+            from scripts.ai.rag_matrix import TermDocMatrix
+
+            self._matrix = TermDocMatrix(self)
+        return self._matrix
+
+    def search(
+        self,
+        q_tokens: List[str],
+        top_k: int,
+        idf: Optional[Dict[str, float]] = None,
+        avgdl: Optional[float] = None,
+    ) -> List[Tuple[float, int]]:
+        """idf/avgdl الممررة (إحصاءات عامة لعدة فهارس) تحل محل إحصاءات هذا الفهرس."""
+        k1, b = self.k1, self.b
+        avgdl = avgdl or self.avgdl
+        idf_of = idf if idf is not None else self.idf
+        scores: Dict[int, float] = {}
+        for term in set(q_tokens):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = idf_of[term]
+            for doc_id, tf in plist:
+                dl = self.docs[doc_id]["len"]
+                s = idf * tf * (k1 + 1.0) / (tf + k1 * (1.0 - b + b * dl / avgdl))
+                scores[doc_id] = scores.get(doc_id, 0.0) + s
+        best = heapq.nlargest(top_k, scores.items(), key=lambda x: x[1])
+        return [(s, doc_id) for doc_id, s in best]
+
+
+def _read_index(index_path: str) -> Optional[BM25Index]:
+    try:
+        index_mtime = os.path.getmtime(index_path)
+    except OSError:
+        return None
+    cached = _INDEX_CACHE.get(index_path)
+    if cached and cached[0] == index_mtime:
+        return cached[1]
+    with open(index_path, "r", encoding="utf-8") as f:
+        index = BM25Index(json.load(f))
+    _INDEX_CACHE[index_path] = (index_mtime, index)
+    return index
+
+
+def _is_current(index: Optional[BM25Index], store: ChunkStore) -> bool:
+    return index is not None and index.store_built_at == store.built_at and index.version == INDEX_VERSION
+
+
+def rebuild_in_background(key: str, target: Callable[..., Any], *args: Any) -> None:
+    """thread خلفي واحد لكل key في العملية؛ الفشل يُطبع والفهرس السابق يبقى يخدم."""
+
+    def run() -> None:
+        try:
+            target(*args)
+        except Exception as e:
+            print(f"⚠️ background rebuild failed ({key}): {e}", file=sys.stderr)
+
+    with _REBUILDS_LOCK:
+        thread = _REBUILDS.get(key)
+        if thread is not None and thread.is_alive():
+            return
+        thread = threading.Thread(target=run, name="index-rebuild", daemon=True)
+        _REBUILDS[key] = thread
+        thread.start()
+
+
+def rebuild_index_if_stale(knowledge_dir: str, index_path: str) -> BM25Index:
+    """يبني من المخزن الحالي تحت قفل الملف؛ من ينتظر القفل يقرأ الفهرس الذي بناه غيره."""
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    with file_lock(f"{index_path}.lock"):
+        store = open_store(knowledge_dir)
+        index = _read_index(index_path)
+        if not _is_current(index, store):
+            index = BM25Index(_index_from_store(store, knowledge_dir, index_path))
+            _INDEX_CACHE[index_path] = (os.path.getmtime(index_path), index)
+        index.store = store
+        return index
+
+
+def load_index(
+    knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR,
+    index_path: Optional[str] = None,
+) -> BM25Index:
+    """مسار الاستعلام: stat لـ chunks.seg ولملف الفهرس فقط؛ لا مسح لمجلد المعرفة ولا إعادة بناء في الطلب."""
+    index_path = index_path or default_index_path(knowledge_dir)
+    store = open_store(knowledge_dir)
+    index = _read_index(index_path)
+    if _is_current(index, store):
+        index.store = store
+        return index
+    if index is not None and index.version == INDEX_VERSION and index.store is not None:
+        # المخزن استُبدل: doc_id في الفهرس السابق يشير إلى المخزن الذي بُني منه (mmap القديم صالح)،
+        # فنخدم به حتى يجهز الجديد
+        rebuild_in_background(index_path, rebuild_index_if_stale, knowledge_dir, index_path)
+        return index
+    # لا شيء صالح للخدمة (أول تشغيل، صيغة قديمة، أو عملية بدأت بعد استبدال المخزن)
+    return rebuild_index_if_stale(knowledge_dir, index_path)
+
+
+def _watch_sources(knowledge_dir: str, interval: float) -> None:
+    store_path = default_store_path(knowledge_dir)
+    index_path = default_index_path(knowledge_dir)
+    fd: Optional[int] = None
+    while True:
+        time.sleep(interval)
+        if fd is None:
+            # عملية أخرى (عامل prefork آخر) تمسح المجلد نفسه
+            fd = try_file_lock(f"{store_path}.watch.lock")
+            if fd is None:
+                continue
+        try:
+            store = open_store(knowledge_dir)
+            source_sig = source_signature(knowledge_dir)
+            if source_sig != store.source_sig:
+                rebuild_store_if_stale(knowledge_dir, store_path, source_sig)
+            rebuild_index_if_stale(knowledge_dir, index_path)
+        except Exception as e:
+            print(f"⚠️ knowledge watch failed: {e}", file=sys.stderr)
+
+
+def start_source_watcher(knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR, interval: float = WATCH_INTERVAL) -> bool:
+    """
+    مراقب خلفي للخادم: يمسح مجلد المعرفة كل interval ثانية ويعيد حزم المخزن وبناء BM25 عند التغيير،
+    خارج مسار الطلبات. الجامعون و--build يبنون صراحةً؛ هذا لما يُعدَّل يدوياً.
+    """
+    if interval <= 0:
+        return False
+    with _REBUILDS_LOCK:
+        thread = _WATCHERS.get(knowledge_dir)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(
+                target=_watch_sources, args=(knowledge_dir, interval), name="knowledge-watch", daemon=True
+            )
+            _WATCHERS[knowledge_dir] = thread
+            thread.start()
+    return True
 
 
 def search_knowledge(
     query: str,
     top_k: int = 5,
     knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR,
+    mode: str = "bm25",
+    nprobe: Optional[int] = None,
+    index_path: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     os.makedirs(knowledge_dir, exist_ok=True)
+    if mode == "semantic":
+        from scripts.ai.rag_semantic import search_semantic
+
+        return search_semantic(query, top_k, knowledge_dir, nprobe)
+    if mode == "sharded":
+        from scripts.ai.rag_shards import search_sharded
+
+        return search_sharded(query, top_k, knowledge_dir)
+    index = load_index(knowledge_dir, index_path)
     q_tokens = _tokenize(query)
-    results: List[Tuple[float, str, str]] = []
-    for root, _, files in os.walk(knowledge_dir):
-        for fname in files:
-            if not fname.lower().endswith(".txt"):
-                continue
-            path = os.path.join(root, fname)
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    content = f.read()
-            except Exception:
-                continue
-            score = _score_overlap(q_tokens, _tokenize(content))
-            if score > 0:
-                results.append((score, path, content[:1200]))
-    results.sort(key=lambda x: x[0], reverse=True)
-    return [
-        {"score": float(s), "path": p, "preview": c}
-        for s, p, c in results[:top_k]
-    ]
+    results = []
+    store = index.store
+    for score, doc_id in index.search(q_tokens, top_k):
+        results.append({"score": float(score), "path": store.path_of(doc_id), "preview": store.preview(doc_id)})
+    return results
+
+
+def search_knowledge_batch(
+    queries: List[str],
+    top_k: int = 5,
+    knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR,
+    mode: str = "bm25",
+    nprobe: Optional[int] = None,
+    index_path: Optional[str] = None,
+) -> List[List[Dict[str, Any]]]:
+    os.makedirs(knowledge_dir, exist_ok=True)
+    if mode == "semantic":
+        from scripts.ai.rag_semantic import search_semantic_batch
+
+        return search_semantic_batch(queries, top_k, knowledge_dir, nprobe)
+    if mode == "sharded":
+        from scripts.ai.rag_shards import search_sharded_batch
+
+        return search_sharded_batch(queries, top_k, knowledge_dir)
+    index = load_index(knowledge_dir, index_path)
+    matrix = index.term_doc_matrix()
+    store = index.store
+    out = []
+    for hits in matrix.search_batch([_tokenize(q) for q in queries], top_k):
+        out.append([
+            {"score": float(score), "path": store.path_of(doc_id), "preview": store.preview(doc_id)}
+            for score, doc_id in hits
+        ])
+    return out
 
 
 def main() -> None:
     parser = argparse.ArgumentParser()
-    parser.add_argument("--query", required=True)
+    parser.add_argument("--query")
     parser.add_argument("--top-k", type=int, default=5)
     parser.add_argument("--knowledge-dir", default=DEFAULT_KNOWLEDGE_DIR)
+    parser.add_argument("--index-path", default=None)
+    parser.add_argument("--build", action="store_true", help="إعادة بناء الفهرس (BM25 أو الدلالي حسب --mode)")
+    parser.add_argument("--mode", choices=SEARCH_MODES, default="bm25")
+    parser.add_argument("--nprobe", type=int, default=None, help="قوائم IVF المفحوصة (الوضع الدلالي)")
+    parser.add_argument("--queries-file", help="ملف رسائل (سطر لكل رسالة) للبحث الدفعي")
     args = parser.parse_args()
-    res = search_knowledge(args.query, args.top_k, args.knowledge_dir)
+    if not args.build and not args.query and not args.queries_file:
+        parser.error("--query, --queries-file or --build is required")
+    if args.build and args.mode == "semantic":
+        from scripts.ai.rag_semantic import build_semantic_index, default_semantic_dir, semantic_lock_path
+
+        # بناء offline: نفس قفل إعادة البناء الخلفية في الخادم
+        index_dir = default_semantic_dir(args.knowledge_dir)
+        os.makedirs(os.path.dirname(index_dir), exist_ok=True)
+        with file_lock(semantic_lock_path(index_dir)):
+            meta = build_semantic_index(args.knowledge_dir, index_dir)
+        print(json.dumps(
+            {
+                "index_dir": index_dir,
+                "n_docs": meta["n_docs"],
+                "dim": meta["dim"],
+                "nlist": meta["nlist"],
+            },
+            ensure_ascii=False,
+            indent=2,
+        ))
+    elif args.build and args.mode == "sharded":
+        from scripts.ai.rag_shards import build_shards, default_shard_dir
+
+        manifest = build_shards(args.knowledge_dir)
+        print(json.dumps(
+            {
+                "shard_dir": default_shard_dir(args.knowledge_dir),
+                "shard_by": manifest["shard_by"],
+                "shards": {k: v["n_docs"] for k, v in manifest["shards"].items()},
+                "rebuilt": manifest["rebuilt"],
+            },
+            ensure_ascii=False,
+            indent=2,
+        ))
+    elif args.build:
+        data = build_index(args.knowledge_dir, args.index_path)
+        print(json.dumps(
+            {
+                "index_path": args.index_path or default_index_path(args.knowledge_dir),
+                "n_docs": data["n_docs"],
+                "n_terms": len(data["postings"]),
+            },
+            ensure_ascii=False,
+            indent=2,
+        ))
+    if args.build and not args.query and not args.queries_file:
+        return
+    if args.queries_file:
+        with open(args.queries_file, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+        batch = search_knowledge_batch(
+            queries, args.top_k, args.knowledge_dir, args.mode, args.nprobe, args.index_path
+        )
+        print(json.dumps(
+            {"results": [{"query": q, "results": r} for q, r in zip(queries, batch)]},
+            ensure_ascii=False,
+            indent=2,
+        ))
+        return
+    res = search_knowledge(args.query, args.top_k, args.knowledge_dir, args.mode, args.nprobe, args.index_path)
     print(json.dumps({"results": res}, ensure_ascii=False, indent=2))
 
 
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# حد أقصى لعدد خلايا مصفوفة الدرجات (queries × docs) في كل دفعة داخلية
+MAX_SCORE_CELLS = 16_000_000
+
+
+class TermDocMatrix:
+    """مصفوفة term × doc بصيغة CSR تحمل أوزان BM25 الجاهزة لكل (term, doc)."""
+
+    def __init__(self, index) -> None:
+        terms = list(index.postings)
+        self.term_ids: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+        self.n_docs = len(index.docs)
+
+        counts = np.fromiter((len(index.postings[t]) for t in terms), dtype=np.int64, count=len(terms))
+        self.indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.indptr[1:])
+
+        flat = np.fromiter(
+            (v for t in terms for pair in index.postings[t] for v in pair),
+            dtype=np.int64,
+            count=int(self.indptr[-1]) * 2,
+        ).reshape(-1, 2)
+        self.indices = flat[:, 0].astype(np.int32)
+        tf = flat[:, 1].astype(np.float32)
+
+        doc_lens = np.fromiter((d["len"] for d in index.docs), dtype=np.float32, count=self.n_docs)
+        idf = np.repeat(
+            np.fromiter((index.idf[t] for t in terms), dtype=np.float32, count=len(terms)),
+            counts,
+        )
+        k1, b = np.float32(index.k1), np.float32(index.b)
+        norm = k1 * (1.0 - b + b * doc_lens[self.indices] / np.float32(index.avgdl))
+        self.data = idf * tf * (k1 + 1.0) / (tf + norm)
+
+    def _query_matrix(self, batch_tokens: List[List[str]]) -> Tuple[np.ndarray, np.ndarray]:
+        rows: List[int] = []
+        cols: List[int] = []
+        for qi, tokens in enumerate(batch_tokens):
+            ids = {self.term_ids[t] for t in tokens if t in self.term_ids}
+            rows.extend([qi] * len(ids))
+            cols.extend(ids)
+        return np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+
+    def _scores(self, batch_tokens: List[List[str]]) -> np.ndarray:
+        # Q (queries × terms, ثنائية) @ W (terms × docs) كضرب sparse × sparse:
+        # نجمع postings الخاصة بكل (query, term) دفعة واحدة ثم نجمعها بـ bincount.
+        n_queries = len(batch_tokens)
+        q_rows, q_cols = self._query_matrix(batch_tokens)
+        starts = self.indptr[q_cols]
+        lens = self.indptr[q_cols + 1] - starts
+        total = int(lens.sum())
+        if total == 0:
+            return np.zeros((n_queries, self.n_docs), dtype=np.float32)
+        offsets = np.repeat(starts - (np.cumsum(lens) - lens), lens) + np.arange(total)
+        flat_ids = np.repeat(q_rows, lens) * self.n_docs + self.indices[offsets]
+        scores = np.bincount(
+            flat_ids, weights=self.data[offsets], minlength=n_queries * self.n_docs
+        )
+        return scores.reshape(n_queries, self.n_docs)
+
+    def search_batch(
+        self, batch_tokens: List[List[str]], top_k: int
+    ) -> List[List[Tuple[float, int]]]:
+        if not batch_tokens:
+            return []
+        if self.n_docs == 0 or top_k <= 0:
+            return [[] for _ in batch_tokens]
+
+        k = min(top_k, self.n_docs)
+        step = max(1, MAX_SCORE_CELLS // self.n_docs)
+        out: List[List[Tuple[float, int]]] = []
+        for start in range(0, len(batch_tokens), step):
+            scores = self._scores(batch_tokens[start:start + step])
+            if k < self.n_docs:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(self.n_docs), scores.shape)
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            for doc_ids, vals in zip(top.tolist(), top_scores.tolist()):
+                out.append([(s, d) for s, d in zip(vals, doc_ids) if s > 0])
+        return out
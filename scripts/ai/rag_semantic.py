@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+وضع بحث دلالي تقريبي (CPU فقط) بجانب BM25:
+- متجهات TF-IDF لـ character n-grams (3-5) مُجزّأة (hashing) إلى BUCKETS بُعداً
+- تقليل الأبعاد بإسقاط عشوائي متفرق (Achlioptas) إلى DIM بُعداً ثم تطبيع L2
+- فهرس IVF: k-means كروي إلى ~sqrt(N) قائمة؛ المتجهات مرتبة حسب القائمة → كل قائمة شريحة متصلة
+كل المصفوفات تُحفظ كـ .npy وتُقرأ بـ mmap. الاستعلام يفحص nprobe قائمة فقط بدل كل المستندات.
+عند تغيّر المخزن يبقى الفهرس السابق يخدم (مع المخزن الذي بُني منه) بينما يُعاد البناء في thread
+خلفي تحت قفل ملف: عملية واحدة تبني، والبقية تلتقط الفهرس الجديد من meta.json.
+"""
+import os
+import re
+import sys
+import json
+import math
+import shutil
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.chunk_store import ChunkStore, open_store
+from scripts.ai.file_lock import file_lock
+from scripts.ai.rag_engine import DEFAULT_KNOWLEDGE_DIR, INDEX_DIRNAME, rebuild_in_background
+
+SEMANTIC_DIRNAME = "semantic"
+# 2: doc_id == رقم الـ chunk في chunks.seg؛ لا معاينات في meta.json
+SEMANTIC_VERSION = 2
+BUCKETS = 1 << 16
+DIM = int(os.environ.get("RAG_SEMANTIC_DIM", "256"))
+NPROBE = int(os.environ.get("RAG_SEMANTIC_NPROBE", "8"))
+NGRAM_SIZES = (3, 4, 5)
+KMEANS_ITERS = 10
+SEED = 1234
+
+_NON_WORD = re.compile(r"[\W_]+")
+_PRIME = np.uint64(1099511628211)
+_MIX = np.uint64(0xBF58476D1CE4E5B9)
+
+# index_dir -> (mtime الخاص بـ meta.json, الفهرس المحمّل)
+_SEMANTIC_CACHE: Dict[str, Tuple[float, "SemanticIndex"]] = {}
+
+
+def default_semantic_dir(knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR) -> str:
+    parent = os.path.dirname(os.path.abspath(knowledge_dir))
+    return os.path.join(parent, INDEX_DIRNAME, SEMANTIC_DIRNAME)
+
+
+def semantic_lock_path(index_dir: str) -> str:
+    return f"{index_dir}.lock"
+
+
+def ngram_buckets(text: str) -> np.ndarray:
+    """أرقام buckets لكل character n-gram (حدود الكلمات مُمثلة بمسافة)."""
+    norm = " " + _NON_WORD.sub(" ", text.lower()).strip() + " "
+    codes = np.frombuffer(norm.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    out = []
+    with np.errstate(over="ignore"):
+        for n in NGRAM_SIZES:
+            if len(codes) < n:
+                continue
+            h = np.full(len(codes) - n + 1, np.uint64(n), dtype=np.uint64)
+            for j in range(n):
+                h = h * _PRIME + codes[j:len(codes) - n + 1 + j]
+            h ^= h >> np.uint64(29)
+            h *= _MIX
+            h ^= h >> np.uint64(32)
+            out.append(h & np.uint64(BUCKETS - 1))
+    if not out:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(out).astype(np.int64)
+
+
+def _term_freqs(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    idx, counts = np.unique(ngram_buckets(text), return_counts=True)
+    return idx, (1.0 + np.log(counts)).astype(np.float32)
+
+
+def projection_matrix(dim: int = DIM, seed: int = SEED) -> np.ndarray:
+    # قيم {-1, 0, +1} باحتمالات 1/6, 2/3, 1/6 (الإسقاط العشوائي المتفرق)
+    r = np.random.default_rng(seed).integers(0, 6, size=(BUCKETS, dim), dtype=np.int8)
+    out = np.zeros((BUCKETS, dim), dtype=np.int8)
+    out[r == 0] = -1
+    out[r == 5] = 1
+    return out
+
+
+def _embed(idx: np.ndarray, tf: np.ndarray, idf: np.ndarray, proj: np.ndarray) -> np.ndarray:
+    if len(idx) == 0:
+        return np.zeros(proj.shape[1], dtype=np.float32)
+    v = (tf * idf[idx]) @ proj[idx].astype(np.float32)
+    norm = float(np.linalg.norm(v))
+    return (v / norm).astype(np.float32) if norm > 0 else v.astype(np.float32)
+
+
+def _spherical_kmeans(vectors: np.ndarray, nlist: int, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    n = len(vectors)
+    centroids = vectors[rng.choice(n, size=nlist, replace=False)].copy()
+    assign = np.zeros(n, dtype=np.int64)
+    for _ in range(KMEANS_ITERS):
+        for start in range(0, n, 8192):
+            assign[start:start + 8192] = np.argmax(vectors[start:start + 8192] @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(n, size=int(empty.sum()), replace=False)]
+            norms[empty] = 1.0
+        centroids = (sums / norms[:, None]).astype(np.float32)
+    for start in range(0, n, 8192):
+        assign[start:start + 8192] = np.argmax(vectors[start:start + 8192] @ centroids.T, axis=1)
+    return centroids, assign
+
+
+def build_semantic_index(
+    knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR,
+    index_dir: Optional[str] = None,
+    dim: int = DIM,
+    nlist: int = 0,
+    store: Optional[ChunkStore] = None,
+) -> Dict[str, Any]:
+    index_dir = index_dir or default_semantic_dir(knowledge_dir)
+    store = store or open_store(knowledge_dir)
+
+    sparse: List[Tuple[np.ndarray, np.ndarray]] = []
+    df = np.zeros(BUCKETS, dtype=np.int64)
+    for _, content in store.iter_texts():
+        idx, tf = _term_freqs(content)
+        df[idx] += 1
+        sparse.append((idx, tf))
+
+    n_docs = len(sparse)
+    idf = (np.log((1.0 + n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+    proj = projection_matrix(dim)
+    vectors = np.zeros((n_docs, dim), dtype=np.float32)
+    for i, (idx, tf) in enumerate(sparse):
+        vectors[i] = _embed(idx, tf, idf, proj)
+
+    nlist = min(nlist or max(1, int(round(math.sqrt(n_docs)))), max(n_docs, 1))
+    if n_docs:
+        centroids, assign = _spherical_kmeans(vectors, nlist, np.random.default_rng(SEED))
+    else:
+        centroids, assign = np.zeros((nlist, dim), dtype=np.float32), np.zeros(0, dtype=np.int64)
+    order = np.argsort(assign, kind="stable")
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assign, minlength=nlist), out=offsets[1:])
+
+    meta = {
+        "version": SEMANTIC_VERSION,
+        "built_at": time.time(),
+        "knowledge_dir": os.path.abspath(knowledge_dir),
+        "source_mtime": store.source_mtime,
+        "store_built_at": store.built_at,
+        "dim": dim,
+        "buckets": BUCKETS,
+        "nlist": nlist,
+        "n_docs": n_docs,
+    }
+
+    # كتابة نسخة كاملة في مجلد مؤقت ثم استبدال المجلد: القرّاء الحاليون يحتفظون بـ mmap على الملفات القديمة
+    tmp_dir = f"{index_dir}.tmp.{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "idf.npy"), idf)
+    np.save(os.path.join(tmp_dir, "projection.npy"), proj)
+    np.save(os.path.join(tmp_dir, "centroids.npy"), centroids)
+    np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp_dir, "doc_ids.npy"), order.astype(np.int32))
+    np.save(os.path.join(tmp_dir, "vectors.npy"), vectors[order])
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    old_dir = f"{index_dir}.old.{os.getpid()}"
+    if os.path.isdir(index_dir):
+        os.replace(index_dir, old_dir)
+    os.replace(tmp_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    _SEMANTIC_CACHE.pop(index_dir, None)
+    return meta
+
+
+class SemanticIndex:
+    def __init__(self, index_dir: str, meta: Dict[str, Any], store: Optional[ChunkStore] = None) -> None:
+        self.version = meta.get("version")
+        self.buckets = meta.get("buckets")
+        self.store_built_at = float(meta.get("store_built_at", 0.0))
+        self.store = store
+        self.n_docs = int(meta.get("n_docs", 0))
+        self.nlist = int(meta.get("nlist", 1))
+
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(index_dir, name), mmap_mode="r")
+
+        self.idf = load("idf.npy")
+        self.proj = load("projection.npy")
+        self.centroids = np.asarray(load("centroids.npy"))
+        self.offsets = np.asarray(load("offsets.npy"))
+        self.doc_ids = load("doc_ids.npy")
+        self.vectors = load("vectors.npy")
+
+    def embed(self, text: str) -> np.ndarray:
+        idx, tf = _term_freqs(text)
+        return _embed(idx, tf, self.idf, self.proj)
+
+    def _top(self, scores: np.ndarray, rows: np.ndarray, top_k: int) -> List[Tuple[float, int]]:
+        if len(scores) > top_k:
+            part = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            part = np.arange(len(scores))
+        part = part[np.argsort(-scores[part], kind="stable")]
+        return [(float(scores[i]), int(self.doc_ids[rows[i]])) for i in part]
+
+    def search(self, q: np.ndarray, top_k: int, nprobe: int = NPROBE) -> List[Tuple[float, int]]:
+        if not self.n_docs or not q.any():
+            return []
+        nprobe = max(1, min(nprobe, self.nlist))
+        c_scores = self.centroids @ q
+        lists = np.argpartition(-c_scores, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+        rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in lists])
+        if not len(rows):
+            return []
+        # كل قائمة شريحة متصلة من vectors.npy → قراءة mmap متتابعة
+        scores = np.concatenate([
+            np.asarray(self.vectors[self.offsets[c]:self.offsets[c + 1]]) @ q for c in lists
+        ])
+        return self._top(scores, rows, top_k)
+
+    def search_exact(self, q: np.ndarray, top_k: int) -> List[Tuple[float, int]]:
+        """مسح كامل (brute force) لقياس recall@k."""
+        if not self.n_docs or not q.any():
+            return []
+        return self._top(np.asarray(self.vectors) @ q, np.arange(self.n_docs), top_k)
+
+
+def _read_semantic_index(index_dir: str) -> Optional[SemanticIndex]:
+    meta_path = os.path.join(index_dir, "meta.json")
+    try:
+        meta_mtime = os.path.getmtime(meta_path)
+    except OSError:
+        return None
+    cached = _SEMANTIC_CACHE.get(index_dir)
+    if cached and cached[0] == meta_mtime:
+        return cached[1]
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    index = SemanticIndex(index_dir, meta)
+    _SEMANTIC_CACHE[index_dir] = (meta_mtime, index)
+    return index
+
+
+def _compatible(index: Optional[SemanticIndex]) -> bool:
+    return index is not None and index.version == SEMANTIC_VERSION and index.buckets == BUCKETS
+
+
+def _is_current(index: Optional[SemanticIndex], store: ChunkStore) -> bool:
+    return _compatible(index) and index.store_built_at == store.built_at
+
+
+def rebuild_semantic_index_if_stale(knowledge_dir: str, index_dir: str) -> SemanticIndex:
+    """يبني تحت قفل الملف؛ من ينتظر القفل يجد الفهرس الذي بناه غيره ولا يعيد البناء."""
+    os.makedirs(os.path.dirname(index_dir), exist_ok=True)
+    with file_lock(semantic_lock_path(index_dir)):
+        store = open_store(knowledge_dir)
+        index = _read_semantic_index(index_dir)
+        if not _is_current(index, store):
+            build_semantic_index(knowledge_dir, index_dir, store=store)
+            index = _read_semantic_index(index_dir)
+        index.store = store
+        return index
+
+
+def load_semantic_index(
+    knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR,
+    index_dir: Optional[str] = None,
+) -> SemanticIndex:
+    index_dir = index_dir or default_semantic_dir(knowledge_dir)
+    # نفس قاعدة BM25: stat لـ chunks.seg فقط؛ إعادة الحزم عند تغيّر المصادر تتم خارج الطلب
+    store = open_store(knowledge_dir)
+    index = _read_semantic_index(index_dir)
+    if _is_current(index, store):
+        index.store = store
+        return index
+    if _compatible(index) and index.store is not None:
+        # doc_id في الفهرس السابق يشير إلى المخزن الذي بُني منه (mmap على الملف القديم يبقى صالحاً):
+        # نخدم به حتى يجهز الجديد بدل إعادة البناء داخل الطلب
+        rebuild_in_background(index_dir, rebuild_semantic_index_if_stale, knowledge_dir, index_dir)
+        return index
+    # لا شيء صالح للخدمة (أول تشغيل، صيغة قديمة، أو عملية بدأت بعد استبدال المخزن)
+    return rebuild_semantic_index_if_stale(knowledge_dir, index_dir)
+
+
+def _results(index: SemanticIndex, hits: List[Tuple[float, int]]) -> List[Dict[str, Any]]:
+    # مثل BM25: لا نعيد مستندات بلا أي تشابه
+    store = index.store
+    return [
+        {"score": score, "path": store.path_of(doc_id), "preview": store.preview(doc_id)}
+        for score, doc_id in hits
+        if score > 0
+    ]
+
+
+def search_semantic(
+    query: str,
+    top_k: int = 5,
+    knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR,
+    nprobe: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    index = load_semantic_index(knowledge_dir)
+    return _results(index, index.search(index.embed(query), top_k, nprobe or NPROBE))
+
+
+def search_semantic_batch(
+    queries: List[str],
+    top_k: int = 5,
+    knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR,
+    nprobe: Optional[int] = None,
+) -> List[List[Dict[str, Any]]]:
+    index = load_semantic_index(knowledge_dir)
+    return [_results(index, index.search(index.embed(q), top_k, nprobe or NPROBE)) for q in queries]
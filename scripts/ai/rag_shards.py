@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+فهرس BM25 مقسّم (shards) فوق مخزن chunks.seg:
+  - RAG_SHARD_BY=source (افتراضي): شارد لكل مصدر (نطاق raw_content/<domain>، pdf، local، web)
+  - RAG_SHARD_BY=size:N: شارد لكل N chunk متتالية
+كل شارد ملف BM25 مستقل (knowledge_index/shards/<key>.bm25.json) ببصمة (digest) لمحتواه؛
+إعادة الجلب لمصدر واحد تعيد بناء شارده فقط. الاستعلام يُوزَّع على عمليات مثبّتة (كل شارد
+في عملية واحدة دائماً)، وكل عملية تعيد top_k مرتبة تُدمج بـ heap.
+البناء تحت قفل <shard_dir>.lock؛ كل شارد مختوم بـ store_built_at للمخزن الذي بُني منه، والعملية
+العاملة ترفض شارداً لا يطابق ختمه ما في manifest المستدعي (ShardVersionError → إعادة تحميل ومحاولة).
+الدرجات بإحصاءات عامة: N وطول المستندات الكلي من manifest.json، وdf كل كلمة من الاستعلام
+يُجمع من الشاردات في جولة أولى قبل البحث؛ فالدرجات قابلة للمقارنة بين الشاردات
+ومطابقة لفهرس BM25 الموحّد.
+"""
+import os
+import sys
+import json
+import hashlib
+import heapq
+import itertools
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.chunk_store import ChunkStore, open_store
+from scripts.ai.executors import SERVER_WORKERS, pinned_executors
+from scripts.ai.file_lock import file_lock
+from scripts.ai.rag_engine import (
+    DEFAULT_KNOWLEDGE_DIR,
+    INDEX_DIRNAME,
+    BM25Index,
+    _tokenize,
+    bm25_data,
+    bm25_idf,
+)
+
+SHARD_DIRNAME = "shards"
+# 3: store_built_at لكل شارد (في ملفه وفي manifest.json)
+SHARD_VERSION = 3
+# طريقة التقسيم عند البناء الأول؛ بعدها يُتبع ما في manifest.json
+SHARD_BY = os.environ.get("RAG_SHARD_BY", "source")
+# عدد العمليات التي يُوزَّع عليها الاستعلام؛ ≤ 1 = بحث داخل نفس العملية
+# مع عدة عمال للخادم: البحث داخل العامل نفسه افتراضياً (بدون عمليات إضافية لكل عامل)
+SHARD_WORKERS = int(
+    os.environ.get("RAG_SHARD_WORKERS", str(min(4, os.cpu_count() or 1) if SERVER_WORKERS <= 1 else 1))
+)
+
+# shard_dir -> (mtime الخاص بـ manifest.json, المخزن, الفهرس المقسّم)
+_SHARDED_CACHE: Dict[str, Tuple[float, ChunkStore, "ShardedIndex"]] = {}
+# داخل كل عملية عاملة: مسار الشارد -> (st_mtime_ns, الفهرس)
+_SHARD_CACHE: Dict[str, Tuple[int, BM25Index]] = {}
+
+
+class ShardVersionError(RuntimeError):
+    """ملف شارد استُبدل بنسخة غير التي يصفها manifest المستدعي."""
+
+
+def default_shard_dir(knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR) -> str:
+    parent = os.path.dirname(os.path.abspath(knowledge_dir))
+    return os.path.join(parent, INDEX_DIRNAME, SHARD_DIRNAME)
+
+
+def _shard_size(shard_by: str) -> int:
+    if shard_by == "source":
+        return 0
+    if shard_by.startswith("size:") and shard_by[5:].isdigit() and int(shard_by[5:]) > 0:
+        return int(shard_by[5:])
+    raise ValueError(f"invalid shard_by: {shard_by!r} (expected 'source' or 'size:N')")
+
+
+def group_entries(store: ChunkStore, shard_by: str = SHARD_BY) -> Dict[str, List[int]]:
+    """مفتاح الشارد -> أرقام الـ chunks في المخزن (بترتيبها؛ هذا الترتيب = doc_id داخل الشارد)."""
+    size = _shard_size(shard_by)
+    groups: Dict[str, List[int]] = {}
+    for i, entry in enumerate(store.entries):
+        if size:
+            key = f"part{i // size:05d}"
+        else:
+            key = re.sub(r"[^\w.-]", "_", entry["domain"]) or "local"
+        groups.setdefault(key, []).append(i)
+    return groups
+
+
+def _digest(store: ChunkStore, ids: List[int]) -> str:
+    h = hashlib.sha256()
+    for i in ids:
+        entry = store.entries[i]
+        h.update(f"{entry['path']}\0{entry['sha256']}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _read_manifest(shard_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(shard_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def build_shards(
+    knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR,
+    shard_by: str = SHARD_BY,
+    force: Iterable[str] = (),
+    store: Optional[ChunkStore] = None,
+) -> Dict[str, Any]:
+    """
+    يبني الشاردات التي تغيّر محتواها (أو المذكورة في force) ويُبقي الباقي كما هو.
+    يعيد الـ manifest ومعه قائمة rebuilt. عامل آخر بنى من نفس المخزن أثناء انتظار القفل → لا إعادة.
+    """
+    _shard_size(shard_by)
+    store = store or open_store(knowledge_dir)
+    shard_dir = default_shard_dir(knowledge_dir)
+    os.makedirs(shard_dir, exist_ok=True)
+    with file_lock(f"{shard_dir}.lock"):
+        return _build_shards_locked(shard_dir, shard_by, set(force), store)
+
+
+def _build_shards_locked(shard_dir: str, shard_by: str, force: Set[str], store: ChunkStore) -> Dict[str, Any]:
+    old = _read_manifest(shard_dir)
+    if (
+        not force
+        and old.get("version") == SHARD_VERSION
+        and old.get("shard_by") == shard_by
+        and old.get("store_built_at") == store.built_at
+    ):
+        _SHARDED_CACHE.pop(shard_dir, None)
+        return dict(old, rebuilt=[])
+    reusable = old.get("shards", {}) if (
+        old.get("version") == SHARD_VERSION and old.get("shard_by") == shard_by
+    ) else {}
+
+    shards: Dict[str, Dict[str, Any]] = {}
+    rebuilt: List[str] = []
+    for key, ids in sorted(group_entries(store, shard_by).items()):
+        digest = _digest(store, ids)
+        fname = f"{key}.bm25.json"
+        prev = reusable.get(key)
+        if (
+            prev
+            and prev.get("digest") == digest
+            and key not in force
+            and os.path.exists(os.path.join(shard_dir, fname))
+        ):
+            shards[key] = prev
+            continue
+        data = {"version": SHARD_VERSION, "key": key, "digest": digest, "store_built_at": store.built_at}
+        data.update(bm25_data(store.text(i) for i in ids))
+        _write_json(os.path.join(shard_dir, fname), data)
+        total_len = sum(d["len"] for d in data["docs"])
+        shards[key] = {
+            "file": fname,
+            "digest": digest,
+            "n_docs": len(ids),
+            "total_len": total_len,
+            "store_built_at": store.built_at,
+        }
+        rebuilt.append(key)
+
+    # شاردات مصادر لم تعد موجودة
+    for fname in os.listdir(shard_dir):
+        if fname.endswith(".bm25.json") and fname[: -len(".bm25.json")] not in shards:
+            os.remove(os.path.join(shard_dir, fname))
+
+    manifest = {
+        "version": SHARD_VERSION,
+        "built_at": time.time(),
+        "shard_by": shard_by,
+        "store_built_at": store.built_at,
+        "shards": shards,
+        "rebuilt": rebuilt,
+    }
+    _write_json(os.path.join(shard_dir, "manifest.json"), manifest)
+    _SHARDED_CACHE.pop(shard_dir, None)
+    return manifest
+
+
+def _load_shard(path: str) -> BM25Index:
+    mtime_ns = os.stat(path).st_mtime_ns
+    cached = _SHARD_CACHE.get(path)
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        index = BM25Index(json.load(f))
+    _SHARD_CACHE[path] = (mtime_ns, index)
+    return index
+
+
+def _load_stamped(key: str, path: str, stamp: float) -> BM25Index:
+    index = _load_shard(path)
+    if index.store_built_at != stamp:
+        raise ShardVersionError(f"shard {key}: built from store {index.store_built_at}, caller expects {stamp}")
+    return index
+
+
+def shard_df(shards: List[Tuple[str, str, float]], terms: List[str]) -> Dict[str, int]:
+    """يعمل داخل العملية العاملة: df لكل كلمة مجموعاً على الشاردات المسندة إليها."""
+    df: Dict[str, int] = {}
+    for key, path, stamp in shards:
+        postings = _load_stamped(key, path, stamp).postings
+        for term in terms:
+            plist = postings.get(term)
+            if plist:
+                df[term] = df.get(term, 0) + len(plist)
+    return df
+
+
+def search_shards(
+    shards: List[Tuple[str, str, float]],
+    token_lists: List[List[str]],
+    top_k: int,
+    idf: Dict[str, float],
+    avgdl: float,
+) -> List[List[Tuple[float, str, int]]]:
+    """
+    يعمل داخل العملية العاملة: لكل استعلام، أفضل top_k من كل شارد مسند إليها
+    كـ (score, key, doc_id المحلي) مرتبة تنازلياً، بالـ idf/avgdl العامة.
+    """
+    indexes = [(key, _load_stamped(key, path, stamp)) for key, path, stamp in shards]
+    out = []
+    for q_tokens in token_lists:
+        hits = [
+            (score, key, doc_id)
+            for key, index in indexes
+            for score, doc_id in index.search(q_tokens, top_k, idf, avgdl)
+        ]
+        hits.sort(key=lambda h: h[0], reverse=True)
+        out.append(hits[:top_k])
+    return out
+
+
+class ShardedIndex:
+    def __init__(self, shard_dir: str, manifest: Dict[str, Any], store: ChunkStore) -> None:
+        self.store = store
+        self.shard_by = manifest.get("shard_by", SHARD_BY)
+        self.version = manifest.get("version")
+        self.store_built_at = float(manifest.get("store_built_at", 0.0))
+        self.shards = manifest.get("shards", {})
+        self.paths = {key: os.path.join(shard_dir, s["file"]) for key, s in self.shards.items()}
+        self.n_docs = sum(s["n_docs"] for s in self.shards.values())
+        self.avgdl = (sum(s.get("total_len", 0) for s in self.shards.values()) / float(self.n_docs)) if self.n_docs else 0.0
+        # doc_id المحلي -> رقم الـ chunk في المخزن الحالي
+        self.ids = group_entries(store, self.shard_by) if self.store_built_at == store.built_at else {}
+
+    def assignment(self, n_workers: int) -> List[List[Tuple[str, str, float]]]:
+        """توزيع ثابت للشاردات على العمليات: الأكبر أولاً إلى الأقل حملاً."""
+        n_workers = max(1, min(n_workers, len(self.shards)))
+        loads = [0] * n_workers
+        groups: List[List[Tuple[str, str, float]]] = [[] for _ in range(n_workers)]
+        for key in sorted(self.shards, key=lambda k: (-self.shards[k]["n_docs"], k)):
+            w = loads.index(min(loads))
+            groups[w].append((key, self.paths[key], float(self.shards[key].get("store_built_at", 0.0))))
+            loads[w] += self.shards[key]["n_docs"]
+        return groups
+
+    def search_batch(
+        self,
+        token_lists: List[List[str]],
+        top_k: int,
+        workers: int = SHARD_WORKERS,
+    ) -> List[List[Tuple[float, int]]]:
+        if not self.shards:
+            return [[] for _ in token_lists]
+        groups = self.assignment(workers)
+        terms = sorted({t for q_tokens in token_lists for t in q_tokens})
+        # جولتان: df العامة أولاً ثم البحث بها
+        if len(groups) <= 1:
+            df = shard_df(groups[0], terms)
+        else:
+            pools = pinned_executors(len(groups))
+            df = {}
+            for f in [pool.submit(shard_df, group, terms) for pool, group in zip(pools, groups)]:
+                for term, n in f.result().items():
+                    df[term] = df.get(term, 0) + n
+        idf = {term: bm25_idf(self.n_docs, n) for term, n in df.items()}
+        avgdl = self.avgdl or 1.0
+        if len(groups) <= 1:
+            per_worker = [search_shards(groups[0], token_lists, top_k, idf, avgdl)]
+        else:
+            futures = [
+                pool.submit(search_shards, group, token_lists, top_k, idf, avgdl)
+                for pool, group in zip(pools, groups)
+            ]
+            per_worker = [f.result() for f in futures]
+        out = []
+        for qi in range(len(token_lists)):
+            merged = heapq.merge(*(w[qi] for w in per_worker), key=lambda h: h[0], reverse=True)
+            out.append([(score, self.ids[key][doc_id]) for score, key, doc_id in itertools.islice(merged, top_k)])
+        return out
+
+
+def load_sharded_index(knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR) -> ShardedIndex:
+    shard_dir = default_shard_dir(knowledge_dir)
+    manifest_path = os.path.join(shard_dir, "manifest.json")
+    # المخزن أُعيد حزمه (refresh_store أو المراقب) → تُعاد الشاردات المتغيرة فقط
+    store = open_store(knowledge_dir)
+    try:
+        manifest_mtime = os.path.getmtime(manifest_path)
+    except OSError:
+        build_shards(knowledge_dir, store=store)
+        manifest_mtime = os.path.getmtime(manifest_path)
+
+    cached = _SHARDED_CACHE.get(shard_dir)
+    if cached and cached[0] == manifest_mtime and cached[1] is store:
+        index = cached[2]
+    else:
+        index = ShardedIndex(shard_dir, _read_manifest(shard_dir), store)
+        _SHARDED_CACHE[shard_dir] = (manifest_mtime, store, index)
+
+    # طريقة التقسيم يحددها الـ manifest الموجود (RAG_SHARD_BY للبناء الأول فقط)
+    if index.version != SHARD_VERSION or index.store_built_at != store.built_at:
+        manifest = build_shards(knowledge_dir, index.shard_by, store=store)
+        index = ShardedIndex(shard_dir, manifest, store)
+        _SHARDED_CACHE[shard_dir] = (os.path.getmtime(manifest_path), store, index)
+    return index
+
+
+def _results(store: ChunkStore, hits: List[Tuple[float, int]]) -> List[Dict[str, Any]]:
+    return [
+        {"score": float(score), "path": store.path_of(doc_id), "preview": store.preview(doc_id)}
+        for score, doc_id in hits
+    ]
+
+
+def search_sharded(
+    query: str,
+    top_k: int = 5,
+    knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR,
+) -> List[Dict[str, Any]]:
+    return search_sharded_batch([query], top_k, knowledge_dir)[0]
+
+
+def search_sharded_batch(
+    queries: List[str],
+    top_k: int = 5,
+    knowledge_dir: str = DEFAULT_KNOWLEDGE_DIR,
+) -> List[List[Dict[str, Any]]]:
+    # دفعة واحدة لكل عملية: تكلفة IPC لا تتضاعف مع عدد الاستعلامات
+    token_lists = [_tokenize(q) for q in queries]
+    index = load_sharded_index(knowledge_dir)
+    try:
+        hits = index.search_batch(token_lists, top_k)
+    except ShardVersionError:
+        # عامل آخر أعاد بناء شارد بين قراءة manifest والبحث: manifest الجديد ثم محاولة واحدة
+        _SHARDED_CACHE.pop(default_shard_dir(knowledge_dir), None)
+        index = load_sharded_index(knowledge_dir)
+        hits = index.search_batch(token_lists, top_k)
+    return [_results(index.store, h) for h in hits]
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--knowledge-dir", default=DEFAULT_KNOWLEDGE_DIR)
+    p.add_argument("--shard-by", default=SHARD_BY, help="source أو size:N")
+    p.add_argument("--rebuild-shard", action="append", default=[], help="إعادة بناء شارد بالاسم حتى لو لم يتغير")
+    a = p.parse_args()
+    manifest = build_shards(a.knowledge_dir, a.shard_by, a.rebuild_shard)
+    print(json.dumps(
+        {
+            "shard_dir": default_shard_dir(a.knowledge_dir),
+            "shard_by": manifest["shard_by"],
+            "shards": {k: v["n_docs"] for k, v in manifest["shards"].items()},
+            "rebuilt": manifest["rebuilt"],
+        },
+        ensure_ascii=False,
+        indent=2,
+    ))
+
+
+if __name__ == "__main__":
+    main()
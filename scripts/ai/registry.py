@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+سجل مكونات مشترك على مستوى العملية: كل مكون يُبنى عند أول طلب له ومرة واحدة فقط
+(main.py و skills_api.py يتشاركان نفس النسخ)، مع مرحلة إحماء صريحة تحمّل فهرس
+الاسترجاع وجداول التوجيه قبل أن تُعلَن الجاهزية (/api/ready).
+"""
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+# 0 = بدون إحماء: المكونات تُبنى عند أول طلب فقط
+WARMUP_ENABLED = os.environ.get("FACTORY_WARMUP", "1") != "0"
+
+_lock = threading.RLock()
+_factories: Dict[str, Callable[[], Any]] = {}
+_instances: Dict[str, Any] = {}
+_status: Dict[str, Dict[str, Any]] = {}
+_ready = threading.Event()
+_warmup: Dict[str, Any] = {}
+_started_at = time.time()
+
+
+def register(name: str, factory: Callable[[], Any]) -> None:
+    with _lock:
+        _factories[name] = factory
+
+
+def get(name: str) -> Any:
+    """النسخة الوحيدة من المكون؛ تُبنى هنا إن لم تكن موجودة. الفشل لا يُخزَّن (يُعاد المحاولة)."""
+    inst = _instances.get(name)
+    if inst is not None:
+        return inst
+    with _lock:
+        inst = _instances.get(name)
+        if inst is not None:
+            return inst
+        t0 = time.perf_counter()
+        try:
+            inst = _factories[name]()
+        except Exception as e:
+            _status[name] = {"built": False, "error": str(e)}
+            raise
+        _status[name] = {"built": True, "build_ms": round((time.perf_counter() - t0) * 1000.0, 2)}
+        _instances[name] = inst
+        return inst
+
+
+def peek(name: str) -> Optional[Any]:
+    """المكون إن كان مبنياً، دون بنائه (لنقاط مثل /api/health)."""
+    return _instances.get(name)
+
+
+def _orchestrator() -> Any:
+    from scripts.ai.llm.llm_orchestrator import LLMOrchestrator
+
+    return LLMOrchestrator()
+
+
+def _skills_manager() -> Any:
+    from scripts.ai.skills_manager import SkillsManager
+
+    return SkillsManager()
+
+
+def _cohort() -> Any:
+    from scripts.ai.skills_cohort import CohortSnapshot
+
+    # المستمع قبل البناء: أي كتابة أثناء البناء تصل عبره أو عبر refresh التالي
+    skills_manager = get("skills_manager")
+    cohort = CohortSnapshot(skills_manager.store)
+    skills_manager.add_listener(cohort.upsert)
+    cohort.refresh(force=True)
+    return cohort
+
+
+register("orchestrator", _orchestrator)
+register("skills_manager", _skills_manager)
+register("cohort", _cohort)
+
+
+def warm_up(names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """يبني المكونات ثم يستدعي warm_up() لكل مكون يعرّفها؛ الأخطاء تُسجَّل ولا توقف الباقي."""
+    t0 = time.perf_counter()
+    steps: Dict[str, Any] = {}
+    for name in names or list(_factories):
+        step_t0 = time.perf_counter()
+        try:
+            inst = get(name)
+        except Exception as e:
+            # get() سجّل الخطأ في _status
+            steps[name] = {"ms": round((time.perf_counter() - step_t0) * 1000.0, 2), "error": str(e)}
+            continue
+        try:
+            warm = getattr(inst, "warm_up", None)
+            detail = warm() if callable(warm) else None
+        except Exception as e:
+            with _lock:
+                _status[name] = {**_status.get(name, {}), "warm_error": str(e)}
+            steps[name] = {"ms": round((time.perf_counter() - step_t0) * 1000.0, 2), "error": str(e)}
+            continue
+        with _lock:
+            _status.get(name, {}).pop("warm_error", None)
+        steps[name] = {"ms": round((time.perf_counter() - step_t0) * 1000.0, 2), "detail": detail}
+    _warmup.update({"ms": round((time.perf_counter() - t0) * 1000.0, 2), "steps": steps})
+    _ready.set()
+    return dict(_warmup)
+
+
+def mark_ready() -> None:
+    # بدون إحماء: الخدمة جاهزة فور الإقلاع
+    _ready.set()
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def status() -> Dict[str, Any]:
+    # جاهز = انتهى الإحماء ولم يفشل بناء أي مكون ولا إحماؤه
+    failed = any(s.get("error") or s.get("warm_error") for s in _status.values())
+    return {
+        "ready": _ready.is_set() and not failed,
+        "uptime_s": round(time.time() - _started_at, 3),
+        "components": {name: dict(_status.get(name, {"built": False})) for name in _factories},
+        "warmup": dict(_warmup) or None,
+    }
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+تحليلات جماعية لمهارات كل المستخدمين من لقطة عمودية في الذاكرة:
+  scores      users × skills (int8، ‎-1 = المهارة غير موجودة في ملف المستخدم)
+  levels      رمز المستوى لكل مستخدم
+  user_track  رمز المسار (track_id) لكل مستخدم؛ 0 = بدون مسار
+تُبنى مرة واحدة من المخزن، ثم تُحدَّث تدريجياً: upsert مع كل كتابة من SkillsManager
+(نفس العملية) و refresh() دوري عبر store.changed_since لالتقاط كتابات العمال الآخرين.
+
+الدرجات أعداد صحيحة 0..100، فالتوزيع عدّاد (رمز مسار × مهارة × درجة) يُحدَّث مع كل upsert
+(طرح الملف القديم وإضافة الجديد)؛ الاستعلام يجمع صفوف المسار منه ويشتق الـ histogram والمئينات
+(nearest-rank) والمتوسط دون المرور على المستخدمين، فزمنه لا يتغير مع عددهم.
+
+    python3 scripts/ai/skills_cohort.py --track backend_junior --skill python_control_flow
+"""
+import os
+import sys
+import glob
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import yaml
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.skills_store import SkillsStore, make_store
+
+TRACKS_DIR = os.path.join(ROOT_DIR, "ai", "skills_tracks")
+# أقصى عمر للقطة (ثوانٍ) قبل سحب تغييرات العمليات الأخرى من المخزن
+REFRESH_INTERVAL = float(os.environ.get("COHORT_REFRESH_INTERVAL", "5"))
+MAX_SCORE = 100
+MISSING = -1
+LEVELS = ("beginner", "intermediate", "advanced")
+_LEVEL_CODES = {name: i for i, name in enumerate(LEVELS)}
+_UNKNOWN_LEVEL = len(LEVELS)
+# هامش لفروق الساعة/دقة mtime بين العمليات: إعادة قراءة مستخدم لم يتغير لا تضر
+_REFRESH_SLACK = 2.0
+
+
+def load_tracks(tracks_dir: str = TRACKS_DIR) -> Dict[str, Dict[str, Any]]:
+    """track_id -> {"id", "name", "phases": [{"id", "name", "skills", "max_scores"}], "skills"}."""
+    tracks: Dict[str, Dict[str, Any]] = {}
+    for path in sorted(glob.glob(os.path.join(tracks_dir, "*.yaml"))):
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        track = data.get("track") or {}
+        if not track.get("id"):
+            continue
+        phases = []
+        for phase in data.get("phases") or []:
+            skills = [s for s in phase.get("skills") or [] if s.get("id")]
+            phases.append({
+                "id": phase.get("id", ""),
+                "name": phase.get("name", ""),
+                "skills": [s["id"] for s in skills],
+                "max_scores": [int(s.get("max_score", MAX_SCORE)) for s in skills],
+            })
+        tracks[track["id"]] = {
+            "id": track["id"],
+            "name": track.get("name", ""),
+            "phases": phases,
+            "skills": [s for phase in phases for s in phase["skills"]],
+        }
+    return tracks
+
+
+def _grow(arr: np.ndarray, shape: Sequence[int], fill: int = 0) -> np.ndarray:
+    """نسخة أكبر (ضعف السعة على الأقل في كل بُعد يلزم توسيعه) مع الحفاظ على المحتوى."""
+    new = tuple(max(s, 2 * c) if s > c else c for s, c in zip(shape, arr.shape))
+    if new == arr.shape:
+        return arr
+    out = np.full(new, fill, dtype=arr.dtype)
+    out[tuple(slice(0, c) for c in arr.shape)] = arr
+    return out
+
+
+def _nearest_rank(cum: np.ndarray, pcts: Sequence[float]) -> np.ndarray:
+    """cum: (k, 101) تراكمي لكل عمود → (k, len(pcts)) درجة المئين (nearest-rank)."""
+    n = cum[:, -1:]
+    ranks = np.maximum(1, np.ceil(np.asarray(pcts, dtype=np.float64) / 100.0 * n))
+    # أول درجة يبلغ عندها العدد التراكمي الرتبة المطلوبة
+    return (cum[:, None, :] >= ranks[:, :, None]).argmax(axis=2)
+
+
+def _round(values: Union[np.ndarray, float]) -> Any:
+    return np.round(values, 2).tolist()
+
+
+class CohortSnapshot:
+    def __init__(
+        self,
+        store: Optional[SkillsStore] = None,
+        tracks: Optional[Dict[str, Dict[str, Any]]] = None,
+        refresh_interval: float = REFRESH_INTERVAL,
+        capacity: int = 1024,
+    ) -> None:
+        self.store = store
+        self.tracks = load_tracks() if tracks is None else tracks
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self.users: Dict[str, int] = {}
+        self.skills: Dict[str, int] = {}
+        self.track_ids: List[str] = [""]
+        self._track_codes: Dict[str, int] = {"": 0}
+        self.n = 0
+        self.scores = np.full((capacity, 32), MISSING, dtype=np.int8)
+        self.levels = np.full(capacity, _UNKNOWN_LEVEL, dtype=np.int8)
+        self.user_track = np.zeros(capacity, dtype=np.int16)
+        # تجميعات لكل رمز مسار تُحدَّث مع كل upsert: الاستعلام يجمع صفين منها ولا يمسح المستخدمين
+        self.code_users = np.zeros(2, dtype=np.int64)
+        self.level_counts = np.zeros((2, len(LEVELS) + 1), dtype=np.int64)
+        self.score_counts = np.zeros((2, 32, MAX_SCORE + 1), dtype=np.int64)
+        # لكل مسار: توزيع مجموع درجات كل مرحلة (codes × phases × مجموع) وعدد من أتمّها
+        self._phases: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+        self.phase_sums: Dict[str, np.ndarray] = {}
+        self.phase_done: Dict[str, np.ndarray] = {}
+        self.refreshed_at = 0.0
+        # أعمدة مهارات المسارات أولاً: ترتيب ثابت بغض النظر عن ترتيب وصول المستخدمين
+        for track_id, track in self.tracks.items():
+            phases = [
+                (np.asarray([self._column(s) for s in phase["skills"]], dtype=np.int64),
+                 np.asarray(phase["max_scores"], dtype=np.int64))
+                for phase in track["phases"]
+            ]
+            width = max([int(m.sum()) for _, m in phases] + [0]) + 1
+            self._phases[track_id] = phases
+            self.phase_sums[track_id] = np.zeros((2, len(phases), width), dtype=np.int64)
+            self.phase_done[track_id] = np.zeros((2, len(phases)), dtype=np.int64)
+        self._ensure_capacity()
+
+    def _column(self, skill_id: str) -> int:
+        col = self.skills.get(skill_id)
+        if col is None:
+            col = self.skills[skill_id] = len(self.skills)
+        return col
+
+    def _track_code(self, track_id: str) -> int:
+        code = self._track_codes.get(track_id)
+        if code is None:
+            code = self._track_codes[track_id] = len(self.track_ids)
+            self.track_ids.append(track_id)
+        return code
+
+    def _ensure_capacity(self) -> None:
+        n_codes, n_skills = len(self.track_ids), len(self.skills)
+        self.scores = _grow(self.scores, (self.n, n_skills), MISSING)
+        self.levels = _grow(self.levels, (self.n,), _UNKNOWN_LEVEL)
+        self.user_track = _grow(self.user_track, (self.n,))
+        self.code_users = _grow(self.code_users, (n_codes,))
+        self.level_counts = _grow(self.level_counts, (n_codes, len(LEVELS) + 1))
+        self.score_counts = _grow(self.score_counts, (n_codes, n_skills, MAX_SCORE + 1))
+        for track_id in self._phases:
+            self.phase_sums[track_id] = _grow(self.phase_sums[track_id], (n_codes,) + self.phase_sums[track_id].shape[1:])
+            self.phase_done[track_id] = _grow(self.phase_done[track_id], (n_codes,) + self.phase_done[track_id].shape[1:])
+
+    def _apply(self, rows: np.ndarray, sign: int) -> None:
+        """يضيف (sign=1) أو يطرح (sign=-1) مساهمة الصفوف rows في التجميعات."""
+        if not len(rows):
+            return
+        codes = self.user_track[rows].astype(np.intp)
+        np.add.at(self.code_users, codes, sign)
+        np.add.at(self.level_counts, (codes, self.levels[rows]), sign)
+        sub = self.scores[rows, : len(self.skills)]
+        r, c = np.nonzero(sub >= 0)
+        np.add.at(self.score_counts, (codes[r], c, sub[r, c]), sign)
+        for track_id, phases in self._phases.items():
+            for k, (cols, max_scores) in enumerate(phases):
+                if not len(cols):
+                    continue
+                psub = sub[:, cols]
+                # الدرجة فوق max_score لا تزيد التقدم عن 100%
+                sums = np.clip(psub, 0, max_scores).sum(axis=1, dtype=np.intp)
+                np.add.at(self.phase_sums[track_id], (codes, k, sums), sign)
+                done = (psub >= max_scores).all(axis=1)
+                np.add.at(self.phase_done[track_id], (codes[done], k), sign)
+
+    def upsert(self, state: Dict[str, Any]) -> int:
+        return self.upsert_many([state])
+
+    def upsert_many(self, states: Iterable[Dict[str, Any]]) -> int:
+        """يستبدل ملف كل مستخدم بالكامل (المهارات المحذوفة تصبح MISSING)."""
+        latest: Dict[str, Dict[str, Any]] = {}
+        for state in states:
+            if state.get("user_id"):
+                latest[state["user_id"]] = state
+        if not latest:
+            return 0
+        with self._lock:
+            n_before = self.n
+            rows: List[int] = []
+            cells_r: List[int] = []
+            cells_c: List[int] = []
+            values: List[int] = []
+            levels: List[int] = []
+            tracks: List[int] = []
+            for user_id, state in latest.items():
+                row = self.users.get(user_id)
+                if row is None:
+                    row = self.users[user_id] = self.n
+                    self.n += 1
+                rows.append(row)
+                levels.append(_LEVEL_CODES.get(state.get("level"), _UNKNOWN_LEVEL))
+                tracks.append(self._track_code(state.get("track_id") or ""))
+                for skill_id, score in (state.get("skills") or {}).items():
+                    if isinstance(score, dict):
+                        score = score.get("score", 0)
+                    cells_r.append(row)
+                    cells_c.append(self._column(skill_id))
+                    values.append(int(score or 0))
+            self._ensure_capacity()
+            r = np.asarray(rows, dtype=np.int64)
+            # المستخدمون الموجودون: طرح الملف القديم من التجميعات قبل استبداله
+            self._apply(r[r < n_before], -1)
+            self.scores[r] = MISSING
+            self.scores[np.asarray(cells_r, dtype=np.int64), np.asarray(cells_c, dtype=np.int64)] = np.clip(
+                values, 0, MAX_SCORE
+            )
+            self.levels[r] = levels
+            self.user_track[r] = tracks
+            self._apply(r, 1)
+        return len(latest)
+
+    def refresh(self, force: bool = False) -> int:
+        """يسحب من المخزن ما تغيّر منذ آخر سحب (أو الكل في المرة الأولى)."""
+        if self.store is None:
+            return 0
+        now = time.time()
+        if not force and now - self.refreshed_at < self.refresh_interval:
+            return 0
+        # سحب واحد في كل مرة؛ الطلبات المتزامنة تستخدم اللقطة الحالية
+        if not self._refresh_lock.acquire(blocking=force):
+            return 0
+        try:
+            if self.refreshed_at:
+                states = self.store.changed_since(self.refreshed_at - _REFRESH_SLACK)
+            else:
+                states = self.store.iter_states()
+            n = self.upsert_many(states)
+            self.refreshed_at = now
+            return n
+        finally:
+            self._refresh_lock.release()
+
+    def _codes(self, track: Optional[str]) -> Union[slice, List[int]]:
+        if track is None:
+            return slice(None)
+        # مستخدمو المسار + من لا مسار في ملفه (الحالة الافتراضية لا تحدد track_id)
+        code = self._track_codes.get(track)
+        return [0, code] if code else [0]
+
+    def stats(
+        self,
+        track: Optional[str] = None,
+        skills: Optional[List[str]] = None,
+        bins: int = 10,
+        percentiles: Sequence[float] = (50, 90, 99),
+        refresh: bool = True,
+    ) -> Dict[str, Any]:
+        if track is not None and track not in self.tracks:
+            raise KeyError(f"unknown track: {track}")
+        if not 1 <= bins <= MAX_SCORE + 1:
+            raise ValueError("bins must be in 1..101")
+        pcts = [float(p) for p in percentiles]
+        if any(not 0 <= p <= 100 for p in pcts):
+            raise ValueError("percentiles must be in 0..100")
+        if refresh:
+            self.refresh()
+        t0 = time.perf_counter()
+        whole_track = skills is None
+        if skills is None:
+            skills = list(self.tracks[track]["skills"]) if track else list(self.skills)
+        # بداية كل bin من درجات 0..100 (الأخير يشمل 100)
+        starts = np.unique(np.ceil(np.linspace(0, MAX_SCORE + 1, bins + 1)[:-1]).astype(np.int64))
+        with self._lock:
+            codes = self._codes(track)
+            n_users = int(self.code_users[codes].sum())
+            unassigned = int(self.code_users[0]) if track else None
+            levels = self.level_counts[codes].sum(axis=0)
+            known = [s for s in skills if s in self.skills]
+            scores = self.score_counts[codes][:, [self.skills[s] for s in known]].sum(axis=0)
+            # تقدّم المراحل فقط لاستعلام المسار كاملاً (بدون تحديد مهارات)
+            if track and whole_track:
+                phase_sums = self.phase_sums[track][codes].sum(axis=0)
+                phase_done = self.phase_done[track][codes].sum(axis=0)
+
+        present = scores.sum(axis=1)
+        cum = np.cumsum(scores, axis=1)
+        means = (scores * np.arange(MAX_SCORE + 1)).sum(axis=1) / np.maximum(present, 1)
+        ranks = _nearest_rank(cum, pcts) if pcts else np.zeros((len(known), 0), dtype=np.int64)
+        hist = np.add.reduceat(scores, starts, axis=1) if len(known) else np.zeros((0, len(starts)))
+        edges = starts.tolist() + [MAX_SCORE]
+        out_skills: Dict[str, Any] = {}
+        for i, skill_id in enumerate(known):
+            has = int(present[i])
+            out_skills[skill_id] = {
+                "users": has,
+                "missing": n_users - has,
+                "mean": _round(means[i]) if has else None,
+                "percentiles": {f"p{p:g}": int(v) for p, v in zip(pcts, ranks[i])} if has else {},
+                "histogram": {"edges": edges, "counts": hist[i].astype(int).tolist()},
+            }
+        for skill_id in skills:
+            if skill_id not in out_skills:
+                out_skills[skill_id] = {"users": 0, "missing": n_users, "mean": None, "percentiles": {},
+                                        "histogram": {"edges": edges, "counts": [0] * len(starts)}}
+        return {
+            "track": track,
+            "users": n_users,
+            "unassigned": unassigned,
+            "levels": {name: int(levels[i]) for i, name in enumerate(LEVELS + ("unknown",))},
+            "skills": out_skills,
+            "phases": self._phase_progress(track, phase_sums, phase_done, pcts) if track and whole_track else [],
+            "snapshot": {
+                "users": self.n,
+                "skills": len(self.skills),
+                "refreshed_at": datetime.utcfromtimestamp(self.refreshed_at).isoformat() + "Z"
+                if self.refreshed_at else None,
+                "compute_ms": round((time.perf_counter() - t0) * 1000.0, 3),
+            },
+        }
+
+    def _phase_progress(
+        self, track: str, sums: np.ndarray, done: np.ndarray, pcts: Sequence[float]
+    ) -> List[Dict[str, Any]]:
+        """
+        تقدّم المستخدم في المرحلة = مجموع درجاته (حتى max_score لكل مهارة) / مجموع max_score لمهاراتها (الغائبة = 0).
+        المجموع عدد صحيح → توزيعه محفوظ كعدّاد، والمئينات nearest-rank كما في المهارات.
+        """
+        out = []
+        for k, (phase, (cols, max_scores)) in enumerate(zip(self.tracks[track]["phases"], self._phases[track])):
+            entry: Dict[str, Any] = {"id": phase["id"], "name": phase["name"], "skills": len(cols)}
+            total = int(max_scores.sum())
+            counts = sums[k, : total + 1]
+            users = int(counts.sum())
+            if not len(cols) or not users or not total:
+                entry["progress"] = None
+                out.append(entry)
+                continue
+            ranks = _nearest_rank(np.cumsum(counts)[None, :], pcts)[0] if pcts else []
+            scale = 100.0 / total
+            entry["progress"] = {
+                "mean": _round(float((counts * np.arange(total + 1)).sum()) / users * scale),
+                **{f"p{p:g}": _round(float(v) * scale) for p, v in zip(pcts, ranks)},
+                "completed": int(done[k]),
+            }
+            out.append(entry)
+        return out
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--track")
+    p.add_argument("--skill", action="append", help="مهارة (يمكن تكراره)؛ الافتراضي كل مهارات المسار")
+    p.add_argument("--bins", type=int, default=10)
+    p.add_argument("--percentiles", default="50,90,99")
+    p.add_argument("--backend", choices=["json", "sqlite"], default=None)
+    a = p.parse_args()
+
+    cohort = CohortSnapshot(make_store(a.backend, write_back_interval=0))
+    cohort.refresh(force=True)
+    pcts = [float(x) for x in a.percentiles.split(",") if x.strip()]
+    print(json.dumps(cohort.stats(a.track, a.skill, a.bins, pcts, refresh=False), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
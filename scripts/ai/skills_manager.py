@@ -1,22 +1,45 @@
 #!/usr/bin/env python3
 import os
-import json
-from typing import Dict, Any
+import sys
+from datetime import datetime
+from typing import Callable, Dict, Any, Iterable, List, Optional
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.executors import run_io
+from scripts.ai.skills_store import SkillsStore, make_store
+from scripts.ai.stage_timing import timed
+
+# خريطة: agent -> skills (تُرفع كل منها عند توجيه السؤال إلى ذلك الـ agent)
+AGENT_SKILL_MAP = {
+    "debug_expert": ["python_errors_handling"],
+    "technical_coach": ["python_control_flow", "python_functions_basics"],
+    "system_architect": ["backend_framework_intro", "db_modeling_basic"],
+    "knowledge_spider": ["web_http_fundamentals", "rest_api_concepts"],
+}
 
 class SkillsManager:
-    def __init__(self):
-        self.data_path = "ai/datasets/user_skills"
-        os.makedirs(self.data_path, exist_ok=True)
+    def __init__(self, store: Optional[SkillsStore] = None, backend: Optional[str] = None):
+        # backend: json | sqlite (الافتراضي من متغير البيئة SKILLS_BACKEND)
+        self.store = store or make_store(backend)
+        # تُستدعى بالحالة الجديدة بعد كل كتابة ناجحة (مثلاً لقطة التحليلات skills_cohort)
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    def add_listener(self, fn: Callable[[Dict[str, Any]], None]) -> None:
+        self._listeners.append(fn)
+
+    def _notify(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        for fn in self._listeners:
+            try:
+                fn(state)
+            except Exception as e:
+                print(f"⚠️ خطأ في مستمع تحديث المهارات: {e}")
+        return state
     
-    def get_skills_state(self, user_id: str) -> Dict[str, Any]:
-        file_path = f"{self.data_path}/{user_id}.json"
-        try:
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-        except Exception as e:
-            print(f"⚠️ خطأ في قراءة ملف المهارات: {e}")
-        
+    def _default_state(self, user_id: str) -> Dict[str, Any]:
         # حالة افتراضية إذا المستخدم جديد
         return {
             "user_id": user_id,
@@ -28,21 +51,87 @@ class SkillsManager:
             "level": "beginner"
         }
     
-    def update_skill(self, user_id: str, skill_id: str, new_score: int) -> Dict[str, Any]:
+    def get_skills_state(self, user_id: str) -> Dict[str, Any]:
         try:
-            state = self.get_skills_state(user_id)
+            state = self.store.load(user_id)
+            if state is not None:
+                return state
+        except Exception as e:
+            print(f"⚠️ خطأ في قراءة ملف المهارات: {e}")
+        return self._default_state(user_id)
+    
+    def update_skill(self, user_id: str, skill_id: str, new_score: int) -> Dict[str, Any]:
+        def apply(state: Dict[str, Any]) -> Dict[str, Any]:
             state["skills"][skill_id] = new_score
-            state["level"] = self._calculate_level(state["skills"])
-            
-            file_path = f"{self.data_path}/{user_id}.json"
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(state, f, ensure_ascii=False, indent=2)
-            
+            self._touch(state, [skill_id])
             return state
+
+        try:
+            return self._notify(self.store.update(user_id, apply, lambda: self._default_state(user_id)))
         except Exception as e:
             print(f"⚠️ خطأ في تحديث المهارة: {e}")
             return {"error": str(e)}
     
+    def apply_skill_deltas(
+        self,
+        user_id: str,
+        deltas: Dict[str, int],
+        changes: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        يطبّق عدة تغييرات {skill_id: delta} في قراءة/كتابة واحدة ويحسب المستوى مرة واحدة.
+        إذا مُرِّرت قائمة changes تُملأ بـ {"skill_id", "old_score", "new_score"}.
+        """
+        def apply(state: Dict[str, Any]) -> Dict[str, Any]:
+            skills = state["skills"]
+            for skill_id, delta in deltas.items():
+                old = skills.get(skill_id, 0)
+                new = max(0, min(100, old + int(delta)))
+                skills[skill_id] = new
+                if changes is not None:
+                    changes.append({"skill_id": skill_id, "old_score": old, "new_score": new})
+            self._touch(state, deltas)
+            return state
+
+        try:
+            return self._notify(self.store.update(user_id, apply, lambda: self._default_state(user_id)))
+        except Exception as e:
+            print(f"⚠️ خطأ في تحديث المهارات: {e}")
+            return {"error": str(e)}
+    
+    def _touch(self, state: Dict[str, Any], skill_ids: Iterable[str]) -> None:
+        """المستوى، وحقول الصيغة الغنية (إن وُجدت) للمهارات المعدّلة ونسبة التقدم المخزنة."""
+        skills = state["skills"]
+        state["level"] = self._calculate_level(skills)
+        now = datetime.utcnow().isoformat()
+        meta = state.get("skill_meta") or {}
+        for skill_id in skill_ids:
+            if skill_id in meta:
+                meta[skill_id]["last_updated"] = now
+                meta[skill_id]["practice_count"] = int(meta[skill_id].get("practice_count") or 0) + 1
+        if "overall_progress" in state:
+            state["overall_progress"] = round(sum(skills.values()) / len(skills), 1) if skills else 0.0
+        if "updated_at" in state:
+            state["updated_at"] = now
+
+    # نسخ async: قراءة/كتابة التخزين (ملفات JSON أو SQLite) تتم في thread pool
+    @timed("skills_io")
+    async def get_skills_state_async(self, user_id: str) -> Dict[str, Any]:
+        return await run_io(self.get_skills_state, user_id)
+
+    @timed("skills_io")
+    async def update_skill_async(self, user_id: str, skill_id: str, new_score: int) -> Dict[str, Any]:
+        return await run_io(self.update_skill, user_id, skill_id, new_score)
+
+    @timed("skills_io")
+    async def apply_skill_deltas_async(
+        self,
+        user_id: str,
+        deltas: Dict[str, int],
+        changes: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        return await run_io(self.apply_skill_deltas, user_id, deltas, changes)
+
     def _calculate_level(self, skills: Dict[str, int]) -> str:
         if not skills:
             return "beginner"
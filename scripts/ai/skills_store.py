@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+import os
+import sys
+import abc
+import atexit
+import copy
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, Optional
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.file_lock import file_lock
+
+USER_SKILLS_DIR = os.path.join(ROOT_DIR, "ai", "datasets", "user_skills")
+SKILLS_DB_PATH = os.environ.get(
+    "SKILLS_DB_PATH", os.path.join(ROOT_DIR, "ai", "datasets", "user_skills.sqlite3")
+)
+# json (الافتراضي، ملف لكل مستخدم) | sqlite (WAL، صف لكل مهارة)
+SKILLS_BACKEND = os.environ.get("SKILLS_BACKEND", "json")
+# > 0: دمج تحديثات نفس المستخدم في كتابة واحدة كل N ثانية (عملية واحدة فقط)
+SKILLS_WRITE_BACK_INTERVAL = float(os.environ.get("SKILLS_WRITE_BACK_INTERVAL", "0"))
+# عدد عمليات الخادم (يضبطه scripts/ai/prefork.py)؛ > 1 يعطّل طبقة write-back
+SERVER_WORKERS = int(os.environ.get("FACTORY_WORKERS", "1"))
+
+State = Dict[str, Any]
+Mutator = Callable[[State], State]
+
+
+def _normalize(state: State) -> State:
+    """
+    state["skills"] دائماً {skill_id: score}. الملفات بالصيغة الغنية تخزن المهارة كـ
+    {"score", "confidence", "last_updated", "practice_count"}: ما عدا score يُحفظ في
+    state["skill_meta"][skill_id] ويُعاد عند الكتابة.
+    """
+    skills = {}
+    meta = dict(state.get("skill_meta") or {})
+    for skill_id, value in (state.get("skills") or {}).items():
+        if isinstance(value, dict):
+            meta[skill_id] = {**meta.get(skill_id, {}), **{k: v for k, v in value.items() if k != "score"}}
+            value = value.get("score", 0)
+        skills[skill_id] = int(value or 0)
+    state["skills"] = skills
+    if meta:
+        state["skill_meta"] = meta
+    return state
+
+
+def _denormalize(state: State) -> State:
+    """الصيغة المكتوبة في ملف JSON: المهارات التي لها skill_meta تعود إلى الصيغة الغنية."""
+    meta = state.get("skill_meta") or {}
+    out = {k: v for k, v in state.items() if k != "skill_meta"}
+    out["skills"] = {
+        skill_id: {"score": score, **meta[skill_id]} if skill_id in meta else score
+        for skill_id, score in (state.get("skills") or {}).items()
+    }
+    return out
+
+
+class SkillsStore(abc.ABC):
+    @abc.abstractmethod
+    def load(self, user_id: str) -> Optional[State]:
+        ...
+
+    @abc.abstractmethod
+    def update(self, user_id: str, fn: Mutator, default: Callable[[], State]) -> State:
+        """read-modify-write ذري لمستخدم واحد."""
+
+    @abc.abstractmethod
+    def save(self, state: State) -> None:
+        ...
+
+    @abc.abstractmethod
+    def user_ids(self) -> Iterator[str]:
+        ...
+
+    def iter_states(self) -> Iterator[State]:
+        """كل حالات المستخدمين (للتحليلات: scripts/ai/skills_cohort.py)."""
+        for user_id in self.user_ids():
+            state = self.load(user_id)
+            if state is not None:
+                yield state
+
+    def changed_since(self, since: float) -> Iterator[State]:
+        """حالات المستخدمين المعدّلة بعد since (epoch)؛ الافتراضي: الكل."""
+        return self.iter_states()
+
+    def close(self) -> None:
+        pass
+
+
+class JsonSkillsStore(SkillsStore):
+    """
+    ملف JSON لكل مستخدم. read-modify-write محمي بقفل thread داخل العملية
+    وبقفل ملف (.locks/<user>.lock) بين العمليات.
+    """
+
+    def __init__(self, data_path: str = USER_SKILLS_DIR) -> None:
+        self.data_path = data_path
+        self.locks_path = os.path.join(data_path, ".locks")
+        os.makedirs(self.locks_path, exist_ok=True)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _path(self, user_id: str) -> str:
+        return os.path.join(self.data_path, f"{user_id.replace('/', '_')}.json")
+
+    def _lock(self, user_id: str) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._locks.get(user_id)
+            if lock is None:
+                lock = self._locks[user_id] = threading.Lock()
+            return lock
+
+    def _file_lock(self, user_id: str) -> Any:
+        return file_lock(os.path.join(self.locks_path, f"{user_id.replace('/', '_')}.lock"))
+
+    def load(self, user_id: str) -> Optional[State]:
+        path = self._path(user_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return _normalize(json.load(f))
+
+    def save(self, state: State) -> None:
+        with self._lock(state["user_id"]), self._file_lock(state["user_id"]):
+            self._save(state)
+
+    def _save(self, state: State) -> None:
+        path = self._path(state["user_id"])
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_denormalize(state), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def update(self, user_id: str, fn: Mutator, default: Callable[[], State]) -> State:
+        with self._lock(user_id), self._file_lock(user_id):
+            state = self.load(user_id) or default()
+            state = fn(state)
+            self._save(state)
+            return state
+
+    def user_ids(self) -> Iterator[str]:
+        for fname in sorted(os.listdir(self.data_path)):
+            if fname.endswith(".json"):
+                path = os.path.join(self.data_path, fname)
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        yield json.load(f).get("user_id") or fname[:-5]
+                except (OSError, ValueError):
+                    continue
+
+    def _scan(self, since: Optional[float]) -> Iterator[State]:
+        with os.scandir(self.data_path) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    if since is not None and entry.stat().st_mtime <= since:
+                        continue
+                    with open(entry.path, "r", encoding="utf-8") as f:
+                        state = _normalize(json.load(f))
+                except (OSError, ValueError):
+                    continue
+                state.setdefault("user_id", entry.name[:-5])
+                yield state
+
+    def iter_states(self) -> Iterator[State]:
+        return self._scan(None)
+
+    def changed_since(self, since: float) -> Iterator[State]:
+        # mtime الملف = آخر كتابة (os.replace لملف جديد)
+        return self._scan(since)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_profiles (
+    user_id       TEXT PRIMARY KEY,
+    level         TEXT NOT NULL,
+    track_id      TEXT,
+    current_phase TEXT,
+    extra         TEXT,
+    updated_at    TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_skills (
+    user_id    TEXT NOT NULL,
+    skill_id   TEXT NOT NULL,
+    score      INTEGER NOT NULL,
+    meta       TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (user_id, skill_id)
+) WITHOUT ROWID;
+"""
+# أعمدة أُضيفت بعد الإصدار الأول من المخطط (قواعد موجودة تُرقّى عند الفتح)
+ADDED_COLUMNS = (
+    ("user_profiles", "track_id", "TEXT"),
+    ("user_profiles", "current_phase", "TEXT"),
+    ("user_profiles", "extra", "TEXT"),
+    ("user_skills", "meta", "TEXT"),
+)
+# حقول الملف الشخصي التي لها أعمدة؛ البقية (sessions_count، created_at، overall_progress...) في extra
+PROFILE_COLUMNS = ("track_id", "current_phase")
+_NOT_EXTRA = ("user_id", "skills", "skill_meta", "level", "updated_at") + PROFILE_COLUMNS
+
+SQL_SELECT_PROFILE = (
+    "SELECT user_id, level, track_id, current_phase, extra, updated_at FROM user_profiles WHERE user_id = ?"
+)
+SQL_SELECT_SKILLS = "SELECT skill_id, score, meta FROM user_skills WHERE user_id = ?"
+SQL_UPSERT_PROFILE = (
+    "INSERT INTO user_profiles (user_id, level, track_id, current_phase, extra, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(user_id) DO UPDATE SET level = excluded.level, track_id = excluded.track_id, "
+    "current_phase = excluded.current_phase, extra = excluded.extra, updated_at = excluded.updated_at"
+)
+SQL_UPSERT_SKILL = (
+    "INSERT INTO user_skills (user_id, skill_id, score, meta, updated_at) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(user_id, skill_id) DO UPDATE SET score = excluded.score, meta = excluded.meta, "
+    "updated_at = excluded.updated_at"
+)
+SQL_USER_IDS = "SELECT user_id FROM user_profiles ORDER BY user_id"
+
+
+def _profile_state(
+    user_id: str,
+    level: str,
+    track_id: Optional[str],
+    current_phase: Optional[str],
+    extra: Optional[str],
+    updated_at: str,
+) -> State:
+    state: State = json.loads(extra) if extra else {}
+    state.update({"user_id": user_id, "level": level, "updated_at": updated_at})
+    if track_id is not None:
+        state["track_id"] = track_id
+    if current_phase is not None:
+        state["current_phase"] = current_phase
+    return state
+
+
+def _add_skill(state: State, skill_id: str, score: int, meta: Optional[str]) -> None:
+    state["skills"][skill_id] = score
+    if meta:
+        state.setdefault("skill_meta", {})[skill_id] = json.loads(meta)
+
+
+class SqliteSkillsStore(SkillsStore):
+    """SQLite بوضع WAL: اتصال لكل thread، صف لكل (user, skill)، upsert داخل معاملة."""
+
+    def __init__(self, db_path: str = SKILLS_DB_PATH) -> None:
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        self._upgrade(conn)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            # isolation_level=None: نتحكم بالمعاملات يدوياً (BEGIN IMMEDIATE)
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _upgrade(conn: sqlite3.Connection) -> None:
+        def missing() -> list:
+            have = {
+                table: {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                for table in ("user_profiles", "user_skills")
+            }
+            return [c for c in ADDED_COLUMNS if c[1] not in have[c[0]]]
+
+        if not missing():
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # إعادة الفحص بعد قفل الكتابة: عملية أخرى قد تكون رقّت القاعدة
+            for table, column, decl in missing():
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _read(self, conn: sqlite3.Connection, user_id: str) -> Optional[State]:
+        row = conn.execute(SQL_SELECT_PROFILE, (user_id,)).fetchone()
+        if row is None:
+            return None
+        state = _profile_state(*row)
+        state["skills"] = {}
+        for skill_id, score, meta in conn.execute(SQL_SELECT_SKILLS, (user_id,)):
+            _add_skill(state, skill_id, score, meta)
+        return state
+
+    def _write(self, conn: sqlite3.Connection, state: State, previous: Optional[State]) -> None:
+        now = datetime.utcnow().isoformat()
+        user_id = state["user_id"]
+        old = (previous or {}).get("skills", {})
+        old_meta = (previous or {}).get("skill_meta", {})
+        meta = state.get("skill_meta") or {}
+        extra = {k: v for k, v in state.items() if k not in _NOT_EXTRA}
+        conn.execute(
+            SQL_UPSERT_PROFILE,
+            (
+                user_id,
+                state.get("level", "beginner"),
+                state.get("track_id"),
+                state.get("current_phase"),
+                json.dumps(extra, ensure_ascii=False) if extra else None,
+                now,
+            ),
+        )
+        conn.executemany(
+            SQL_UPSERT_SKILL,
+            [
+                (
+                    user_id,
+                    skill_id,
+                    int(score),
+                    json.dumps(meta[skill_id], ensure_ascii=False) if skill_id in meta else None,
+                    now,
+                )
+                for skill_id, score in state.get("skills", {}).items()
+                if old.get(skill_id) != score or old_meta.get(skill_id) != meta.get(skill_id)
+            ],
+        )
+
+    def load(self, user_id: str) -> Optional[State]:
+        return self._read(self._conn(), user_id)
+
+    def save(self, state: State) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write(conn, _normalize(dict(state)), None)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def update(self, user_id: str, fn: Mutator, default: Callable[[], State]) -> State:
+        conn = self._conn()
+        # BEGIN IMMEDIATE يأخذ قفل الكتابة قبل القراءة → لا تحديثات مفقودة بين العمال
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            previous = self._read(conn, user_id)
+            state = previous or default()
+            snapshot = copy.deepcopy(state) if previous else None
+            state = fn(state)
+            self._write(conn, state, snapshot)
+            conn.execute("COMMIT")
+            return state
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def user_ids(self) -> Iterator[str]:
+        for (user_id,) in self._conn().execute(SQL_USER_IDS).fetchall():
+            yield user_id
+
+    def _states(self, where: str, params: tuple) -> Iterator[State]:
+        conn = self._conn()
+        # معاملة قراءة واحدة: لقطة متسقة للجدولين
+        conn.execute("BEGIN")
+        try:
+            states: Dict[str, State] = {}
+            for row in conn.execute(
+                f"SELECT user_id, level, track_id, current_phase, extra, updated_at FROM user_profiles {where}", params
+            ):
+                state = states[row[0]] = _profile_state(*row)
+                state["skills"] = {}
+            sql = "SELECT user_id, skill_id, score, meta FROM user_skills"
+            if where:
+                sql += f" WHERE user_id IN (SELECT user_id FROM user_profiles {where})"
+            for user_id, skill_id, score, meta in conn.execute(sql, params):
+                if user_id in states:
+                    _add_skill(states[user_id], skill_id, score, meta)
+        finally:
+            conn.execute("COMMIT")
+        yield from states.values()
+
+    def iter_states(self) -> Iterator[State]:
+        return self._states("", ())
+
+    def changed_since(self, since: float) -> Iterator[State]:
+        # updated_at يُكتب بتوقيت UTC (datetime.utcnow) مع كل تحديث للمستخدم
+        return self._states("WHERE updated_at > ?", (datetime.utcfromtimestamp(since).isoformat(),))
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _copy(state: State) -> State:
+    out = dict(state)
+    out["skills"] = dict(state.get("skills", {}))
+    if "skill_meta" in state:
+        out["skill_meta"] = {k: dict(v) for k, v in state["skill_meta"].items()}
+    return out
+
+
+class WriteBackSkillsStore(SkillsStore):
+    """
+    طبقة write-back داخل العملية: التحديثات تُطبَّق على نسخة في الذاكرة،
+    وthread خلفي يكتب كل مستخدم متغيّر مرة واحدة كل flush_interval.
+    صالحة لعملية واحدة فقط؛ عدة عمال يجب أن يكتبوا مباشرة إلى المخزن.
+    """
+
+    def __init__(self, inner: SkillsStore, flush_interval: float = 1.0) -> None:
+        self.inner = inner
+        self.flush_interval = flush_interval
+        self._states: Dict[str, State] = {}
+        self._dirty: Dict[str, bool] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.coalesced = 0
+        self.writes = 0
+        self._thread = threading.Thread(target=self._run, name="skills-write-back", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _lock(self, user_id: str) -> threading.Lock:
+        with self._guard:
+            lock = self._locks.get(user_id)
+            if lock is None:
+                lock = self._locks[user_id] = threading.Lock()
+            return lock
+
+    def load(self, user_id: str) -> Optional[State]:
+        with self._lock(user_id):
+            state = self._states.get(user_id)
+            if state is not None:
+                return _copy(state)
+        return self.inner.load(user_id)
+
+    def update(self, user_id: str, fn: Mutator, default: Callable[[], State]) -> State:
+        with self._lock(user_id):
+            state = self._states.get(user_id)
+            if state is None:
+                state = self.inner.load(user_id) or default()
+            elif self._dirty.get(user_id):
+                self.coalesced += 1
+            state = fn(_copy(state))
+            self._states[user_id] = state
+            self._dirty[user_id] = True
+            return _copy(state)
+
+    def save(self, state: State) -> None:
+        user_id = state["user_id"]
+        with self._lock(user_id):
+            self._states[user_id] = _copy(state)
+            self._dirty[user_id] = True
+
+    def user_ids(self) -> Iterator[str]:
+        self.flush()
+        return self.inner.user_ids()
+
+    def iter_states(self) -> Iterator[State]:
+        self.flush()
+        return self.inner.iter_states()
+
+    def changed_since(self, since: float) -> Iterator[State]:
+        self.flush()
+        return self.inner.changed_since(since)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            n = 0
+            for user_id in list(self._dirty):
+                with self._lock(user_id):
+                    if not self._dirty.get(user_id):
+                        continue
+                    snapshot = _copy(self._states[user_id])
+                    self._dirty[user_id] = False
+                self.inner.save(snapshot)
+                self.writes += 1
+                n += 1
+                with self._lock(user_id):
+                    # نحذف النسخة النظيفة كي لا تكبر الذاكرة مع عدد المستخدمين
+                    if not self._dirty.get(user_id):
+                        self._states.pop(user_id, None)
+                        self._dirty.pop(user_id, None)
+            return n
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ skills write-back flush error: {e}", file=sys.stderr)
+
+    def close(self) -> None:
+        self._stop.set()
+        self.flush()
+        self.inner.close()
+
+
+def make_store(backend: Optional[str] = None, write_back_interval: Optional[float] = None) -> SkillsStore:
+    backend = backend or SKILLS_BACKEND
+    if backend == "json":
+        store: SkillsStore = JsonSkillsStore()
+    elif backend == "sqlite":
+        store = SqliteSkillsStore()
+    else:
+        raise ValueError(f"unknown skills backend: {backend}")
+    interval = SKILLS_WRITE_BACK_INTERVAL if write_back_interval is None else write_back_interval
+    if interval > 0 and SERVER_WORKERS > 1:
+        print(f"⚠️ SKILLS_WRITE_BACK_INTERVAL معطّل: {SERVER_WORKERS} عمليات تكتب نفس المخزن", file=sys.stderr)
+        interval = 0
+    if interval > 0:
+        store = WriteBackSkillsStore(store, interval)
+    return store
+
+
+def migrate_json_to_sqlite(json_dir: str = USER_SKILLS_DIR, db_path: str = SKILLS_DB_PATH) -> int:
+    dst = SqliteSkillsStore(db_path)
+    conn = dst._conn()
+    n = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for fname in sorted(os.listdir(json_dir)):
+            if not fname.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(json_dir, fname), "r", encoding="utf-8") as f:
+                    state = _normalize(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ تخطي {fname}: {e}", file=sys.stderr)
+                continue
+            state.setdefault("user_id", fname[:-5])
+            state.setdefault("level", "beginner")
+            dst._write(conn, state, None)
+            n += 1
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        dst.close()
+    return n
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("command", choices=["migrate"])
+    p.add_argument("--json-dir", default=USER_SKILLS_DIR)
+    p.add_argument("--db", default=SKILLS_DB_PATH)
+    a = p.parse_args()
+    if a.command == "migrate":
+        n = migrate_json_to_sqlite(a.json_dir, a.db)
+        print(json.dumps({"migrated_users": n, "db": a.db}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+توقيت مراحل الطلب (route / rag / cache / skills_io / metrics ...) في histograms ثابتة
+الحدود، وزمن/عدد الطلبات لكل route عبر ASGI middleware، وتصديرها بصيغة Prometheus النصية.
+
+    with stage("rag"):
+        ...
+
+    @timed("skills_io")
+    async def get_skills_state_async(...): ...
+
+تتبّع اختياري لكل طلب: الترويسة X-Factory-Trace: 1 تعيد تفصيل المراحل في Server-Timing.
+"""
+import os
+import asyncio
+import functools
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 0 = تعطيل التسجيل (stage يبقى context manager فارغاً تقريباً)
+ENABLED = os.environ.get("FACTORY_STAGE_TIMING", "1") != "0"
+TRACE_HEADER = b"x-factory-trace"
+# حدود الـ buckets بالثواني: من 50µs (مرحلة توجيه) إلى 10s (طلب RAG على corpus كبير)
+BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# قائمة (stage, seconds) للطلب الحالي إن كان التتبّع مطلوباً، وإلا None
+_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("factory_stage_trace", default=None)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count", "_lock")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(BUCKETS, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+_lock = threading.Lock()
+_stages: Dict[str, Histogram] = {}
+# (method, route) -> histogram ؛ (method, route, status) -> عدد
+_requests: Dict[Tuple[str, str], Histogram] = {}
+_request_counts: Dict[Tuple[str, str, int], int] = {}
+
+
+def _histogram(table: Dict[Any, Histogram], key: Any) -> Histogram:
+    hist = table.get(key)
+    if hist is None:
+        with _lock:
+            hist = table.setdefault(key, Histogram())
+    return hist
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    if not ENABLED:
+        return
+    _histogram(_stages, name).observe(seconds)
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((name, seconds))
+
+
+class stage:
+    """context manager لمرحلة واحدة؛ يعمل عبر await داخل نفس الـ task."""
+
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "stage":
+        self.t0 = perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> bool:
+        observe_stage(self.name, perf_counter() - self.t0)
+        return False
+
+
+def timed(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """decorator لدالة عادية أو async."""
+
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with stage(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with stage(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    if not ENABLED:
+        return
+    _histogram(_requests, (method, route)).observe(seconds)
+    key = (method, route, status)
+    with _lock:
+        _request_counts[key] = _request_counts.get(key, 0) + 1
+
+
+def server_timing(trace: List[Tuple[str, float]], total: float) -> str:
+    # صيغة Server-Timing القياسية (ms)؛ المرحلة المتكررة تُجمع
+    totals: Dict[str, float] = {}
+    for name, seconds in trace:
+        totals[name] = totals.get(name, 0.0) + seconds
+    parts = [f"{name};dur={seconds * 1000.0:.3f}" for name, seconds in totals.items()]
+    parts.append(f"total;dur={total * 1000.0:.3f}")
+    return ", ".join(parts)
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware خام (بدون BaseHTTPMiddleware): زمن وعدد الطلبات لكل route (قالب المسار
+    لا المسار الفعلي، حتى لا تنفجر الـ labels)، وServer-Timing عند طلب التتبّع.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace: Optional[List[Tuple[str, float]]] = None
+        for key, value in scope.get("headers", ()):
+            if key == TRACE_HEADER and value not in (b"0", b""):
+                trace = []
+                break
+        token = _trace.set(trace)
+        t0 = perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace is not None:
+                    header = server_timing(trace, perf_counter() - t0).encode("latin-1")
+                    message = dict(message, headers=list(message.get("headers", [])) + [(b"server-timing", header)])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _trace.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "<unmatched>"
+            observe_request(scope.get("method", ""), route, status, perf_counter() - t0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels: Any) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _render_histogram(lines: List[str], name: str, labels: Dict[str, Any], hist: Histogram) -> None:
+    counts, total, count = hist.snapshot()
+    cumulative = 0
+    for bound, c in zip(BUCKETS, counts):
+        cumulative += c
+        lines.append(f"{name}_bucket{_labels(**labels, le=repr(bound))} {cumulative}")
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {count}")
+    lines.append(f"{name}_sum{_labels(**labels)} {total!r}")
+    lines.append(f"{name}_count{_labels(**labels)} {count}")
+
+
+def render_prometheus() -> str:
+    """صيغة Prometheus النصية (text/plain; version=0.0.4)."""
+    lines: List[str] = [
+        "# HELP factory_stage_seconds Latency of internal request stages.",
+        "# TYPE factory_stage_seconds histogram",
+    ]
+    with _lock:
+        stages = sorted(_stages.items())
+        requests = sorted(_requests.items())
+        counts = sorted(_request_counts.items())
+    for name, hist in stages:
+        _render_histogram(lines, "factory_stage_seconds", {"stage": name}, hist)
+    lines += [
+        "# HELP factory_http_request_duration_seconds HTTP request latency per route.",
+        "# TYPE factory_http_request_duration_seconds histogram",
+    ]
+    for (method, route), hist in requests:
+        _render_histogram(lines, "factory_http_request_duration_seconds", {"method": method, "route": route}, hist)
+    lines += [
+        "# HELP factory_http_requests_total HTTP requests per route and status.",
+        "# TYPE factory_http_requests_total counter",
+    ]
+    for (method, route, status), n in counts:
+        lines.append(f"factory_http_requests_total{_labels(method=method, route=route, status=status)} {n}")
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    with _lock:
+        _stages.clear()
+        _requests.clear()
+        _request_counts.clear()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+كاش الإجابات المولَّدة (scripts/ai/answer_cache.py):
+  1) micro     زمن get (إصابة تامة / تقريبية / إخفاق) و put، والإخلاء تحت max_bytes صغير
+  2) e2e       smart_answer_async عبر LLMClient مقابل الخادم البديل (llm_stub_server.py) على حمل
+               أسئلة متكررة (توزيع Zipf) مع صيغ مختلفة قليلاً (حالة أحرف، ترقيم، ترتيب كلمات):
+               بدون كاش / تطابق تام / تطابق تقريبي. لكل حالة: الزمن، عدد طلبات الـ LLM
+               الفعلية، ونسبة الإصابة لكل عامل.
+
+    python3 scripts/bench/bench_answer_cache.py [--requests 400] [--questions 40] [--latency-ms 300]
+"""
+import os
+import sys
+import asyncio
+import json
+import random
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import yaml
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.answer_cache import AnswerCache
+from scripts.bench.bench_backend_load import _free_port, latency_summary
+from scripts.bench.bench_llm_client import start_stub, stub_stats
+
+TOPICS = [
+    "python error handling", "traceback في الكود", "REST API design", "نظام قاعدة بيانات",
+    "تعلم FastAPI", "async python", "SQL joins", "docker deployment", "unit tests", "git branching",
+]
+TEMPLATES = [
+    "كيف أتعلم {t} خطوة بخطوة",
+    "how do I fix a bug in {t}",
+    "اشرح لي {t} للمبتدئين",
+    "what is the best architecture for {t} system",
+    "ابحث عن معلومات حول {t}",
+]
+
+
+def make_questions(n: int) -> List[str]:
+    out = []
+    for i in range(n):
+        out.append(TEMPLATES[i % len(TEMPLATES)].format(t=TOPICS[(i // len(TEMPLATES)) % len(TOPICS)]) + f" {i}")
+    return out
+
+
+def variant(question: str, rnd: random.Random) -> str:
+    """صيغة أخرى لنفس السؤال: حالة الأحرف، علامة استفهام، أو تبديل كلمتين متجاورتين."""
+    words = question.split()
+    r = rnd.random()
+    if r < 0.5:
+        return question
+    if r < 0.7:
+        return question.upper() + " ؟"
+    if r < 0.85:
+        return question + "?"
+    i = rnd.randrange(len(words) - 1)
+    words[i], words[i + 1] = words[i + 1], words[i]
+    return " ".join(words)
+
+
+def workload(n: int, questions: List[str], seed: int = 0) -> List[str]:
+    rnd = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(len(questions))]
+    return [variant(q, rnd) for q in rnd.choices(questions, weights=weights, k=n)]
+
+
+def micro(tmp: str, n: int) -> Dict[str, Any]:
+    cache = AnswerCache(os.path.join(tmp, "micro.sqlite3"), near_threshold=0.8)
+    chunks = [f"chunk_{i}.txt#abc" for i in range(5)]
+    answer = "إجابة " * 200
+    t0 = time.perf_counter()
+    for i in range(n):
+        cache.put("debug_expert", f"how do i fix error number {i}", chunks, "v1", answer)
+    put_us = (time.perf_counter() - t0) / n * 1e6
+
+    def timed(fn: Any, count: int) -> float:
+        t = time.perf_counter()
+        for i in range(count):
+            fn(i)
+        return round((time.perf_counter() - t) / count * 1e6, 1)
+
+    out = {
+        "put_us": round(put_us, 1),
+        "get_exact_us": timed(lambda i: cache.get("debug_expert", f"how do i fix error number {i}", chunks, "v1"), n),
+        "get_near_us": timed(lambda i: cache.get("debug_expert", f"how do i fix error number {i} please", chunks, "v1"), n),
+        "get_miss_us": timed(lambda i: cache.get("debug_expert", f"unrelated {i}", chunks, "v2"), n),
+    }
+    cache.flush()
+    out["stats"] = {k: v for k, v in cache.stats().items() if k != "agents"}
+
+    small = AnswerCache(os.path.join(tmp, "evict.sqlite3"), max_bytes=256 * 1024)
+    for i in range(n):
+        small.put("debug_expert", f"question {i}", chunks, "v1", answer)
+    st = small.stats()
+    out["eviction"] = {"puts": n, "entries": st["entries"], "bytes": st["bytes"], "max_bytes": st["max_bytes"], "evictions": st["evictions"]}
+    return out
+
+
+async def e2e(orch: Any, messages: List[str], concurrency: int) -> Dict[str, Any]:
+    lat: List[float] = []
+    kinds: Dict[str, int] = {}
+    queue = iter(messages)
+
+    async def worker() -> None:
+        for msg in queue:
+            t = time.perf_counter()
+            r = await orch.smart_answer_async("bench_user", msg)
+            lat.append(time.perf_counter() - t)
+            kind = r["analysis"].get("answer_cache", "off")
+            kinds[kind] = kinds.get(kind, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - t0
+    return {"elapsed_s": round(elapsed, 2), "latency": latency_summary(lat), "answer_cache": kinds}
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--requests", type=int, default=400)
+    p.add_argument("--questions", type=int, default=40)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--latency-ms", type=float, default=300.0)
+    p.add_argument("--near", type=float, default=0.8)
+    p.add_argument("--micro-n", type=int, default=2000)
+    p.add_argument("--out", help="حفظ النتائج كـ JSON")
+    a = p.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="hf_answer_cache_")
+    results: Dict[str, Any] = {"config": vars(a), "micro": micro(tmp, a.micro_n)}
+
+    port = _free_port()
+    stub = start_stub(port, a.latency_ms)
+    try:
+        with open(os.path.join(ROOT_DIR, "config", "orchestrator.yaml"), "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f) or {}
+        cfg["llm"] = {**(cfg.get("llm") or {}), "provider": "openai", "base_url": f"http://127.0.0.1:{port}/v1", "model": "stub"}
+        # الكاش يُنشأ أدناه لكل حالة في المجلد المؤقت، لا في ai/datasets
+        cfg["answer_cache"] = {"enabled": False}
+        cfg_path = os.path.join(tmp, "orchestrator.yaml")
+        with open(cfg_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(cfg, f, allow_unicode=True)
+        # CONFIG_PATH يُقرأ عند الاستيراد
+        os.environ["ORCHESTRATOR_CONFIG"] = cfg_path
+        from scripts.ai.llm.llm_orchestrator import LLMOrchestrator
+
+        orch = LLMOrchestrator()
+        orch.warm_up(spawn_pools=False)
+        messages = workload(a.requests, make_questions(a.questions))
+        results["workload"] = {"requests": len(messages), "distinct_texts": len(set(messages))}
+        for name, near in (("no_cache", None), ("exact", 0.0), ("near", a.near)):
+            orch.answers = None if near is None else AnswerCache(os.path.join(tmp, f"{name}.sqlite3"), near_threshold=near)
+            stub_stats(port, reset=True)
+            r = asyncio.run(e2e(orch, messages, a.concurrency))
+            r["llm_calls"] = stub_stats(port, reset=True)["requests"]
+            if orch.answers is not None:
+                st = orch.answers.stats()
+                r["hit_rate"] = st["hit_rate"]
+                r["agents"] = {agent: s["hit_rate"] for agent, s in st["agents"].items()}
+            results[name] = r
+    finally:
+        stub.terminate()
+        stub.wait(30)
+
+    m = results["micro"]
+    print(f"micro     put={m['put_us']}µs get exact={m['get_exact_us']}µs near={m['get_near_us']}µs miss={m['get_miss_us']}µs"
+          f" eviction={m['eviction']}")
+    for name in ("no_cache", "exact", "near"):
+        r = results[name]
+        print(f"{name:<9} elapsed={r['elapsed_s']}s p50={r['latency']['p50_ms']}ms p99={r['latency']['p99_ms']}ms"
+              f" llm_calls={r['llm_calls']} hit_rate={r.get('hit_rate', '-')} agents={r.get('agents', {})}")
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+اختبار حمل لـ backend_coach: إشباع /api/orchestrator/analyze بطلبات متزامنة
+مع قياس زمن /api/health (p50/p95/p99) قبل الحمل وأثناءه.
+إذا بقي p99 لـ health ثابتاً تقريباً فالـ event loop غير محجوز بعمل RAG.
+
+    python3 scripts/bench/bench_backend_load.py [--docs 20000] [--concurrency 32] \
+        [--duration 10] [--cpu-workers 0,4] [--url http://127.0.0.1:9090]
+
+بدون --url يُنشأ corpus اصطناعي مؤقت ويُشغَّل الخادم (uvicorn) لكل قيمة في --cpu-workers
+(0 = التقييم في thread pool، N>0 = process pool بـ N عمليات).
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import http.client
+from typing import Any, Dict, List
+from urllib.parse import quote, urlparse
+
+import yaml
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.rag_engine import build_index
+
+CONFIG_PATH = os.path.join(ROOT_DIR, "config", "orchestrator.yaml")
+APP_DIR = os.path.join(ROOT_DIR, "apps", "backend_coach")
+
+VOCAB = (
+    "python error bug exception traceback system architecture api design data search "
+    "function loop class module import file read write list dict string number http server "
+    "database query index cache thread process async request response json yaml config "
+    "خطأ تصميم نظام تعلم شرح بحث معلومات بيانات ملف دالة قائمة مكتبة خادم طلب استجابة"
+).split()
+
+
+def make_corpus(path: str, n_docs: int, rnd: random.Random) -> None:
+    os.makedirs(path, exist_ok=True)
+    for i in range(n_docs):
+        words = [rnd.choice(VOCAB) for _ in range(rnd.randint(80, 240))]
+        with open(os.path.join(path, f"doc_{i:06d}.txt"), "w", encoding="utf-8") as f:
+            f.write(" ".join(words))
+
+
+def make_messages(n: int, rnd: random.Random) -> List[str]:
+    return [" ".join(rnd.choice(VOCAB) for _ in range(rnd.randint(4, 12))) for _ in range(n)]
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(p / 100.0 * (len(values) - 1)))))
+    return values[k]
+
+
+def latency_summary(values: List[float]) -> Dict[str, Any]:
+    ms = [v * 1000.0 for v in values]
+    return {
+        "count": len(ms),
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "max_ms": round(max(ms), 2) if ms else 0.0,
+    }
+
+
+def _get(conn: http.client.HTTPConnection, path: str) -> int:
+    conn.request("GET", path)
+    resp = conn.getresponse()
+    resp.read()
+    return resp.status
+
+
+def probe_health(host: str, port: int, stop: threading.Event, interval: float) -> List[float]:
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    out: List[float] = []
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        _get(conn, "/api/health")
+        out.append(time.perf_counter() - t0)
+        stop.wait(interval)
+    conn.close()
+    return out
+
+
+def load_worker(
+    host: str, port: int, messages: List[str], stop: threading.Event,
+    latencies: List[float], errors: List[int],
+) -> None:
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    i = 0
+    while not stop.is_set():
+        msg = messages[i % len(messages)]
+        i += 1
+        t0 = time.perf_counter()
+        try:
+            status = _get(conn, f"/api/orchestrator/analyze?user_id=bench&message={quote(msg)}")
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=60)
+            status = 0
+        latencies.append(time.perf_counter() - t0)
+        if status != 200:
+            errors.append(status)
+    conn.close()
+
+
+def run_phase(
+    host: str, port: int, messages: List[str], concurrency: int,
+    duration: float, probe_interval: float,
+) -> Dict[str, Any]:
+    stop = threading.Event()
+    latencies: List[float] = []
+    errors: List[int] = []
+    workers = [
+        threading.Thread(target=load_worker, args=(host, port, messages, stop, latencies, errors))
+        for _ in range(concurrency)
+    ]
+    for t in workers:
+        t.start()
+    health: List[float] = []
+    prober = threading.Thread(
+        target=lambda: health.extend(probe_health(host, port, stop, probe_interval))
+    )
+    prober.start()
+    time.sleep(duration)
+    stop.set()
+    prober.join()
+    for t in workers:
+        t.join()
+    return {
+        "health": latency_summary(health),
+        "analyze": latency_summary(latencies),
+        "analyze_rps": round(len(latencies) / duration, 1),
+        "analyze_errors": len(errors),
+    }
+
+
+def idle_health(host: str, port: int, duration: float, probe_interval: float) -> Dict[str, Any]:
+    stop = threading.Event()
+    timer = threading.Timer(duration, stop.set)
+    timer.start()
+    return latency_summary(probe_health(host, port, stop, probe_interval))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(config_path: str, cpu_workers: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["ORCHESTRATOR_CONFIG"] = config_path
+    env["FACTORY_CPU_WORKERS"] = str(cpu_workers)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", APP_DIR,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            if _get(conn, "/api/health") == 200:
+                conn.close()
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("backend_coach did not start")
+
+
+def bench_target(
+    host: str, port: int, messages: List[str], args: Any
+) -> Dict[str, Any]:
+    # إحماء: تحميل الفهرس في كل عامل قبل القياس
+    conn = http.client.HTTPConnection(host, port, timeout=120)
+    for msg in messages[: max(8, args.concurrency)]:
+        _get(conn, f"/api/orchestrator/analyze?user_id=bench&message={quote(msg)}")
+    conn.close()
+    idle = idle_health(host, port, args.idle, args.probe_interval)
+    loaded = run_phase(host, port, messages, args.concurrency, args.duration, args.probe_interval)
+    return {"idle_health": idle, **loaded}
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--url", help="خادم قائم بدلاً من تشغيل خادم مؤقت")
+    p.add_argument("--docs", type=int, default=20000)
+    p.add_argument("--messages", type=int, default=500)
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--duration", type=float, default=10.0)
+    p.add_argument("--idle", type=float, default=3.0)
+    p.add_argument("--probe-interval", type=float, default=0.01)
+    p.add_argument("--cpu-workers", default="0,4", help="قيم FACTORY_CPU_WORKERS مفصولة بفواصل")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--out", help="حفظ النتائج كـ JSON")
+    a = p.parse_args()
+
+    rnd = random.Random(a.seed)
+    messages = make_messages(a.messages, rnd)
+    results: Dict[str, Any] = {"concurrency": a.concurrency, "duration_s": a.duration, "runs": {}}
+
+    if a.url:
+        u = urlparse(a.url)
+        results["runs"][a.url] = bench_target(u.hostname or "127.0.0.1", u.port or 80, messages, a)
+    else:
+        tmp = tempfile.mkdtemp(prefix="hf_bench_load_")
+        try:
+            knowledge_dir = os.path.join(tmp, "knowledge_chunks")
+            make_corpus(knowledge_dir, a.docs, rnd)
+            build_index(knowledge_dir)
+            with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+                cfg = yaml.safe_load(f) or {}
+            cfg.setdefault("rag", {})["index_path"] = knowledge_dir
+            config_path = os.path.join(tmp, "orchestrator.yaml")
+            with open(config_path, "w", encoding="utf-8") as f:
+                yaml.safe_dump(cfg, f, allow_unicode=True)
+            results["docs"] = a.docs
+            for workers in [int(x) for x in a.cpu_workers.split(",") if x.strip()]:
+                port = _free_port()
+                proc = start_server(config_path, workers, port)
+                try:
+                    results["runs"][f"cpu_workers={workers}"] = bench_target("127.0.0.1", port, messages, a)
+                finally:
+                    proc.terminate()
+                    proc.wait(10)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"{'run':<16} {'health idle p99':>16} {'health load p50':>16} {'health load p99':>16} {'analyze rps':>12} {'analyze p99':>12}")
+    for name, r in results["runs"].items():
+        print(
+            f"{name:<16} {r['idle_health']['p99_ms']:>14.2f}ms {r['health']['p50_ms']:>14.2f}ms "
+            f"{r['health']['p99_ms']:>14.2f}ms {r['analyze_rps']:>12.1f} {r['analyze']['p99_ms']:>10.2f}ms"
+        )
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
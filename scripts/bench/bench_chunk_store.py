@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+قياس مخزن الـ segment (scripts/ai/chunk_store.py) مقابل ملف لكل chunk:
+  1) قراءة كل النصوص: open() لكل ملف مقابل شرائح mmap
+  2) جلب معاينات top_k: open()+read لكل نتيجة مقابل preview() من الـ mmap
+  3) حجم وزمن تحميل فهرس BM25: مع المعاينات داخل JSON (الصيغة السابقة) مقابل الأطوال فقط
+  4) عدد استدعاءات open() أثناء search_knowledge (يجب أن يكون 0 بعد التحميل)
+نصف الـ corpus بأسماء العنكبوت بدون امتداد (<md5>_chunk_NN) كما في knowledge_chunks.
+
+    python3 scripts/bench/bench_chunk_store.py [--docs 20000] [--queries 300] [--top-k 5]
+"""
+import os
+import sys
+import io
+import json
+import builtins
+import random
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.chunk_store import PREVIEW_CHARS, build_store, iter_chunk_files, open_store
+from scripts.ai.rag_engine import build_index, default_index_path, search_knowledge
+from scripts.bench.bench_backend_load import VOCAB, latency_summary
+
+
+def make_chunks(path: str, n_docs: int, rnd: random.Random) -> None:
+    os.makedirs(path, exist_ok=True)
+    for i in range(n_docs):
+        words = [rnd.choice(VOCAB) for _ in range(rnd.randint(80, 240))]
+        name = f"{i:032x}_chunk_00" if i % 2 else f"doc_{i:06d}.txt"
+        with open(os.path.join(path, name), "w", encoding="utf-8") as f:
+            f.write(" ".join(words))
+
+
+def count_opens(fn) -> int:
+    calls = [0]
+    orig_open, orig_io_open = builtins.open, io.open
+
+    def spy(*args, **kwargs):
+        calls[0] += 1
+        return orig_open(*args, **kwargs)
+
+    builtins.open = io.open = spy
+    try:
+        fn()
+    finally:
+        builtins.open, io.open = orig_open, orig_io_open
+    return calls[0]
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--docs", type=int, default=20000)
+    p.add_argument("--queries", type=int, default=300)
+    p.add_argument("--top-k", type=int, default=5)
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--out", help="حفظ النتائج كـ JSON")
+    a = p.parse_args()
+
+    rnd = random.Random(a.seed)
+    tmp = tempfile.mkdtemp(prefix="hf_bench_store_")
+    results: Dict[str, Any] = {"docs": a.docs, "top_k": a.top_k}
+    try:
+        kdir = os.path.join(tmp, "knowledge_chunks")
+        make_chunks(kdir, a.docs, rnd)
+        paths = list(iter_chunk_files(kdir))
+
+        t0 = time.perf_counter()
+        table = build_store(kdir)
+        results["convert_s"] = round(time.perf_counter() - t0, 3)
+        store = open_store(kdir)
+        results["segment_bytes"] = os.path.getsize(store.path)
+        results["table_chunks"] = len(table["entries"])
+
+        # 1) قراءة كل النصوص
+        t0 = time.perf_counter()
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                f.read()
+        files_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in store.iter_texts():
+            pass
+        mmap_s = time.perf_counter() - t0
+        results["read_all"] = {"files_ms": round(files_s * 1000, 2), "mmap_ms": round(mmap_s * 1000, 2)}
+
+        # 2) جلب معاينات top_k
+        picks = [[rnd.randrange(len(store)) for _ in range(a.top_k)] for _ in range(a.queries)]
+        file_lat: List[float] = []
+        mmap_lat: List[float] = []
+        for ids in picks:
+            t = time.perf_counter()
+            for i in ids:
+                with open(store.path_of(i), "r", encoding="utf-8") as f:
+                    f.read()[:PREVIEW_CHARS]
+            file_lat.append(time.perf_counter() - t)
+            t = time.perf_counter()
+            for i in ids:
+                store.preview(i)
+            mmap_lat.append(time.perf_counter() - t)
+        results["previews"] = {"files": latency_summary(file_lat), "mmap": latency_summary(mmap_lat)}
+
+        # 3) فهرس BM25 بالصيغة الحالية مقابل المعاينات داخل JSON
+        build_index(kdir)
+        index_path = default_index_path(kdir)
+        with open(index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        legacy_path = index_path + ".legacy"
+        for i, doc in enumerate(data["docs"]):
+            doc["path"] = store.path_of(i)
+            doc["preview"] = store.preview(i)
+        with open(legacy_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        index_stats: Dict[str, Any] = {}
+        for label, path in (("legacy_previews", legacy_path), ("lengths_only", index_path)):
+            t0 = time.perf_counter()
+            with open(path, "r", encoding="utf-8") as f:
+                json.load(f)
+            index_stats[label] = {
+                "bytes": os.path.getsize(path),
+                "load_ms": round((time.perf_counter() - t0) * 1000, 2),
+            }
+        results["bm25_index"] = index_stats
+
+        # 4) open() لكل استعلام
+        queries = [" ".join(rnd.sample(VOCAB, 3)) for _ in range(a.queries)]
+        search_knowledge(queries[0], a.top_k, kdir)
+        lat: List[float] = []
+
+        def run() -> None:
+            for q in queries:
+                t = time.perf_counter()
+                search_knowledge(q, a.top_k, kdir)
+                lat.append(time.perf_counter() - t)
+
+        opens = count_opens(run)
+        results["search"] = {
+            "latency": latency_summary(lat),
+            "open_calls_per_query": round(opens / float(len(queries)), 3),
+            "open_calls_per_query_legacy_scan": len(paths),
+        }
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+مقارنة التقسيم القديم مع scripts/ai/chunker.py على البيانات الحالية:
+  قبل: صفحات الويب split -l 100 (بدون حذف nav/footer)، PDF نوافذ 1000 كلمة بتداخل 100
+  بعد: حدود الفقرات/العناوين بحد tokens + إسقاط شبه المكرر (SimHash)
+المصادر: raw_content/*/*.html ، نص ملفات ai/pdfs (يُستخرج في مجلد مؤقت)، وملفات knowledge_chunks/*.txt اليدوية.
+كل chunk يُكتب بامتداد .txt في المجلدين المؤقتين ليفهرسه BM25 في الحالتين.
+
+    python3 scripts/bench/bench_chunker.py [--max-tokens 200,300,500] [--queries 200] [--repeat 5]
+        [--no-pdf | --pdf-text-dir ai/datasets/pdf_text] [--out report.json]
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+import time
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.chunker import MAX_TOKENS, NearDuplicateIndex, count_tokens, iter_blocks, iter_chunks, write_chunks
+from scripts.ai.knowledge_spider import html_to_text
+from scripts.ai.rag_engine import _tokenize, build_index, search_knowledge
+from scripts.bench.bench_backend_load import latency_summary, percentile
+
+DATASETS_DIR = os.path.join(ROOT_DIR, "ai", "datasets")
+PDF_DIR = os.path.join(ROOT_DIR, "ai", "pdfs")
+
+FIXED_QUERIES = [
+    "python list comprehension",
+    "how to define a function in python",
+    "fastapi dependency injection",
+    "django models and migrations",
+    "http request response",
+    "كيف أكتب دالة في بايثون",
+    "أخطاء البرمجة وتصحيحها",
+    "الذكاء الاصطناعي",
+]
+
+_LEGACY_SKIP = {"script", "style", "noscript", "template", "svg", "head"}
+_LEGACY_BLOCK = {
+    "p", "div", "section", "article", "main", "header", "footer", "nav", "aside",
+    "br", "hr", "li", "ul", "ol", "dl", "dt", "dd", "table", "tr", "td", "th",
+    "pre", "blockquote", "h1", "h2", "h3", "h4", "h5", "h6", "title",
+}
+
+
+class _LegacyExtractor(HTMLParser):
+    # استخراج النص كما كان قبل chunker: سطر لكل وسم كتلي، قوائم التنقل ضمن النص
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag: str, attrs: Any) -> None:
+        if tag in _LEGACY_SKIP:
+            self._skip += 1
+        if tag in _LEGACY_BLOCK:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in _LEGACY_SKIP and self._skip:
+            self._skip -= 1
+        if tag in _LEGACY_BLOCK:
+            self.parts.append("\n")
+
+    def handle_data(self, data: str) -> None:
+        if not self._skip:
+            self.parts.append(data)
+
+
+def legacy_lines(raw: bytes) -> List[str]:
+    parser = _LegacyExtractor()
+    parser.feed(raw.decode("utf-8", errors="replace"))
+    parser.close()
+    return [line for line in (" ".join(x.split()) for x in "".join(parser.parts).splitlines()) if line]
+
+
+def legacy_word_windows(text: str, size: int = 1000, overlap: int = 100) -> List[str]:
+    words = text.split()
+    out = []
+    for start in range(0, max(len(words), 1), size - overlap):
+        chunk = " ".join(words[start:start + size])
+        if len(chunk.strip()) > 50:
+            out.append(chunk)
+        if start + size >= len(words):
+            break
+    return out
+
+
+def load_sources(
+    datasets_dir: str,
+    pdf_dir: Optional[str],
+    pdf_text_dir: Optional[str],
+    tmp: str,
+) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    web: List[Dict[str, Any]] = []
+    raw_root = os.path.join(datasets_dir, "raw_content")
+    for domain in sorted(os.listdir(raw_root)) if os.path.isdir(raw_root) else []:
+        for fname in sorted(os.listdir(os.path.join(raw_root, domain))):
+            if not fname.endswith(".html"):
+                continue
+            with open(os.path.join(raw_root, domain, fname), "rb") as f:
+                web.append({"key": fname[:-5], "domain": domain, "raw": f.read()})
+
+    pdf_texts: Dict[str, str] = {}
+    text_dir = pdf_text_dir
+    if text_dir is None and pdf_dir and os.path.isdir(pdf_dir):
+        from scripts.ai.pdf_processor.pdf_ingest import ingest
+
+        work = os.path.join(tmp, "pdf_work")
+        text_dir = os.path.join(work, "pdf_text")
+        ingest(
+            pdf_dir=pdf_dir,
+            text_dir=text_dir,
+            cleaned_dir=os.path.join(work, "cleaned_content"),
+            knowledge_dir=os.path.join(work, "knowledge_chunks"),
+            state_path=os.path.join(work, "state.json"),
+        )
+    if text_dir and os.path.isdir(text_dir):
+        for fname in sorted(os.listdir(text_dir)):
+            if fname.endswith(".txt"):
+                with open(os.path.join(text_dir, fname), "r", encoding="utf-8") as f:
+                    pdf_texts[fname[:-4]] = f.read()
+    return web, pdf_texts
+
+
+def _header(doc: Dict[str, Any]) -> List[str]:
+    return [f"🔗 المصدر: https://{doc['domain']}/", "=========================================="]
+
+
+def build_before(web: List[Dict[str, Any]], pdf_texts: Dict[str, str], manual: Dict[str, str], out_dir: str) -> Dict[str, int]:
+    os.makedirs(out_dir, exist_ok=True)
+    chunks: Dict[str, str] = dict(manual)
+    for doc in web:
+        lines = _header(doc) + legacy_lines(doc["raw"])
+        for n, i in enumerate(range(0, len(lines), 100)):
+            chunks[f"{doc['key']}_chunk_{n:02d}.txt"] = "\n".join(lines[i:i + 100]) + "\n"
+    for base, text in pdf_texts.items():
+        for n, chunk in enumerate(legacy_word_windows(text)):
+            chunks[f"{base}_pdf_chunk_{n:03d}.txt"] = chunk
+    for name, text in chunks.items():
+        with open(os.path.join(out_dir, name), "w", encoding="utf-8") as f:
+            f.write(text)
+    return {"dropped": 0}
+
+
+def build_after(
+    web: List[Dict[str, Any]],
+    pdf_texts: Dict[str, str],
+    manual: Dict[str, str],
+    out_dir: str,
+    max_tokens: int,
+) -> Dict[str, int]:
+    os.makedirs(out_dir, exist_ok=True)
+    for name, text in manual.items():
+        with open(os.path.join(out_dir, name), "w", encoding="utf-8") as f:
+            f.write(text)
+    dedupe = NearDuplicateIndex.load("", out_dir)
+    dropped = 0
+    for doc in web:
+        extracted = html_to_text(doc["raw"])
+        lines = _header(doc) + [extracted["title"], ""] + extracted["text"].splitlines()
+        prefix = f"{doc['key']}_chunk_"
+        dropped += write_chunks(iter_chunks(iter_blocks(lines), max_tokens), out_dir, prefix, prefix + "{:02d}.txt", dedupe)["dropped"]
+    for base, text in pdf_texts.items():
+        prefix = f"{base}_pdf_chunk_"
+        dropped += write_chunks(
+            iter_chunks(iter_blocks(text.splitlines()), max_tokens), out_dir, prefix, prefix + "{:03d}.txt", dedupe
+        )["dropped"]
+    return {"dropped": dropped}
+
+
+def corpus_stats(knowledge_dir: str) -> Dict[str, Any]:
+    sizes: List[int] = []
+    tokens: List[int] = []
+    for fname in os.listdir(knowledge_dir):
+        with open(os.path.join(knowledge_dir, fname), "r", encoding="utf-8") as f:
+            text = f.read()
+        sizes.append(len(text.encode("utf-8")))
+        tokens.append(count_tokens(text))
+    n = len(tokens)
+    mean = sum(tokens) / float(n) if n else 0.0
+    std = (sum((t - mean) ** 2 for t in tokens) / float(n)) ** 0.5 if n else 0.0
+    return {
+        "chunks": n,
+        "bytes": sum(sizes),
+        "tokens": sum(tokens),
+        "chunk_tokens_mean": round(mean, 1),
+        "chunk_tokens_p50": percentile([float(t) for t in tokens], 50),
+        "chunk_tokens_p95": percentile([float(t) for t in tokens], 95),
+        "chunk_tokens_max": max(tokens) if tokens else 0,
+        "chunk_tokens_cv": round(std / mean, 3) if mean else 0.0,
+    }
+
+
+def make_queries(knowledge_dir: str, n: int, rnd: random.Random) -> List[str]:
+    vocab: List[str] = []
+    for fname in sorted(os.listdir(knowledge_dir)):
+        with open(os.path.join(knowledge_dir, fname), "r", encoding="utf-8") as f:
+            vocab.extend(t for t in _tokenize(f.read()) if len(t) > 3)
+    queries = list(FIXED_QUERIES)
+    while vocab and len(queries) < n:
+        queries.append(" ".join(rnd.choice(vocab) for _ in range(rnd.randint(2, 6))))
+    return queries[:n]
+
+
+def measure_queries(knowledge_dir: str, queries: List[str], repeat: int) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    build_index(knowledge_dir)
+    build_s = time.perf_counter() - t0
+    search_knowledge("warmup", knowledge_dir=knowledge_dir)
+    latencies: List[float] = []
+    preview_bytes = 0
+    for _ in range(repeat):
+        for q in queries:
+            t = time.perf_counter()
+            hits = search_knowledge(q, top_k=5, knowledge_dir=knowledge_dir)
+            latencies.append(time.perf_counter() - t)
+            preview_bytes += sum(len(h["preview"].encode("utf-8")) for h in hits)
+    return {
+        "index_build_s": round(build_s, 4),
+        "query": latency_summary(latencies),
+        "query_mean_ms": round(sum(latencies) / len(latencies) * 1000.0, 3) if latencies else 0.0,
+        "preview_bytes_per_query": round(preview_bytes / float(len(latencies)), 1) if latencies else 0.0,
+    }
+
+
+def _reduction(before: float, after: float) -> Optional[float]:
+    return round(100.0 * (before - after) / before, 1) if before else None
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--datasets-dir", default=DATASETS_DIR)
+    p.add_argument("--pdf-dir", default=PDF_DIR)
+    p.add_argument("--no-pdf", action="store_true", help="تخطي استخراج ملفات PDF")
+    p.add_argument("--pdf-text-dir", help="نص PDF مستخرج مسبقاً (بدل استخراج --pdf-dir)")
+    p.add_argument("--max-tokens", default=str(MAX_TOKENS), help="حدود chunk للمقارنة، مفصولة بفواصل")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--out", help="حفظ التقرير كـ JSON")
+    a = p.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="hf_bench_chunker_")
+    try:
+        web, pdf_texts = load_sources(
+            a.datasets_dir, None if a.no_pdf else a.pdf_dir, None if a.no_pdf else a.pdf_text_dir, tmp
+        )
+        manual: Dict[str, str] = {}
+        kdir = os.path.join(a.datasets_dir, "knowledge_chunks")
+        for fname in sorted(os.listdir(kdir)) if os.path.isdir(kdir) else []:
+            # ملفات المعرفة المكتوبة يدوياً (ليست ناتج تقسيم)
+            if fname.endswith(".txt") and "_chunk_" not in fname:
+                with open(os.path.join(kdir, fname), "r", encoding="utf-8") as f:
+                    manual[fname] = f.read()
+
+        before_dir = os.path.join(tmp, "before", "knowledge_chunks")
+        build_before(web, pdf_texts, manual, before_dir)
+        queries = make_queries(before_dir, a.queries, random.Random(a.seed))
+        report: Dict[str, Any] = {
+            "sources": {"web_pages": len(web), "pdfs": len(pdf_texts), "manual": len(manual)},
+            "queries": len(queries),
+            "repeat": a.repeat,
+            "before": corpus_stats(before_dir),
+            "after": {},
+        }
+        report["before"].update(measure_queries(before_dir, queries, a.repeat))
+        for max_tokens in (int(x) for x in a.max_tokens.split(",")):
+            after_dir = os.path.join(tmp, f"after_{max_tokens}", "knowledge_chunks")
+            built = build_after(web, pdf_texts, manual, after_dir, max_tokens)
+            r = corpus_stats(after_dir)
+            r.update(measure_queries(after_dir, queries, a.repeat))
+            r["duplicates_dropped"] = built["dropped"]
+            r["reduction_pct"] = {
+                key: _reduction(report["before"][key], r[key])
+                for key in ("bytes", "tokens", "query_mean_ms", "preview_bytes_per_query")
+            }
+            report["after"][str(max_tokens)] = r
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    rows = [("before", report["before"])] + [(f"after@{k}", r) for k, r in report["after"].items()]
+    for name, r in rows:
+        print(
+            f"{name:<10} chunks={r['chunks']:>5} bytes={r['bytes']:>9} tokens={r['tokens']:>8} "
+            f"tokens/chunk p50={r['chunk_tokens_p50']:.0f} p95={r['chunk_tokens_p95']:.0f} max={r['chunk_tokens_max']} "
+            f"cv={r['chunk_tokens_cv']}  query mean={r['query_mean_ms']:.3f}ms p95={r['query']['p95_ms']}ms "
+            f"preview={r['preview_bytes_per_query']:.0f}B/q"
+        )
+    for k, r in report["after"].items():
+        print(f"after@{k}: dropped={r['duplicates_dropped']} reduction %: " + json.dumps(r["reduction_pct"]))
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
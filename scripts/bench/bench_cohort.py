@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+قياس تحليلات المهارات الجماعية (scripts/ai/skills_cohort.py) على مجتمع اصطناعي:
+  1) زمن الاستعلام على اللقطة (--users، افتراضياً 100k): مهارة واحدة في مسار، كل مهارات
+     المسار مع تقدّم المراحل، وكل المهارات بدون مسار
+  2) كلفة upsert واحد (تحديث تدريجي مع كل كتابة) والبناء الكامل من SQLite
+  3) خط الأساس اليوم: فتح كل ملف JSON في user_skills وحساب توزيع مهارة واحدة (--json-users)،
+     مقابل اللقطة، و changed_since (فحص mtime) على نفس المجلد
+الدرجات تتقدم مع مرحلة المستخدم (مرحلة مبكرة = درجات أعلى) ليبدو التوزيع واقعياً.
+
+    python3 scripts/bench/bench_cohort.py [--users 100000] [--json-users 10000] [--repeat 20]
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.skills_cohort import LEVELS, CohortSnapshot, load_tracks
+from scripts.ai.skills_store import JsonSkillsStore, SqliteSkillsStore
+from scripts.bench.bench_backend_load import latency_summary
+
+TRACK = "backend_junior"
+SKILL = "python_control_flow"
+
+
+def make_states(n: int, tracks: Dict[str, Dict[str, Any]], rnd: random.Random) -> List[Dict[str, Any]]:
+    phases = tracks[TRACK]["phases"]
+    extra = ["web_http_fundamentals", "rest_api_concepts", "db_modeling_basic", "python_errors_handling"]
+    states = []
+    for i in range(n):
+        reached = rnd.randint(0, len(phases) - 1)
+        skills: Dict[str, int] = {}
+        for p, phase in enumerate(phases[: reached + 1]):
+            for skill_id in phase["skills"]:
+                skills[skill_id] = min(100, max(0, int(rnd.gauss(80 - 30 * (reached - p == 0), 15))))
+        for skill_id in rnd.sample(extra, rnd.randint(0, 2)):
+            skills[skill_id] = rnd.randint(0, 60)
+        state: Dict[str, Any] = {"user_id": f"bench_u{i:06d}", "skills": skills, "level": rnd.choice(LEVELS)}
+        if i % 4:
+            state["track_id"] = TRACK
+        states.append(state)
+    return states
+
+
+def timed_ms(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    lat = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        lat.append(time.perf_counter() - t)
+    return latency_summary(lat)
+
+
+def naive_histogram(data_dir: str, skill_id: str) -> Dict[int, int]:
+    # ما يلزم اليوم: فتح كل ملف مستخدم
+    hist: Dict[int, int] = {}
+    for fname in os.listdir(data_dir):
+        if not fname.endswith(".json"):
+            continue
+        with open(os.path.join(data_dir, fname), "r", encoding="utf-8") as f:
+            score = json.load(f).get("skills", {}).get(skill_id)
+        if score is not None:
+            b = min(int(score) // 10, 9)
+            hist[b] = hist.get(b, 0) + 1
+    return hist
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--users", type=int, default=100000)
+    p.add_argument("--json-users", type=int, default=10000)
+    p.add_argument("--sqlite", action="store_true", help="قياس البناء الكامل من SQLite بنفس عدد المستخدمين")
+    p.add_argument("--repeat", type=int, default=20)
+    p.add_argument("--seed", type=int, default=3)
+    p.add_argument("--out", help="حفظ النتائج كـ JSON")
+    a = p.parse_args()
+
+    rnd = random.Random(a.seed)
+    tracks = load_tracks()
+    states = make_states(a.users, tracks, rnd)
+    results: Dict[str, Any] = {"users": a.users}
+
+    cohort = CohortSnapshot(tracks=tracks)
+    t0 = time.perf_counter()
+    cohort.upsert_many(states)
+    results["build_from_states_s"] = round(time.perf_counter() - t0, 3)
+    results["matrix_bytes"] = int(cohort.scores[: cohort.n].nbytes)
+    stats = lambda *args: cohort.stats(*args, refresh=False)  # noqa: E731
+    results["query_ms"] = {
+        "one_skill_in_track": timed_ms(lambda: stats(TRACK, [SKILL]), a.repeat),
+        "track_with_phases": timed_ms(lambda: stats(TRACK), a.repeat),
+        "all_skills": timed_ms(lambda: stats(None), a.repeat),
+    }
+    for name, r in results["query_ms"].items():
+        print(f"{name:<20} p50={r['p50_ms']:>8.3f}ms p99={r['p99_ms']:>8.3f}ms")
+    t0 = time.perf_counter()
+    for state in states[:2000]:
+        cohort.upsert(state)
+    results["upsert_us"] = round((time.perf_counter() - t0) * 1e6 / 2000, 2)
+    print(f"upsert: {results['upsert_us']}us")
+
+    tmp = tempfile.mkdtemp(prefix="hf_bench_cohort_")
+    try:
+        if a.sqlite:
+            store = SqliteSkillsStore(os.path.join(tmp, "user_skills.sqlite3"))
+            conn = store._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            for state in states:
+                store._write(conn, state, None)
+            conn.execute("COMMIT")
+            fresh = CohortSnapshot(store, tracks=tracks)
+            t0 = time.perf_counter()
+            fresh.refresh(force=True)
+            results["build_from_sqlite_s"] = round(time.perf_counter() - t0, 3)
+            print(f"build from sqlite: {results['build_from_sqlite_s']}s")
+            store.close()
+
+        if a.json_users:
+            data_dir = os.path.join(tmp, "user_skills")
+            json_store = JsonSkillsStore(data_dir)
+            for state in states[: a.json_users]:
+                json_store._save(state)
+            snapshot = CohortSnapshot(json_store, tracks=tracks)
+            t0 = time.perf_counter()
+            snapshot.refresh(force=True)
+            build_s = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            naive_histogram(data_dir, SKILL)
+            naive_s = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            changed = sum(1 for _ in json_store.changed_since(time.time()))
+            scan_s = time.perf_counter() - t0
+            query = timed_ms(lambda: snapshot.stats(None, [SKILL], refresh=False), a.repeat)
+            results["json_baseline"] = {
+                "users": a.json_users,
+                "naive_scan_ms": round(naive_s * 1000.0, 1),
+                "snapshot_build_ms": round(build_s * 1000.0, 1),
+                "snapshot_query_p50_ms": query["p50_ms"],
+                "changed_since_scan_ms": round(scan_s * 1000.0, 1),
+                "changed": changed,
+            }
+            r = results["json_baseline"]
+            print(
+                f"json x{a.json_users}: naive scan {r['naive_scan_ms']}ms vs snapshot query "
+                f"{r['snapshot_query_p50_ms']}ms (build {r['snapshot_build_ms']}ms, mtime scan {r['changed_since_scan_ms']}ms)"
+            )
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
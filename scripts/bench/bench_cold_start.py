@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+زمن الإقلاع البارد لـ backend_coach وزمن أول طلب:
+  - health_s: من تشغيل العملية حتى أول 200 من /api/health (المنفذ مفتوح)
+  - ready_s:  حتى أول 200 من /api/ready (بدون هذه النقطة في النسخة المقاسة = health_s)
+  - first_analyze_ms: أول /api/orchestrator/analyze بعد الجاهزية، مقابل p50 للطلبات التالية
+لكل نسخة: الشجرة الحالية مع الإحماء (FACTORY_WARMUP=1) وبدونه (=0)، واختيارياً
+--baseline-ref (git worktree مؤقت) للمقارنة قبل/بعد. كاش التحليل معطّل.
+
+    python3 scripts/bench/bench_cold_start.py [--docs 20000] [--runs 5] [--baseline-ref HEAD~1]
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import http.client
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+import yaml
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.rag_engine import build_index
+from scripts.bench.bench_backend_load import (
+    APP_DIR,
+    CONFIG_PATH,
+    _free_port,
+    _get,
+    latency_summary,
+    make_corpus,
+    make_messages,
+)
+
+
+def _wait_status(port: int, path: str, deadline: float) -> Optional[int]:
+    """ينتظر أول استجابة غير 503 ويعيد رمزها (None عند انتهاء المهلة)."""
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            status = _get(conn, path)
+            conn.close()
+            if status != 503:
+                return status
+        except OSError:
+            pass
+        time.sleep(0.005)
+    return None
+
+
+def cold_start(app_dir: str, config_path: str, warmup: bool, messages: List[str]) -> Dict[str, Any]:
+    port = _free_port()
+    env = dict(os.environ)
+    env["ORCHESTRATOR_CONFIG"] = config_path
+    env["FACTORY_WARMUP"] = "1" if warmup else "0"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", app_dir,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.time() + 120
+        if _wait_status(port, "/api/health", deadline) != 200:
+            raise RuntimeError("backend_coach did not start")
+        health_s = time.perf_counter() - t0
+        ready_status = _wait_status(port, "/api/ready", deadline)
+        ready_s = time.perf_counter() - t0 if ready_status == 200 else health_s
+
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        lat: List[float] = []
+        for msg in messages:
+            t = time.perf_counter()
+            if _get(conn, f"/api/orchestrator/analyze?user_id=bench&message={quote(msg)}") != 200:
+                raise RuntimeError("analyze failed")
+            lat.append(time.perf_counter() - t)
+        conn.close()
+        return {
+            "health_s": round(health_s, 3),
+            "ready_s": round(ready_s, 3),
+            "has_ready_endpoint": ready_status == 200,
+            "first_analyze_ms": round(lat[0] * 1000.0, 2),
+            "next_analyze": latency_summary(lat[1:]),
+        }
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def med(key: str) -> float:
+        values = sorted(r[key] for r in runs)
+        return values[len(values) // 2]
+
+    return {
+        "runs": len(runs),
+        "health_s": med("health_s"),
+        "ready_s": med("ready_s"),
+        "first_analyze_ms": med("first_analyze_ms"),
+        "next_analyze_p50_ms": sorted(r["next_analyze"]["p50_ms"] for r in runs)[len(runs) // 2],
+        "has_ready_endpoint": runs[0]["has_ready_endpoint"],
+    }
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--docs", type=int, default=20000)
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--requests", type=int, default=20, help="طلبات analyze بعد الجاهزية في كل تشغيل")
+    p.add_argument("--baseline-ref", help="git ref للمقارنة (يُفحص في worktree مؤقت)")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--out", help="حفظ النتائج كـ JSON")
+    a = p.parse_args()
+
+    rnd = random.Random(a.seed)
+    results: Dict[str, Any] = {"docs": a.docs, "variants": {}}
+    tmp = tempfile.mkdtemp(prefix="hf_bench_cold_")
+    worktree = os.path.join(tmp, "baseline")
+    try:
+        knowledge_dir = os.path.join(tmp, "knowledge_chunks")
+        make_corpus(knowledge_dir, a.docs, rnd)
+        build_index(knowledge_dir)
+        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f) or {}
+        cfg.setdefault("rag", {})["index_path"] = knowledge_dir
+        cfg.setdefault("cache", {})["enabled"] = False
+        config_path = os.path.join(tmp, "orchestrator.yaml")
+        with open(config_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(cfg, f, allow_unicode=True)
+
+        variants = [("current/warmup", APP_DIR, True), ("current/lazy", APP_DIR, False)]
+        if a.baseline_ref:
+            subprocess.run(
+                ["git", "-C", ROOT_DIR, "worktree", "add", "--detach", worktree, a.baseline_ref],
+                check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            variants.insert(0, (f"baseline/{a.baseline_ref}", os.path.join(worktree, "apps", "backend_coach"), True))
+
+        for name, app_dir, warmup in variants:
+            runs = [
+                cold_start(app_dir, config_path, warmup, make_messages(a.requests, rnd))
+                for _ in range(a.runs)
+            ]
+            results["variants"][name] = summarize(runs)
+            results["variants"][name]["all"] = runs
+    finally:
+        if a.baseline_ref and os.path.isdir(worktree):
+            subprocess.run(["git", "-C", ROOT_DIR, "worktree", "remove", "--force", worktree],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"{'variant':<24} {'health':>8} {'ready':>8} {'1st analyze':>12} {'next p50':>10}")
+    for name, r in results["variants"].items():
+        print(
+            f"{name:<24} {r['health_s']:>7.3f}s {r['ready_s']:>7.3f}s "
+            f"{r['first_analyze_ms']:>10.2f}ms {r['next_analyze_p50_ms']:>8.2f}ms"
+        )
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+قرارات/ثانية: خدمة القرارات (scripts/ai/decision_daemon.py) مقابل محرك الـ shell القديم
+(orchestrator_decision_engine.sh قبل الخدمة: `echo | grep -qiE` لكل قاعدة، و `tail | grep | wc`
+لكل تقييم جودة؛ مضمّن هنا كما كان ليبقى خط الأساس قابلاً للقياس):
+  1) legacy_shell_loop   دالة decide_agent القديمة في حلقة داخل bash واحد (كلفة الـ forks فقط)
+  2) legacy_cli          استدعاء السكريبت القديم لكل رسالة (كما يفعل `ffactory decide`)
+  3) daemon_socket       طلب decide لكل رسالة على اتصال Unix socket دائم
+  4) daemon_batch        طلبات batch (--chunk رسالة لكل طلب)
+  5) cli_batch           `decision_daemon.py batch < ملف` من البداية للنهاية (مع الخدمة)
+  6) cli_decide          عميل Python لكل رسالة (مع الخدمة)؛ محدود بزمن بدء المفسّر
+  7) cli_socat           سطر نصي عبر socat لكل رسالة (مسار orchestrator_decision_engine.sh)،
+                         فقط إن كان socat مثبتاً
+  + تقييمات الجودة: monitor_quality القديمة مقابل op=quality، ونسبة اتفاق القواعد القديمة مع
+    قواعد config/orchestrator.yaml (الانحراف الذي تزيله الخدمة)
+
+    python3 scripts/bench/bench_decisions.py [--messages 20000] [--shell-messages 300]
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Any, Dict, List
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.decision_daemon import DecisionClient, DecisionService, start
+from scripts.bench.bench_backend_load import latency_summary
+
+DAEMON = os.path.join(ROOT_DIR, "scripts", "ai", "decision_daemon.py")
+
+# orchestrator_decision_engine.sh كما كان قبل خدمة القرارات
+LEGACY_ENGINE = r'''#!/bin/bash
+set -e
+LOGS_DIR="${LEGACY_LOGS_DIR:?}"
+mkdir -p "$LOGS_DIR/orchestrator"
+
+log() {
+    echo "$(date +'%Y-%m-%d %H:%M:%S') - $1" >> "$LOGS_DIR/orchestrator/decisions.log"
+    echo "$1"
+}
+
+decide_agent() {
+    local message="$1"
+    local user_id="$2"
+    log "🧠 المدير يحلل الرسالة من $user_id: '$message'"
+    if echo "$message" | grep -qiE "(error|خطأ|traceback|exception|bug|مشكلة|غلط)"; then
+        log "🔧 توجيه لـ: Debug Expert"
+        echo "debug_expert"
+        return 0
+    fi
+    if echo "$message" | grep -qiE "(مصنع|نظام|تصميم|معماري|مشروع|هندسة|architecture|design)"; then
+        log "🏗️ توجيه لـ: System Architect"
+        echo "system_architect"
+        return 0
+    fi
+    if echo "$message" | grep -qiE "(تعلم|تدريب|مسار|مهارة|تدرب|كورس|تعليم|learn|train)"; then
+        log "👨‍🏫 توجيه لـ: Technical Coach"
+        echo "technical_coach"
+        return 0
+    fi
+    if echo "$message" | grep -qiE "(مصدر|كتاب|مقال|docs|وثيقة|معرفة|knowledge|جمع|معلومات)"; then
+        log "🕸️ توجيه لـ: Knowledge Spider"
+        echo "knowledge_spider"
+        return 0
+    fi
+    log "🔧 افتراضي: Debug Expert"
+    echo "debug_expert"
+}
+
+monitor_quality() {
+    local agent_id="$1"
+    local user_id="$2"
+    local quality="$3"
+    log "📊 مراقبة الجودة: عامل $agent_id، مستخدم $user_id، جودة: $quality"
+    echo "$(date +'%Y-%m-%d %H:%M:%S'),$agent_id,$user_id,$quality" >> "$LOGS_DIR/quality_feedback.csv"
+    local recent_bad=$(tail -n 10 "$LOGS_DIR/quality_feedback.csv" | grep "$agent_id,$user_id,bad" | wc -l)
+    if [ "$recent_bad" -ge 3 ]; then
+        log "⚠️  تحذير: عامل $agent_id حصل على 3 تقييمات سيئة متتالية من $user_id"
+    fi
+}
+
+case "${1:-}" in
+    decide) decide_agent "$2" "${3:-anonymous}" | tail -1 ;;
+    loop) while IFS= read -r line; do decide_agent "$line" bench | tail -1; done ;;
+    quality_loop) while IFS=, read -r a u q; do monitor_quality "$a" "$u" "$q" > /dev/null; done ;;
+esac
+'''
+
+WORDS = {
+    "debug": ["error", "خطأ", "traceback", "exception", "bug", "مشكلة", "لا يعمل"],
+    "architect": ["تصميم", "architecture", "نظام", "هندسة", "API", "مشروع", "design"],
+    "coach": ["كيف", "أتعلم", "تعلم", "شرح", "tutorial", "مسار", "تدريب", "learn"],
+    "spider": ["ابحث", "معلومات", "search", "PDF", "data", "مصدر", "docs"],
+}
+FILLER = ["في", "الكود", "python", "my", "the", "function", "عندي", "سؤال", "عن", "قاعدة", "البيانات", "server"]
+
+
+def make_messages(n: int, rnd: random.Random) -> List[str]:
+    out = []
+    for _ in range(n):
+        words = rnd.sample(FILLER, rnd.randint(3, 7))
+        for group in rnd.sample(list(WORDS), rnd.randint(0, 2)):
+            words.insert(rnd.randint(0, len(words)), rnd.choice(WORDS[group]))
+        out.append(" ".join(words))
+    return out
+
+
+def rate(n: int, seconds: float) -> float:
+    return round(n / seconds, 1) if seconds > 0 else 0.0
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--messages", type=int, default=20000)
+    p.add_argument("--shell-messages", type=int, default=300, help="عدد الرسائل لمسارات الـ shell والـ CLI البطيئة")
+    p.add_argument("--chunk", type=int, default=1000)
+    p.add_argument("--seed", type=int, default=5)
+    p.add_argument("--out", help="حفظ النتائج كـ JSON")
+    a = p.parse_args()
+
+    rnd = random.Random(a.seed)
+    messages = make_messages(a.messages, rnd)
+    few = messages[: a.shell_messages]
+    results: Dict[str, Any] = {"messages": a.messages, "shell_messages": len(few), "decisions_per_s": {}}
+    rates = results["decisions_per_s"]
+
+    tmp = tempfile.mkdtemp(prefix="hf_bench_decisions_")
+    env = dict(
+        os.environ,
+        LEGACY_LOGS_DIR=os.path.join(tmp, "legacy"),
+        DECISION_SOCKET=os.path.join(tmp, "decision.sock"),
+        DECISIONS_LOG=os.path.join(tmp, "daemon", "decisions.log"),
+        QUALITY_FEEDBACK_CSV=os.path.join(tmp, "daemon", "quality_feedback.csv"),
+    )
+    saved_env = {k: os.environ.get(k) for k in ("DECISION_SOCKET", "DECISIONS_LOG", "QUALITY_FEEDBACK_CSV")}
+    engine = os.path.join(tmp, "legacy_engine.sh")
+    with open(engine, "w", encoding="utf-8") as f:
+        f.write(LEGACY_ENGINE)
+    messages_path = os.path.join(tmp, "messages.txt")
+    with open(messages_path, "w", encoding="utf-8") as f:
+        f.write("".join(m + "\n" for m in messages))
+    client = None
+    try:
+        t0 = time.perf_counter()
+        legacy = subprocess.run(
+            ["bash", engine, "loop"], input="".join(m + "\n" for m in few), env=env,
+            capture_output=True, text=True, check=True,
+        ).stdout.split()
+        rates["legacy_shell_loop"] = rate(len(few), time.perf_counter() - t0)
+        k = min(len(few), 100)
+        t0 = time.perf_counter()
+        for m in few[:k]:
+            subprocess.run(["bash", engine, "decide", m, "bench"], env=env, capture_output=True, check=True)
+        rates["legacy_cli"] = rate(k, time.perf_counter() - t0)
+
+        # الخدمة في عملية منفصلة كما في الاستخدام الفعلي
+        os.environ.update({key: env[key] for key in saved_env})
+        start(env["DECISION_SOCKET"])
+        client = DecisionClient(env["DECISION_SOCKET"])
+        lat = []
+        t_all = time.perf_counter()
+        for m in messages:
+            t0 = time.perf_counter()
+            client.call(op="decide", message=m, user_id="bench")
+            lat.append(time.perf_counter() - t0)
+        rates["daemon_socket"] = rate(len(messages), time.perf_counter() - t_all)
+        results["daemon_socket_latency"] = latency_summary(lat)
+        t0 = time.perf_counter()
+        agents: List[str] = []
+        for i in range(0, len(messages), a.chunk):
+            agents.extend(client.call(op="batch", items=messages[i : i + a.chunk], user_id="bench")["agents"])
+        rates["daemon_batch"] = rate(len(messages), time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        with open(messages_path, "r", encoding="utf-8") as f:
+            subprocess.run([sys.executable, DAEMON, "batch"], stdin=f, env=env, capture_output=True, check=True)
+        rates["cli_batch"] = rate(len(messages), time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        for m in few[:k]:
+            subprocess.run([sys.executable, DAEMON, "decide", m, "bench"], env=env, capture_output=True, check=True)
+        rates["cli_decide"] = rate(k, time.perf_counter() - t0)
+        if shutil.which("socat"):
+            t0 = time.perf_counter()
+            for m in few[:k]:
+                subprocess.run(
+                    ["socat", "-t", "5", "-", "UNIX-CONNECT:" + env["DECISION_SOCKET"]],
+                    input=f"bench\t{m}\n".encode("utf-8"), capture_output=True, check=True,
+                )
+            rates["cli_socat"] = rate(k, time.perf_counter() - t0)
+
+        events = [(rnd.choice(list(WORDS)), f"u{rnd.randint(0, 20)}", rnd.choice(["good", "bad"])) for _ in range(len(few))]
+        t0 = time.perf_counter()
+        subprocess.run(
+            ["bash", engine, "quality_loop"], input="".join(f"{e[0]},{e[1]},{e[2]}\n" for e in events),
+            env=env, capture_output=True, text=True, check=True,
+        )
+        legacy_quality = rate(len(events), time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        for agent_id, user_id, quality in events:
+            client.call(op="quality", agent_id=agent_id, user_id=user_id, quality=quality)
+        results["quality_events_per_s"] = {
+            "legacy_shell_loop": legacy_quality,
+            "daemon_socket": rate(len(events), time.perf_counter() - t0),
+        }
+        results["daemon_status"] = client.call(op="status")
+
+        # الانحراف: القواعد القديمة (افتراضي debug_expert) مقابل قواعد الـ YAML (نفس الـ API)
+        service = DecisionService(
+            decisions_log=os.path.join(tmp, "agree", "decisions.log"),
+            quality_csv=os.path.join(tmp, "agree", "quality_feedback.csv"),
+        )
+        current = service.decide_many(few, "bench")
+        service.close()
+        results["legacy_agreement"] = round(sum(x == y for x, y in zip(legacy, current)) / max(len(few), 1), 3)
+    finally:
+        if client is not None:
+            client.call(op="shutdown")
+            client.close()
+        for key, v in saved_env.items():
+            if v is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = v
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    base = rates["legacy_cli"]
+    for name, r in rates.items():
+        print(f"{name:<18} {r:>10.1f} decisions/s  (x{r / base:.1f} vs legacy_cli)")
+    q = results["quality_events_per_s"]
+    print(f"quality events/s: legacy {q['legacy_shell_loop']} vs daemon {q['daemon_socket']}")
+    print(f"legacy rules agree with orchestrator.yaml on {results['legacy_agreement'] * 100:.1f}% of messages")
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+عميل الـ LLM (scripts/ai/llm/llm_client.py) تحت الحمل مقابل خادم بديل محلي
+(scripts/ai/llm/llm_stub_server.py، في عملية منفصلة):
+  1) naive      httpx.AsyncClient جديد لكل طلب (اتصال TCP لكل طلب) — خط الأساس
+  2) pooled     LLMClient.chat: اتصالات keep-alive مُعاد استخدامها وحدود التزامن
+  3) batched    LLMClient.complete مع batch_size: طلبات متزامنة في طلب /completions واحد
+  4) per_agent  حد عامل واحد (per_agent_concurrency): أقصى تزامن يراه الخادم
+  5) faults     خادم يرد 503 بنسبة --fail-rate: نسبة النجاح وتضخيم الطلبات مع ميزانية الإعادة
+لكل سيناريو: throughput، p50/p99، عدد الاتصالات التي رآها الخادم، وأقصى تأخر للـ event loop
+(مؤقت 10ms: طلب يحجب الـ loop يظهر هنا).
+
+    python3 scripts/bench/bench_llm_client.py [--requests 1000] [--concurrency 64] [--pool 16] [--latency-ms 50]
+"""
+import os
+import sys
+import asyncio
+import json
+import subprocess
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+import httpx
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.llm.llm_client import LLMClient, LLMError
+from scripts.bench.bench_backend_load import _free_port, latency_summary
+
+STUB = os.path.join(ROOT_DIR, "scripts", "ai", "llm", "llm_stub_server.py")
+MESSAGES = [[{"role": "user", "content": f"سؤال رقم {i} عن الكود"}] for i in range(64)]
+
+
+def start_stub(port: int, latency_ms: float, fail_rate: float = 0.0) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, STUB, "--port", str(port), "--latency-ms", str(latency_ms), "--fail-rate", str(fail_rate)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/v1/models", timeout=1.0).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("LLM stub did not start")
+
+
+def stub_stats(port: int, reset: bool = False) -> Dict[str, Any]:
+    stats = httpx.get(f"http://127.0.0.1:{port}/stats").json()
+    if reset:
+        httpx.post(f"http://127.0.0.1:{port}/stats/reset")
+    return stats
+
+
+async def run_load(call: Callable[[int], Awaitable[Any]], n: int, concurrency: int) -> Dict[str, Any]:
+    lat: List[float] = []
+    errors: List[str] = []
+    lag = {"max_ms": 0.0}
+    done = asyncio.Event()
+
+    async def ticker() -> None:
+        while not done.is_set():
+            t = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag["max_ms"] = max(lag["max_ms"], (time.perf_counter() - t - 0.01) * 1000.0)
+
+    queue = iter(range(n))
+
+    async def worker() -> None:
+        for i in queue:
+            t = time.perf_counter()
+            try:
+                await call(i)
+                lat.append(time.perf_counter() - t)
+            except (LLMError, httpx.HTTPError) as e:
+                errors.append(type(e).__name__)
+
+    tick = asyncio.create_task(ticker())
+    t0 = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - t0
+    done.set()
+    await tick
+    return {
+        "ok": len(lat),
+        "errors": len(errors),
+        "throughput_rps": round(len(lat) / elapsed, 1),
+        "latency": latency_summary(lat),
+        "max_loop_lag_ms": round(lag["max_ms"], 2),
+    }
+
+
+async def scenarios(port: int, fault_port: int, a: Any) -> Dict[str, Any]:
+    base_url = f"http://127.0.0.1:{port}/v1"
+    out: Dict[str, Any] = {}
+    payload = {"model": "stub", "max_tokens": 64}
+
+    async def naive(i: int) -> None:
+        async with httpx.AsyncClient(base_url=base_url, timeout=15.0) as c:
+            r = await c.post("/chat/completions", json={**payload, "messages": MESSAGES[i % 64]})
+            r.raise_for_status()
+
+    stub_stats(port, reset=True)
+    out["naive"] = await run_load(naive, a.requests, a.concurrency)
+    out["naive"]["server"] = stub_stats(port, reset=True)
+
+    cfg = {"provider": "openai", "base_url": base_url, "model": "stub", "max_tokens": 64,
+           "max_connections": a.pool, "max_keepalive": a.pool, "max_concurrency": a.pool, "per_agent_concurrency": a.concurrency}
+    pooled = LLMClient(cfg)
+    out["pooled"] = await run_load(lambda i: pooled.chat(MESSAGES[i % 64], "bench"), a.requests, a.concurrency)
+    out["pooled"]["server"] = stub_stats(port, reset=True)
+    out["pooled"]["client"] = pooled.stats()
+    await pooled.aclose()
+
+    batched = LLMClient({**cfg, "batch_size": a.batch_size, "batch_window_ms": a.batch_window_ms})
+    out["batched"] = await run_load(
+        lambda i: batched.complete(MESSAGES[i % 64][0]["content"], "bench"), a.requests, a.concurrency
+    )
+    out["batched"]["server"] = stub_stats(port, reset=True)
+    out["batched"]["client"] = batched.stats()
+    await batched.aclose()
+
+    limited = LLMClient({**cfg, "per_agent_concurrency": a.agent_limit})
+    out["per_agent"] = await run_load(lambda i: limited.chat(MESSAGES[i % 64], "bench"), a.requests // 2, a.concurrency)
+    out["per_agent"]["server"] = stub_stats(port, reset=True)
+    out["per_agent"]["agent_limit"] = a.agent_limit
+    await limited.aclose()
+
+    fault_cfg = {**cfg, "base_url": f"http://127.0.0.1:{fault_port}/v1", "backoff": 0.02}
+    for name, retries in (("faults_no_retry", 0), ("faults_retry", 2)):
+        client = LLMClient({**fault_cfg, "retries": retries})
+        r = await run_load(lambda i: client.chat(MESSAGES[i % 64], "bench"), a.requests, a.concurrency)
+        r["server"] = stub_stats(fault_port, reset=True)
+        r["client"] = client.stats()
+        r["success_rate"] = round(r["ok"] / a.requests, 3)
+        r["amplification"] = round(r["server"]["requests"] / a.requests, 3)
+        out[name] = r
+        await client.aclose()
+    return out
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--requests", type=int, default=1000)
+    p.add_argument("--concurrency", type=int, default=64)
+    p.add_argument("--pool", type=int, default=16, help="max_connections/max_concurrency للعميل المُجمَّع")
+    p.add_argument("--latency-ms", type=float, default=50.0)
+    p.add_argument("--batch-size", type=int, default=16)
+    p.add_argument("--batch-window-ms", type=float, default=5.0)
+    p.add_argument("--agent-limit", type=int, default=4)
+    p.add_argument("--fail-rate", type=float, default=0.2)
+    p.add_argument("--out", help="حفظ النتائج كـ JSON")
+    a = p.parse_args()
+
+    port, fault_port = _free_port(), _free_port()
+    stub = start_stub(port, a.latency_ms)
+    fault_stub = start_stub(fault_port, a.latency_ms, a.fail_rate)
+    try:
+        results = {"config": vars(a), "scenarios": asyncio.run(scenarios(port, fault_port, a))}
+    finally:
+        for proc in (stub, fault_stub):
+            proc.terminate()
+            proc.wait(30)
+
+    for name, r in results["scenarios"].items():
+        s = r["server"]
+        print(
+            f"{name:<16} rps={r['throughput_rps']:>7.1f} p50={r['latency']['p50_ms']:>7.2f}ms"
+            f" p99={r['latency']['p99_ms']:>8.2f}ms errors={r['errors']:<4} server_requests={s['requests']:<5}"
+            f" connections={s['connections']:<5} max_in_flight={s['max_in_flight']:<3} loop_lag={r['max_loop_lag_ms']}ms"
+        )
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
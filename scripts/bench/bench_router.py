@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+مقارنة الموجّه المترجم (Aho-Corasick) مع المسح القديم any(k in msg)
+بعدد الكلمات المفتاحية الحالي ×1 و×10 و×100.
+
+    python3 scripts/bench/bench_router.py [--messages 2000] [--repeat 3]
+"""
+import os
+import sys
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+import yaml
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.llm.keyword_router import LEGACY_KEYWORD_KEYS, compile_rules
+
+CONFIG_PATH = os.path.join(ROOT_DIR, "config", "orchestrator.yaml")
+
+
+def legacy_select_agent(routing: Dict[str, Any], message: str) -> str:
+    # نسخة مطابقة لـ LLMOrchestrator._select_agent قبل الموجّه المترجم
+    msg = message.lower()
+    if any(k.lower() in msg for k in routing.get("debug_keywords", [])):
+        return "debug_expert"
+    if any(k.lower() in msg for k in routing.get("architect_keywords", [])):
+        return "system_architect"
+    if any(k.lower() in msg for k in routing.get("coach_keywords", [])):
+        return "technical_coach"
+    if any(k.lower() in msg for k in routing.get("spider_keywords", [])):
+        return "knowledge_spider"
+    return "technical_coach"
+
+
+def scale_routing(routing: Dict[str, Any], factor: int, rnd: random.Random) -> Dict[str, Any]:
+    scaled = dict(routing)
+    for key, _ in LEGACY_KEYWORD_KEYS:
+        base = list(routing.get(key, []))
+        extra = [
+            "".join(rnd.choice("abcdefghijklmnopqrstuvwxyzابتثجحخدذرزسشصضطظعغفقكلمنهوي") for _ in range(rnd.randint(4, 10)))
+            for _ in range(len(base) * (factor - 1))
+        ]
+        scaled[key] = base + extra
+    return scaled
+
+
+def make_messages(routing: Dict[str, Any], n: int, rnd: random.Random) -> List[str]:
+    filler = "كيف يمكنني أن أكتب برنامج بسيط في python يقرأ ملف ويطبع النتائج على الشاشة".split()
+    all_kw = [k for key, _ in LEGACY_KEYWORD_KEYS for k in routing.get(key, [])]
+    out = []
+    for _ in range(n):
+        words = [rnd.choice(filler) for _ in range(rnd.randint(6, 20))]
+        if rnd.random() < 0.7:
+            words.insert(rnd.randrange(len(words)), rnd.choice(all_kw))
+        out.append(" ".join(words))
+    return out
+
+
+def _time(fn, messages: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for m in messages:
+            fn(m)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(messages) * 1e6
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--messages", type=int, default=2000)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=42)
+    a = p.parse_args()
+
+    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+        routing = (yaml.safe_load(f) or {}).get("routing", {})
+
+    rnd = random.Random(a.seed)
+    report = []
+    for factor in (1, 10, 100):
+        scaled = scale_routing(routing, factor, rnd)
+        messages = make_messages(scaled, a.messages, rnd)
+        compiled = compile_rules(scaled)
+        mismatches = sum(
+            1 for m in messages if compiled.route(m) != legacy_select_agent(scaled, m)
+        )
+        legacy_us = _time(lambda m: legacy_select_agent(scaled, m), messages, a.repeat)
+        compiled_us = _time(compiled.route, messages, a.repeat)
+        report.append({
+            "factor": factor,
+            "keywords": compiled.n_keywords,
+            "legacy_us_per_msg": round(legacy_us, 2),
+            "compiled_us_per_msg": round(compiled_us, 2),
+            "speedup": round(legacy_us / compiled_us, 2) if compiled_us else None,
+            "mismatches": mismatches,
+        })
+    print(json.dumps({"benchmark": "router", "results": report}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
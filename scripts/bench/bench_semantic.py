@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+قياس الوضع الدلالي (scripts/ai/rag_semantic.py):
+  1) زمن الاستعلام IVF مقابل المسح الكامل (brute force) بأحجام corpus متزايدة → هل النمو دون خطي؟
+  2) recall@k لنتائج IVF مقارنة بالمسح الكامل لكل nprobe
+  3) hit@k للمستند المصدر باستعلامات مُحرّفة (حذف لواحق/أخطاء إملائية) لـ BM25 مقابل الدلالي
+corpus اصطناعي: مواضيع بمفردات مميزة (عربي/إنجليزي) + مفردات عامة.
+
+    python3 scripts/bench/bench_semantic.py [--sizes 1000,4000,16000] [--nprobe 1,4,8,16] [--queries 200]
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.rag_engine import build_index, search_knowledge
+from scripts.ai.rag_semantic import build_semantic_index, load_semantic_index
+from scripts.bench.bench_backend_load import latency_summary
+
+LATIN = "abcdefghijklmnopqrstuvwxyz"
+ARABIC = "ابتثجحخدذرزسشصضطظعغفقكلمنهوي"
+
+
+def make_vocab(n: int, rnd: random.Random) -> List[str]:
+    out = set()
+    while len(out) < n:
+        alphabet = ARABIC if rnd.random() < 0.4 else LATIN
+        out.add("".join(rnd.choice(alphabet) for _ in range(rnd.randint(4, 10))))
+    return sorted(out)
+
+
+def make_topic_corpus(path: str, n_docs: int, rnd: random.Random, n_topics: int = 0) -> List[Dict[str, List[str]]]:
+    """كل مستند: كلمات موضوعه + كلمات عامة + 6 مصطلحات نادرة خاصة به (مكررة مرتين)."""
+    os.makedirs(path, exist_ok=True)
+    vocab = make_vocab(6000 + n_docs * 3, rnd)
+    general = vocab[:1000]
+    topic_vocab = vocab[1000:6000]
+    rare_vocab = vocab[6000:]
+    n_topics = n_topics or max(10, n_docs // 50)
+    topics = [rnd.sample(topic_vocab, 40) for _ in range(n_topics)]
+    docs = []
+    for i in range(n_docs):
+        topic = topics[rnd.randrange(n_topics)]
+        words = [rnd.choice(topic) if rnd.random() < 0.6 else rnd.choice(general) for _ in range(rnd.randint(60, 200))]
+        rare = rnd.sample(rare_vocab, 6)
+        for w in rare * 2:
+            words.insert(rnd.randrange(len(words)), w)
+        docs.append({"words": words, "rare": rare})
+        with open(os.path.join(path, f"doc_{i:06d}.txt"), "w", encoding="utf-8") as f:
+            f.write(" ".join(words))
+    return docs
+
+
+def make_query(doc: Dict[str, List[str]], rnd: random.Random) -> List[str]:
+    words = rnd.sample(doc["rare"], 3) + rnd.sample(doc["words"], 5)
+    rnd.shuffle(words)
+    return words
+
+
+def perturb(word: str, rnd: random.Random) -> str:
+    # تحريف شكلي: حذف لاحقة، أو تبديل حرف، أو بادئة "ال"
+    r = rnd.random()
+    if len(word) > 5 and r < 0.4:
+        return word[:-rnd.randint(1, 2)]
+    if len(word) > 3 and r < 0.8:
+        i = rnd.randrange(1, len(word) - 1)
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return "ال" + word
+
+
+def recall_at_k(approx: List[int], exact: List[int]) -> float:
+    return len(set(approx) & set(exact)) / float(len(exact)) if exact else 1.0
+
+
+def bench_size(n_docs: int, nprobes: List[int], n_queries: int, top_k: int, rnd: random.Random) -> Dict[str, Any]:
+    tmp = tempfile.mkdtemp(prefix="hf_bench_semantic_")
+    try:
+        kdir = os.path.join(tmp, "knowledge_chunks")
+        docs = make_topic_corpus(kdir, n_docs, rnd)
+        t0 = time.perf_counter()
+        meta = build_semantic_index(kdir)
+        build_s = time.perf_counter() - t0
+        index = load_semantic_index(kdir)
+        sources = [rnd.randrange(n_docs) for _ in range(n_queries)]
+        queries = [" ".join(make_query(docs[s], rnd)) for s in sources]
+        vecs = [index.embed(q) for q in queries]
+
+        exact_lat: List[float] = []
+        exact_ids: List[List[int]] = []
+        for v in vecs:
+            t = time.perf_counter()
+            hits = index.search_exact(v, top_k)
+            exact_lat.append(time.perf_counter() - t)
+            exact_ids.append([d for _, d in hits])
+
+        out: Dict[str, Any] = {
+            "n_docs": n_docs,
+            "nlist": meta["nlist"],
+            "build_s": round(build_s, 2),
+            "exact": latency_summary(exact_lat),
+            "ivf": {},
+        }
+        for nprobe in nprobes:
+            lat: List[float] = []
+            recalls: List[float] = []
+            top1: List[float] = []
+            for v, exact in zip(vecs, exact_ids):
+                t = time.perf_counter()
+                hits = index.search(v, top_k, nprobe)
+                lat.append(time.perf_counter() - t)
+                recalls.append(recall_at_k([d for _, d in hits], exact))
+                top1.append(recall_at_k([d for _, d in hits], exact[:1]))
+            out["ivf"][str(nprobe)] = {
+                "latency": latency_summary(lat),
+                f"recall@{top_k}": round(sum(recalls) / len(recalls), 4),
+                # أفضل نتيجة في المسح الكامل ضمن top_k التقريبية
+                "top1_recall": round(sum(top1) / len(top1), 4),
+                "scanned_fraction": round(min(nprobe, meta["nlist"]) / float(meta["nlist"]), 4),
+            }
+        return out
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_perturbed(n_docs: int, n_queries: int, top_k: int, nprobe: int, rnd: random.Random) -> Dict[str, Any]:
+    tmp = tempfile.mkdtemp(prefix="hf_bench_semantic_")
+    try:
+        kdir = os.path.join(tmp, "knowledge_chunks")
+        docs = make_topic_corpus(kdir, n_docs, rnd)
+        build_index(kdir)
+        build_semantic_index(kdir)
+        hits = {f"{kind}/{mode}": 0 for kind in ("clean", "perturbed") for mode in ("bm25", "semantic")}
+        for _ in range(n_queries):
+            src = rnd.randrange(n_docs)
+            words = make_query(docs[src], rnd)
+            target = f"doc_{src:06d}.txt"
+            for kind, query in (("clean", words), ("perturbed", [perturb(w, rnd) for w in words])):
+                for mode in ("bm25", "semantic"):
+                    res = search_knowledge(" ".join(query), top_k, kdir, mode=mode, nprobe=nprobe)
+                    hits[f"{kind}/{mode}"] += any(os.path.basename(r["path"]) == target for r in res)
+        return {
+            "n_docs": n_docs,
+            "queries": n_queries,
+            f"source_hit@{top_k}": {m: round(h / float(n_queries), 4) for m, h in hits.items()},
+        }
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", default="1000,4000,16000")
+    p.add_argument("--nprobe", default="1,4,8,16")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--top-k", type=int, default=5)
+    p.add_argument("--perturbed-docs", type=int, default=2000)
+    p.add_argument("--seed", type=int, default=11)
+    p.add_argument("--out", help="حفظ النتائج كـ JSON")
+    a = p.parse_args()
+
+    rnd = random.Random(a.seed)
+    nprobes = [int(x) for x in a.nprobe.split(",")]
+    results: Dict[str, Any] = {"sizes": [], "top_k": a.top_k}
+    for n in (int(x) for x in a.sizes.split(",")):
+        r = bench_size(n, nprobes, a.queries, a.top_k, rnd)
+        results["sizes"].append(r)
+        line = f"N={n:>6} nlist={r['nlist']:>4} build={r['build_s']:>6.2f}s exact p50={r['exact']['p50_ms']:>6.2f}ms"
+        for nprobe, s in r["ivf"].items():
+            line += (
+                f" | nprobe={nprobe} p50={s['latency']['p50_ms']:.2f}ms"
+                f" recall={s[f'recall@{a.top_k}']:.3f} top1={s['top1_recall']:.3f}"
+            )
+        print(line)
+    results["perturbed"] = bench_perturbed(a.perturbed_docs, a.queries, a.top_k, max(nprobes), rnd)
+    print(f"perturbed queries source hit@{a.top_k}: {results['perturbed'][f'source_hit@{a.top_k}']}")
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+قياس الفهرس المقسّم (scripts/ai/rag_shards.py) مقابل فهرس BM25 واحد:
+  1) زمن الاستعلام: فهرس واحد مقابل شاردات (حسب المصدر أو الحجم) موزعة على 1..N عمليات
+  2) تطابق النتائج: overlap@k بين الشاردات (إحصاءات محلية) والفهرس الواحد
+  3) إعادة البناء: كل الشاردات مقابل شارد مصدر واحد بعد إعادة جلبه
+corpus اصطناعي بأسماء العنكبوت (raw_content/<domain>/<md5>.html + knowledge_chunks/<md5>_chunk_NN)،
+مفرداته بتوزيع Zipf، وكل استعلام كلمات من مستند مصدر (source_hit@k = ظهور المصدر في النتائج).
+ملاحظة: التسريع مع عدد العمليات يتطلب أنوية فعلية (cpu_count مذكور في النتائج).
+
+    python3 scripts/bench/bench_shards.py [--docs 20000] [--sources 8] [--workers 1,2,4] [--queries 200]
+"""
+import os
+import sys
+import json
+import hashlib
+import random
+import shutil
+import tempfile
+import itertools
+import time
+from typing import Any, Dict, List, Tuple
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.chunk_store import refresh_store
+from scripts.ai.executors import shutdown_executors
+from scripts.ai.rag_engine import _tokenize, build_index, load_index
+from scripts.ai.rag_shards import build_shards, load_sharded_index
+from scripts.bench.bench_backend_load import latency_summary
+from scripts.bench.bench_semantic import make_vocab
+
+
+def make_sources(
+    root: str, n_docs: int, n_sources: int, rnd: random.Random
+) -> Tuple[List[List[str]], Dict[str, List[str]], List[str]]:
+    """يعيد أسماء ملفات الـ chunks لكل مصدر، وكلمات كل ملف، والمفردات."""
+    kdir = os.path.join(root, "knowledge_chunks")
+    os.makedirs(kdir, exist_ok=True)
+    vocab = make_vocab(20000, rnd)
+    cum_weights = list(itertools.accumulate(1.0 / (r + 1) for r in range(len(vocab))))
+    per_source: List[List[str]] = [[] for _ in range(n_sources)]
+    doc_words: Dict[str, List[str]] = {}
+    for i in range(n_docs):
+        s = i % n_sources
+        domain_dir = os.path.join(root, "raw_content", f"site{s:02d}.example.org")
+        os.makedirs(domain_dir, exist_ok=True)
+        md5 = hashlib.md5(f"{s}/{i}".encode()).hexdigest()
+        open(os.path.join(domain_dir, f"{md5}.html"), "w").close()
+        name = f"{md5}_chunk_00"
+        words = rnd.choices(vocab, cum_weights=cum_weights, k=rnd.randint(80, 240))
+        with open(os.path.join(kdir, name), "w", encoding="utf-8") as f:
+            f.write(" ".join(words))
+        per_source[s].append(name)
+        doc_words[name] = words
+    return per_source, doc_words, vocab
+
+
+def source_hit(store, hits: List[List[int]], targets: List[str]) -> float:
+    found = sum(any(os.path.basename(store.path_of(d)) == t for d in h) for h, t in zip(hits, targets))
+    return round(found / float(len(targets)), 4)
+
+
+def timed_queries(fn, token_lists: List[List[str]]) -> Dict[str, Any]:
+    lat: List[float] = []
+    for tokens in token_lists:
+        t = time.perf_counter()
+        fn(tokens)
+        lat.append(time.perf_counter() - t)
+    return latency_summary(lat)
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--docs", type=int, default=20000)
+    p.add_argument("--sources", type=int, default=8)
+    p.add_argument("--size-shard", type=int, default=0, help="حجم الشارد لوضع size:N (0 = docs/sources)")
+    p.add_argument("--workers", default="1,2,4")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--top-k", type=int, default=5)
+    p.add_argument("--seed", type=int, default=5)
+    p.add_argument("--out", help="حفظ النتائج كـ JSON")
+    a = p.parse_args()
+
+    rnd = random.Random(a.seed)
+    workers = [int(x) for x in a.workers.split(",")]
+    results: Dict[str, Any] = {
+        "docs": a.docs,
+        "sources": a.sources,
+        "top_k": a.top_k,
+        "cpu_count": os.cpu_count(),
+    }
+    tmp = tempfile.mkdtemp(prefix="hf_bench_shards_")
+    try:
+        per_source, doc_words, vocab = make_sources(tmp, a.docs, a.sources, rnd)
+        kdir = os.path.join(tmp, "knowledge_chunks")
+        targets = rnd.sample(sorted(doc_words), a.queries)
+        token_lists = [_tokenize(" ".join(rnd.sample(doc_words[t], 4))) for t in targets]
+
+        t0 = time.perf_counter()
+        build_index(kdir)
+        results["monolithic_build_s"] = round(time.perf_counter() - t0, 2)
+        mono = load_index(kdir)
+        exact = [[d for _, d in mono.search(t, a.top_k)] for t in token_lists]
+        results["monolithic"] = timed_queries(lambda t: mono.search(t, a.top_k), token_lists)
+        results["monolithic"][f"source_hit@{a.top_k}"] = source_hit(mono.store, exact, targets)
+        print(f"monolithic p50={results['monolithic']['p50_ms']}ms")
+
+        size = a.size_shard or max(1, a.docs // a.sources)
+        for shard_by in ("source", f"size:{size}"):
+            t0 = time.perf_counter()
+            manifest = build_shards(kdir, shard_by)
+            build_s = time.perf_counter() - t0
+            index = load_sharded_index(kdir)
+            sharded = [[d for _, d in hits] for hits in index.search_batch(token_lists, a.top_k, 1)]
+            overlap = [len(set(s) & set(e)) / float(len(e)) for s, e in zip(sharded, exact) if e]
+            row: Dict[str, Any] = {
+                "shards": len(manifest["shards"]),
+                "build_s": round(build_s, 2),
+                f"overlap@{a.top_k}": round(sum(overlap) / len(overlap), 4) if overlap else 1.0,
+                f"source_hit@{a.top_k}": source_hit(index.store, sharded, targets),
+                "workers": {},
+            }
+            for w in workers:
+                # تحميل الشاردات في كل عملية قبل القياس
+                index.search_batch(token_lists[:4], a.top_k, w)
+                row["workers"][str(w)] = timed_queries(lambda t: index.search_batch([t], a.top_k, w), token_lists)
+                t0 = time.perf_counter()
+                index.search_batch(token_lists, a.top_k, w)
+                row["workers"][str(w)]["batch_ms_per_query"] = round(
+                    (time.perf_counter() - t0) * 1000.0 / len(token_lists), 3
+                )
+                print(
+                    f"{shard_by:>12} shards={row['shards']:>3} workers={w}"
+                    f" p50={row['workers'][str(w)]['p50_ms']}ms"
+                    f" batch={row['workers'][str(w)]['batch_ms_per_query']}ms/q"
+                )
+            results[shard_by.split(":")[0]] = row
+            shutdown_executors()
+
+        # إعادة جلب مصدر واحد → إعادة بناء شارده فقط
+        build_shards(kdir, "source")
+        for name in per_source[0]:
+            with open(os.path.join(kdir, name), "a", encoding="utf-8") as f:
+                f.write(" " + rnd.choice(vocab))
+        os.utime(kdir)
+        store = refresh_store(kdir)
+        t0 = time.perf_counter()
+        manifest = build_shards(kdir, "source", store=store)
+        one_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        build_shards(kdir, "source", force=manifest["shards"], store=store)
+        all_s = time.perf_counter() - t0
+        results["recrawl_one_source"] = {
+            "rebuilt": manifest["rebuilt"],
+            "incremental_s": round(one_s, 3),
+            "full_s": round(all_s, 3),
+        }
+        print(f"recrawl one source: rebuilt={manifest['rebuilt']} {one_s:.3f}s vs all shards {all_s:.3f}s")
+    finally:
+        shutdown_executors()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
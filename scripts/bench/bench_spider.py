@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+تشغيل knowledge_spider.py ضد خادم HTTP محلي (fixture) بصفحات اصطناعية:
+  1) زحف أول  2) إعادة تشغيل بدون تغيير (304)  3) تعديل جزء من الصفحات ثم إعادة التشغيل
+الخادم يدعم ETag/Last-Modified، ويضيف تأخيراً لكل طلب لمحاكاة الشبكة، ويتضمن صفحات مكررة.
+
+    python3 scripts/bench/bench_spider.py [--pages 200] [--latency 0.05] [--change 0.1]
+"""
+import os
+import sys
+import json
+import asyncio
+import hashlib
+import random
+import shutil
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.knowledge_spider import KnowledgeSpider
+
+WORDS = "python function class module error loop list dict http server request response data".split()
+
+
+class FixtureSite:
+    """صفحات في الذاكرة: path → (body, etag, last_modified)."""
+
+    def __init__(self, pages: int, duplicates: int, rnd: random.Random) -> None:
+        self.rnd = rnd
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        self.requests = 0
+        self.not_modified = 0
+        for i in range(pages):
+            self.set_page(f"/page/{i}", self._html(i))
+        for i in range(duplicates):
+            # نفس محتوى صفحة موجودة تحت رابط آخر
+            self.pages[f"/mirror/{i}"] = self.pages[f"/page/{i}"]
+
+    def _html(self, i: int) -> bytes:
+        paras = "".join(
+            "<p>" + " ".join(self.rnd.choice(WORDS) for _ in range(40)) + "</p>" for _ in range(30)
+        )
+        return (
+            f"<html><head><title>Page {i}</title><style>p{{}}</style></head>"
+            f"<body><nav><a href='/page/{(i + 1)}'>next</a></nav><h1>Page {i}</h1>{paras}</body></html>"
+        ).encode("utf-8")
+
+    def set_page(self, path: str, body: bytes) -> None:
+        self.pages[path] = {
+            "body": body,
+            "etag": '"' + hashlib.md5(body).hexdigest() + '"',
+            "last_modified": formatdate(time.time(), usegmt=True),
+        }
+
+    def change(self, fraction: float) -> int:
+        paths = [p for p in self.pages if p.startswith("/page/")]
+        picked = self.rnd.sample(paths, int(len(paths) * fraction))
+        for p in picked:
+            self.set_page(p, self._html(int(p.rsplit("/", 1)[1])) + b"<!-- v2 -->")
+        return len(picked)
+
+
+def serve(site: FixtureSite, latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            site.requests += 1
+            time.sleep(latency)
+            page = site.pages.get(self.path)
+            if page is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            if self.headers.get("If-None-Match") == page["etag"]:
+                site.not_modified += 1
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(page["body"])))
+            self.send_header("ETag", page["etag"])
+            self.send_header("Last-Modified", page["last_modified"])
+            self.end_headers()
+            self.wfile.write(page["body"])
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_once(datasets_dir: str, seeds: list, args: Any) -> Dict[str, Any]:
+    spider = KnowledgeSpider(
+        datasets_dir=datasets_dir,
+        concurrency=args.concurrency,
+        per_domain=args.per_domain,
+        max_pages=args.pages * 2,
+    )
+    t0 = time.perf_counter()
+    try:
+        stats = asyncio.run(spider.crawl(seeds))
+    finally:
+        spider.close()
+    stats["elapsed_s"] = round(time.perf_counter() - t0, 3)
+    return stats
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--pages", type=int, default=200)
+    p.add_argument("--duplicates", type=int, default=10)
+    p.add_argument("--latency", type=float, default=0.05, help="تأخير الخادم لكل طلب (ثانية)")
+    p.add_argument("--change", type=float, default=0.1, help="نسبة الصفحات المعدّلة قبل التشغيل الثالث")
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--per-domain", type=int, default=16)
+    p.add_argument("--seed", type=int, default=3)
+    p.add_argument("--out", help="حفظ النتائج كـ JSON")
+    a = p.parse_args()
+
+    site = FixtureSite(a.pages, a.duplicates, random.Random(a.seed))
+    server = serve(site, a.latency)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    seeds = [base + path for path in site.pages]
+    tmp = tempfile.mkdtemp(prefix="hf_bench_spider_")
+    results: Dict[str, Any] = {"pages": a.pages, "duplicates": a.duplicates, "latency_s": a.latency}
+    try:
+        results["first"] = run_once(tmp, seeds, a)
+        results["rerun_unchanged"] = run_once(tmp, seeds, a)
+        results["changed_pages"] = site.change(a.change)
+        results["rerun_changed"] = run_once(tmp, seeds, a)
+        chunks = os.listdir(os.path.join(tmp, "knowledge_chunks"))
+        results["chunk_files"] = len(chunks)
+        # النسخة القديمة: طلب واحد متسلسل لكل URL في كل تشغيل
+        results["sequential_estimate_s"] = round(len(seeds) * a.latency, 3)
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for name in ("first", "rerun_unchanged", "rerun_changed"):
+        r = results[name]
+        print(
+            f"{name:<16} {r['elapsed_s']:>7.2f}s  fetched={r['fetched']} 304={r['not_modified']} "
+            f"updated={r['updated']} dup={r['duplicates']} failed={r['failed']}"
+        )
+    print(f"sequential fetch estimate: {results['sequential_estimate_s']:.2f}s per run")
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+كلفة توقيت المراحل (scripts/ai/stage_timing.py) لكل عملية، بالنانوثانية:
+  - with stage(...) مقابل جسم فارغ، مع التتبّع (X-Factory-Trace) وبدونه، ومع التسجيل معطّلاً
+  - دالة عادية و async مغلّفة بـ @timed مقابل الاستدعاء المباشر
+  - TimingMiddleware حول تطبيق ASGI أدنى مقابل التطبيق نفسه
+الهدف: بضع ميكروثوان كحد أقصى لكل مرحلة.
+
+    python3 scripts/bench/bench_stage_timing.py [--n 200000] [--repeat 5]
+"""
+import os
+import sys
+import json
+import asyncio
+import time
+from typing import Any, Callable, Dict
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai import stage_timing
+from scripts.ai.stage_timing import TimingMiddleware, _trace, stage, timed
+
+
+def best_ns(fn: Callable[[int], None], n: int, repeat: int) -> float:
+    """أفضل زمن من repeat تكرارات، مقسوماً على n (ns/op)."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter_ns()
+        fn(n)
+        best = min(best, time.perf_counter_ns() - t0)
+    return best / n
+
+
+def loop_empty(n: int) -> None:
+    for _ in range(n):
+        pass
+
+
+def loop_stage(n: int) -> None:
+    for _ in range(n):
+        with stage("bench"):
+            pass
+
+
+def plain(x: int) -> int:
+    return x
+
+
+@timed("bench_sync")
+def wrapped(x: int) -> int:
+    return x
+
+
+async def plain_async(x: int) -> int:
+    return x
+
+
+@timed("bench_async")
+async def wrapped_async(x: int) -> int:
+    return x
+
+
+def loop_call(fn: Callable[[int], int]) -> Callable[[int], None]:
+    def run(n: int) -> None:
+        for i in range(n):
+            fn(i)
+
+    return run
+
+
+def loop_await(fn: Callable[[int], Any]) -> Callable[[int], None]:
+    async def body(n: int) -> None:
+        for i in range(n):
+            await fn(i)
+
+    return lambda n: asyncio.run(body(n))
+
+
+async def asgi_app(scope: Dict[str, Any], receive: Any, send: Any) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def loop_asgi(app: Any, trace: bool) -> Callable[[int], None]:
+    headers = [(b"x-factory-trace", b"1")] if trace else []
+    scope = {"type": "http", "method": "GET", "path": "/bench", "headers": headers}
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b""}
+
+    async def send(message: Dict[str, Any]) -> None:
+        pass
+
+    async def body(n: int) -> None:
+        for _ in range(n):
+            await app(scope, receive, send)
+
+    return lambda n: asyncio.run(body(n))
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--n", type=int, default=200000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--out", help="حفظ النتائج كـ JSON")
+    a = p.parse_args()
+
+    n, r = a.n, a.repeat
+    results: Dict[str, Any] = {"n": n, "repeat": r}
+
+    empty = best_ns(loop_empty, n, r)
+    results["stage"] = {"empty_loop_ns": round(empty, 1), "stage_ns": round(best_ns(loop_stage, n, r) - empty, 1)}
+    token = _trace.set([])
+    # قائمة التتبّع تنمو n عنصراً لكل تكرار: تُفرَّغ داخل القياس نفسه كما في طلب حقيقي قصير
+    results["stage"]["stage_traced_ns"] = round(
+        best_ns(lambda k: (loop_stage(k), _trace.get().clear()), n, r) - empty, 1
+    )
+    _trace.reset(token)
+    stage_timing.ENABLED = False
+    results["stage"]["stage_disabled_ns"] = round(best_ns(loop_stage, n, r) - empty, 1)
+    stage_timing.ENABLED = True
+
+    direct = best_ns(loop_call(plain), n, r)
+    results["timed_sync"] = {"direct_ns": round(direct, 1), "overhead_ns": round(best_ns(loop_call(wrapped), n, r) - direct, 1)}
+    m = max(1, n // 4)
+    direct = best_ns(loop_await(plain_async), m, r)
+    results["timed_async"] = {
+        "direct_ns": round(direct, 1),
+        "overhead_ns": round(best_ns(loop_await(wrapped_async), m, r) - direct, 1),
+    }
+
+    m = max(1, n // 10)
+    direct = best_ns(loop_asgi(asgi_app, False), m, r)
+    results["middleware"] = {
+        "app_ns": round(direct, 1),
+        "overhead_ns": round(best_ns(loop_asgi(TimingMiddleware(asgi_app), False), m, r) - direct, 1),
+        "overhead_traced_ns": round(best_ns(loop_asgi(TimingMiddleware(asgi_app), True), m, r) - direct, 1),
+    }
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
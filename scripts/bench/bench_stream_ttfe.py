@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+زمن أول حدث (time-to-first-event) لـ /api/orchestrator/smart_answer/stream
+مقابل زمن الاستجابة الكاملة لـ /api/orchestrator/smart_answer.
+
+    python3 scripts/bench/bench_stream_ttfe.py [--docs 20000] [--requests 200] [--url http://127.0.0.1:9090]
+
+بدون --url يُنشأ corpus اصطناعي مؤقت ويُشغَّل الخادم مع تعطيل كاش التحليل
+حتى يقيس كل طلب مسار RAG كاملاً.
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+import time
+import http.client
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlparse
+
+import yaml
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.rag_engine import build_index
+from scripts.bench.bench_backend_load import (
+    CONFIG_PATH,
+    _free_port,
+    latency_summary,
+    make_corpus,
+    make_messages,
+    start_server,
+)
+
+
+def _post(conn: http.client.HTTPConnection, path: str, message: str) -> http.client.HTTPResponse:
+    body = json.dumps({"message": message}, ensure_ascii=False).encode("utf-8")
+    conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+    return conn.getresponse()
+
+
+def measure_full(conn: http.client.HTTPConnection, message: str) -> Tuple[float, str]:
+    t0 = time.perf_counter()
+    resp = _post(conn, "/api/orchestrator/smart_answer?user_id=bench", message)
+    body = resp.read()
+    if resp.status != 200:
+        raise RuntimeError(f"smart_answer HTTP {resp.status}")
+    return time.perf_counter() - t0, json.loads(body)["answer"]
+
+
+def measure_stream(conn: http.client.HTTPConnection, message: str) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    resp = _post(conn, "/api/orchestrator/smart_answer/stream?user_id=bench", message)
+    if resp.status != 200:
+        resp.read()
+        raise RuntimeError(f"stream HTTP {resp.status}")
+    first = None
+    first_snippet = None
+    tokens = []
+    event = ""
+    while True:
+        line = resp.readline()
+        if not line:
+            break
+        line = line.decode("utf-8").rstrip("\n")
+        if line.startswith("event: "):
+            event = line[7:]
+            if first is None:
+                first = time.perf_counter() - t0
+            if event == "snippet" and first_snippet is None:
+                first_snippet = time.perf_counter() - t0
+        elif line.startswith("data: ") and event == "token":
+            tokens.append(json.loads(line[6:]))
+    return {
+        "first_event": first or 0.0,
+        "first_snippet": first_snippet,
+        "total": time.perf_counter() - t0,
+        "text": "".join(tokens),
+    }
+
+
+def bench_target(host: str, port: int, messages: List[str]) -> Dict[str, Any]:
+    conn = http.client.HTTPConnection(host, port, timeout=120)
+    # إحماء: تحميل الفهرس في عمال الـ pool
+    for msg in messages[:8]:
+        measure_full(conn, msg)
+    full: List[float] = []
+    first: List[float] = []
+    first_snippet: List[float] = []
+    total: List[float] = []
+    mismatches = 0
+    for msg in messages:
+        elapsed, answer = measure_full(conn, msg)
+        full.append(elapsed)
+        r = measure_stream(conn, msg)
+        first.append(r["first_event"])
+        if r["first_snippet"] is not None:
+            first_snippet.append(r["first_snippet"])
+        total.append(r["total"])
+        # نص الـ tokens = الإجابة الكاملة بدون سطر الـ agent prefix
+        if not r["text"] or not answer.endswith(r["text"]):
+            mismatches += 1
+    conn.close()
+    return {
+        "smart_answer_full": latency_summary(full),
+        "stream_first_event": latency_summary(first),
+        "stream_first_snippet": latency_summary(first_snippet),
+        "stream_complete": latency_summary(total),
+        "text_mismatches": mismatches,
+    }
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--url", help="خادم قائم بدلاً من تشغيل خادم مؤقت")
+    p.add_argument("--docs", type=int, default=20000)
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--cpu-workers", type=int, default=4)
+    p.add_argument("--seed", type=int, default=11)
+    p.add_argument("--out", help="حفظ النتائج كـ JSON")
+    a = p.parse_args()
+
+    rnd = random.Random(a.seed)
+    messages = make_messages(a.requests, rnd)
+
+    if a.url:
+        u = urlparse(a.url)
+        result = bench_target(u.hostname or "127.0.0.1", u.port or 80, messages)
+    else:
+        tmp = tempfile.mkdtemp(prefix="hf_bench_stream_")
+        try:
+            knowledge_dir = os.path.join(tmp, "knowledge_chunks")
+            make_corpus(knowledge_dir, a.docs, rnd)
+            build_index(knowledge_dir)
+            with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+                cfg = yaml.safe_load(f) or {}
+            cfg.setdefault("rag", {})["index_path"] = knowledge_dir
+            cfg["cache"] = {"enabled": False}
+            config_path = os.path.join(tmp, "orchestrator.yaml")
+            with open(config_path, "w", encoding="utf-8") as f:
+                yaml.safe_dump(cfg, f, allow_unicode=True)
+            port = _free_port()
+            proc = start_server(config_path, a.cpu_workers, port)
+            try:
+                result = bench_target("127.0.0.1", port, messages)
+            finally:
+                proc.terminate()
+                proc.wait(10)
+            result["docs"] = a.docs
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    for name in ("smart_answer_full", "stream_first_event", "stream_first_snippet", "stream_complete"):
+        r = result[name]
+        print(f"{name:<22} p50 {r['p50_ms']:>8.2f}ms  p95 {r['p95_ms']:>8.2f}ms  p99 {r['p99_ms']:>8.2f}ms")
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+حزمة قياس تحميل لـ backend_coach:
+  - corpora اصطناعية (افتراضياً 1k/10k/100k chunk، مفردات Zipf) + مجتمع مستخدمين
+  - خليط طلبات analyze / smart_answer / skills_state / skills_update بتزامن قابل للضبط
+  - throughput و p50/p95/p99 لكل endpoint
+  - إعادة تشغيل (replay) سجل طلبات JSONL
+  - النتائج JSON مع git rev، و --compare لعرض الفروق بين تشغيلين (commit مقابل commit)
+
+    python3 scripts/bench/bench_suite.py [--sizes 1000,10000,100000] [--concurrency 1,8,32] [--duration 10] --out a.json
+    python3 scripts/bench/bench_suite.py --url http://127.0.0.1:9090 --replay requests.jsonl --out b.json
+    python3 scripts/bench/bench_suite.py --compare a.json b.json
+
+سطر الـ replay إما طلب HTTP مسجّل:
+    {"method": "GET", "path": "/api/skills/state", "query": {"user_id": "u1"}, "ts": 1700000000.1}
+    {"method": "POST", "path": "/api/orchestrator/smart_answer", "query": {"user_id": "u1"}, "body": {"message": "..."}}
+أو نص رسالة فقط (message، أو title/body كما في requests.jsonl) يُرسل إلى --replay-endpoint.
+"""
+import os
+import sys
+import json
+import itertools
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import http.client
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse
+
+import yaml
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.rag_engine import build_index
+from scripts.bench.bench_backend_load import CONFIG_PATH, VOCAB, _free_port, latency_summary, start_server
+from scripts.bench.bench_cold_start import _wait_status
+from scripts.bench.bench_semantic import make_vocab
+
+ENDPOINTS = ("analyze", "smart_answer", "skills_state", "skills_update")
+DEFAULT_MIX = "analyze=5,smart_answer=2,skills_state=2,skills_update=1"
+SKILL_IDS = ("python_syntax_basics", "python_control_flow", "python_functions_basics")
+
+# (kind, method, path مع query, body أو None, ts أو None)
+Request = Tuple[str, str, str, Optional[bytes], Optional[float]]
+
+
+class Corpus:
+    """مفردات Zipf مشتركة بين ملفات الـ chunks ورسائل المستخدمين."""
+
+    def __init__(self, rnd: random.Random, vocab_size: int = 20000) -> None:
+        self.vocab = make_vocab(vocab_size, rnd)
+        self.cum_weights = list(itertools.accumulate(1.0 / (r + 1) for r in range(len(self.vocab))))
+
+    def words(self, rnd: random.Random, k: int) -> List[str]:
+        return rnd.choices(self.vocab, cum_weights=self.cum_weights, k=k)
+
+    def write(self, path: str, n_docs: int, rnd: random.Random) -> None:
+        os.makedirs(path, exist_ok=True)
+        for i in range(n_docs):
+            with open(os.path.join(path, f"doc_{i:06d}.txt"), "w", encoding="utf-8") as f:
+                f.write(" ".join(self.words(rnd, rnd.randint(80, 240))))
+
+    def message(self, rnd: random.Random) -> str:
+        # كلمات توجيه (خطأ/تصميم/...) + كلمات من الـ corpus
+        words = rnd.sample(VOCAB, rnd.randint(1, 3)) + self.words(rnd, rnd.randint(2, 6))
+        rnd.shuffle(words)
+        return " ".join(words)
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for item in mix.split(","):
+        kind, _, weight = item.partition("=")
+        if kind.strip() not in ENDPOINTS:
+            raise ValueError(f"unknown endpoint in mix: {kind!r}")
+        out[kind.strip()] = float(weight or 1)
+    return out
+
+
+def _json_body(data: Dict[str, Any]) -> bytes:
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def make_request(kind: str, user_id: str, rnd: random.Random, corpus: Corpus) -> Request:
+    if kind == "analyze":
+        q = urlencode({"user_id": user_id, "message": corpus.message(rnd)})
+        return kind, "GET", f"/api/orchestrator/analyze?{q}", None, None
+    if kind == "smart_answer":
+        q = urlencode({"user_id": user_id})
+        return kind, "POST", f"/api/orchestrator/smart_answer?{q}", _json_body({"message": corpus.message(rnd)}), None
+    if kind == "skills_state":
+        return kind, "GET", f"/api/skills/state?{urlencode({'user_id': user_id})}", None, None
+    q = urlencode({"user_id": user_id, "skill_id": rnd.choice(SKILL_IDS), "new_score": rnd.randint(0, 100)})
+    return kind, "POST", f"/api/skills/update?{q}", None, None
+
+
+def make_workload(n: int, users: int, mix: Dict[str, float], rnd: random.Random, corpus: Corpus) -> List[Request]:
+    """قائمة طلبات حتمية (نفس seed = نفس الطلبات في كل commit). المستخدمون بتوزيع Zipf."""
+    kinds = list(mix)
+    user_weights = list(itertools.accumulate(1.0 / (r + 1) for r in range(users)))
+    out = []
+    for _ in range(n):
+        kind = rnd.choices(kinds, weights=[mix[k] for k in kinds])[0]
+        user = rnd.choices(range(users), cum_weights=user_weights)[0]
+        out.append(make_request(kind, f"bench_u{user:05d}", rnd, corpus))
+    return out
+
+
+def _kind_of(path: str) -> str:
+    for marker, kind in (
+        ("/smart_answer", "smart_answer"),
+        ("/analyze", "analyze"),
+        ("/skills/state", "skills_state"),
+        ("/skills/update", "skills_update"),
+    ):
+        if marker in path:
+            return kind
+    return path.split("?", 1)[0]
+
+
+def load_replay(path: str, endpoint: str) -> List[Request]:
+    out: List[Request] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            ts = float(rec["ts"]) if rec.get("ts") is not None else None
+            if rec.get("path"):
+                target = rec["path"]
+                if rec.get("query"):
+                    target += ("&" if "?" in target else "?") + urlencode(rec["query"])
+                body = rec.get("body")
+                data = _json_body(body) if isinstance(body, dict) else None
+                out.append((_kind_of(target), rec.get("method", "GET").upper(), target, data, ts))
+                continue
+            text = rec.get("message") or " ".join(t for t in (rec.get("title"), rec.get("body")) if t)
+            if not text:
+                continue
+            user_id = str(rec.get("user_id") or rec.get("request_id") or "replay")
+            if endpoint == "smart_answer":
+                q = urlencode({"user_id": user_id})
+                out.append(("smart_answer", "POST", f"/api/orchestrator/smart_answer?{q}", _json_body({"message": text}), ts))
+            else:
+                q = urlencode({"user_id": user_id, "message": text})
+                out.append(("analyze", "GET", f"/api/orchestrator/analyze?{q}", None, ts))
+    return out
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, kind: str, latency: Optional[float]) -> None:
+        with self.lock:
+            if latency is None:
+                self.errors[kind] = self.errors.get(kind, 0) + 1
+            else:
+                self.latencies.setdefault(kind, []).append(latency)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        for kind in sorted(set(self.latencies) | set(self.errors)):
+            lat = self.latencies.get(kind, [])
+            endpoints[kind] = dict(
+                latency_summary(lat),
+                rps=round(len(lat) / elapsed, 2) if elapsed else 0.0,
+                errors=self.errors.get(kind, 0),
+            )
+        ok = sum(len(v) for v in self.latencies.values())
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests": ok,
+            "errors": sum(self.errors.values()),
+            "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+            "all": latency_summary([x for v in self.latencies.values() for x in v]),
+            "endpoints": endpoints,
+        }
+
+
+def _send(conn: http.client.HTTPConnection, req: Request) -> int:
+    _, method, target, body, _ = req
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    conn.request(method, target, body=body, headers=headers)
+    resp = conn.getresponse()
+    resp.read()
+    return resp.status
+
+
+def _worker(host: str, port: int, next_request, stop: threading.Event, rec: Recorder) -> None:
+    conn = http.client.HTTPConnection(host, port, timeout=120)
+    while not stop.is_set():
+        req = next_request()
+        if req is None:
+            break
+        t0 = time.perf_counter()
+        try:
+            status = _send(conn, req)
+            rec.add(req[0], time.perf_counter() - t0 if status < 400 else None)
+        except (OSError, http.client.HTTPException):
+            rec.add(req[0], None)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=120)
+    conn.close()
+
+
+def run_load(host: str, port: int, workload: List[Request], concurrency: int, duration: float) -> Dict[str, Any]:
+    """حلقة مغلقة: concurrency عامل يدور كل منهم على قائمة الطلبات لمدة duration ثانية."""
+    counter = itertools.count()
+    rec = Recorder()
+    stop = threading.Event()
+
+    def next_request() -> Request:
+        return workload[next(counter) % len(workload)]
+
+    threads = [
+        threading.Thread(target=_worker, args=(host, port, next_request, stop, rec), daemon=True)
+        for _ in range(concurrency)
+    ]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    return dict(rec.report(time.perf_counter() - t0), concurrency=concurrency)
+
+
+def run_replay(host: str, port: int, requests: List[Request], concurrency: int, speed: float) -> Dict[str, Any]:
+    """
+    كل طلب مرة واحدة بالترتيب. speed > 0 مع وجود ts: إرسال بنفس الفواصل الزمنية المسجلة
+    (مقسومة على speed)؛ وإلا بأسرع ما يمكن بـ concurrency عامل.
+    """
+    rec = Recorder()
+    stop = threading.Event()
+    lock = threading.Lock()
+    pending = iter(requests)
+    timed = speed > 0 and all(r[4] is not None for r in requests)
+    first_ts = requests[0][4] if timed and requests else 0.0
+    t0 = time.perf_counter()
+    lag: List[float] = []
+
+    def next_request() -> Optional[Request]:
+        with lock:
+            req = next(pending, None)
+            if req is None or not timed:
+                return req
+            due = t0 + (req[4] - first_ts) / speed
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            else:
+                lag.append(-wait)
+            return req
+
+    threads = [
+        threading.Thread(target=_worker, args=(host, port, next_request, stop, rec), daemon=True)
+        for _ in range(concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    out = dict(rec.report(time.perf_counter() - t0), concurrency=concurrency, timed=timed)
+    if timed:
+        # تأخر الإرسال عن الموعد المسجل (تشبّع العملاء/الخادم)
+        out["schedule_lag"] = latency_summary(lag)
+    return out
+
+
+def git_rev() -> str:
+    try:
+        rev = subprocess.check_output(["git", "-C", ROOT_DIR, "rev-parse", "--short", "HEAD"], text=True).strip()
+        dirty = subprocess.call(["git", "-C", ROOT_DIR, "diff", "--quiet", "HEAD", "--", "scripts", "apps", "config"])
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _flatten(results: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """مفاتيح قابلة للمقارنة: corpus/phase/endpoint -> الأرقام."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for corpus, c in results.get("corpora", {}).items():
+        for phase, r in c.get("runs", {}).items():
+            out[f"{corpus}/{phase}/all"] = dict(r["all"], rps=r["throughput_rps"], errors=r["errors"])
+            for kind, e in r["endpoints"].items():
+                out[f"{corpus}/{phase}/{kind}"] = e
+    return out
+
+
+def compare(old_path: str, new_path: str) -> None:
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    a, b = _flatten(old), _flatten(new)
+    print(f"{old['meta']['git_rev']} -> {new['meta']['git_rev']}")
+    print(f"{'key':<44} {'metric':>7} {'old':>10} {'new':>10} {'change':>8}")
+    for key in sorted(set(a) & set(b)):
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            x, y = a[key].get(metric, 0.0), b[key].get(metric, 0.0)
+            change = f"{(y - x) / x * 100.0:+.1f}%" if x else "n/a"
+            print(f"{key:<44} {metric:>7} {x:>10.2f} {y:>10.2f} {change:>8}")
+    for key in sorted(set(a) ^ set(b)):
+        print(f"{key:<44} only in {'old' if key in a else 'new'}")
+
+
+def bench_server(host: str, port: int, workload: List[Request], replay: List[Request], a: Any) -> Dict[str, Any]:
+    runs: Dict[str, Any] = {}
+    # إحماء: تحميل الفهرس/المكونات قبل القياس
+    run_load(host, port, workload, max(1, min(a.concurrency)), 1.0)
+    for c in a.concurrency:
+        runs[f"load/c{c}"] = run_load(host, port, workload, c, a.duration)
+        r = runs[f"load/c{c}"]
+        print(
+            f"  c={c:<4} rps={r['throughput_rps']:>8.1f} p50={r['all']['p50_ms']:>7.2f}ms "
+            f"p95={r['all']['p95_ms']:>7.2f}ms p99={r['all']['p99_ms']:>7.2f}ms errors={r['errors']}"
+        )
+    if replay:
+        for c in a.concurrency:
+            runs[f"replay/c{c}"] = run_replay(host, port, replay, c, a.replay_speed)
+            r = runs[f"replay/c{c}"]
+            print(f"  replay c={c:<4} n={r['requests']} rps={r['throughput_rps']:>8.1f} p99={r['all']['p99_ms']:>7.2f}ms")
+    return {"runs": runs}
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--url", help="خادم قائم بدلاً من تشغيل خادم مؤقت لكل corpus")
+    p.add_argument("--sizes", default="1000,10000,100000", help="أحجام الـ corpora (عدد chunks)")
+    p.add_argument("--concurrency", default="1,8,32")
+    p.add_argument("--duration", type=float, default=10.0, help="ثوانٍ لكل مستوى تزامن")
+    p.add_argument("--users", type=int, default=1000)
+    p.add_argument("--mix", default=DEFAULT_MIX)
+    p.add_argument("--workload", type=int, default=5000, help="حجم قائمة الطلبات المولّدة")
+    p.add_argument("--replay", help="سجل طلبات JSONL لإعادة تشغيله")
+    p.add_argument("--replay-endpoint", choices=("analyze", "smart_answer"), default="analyze")
+    p.add_argument("--replay-speed", type=float, default=0.0, help="0 = بأسرع ما يمكن؛ 1 = بالتوقيت المسجل")
+    p.add_argument("--cache", action="store_true", help="إبقاء كاش التحليل مفعلاً (افتراضياً معطّل)")
+    p.add_argument("--cpu-workers", type=int, default=None, help="FACTORY_CPU_WORKERS للخادم المؤقت")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--out", help="حفظ النتائج كـ JSON")
+    p.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="مقارنة ملفي نتائج")
+    a = p.parse_args()
+
+    if a.compare:
+        compare(*a.compare)
+        return
+
+    a.concurrency = [int(x) for x in a.concurrency.split(",")]
+    rnd = random.Random(a.seed)
+    corpus = Corpus(rnd)
+    workload = make_workload(a.workload, a.users, parse_mix(a.mix), rnd, corpus)
+    replay = load_replay(a.replay, a.replay_endpoint) if a.replay else []
+    results: Dict[str, Any] = {
+        "meta": {
+            "git_rev": git_rev(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(a).items() if k != "compare"},
+        },
+        "corpora": {},
+    }
+
+    if a.url:
+        u = urlparse(a.url)
+        print(f"{a.url}")
+        results["corpora"]["external"] = bench_server(u.hostname or "127.0.0.1", u.port or 80, workload, replay, a)
+    else:
+        for n_docs in (int(x) for x in a.sizes.split(",")):
+            tmp = tempfile.mkdtemp(prefix="hf_bench_suite_")
+            saved_env = {k: os.environ.get(k) for k in ("SKILLS_BACKEND", "SKILLS_DB_PATH")}
+            try:
+                knowledge_dir = os.path.join(tmp, "knowledge_chunks")
+                t0 = time.perf_counter()
+                corpus.write(knowledge_dir, n_docs, random.Random(a.seed + n_docs))
+                build_index(knowledge_dir)
+                build_s = time.perf_counter() - t0
+                with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+                    cfg = yaml.safe_load(f) or {}
+                cfg.setdefault("rag", {})["index_path"] = knowledge_dir
+                cfg.setdefault("cache", {})["enabled"] = bool(a.cache)
+                config_path = os.path.join(tmp, "orchestrator.yaml")
+                with open(config_path, "w", encoding="utf-8") as f:
+                    yaml.safe_dump(cfg, f, allow_unicode=True)
+                # مهارات المستخدمين الوهميين في قاعدة مؤقتة بدل ai/datasets/user_skills
+                os.environ["SKILLS_BACKEND"] = "sqlite"
+                os.environ["SKILLS_DB_PATH"] = os.path.join(tmp, "user_skills.sqlite3")
+                port = _free_port()
+                cpu_workers = a.cpu_workers if a.cpu_workers is not None else min(4, os.cpu_count() or 1)
+                proc = start_server(config_path, cpu_workers, port)
+                try:
+                    _wait_status(port, "/api/ready", time.time() + 300)
+                    print(f"corpus={n_docs} (generate+index {build_s:.1f}s)")
+                    r = bench_server("127.0.0.1", port, workload, replay, a)
+                    r["build_s"] = round(build_s, 2)
+                    results["corpora"][str(n_docs)] = r
+                finally:
+                    proc.terminate()
+                    proc.wait(10)
+            finally:
+                for k, v in saved_env.items():
+                    if v is None:
+                        os.environ.pop(k, None)
+                    else:
+                        os.environ[k] = v
+                shutil.rmtree(tmp, ignore_errors=True)
+
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"saved {a.out}")
+
+
+if __name__ == "__main__":
+    main()
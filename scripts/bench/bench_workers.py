@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+توسّع backend_coach مع عدد العمال (scripts/ai/prefork.py):
+  1) throughput و p50/p99 لنفس خليط الطلبات (bench_suite) مع 1..N عمال
+  2) الذاكرة: مجموع RSS مقابل مجموع PSS للعملية الرئيسية والعمال عند الجاهزية وبعد الحمل
+     (PSS أقل بكثير من RSS = الفهرس المحمّل قبل fork مشترك فعلاً؛ عدّادات المراجع في CPython
+     تنسخ مع الوقت الصفحات التي يلمسها كل عامل)
+  3) أمان الحالة بين العمليات: P عمليات تزيد نفس مهارة نفس المستخدم (JsonSkillsStore)
+     وتكتب قياسات في نفس الـ segments؛ لا تحديثات مفقودة ولا أسطر تالفة
+ملاحظة: التوسّع يتطلب أنوية فعلية (cpu_count مذكور في النتائج)، ومولّد الحمل يعمل على نفس الجهاز.
+
+    python3 scripts/bench/bench_workers.py [--docs 10000] [--workers 1,2,4] [--concurrency 32] [--duration 10]
+"""
+import os
+import sys
+import json
+import multiprocessing
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import yaml
+
+_THIS_DIR = os.path.dirname(__file__)
+ROOT_DIR = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.ai.rag_engine import build_index
+from scripts.ai.skills_store import JsonSkillsStore
+from scripts.ai.metrics_segments import list_segments, read_range
+from scripts.bench.bench_backend_load import CONFIG_PATH, _free_port
+from scripts.bench.bench_cold_start import _wait_status
+from scripts.bench.bench_suite import DEFAULT_MIX, Corpus, make_workload, parse_mix, run_load
+
+PREFORK = os.path.join(ROOT_DIR, "scripts", "ai", "prefork.py")
+
+
+def _descendants(pid: int) -> List[int]:
+    parents: Dict[int, List[int]] = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "r") as f:
+                # الحقل الرابع بعد اسم العملية (بين أقواس) هو ppid
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        parents.setdefault(ppid, []).append(int(name))
+    out, stack = [], [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            out.append(child)
+            stack.append(child)
+    return out
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    """مجموع Rss و Pss (KB) للعملية وكل أحفادها (العمال وعمليات الـ CPU pool)."""
+    total = {"rss_kb": 0, "pss_kb": 0, "processes": 0}
+    for p in [pid] + _descendants(pid):
+        try:
+            with open(f"/proc/{p}/smaps_rollup", "r") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key in ("Rss", "Pss"):
+                        total[f"{key.lower()}_kb"] += int(value.split()[0])
+            total["processes"] += 1
+        except OSError:
+            continue
+    return total
+
+
+def start_prefork(config_path: str, workers: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["ORCHESTRATOR_CONFIG"] = config_path
+    return subprocess.Popen(
+        [sys.executable, PREFORK, "--workers", str(workers), "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def _hammer(data_dir: str, segments_dir: str, k: int) -> None:
+    from scripts.ai.factory_metrics import MetricsSink
+
+    store = JsonSkillsStore(data_dir)
+    sink = MetricsSink(segments_dir)
+
+    def inc(state: Dict[str, Any]) -> Dict[str, Any]:
+        state["skills"]["counter"] = state["skills"].get("counter", 0) + 1
+        return state
+
+    for i in range(k):
+        store.update("shared_user", inc, lambda: {"user_id": "shared_user", "skills": {}, "level": "beginner"})
+        sink.submit({"ts": time.strftime("%Y-%m-%dT%H:%M:%S") + "Z", "agent": "bench", "pid": os.getpid(), "i": i})
+    sink.close()
+
+
+def state_safety(tmp: str, procs: int, k: int) -> Dict[str, Any]:
+    data_dir = os.path.join(tmp, "user_skills")
+    segments_dir = os.path.join(tmp, "metrics")
+    ctx = multiprocessing.get_context("fork")
+    t0 = time.perf_counter()
+    workers = [ctx.Process(target=_hammer, args=(data_dir, segments_dir, k)) for _ in range(procs)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    state = JsonSkillsStore(data_dir).load("shared_user") or {"skills": {}}
+    records = list(read_range(segments_dir=segments_dir))
+    return {
+        "processes": procs,
+        "updates_each": k,
+        "expected": procs * k,
+        "skill_counter": state["skills"].get("counter", 0),
+        "metric_records": len(records),
+        "segments": len(list_segments(segments_dir)),
+        "elapsed_s": round(elapsed, 3),
+    }
+
+
+def main() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--docs", type=int, default=10000)
+    p.add_argument("--workers", default="1,2,4")
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--duration", type=float, default=10.0)
+    p.add_argument("--users", type=int, default=1000)
+    p.add_argument("--mix", default=DEFAULT_MIX)
+    p.add_argument("--safety-procs", type=int, default=4)
+    p.add_argument("--safety-updates", type=int, default=500)
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--out", help="حفظ النتائج كـ JSON")
+    a = p.parse_args()
+
+    rnd = random.Random(a.seed)
+    corpus = Corpus(rnd)
+    workload = make_workload(5000, a.users, parse_mix(a.mix), rnd, corpus)
+    results: Dict[str, Any] = {
+        "docs": a.docs,
+        "concurrency": a.concurrency,
+        "cpu_count": os.cpu_count(),
+        "workers": {},
+    }
+    tmp = tempfile.mkdtemp(prefix="hf_bench_workers_")
+    saved_env = {k: os.environ.get(k) for k in ("SKILLS_BACKEND", "SKILLS_DB_PATH")}
+    try:
+        results["state_safety"] = state_safety(tmp, a.safety_procs, a.safety_updates)
+        s = results["state_safety"]
+        print(
+            f"state safety: {s['processes']} procs x {s['updates_each']}: skill={s['skill_counter']}"
+            f" metrics={s['metric_records']} (expected {s['expected']})"
+        )
+
+        knowledge_dir = os.path.join(tmp, "knowledge_chunks")
+        corpus.write(knowledge_dir, a.docs, random.Random(a.seed + a.docs))
+        build_index(knowledge_dir)
+        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f) or {}
+        cfg.setdefault("rag", {})["index_path"] = knowledge_dir
+        cfg.setdefault("cache", {})["enabled"] = False
+        config_path = os.path.join(tmp, "orchestrator.yaml")
+        with open(config_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(cfg, f, allow_unicode=True)
+        # مهارات المستخدمين الوهميين في قاعدة مؤقتة بدل ai/datasets/user_skills
+        os.environ["SKILLS_BACKEND"] = "sqlite"
+        os.environ["SKILLS_DB_PATH"] = os.path.join(tmp, "user_skills.sqlite3")
+
+        for n in (int(x) for x in a.workers.split(",")):
+            port = _free_port()
+            proc = start_prefork(config_path, n, port)
+            try:
+                if _wait_status(port, "/api/ready", time.time() + 300) != 200:
+                    raise RuntimeError("backend_coach did not start")
+                ready = memory_kb(proc.pid)
+                run_load("127.0.0.1", port, workload, a.concurrency, 1.0)
+                r = run_load("127.0.0.1", port, workload, a.concurrency, a.duration)
+                r["memory_ready"] = ready
+                r["memory"] = memory_kb(proc.pid)
+                results["workers"][str(n)] = r
+                print(
+                    f"workers={n:<3} rps={r['throughput_rps']:>8.1f} p50={r['all']['p50_ms']:>7.2f}ms"
+                    f" p99={r['all']['p99_ms']:>8.2f}ms errors={r['errors']}"
+                    f" pss ready={ready['pss_kb'] // 1024}MB loaded={r['memory']['pss_kb'] // 1024}MB"
+                    f" (rss {r['memory']['rss_kb'] // 1024}MB)"
+                )
+            finally:
+                proc.terminate()
+                proc.wait(60)
+        base = results["workers"].get("1", {}).get("throughput_rps")
+        if base:
+            for r in results["workers"].values():
+                r["speedup"] = round(r["throughput_rps"] / base, 2)
+    finally:
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -41,6 +41,8 @@ usage() {
     echo "  $0 start <app_id>                   # تشغيل تطبيق"
     echo "  $0 stop <app_id>                    # إيقاف تطبيق"
     echo "  $0 decide \"رسالة\" [user_id]       # استشارة المدير"
+    echo "  $0 decide --batch [ملف] [--json]    # قرار لكل سطر (ملف أو stdin)"
+    echo "  $0 decisiond start|stop|status      # خدمة القرارات الدائمة"
     echo "  $0 spider [--seeds ملف] [--test]    # تشغيل العنكبوت"
     echo "  $0 status [--detailed]              # حالة المصنع"
     echo "  $0 logs [type] [--follow]           # عرض السجلات"
@@ -122,6 +124,36 @@ decide_agent() {
     "$SCRIPTS_DIR/orchestrator_decision_engine.sh" decide "$message" "$user_id"
 }
 
+# قرارات بالجملة: رسالة في كل سطر من ملف أو stdin
+decide_batch() {
+    local input="-"
+    local extra=()
+    while [[ $# -gt 0 ]]; do
+        case $1 in
+            --json)
+                extra+=(--json)
+                shift
+                ;;
+            --user-id)
+                extra+=(--user-id "$2")
+                shift 2
+                ;;
+            *)
+                input="$1"
+                shift
+                ;;
+        esac
+    done
+    if [ "$input" = "-" ]; then
+        python3 "$AI_SCRIPTS_DIR/decision_daemon.py" batch "${extra[@]}"
+    elif [ -f "$input" ]; then
+        python3 "$AI_SCRIPTS_DIR/decision_daemon.py" batch "${extra[@]}" < "$input"
+    else
+        log_error "الملف غير موجود: $input"
+        exit 1
+    fi
+}
+
 # تشغيل العنكبوت
 run_spider() {
     local seeds_file=""
@@ -241,6 +273,12 @@ show_status() {
             local feedback_count=$(wc -l < "$LOGS_DIR/quality_feedback.csv")
             echo "  - تقييمات الجودة: $feedback_count"
         fi
+        
+        # القياسات (من الـ rollups المحدّثة تدريجياً)
+        if [ -d "$LOGS_DIR/metrics" ] || [ -f "$LOGS_DIR/factory_metrics.jsonl" ]; then
+            echo "  - قياسات آخر 24 ساعة:"
+            python3 "$AI_SCRIPTS_DIR/factory_metrics.py" summary --since 24h --by agent 2>/dev/null | tail -n +2 | sed 's/^/    /'
+        fi
     fi
     
     echo "=========================================="
@@ -385,6 +423,10 @@ clean_logs() {
     done
     
     log_success "تم حذف $deleted_count ملف سجل قديم"
+    
+    # القياسات: الاحتفاظ = حذف segments ساعية كاملة
+    python3 "$AI_SCRIPTS_DIR/factory_metrics.py" clean --days "$days" 2>/dev/null || \
+        log_warning "تعذّر تنظيف segments القياسات"
 }
 
 # التنفيذ الرئيسي
@@ -402,7 +444,15 @@ main() {
             stop_app "$2"
             ;;
         decide)
-            decide_agent "$2" "$3"
+            if [ "${2:-}" = "--batch" ]; then
+                shift 2
+                decide_batch "$@"
+            else
+                decide_agent "$2" "$3"
+            fi
+            ;;
+        decisiond)
+            python3 "$AI_SCRIPTS_DIR/decision_daemon.py" "${2:-status}"
             ;;
         spider)
             shift